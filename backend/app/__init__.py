@@ -15,6 +15,10 @@ from dotenv import load_dotenv
 from app.core.firebase import initialize_firebase
 from app.core.database import init_db  # ← CORRECT IMPORT (from database.py, not firestore_db.py)
 from app.api.v1.routes import register_routes
+from app.services.notification_service import start_alert_digest_scheduler
+from app.services.retention import start_retention_scheduler
+from app.core.config import Config
+from app.ml_models.model_loader import warmup_model
 
 # Load environment variables
 load_dotenv()
@@ -77,6 +81,19 @@ def create_app(config_name: str = 'development') -> Flask:
     register_routes(app)
     app.logger.info("✅ API routes registered")
 
+    # Scheduled retention / compaction (off unless RETENTION_SCHEDULER_ENABLED)
+    if start_retention_scheduler() is not None:
+        app.logger.info("✅ Retention scheduler started")
+
+    # Alert digests deferred by the per-user caps are sent on a timer
+    start_alert_digest_scheduler()
+    app.logger.info("✅ Alert digest scheduler started")
+
+    # The model loads lazily on the first detection unless warmed up here
+    if Config.MODEL_WARMUP_ON_STARTUP:
+        warmup_model()
+        app.logger.info("✅ Disease model loaded and warmed up")
+
     # ============================================
     # HEALTH CHECK ENDPOINTS
     # ============================================
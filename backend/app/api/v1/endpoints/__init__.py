@@ -14,7 +14,8 @@ from app.api.v1.endpoints import (
     knowledge_base,
     users,
     fields,
-    alerts
+    alerts,
+    exports
 )
 
 __all__ = [
@@ -28,4 +29,5 @@ __all__ = [
     'users',
     'fields',
     'alerts',
+    'exports',
 ]
@@ -4,9 +4,17 @@ Disease detection API endpoint - SIMPLIFIED VERSION
 from flask import Blueprint, request, jsonify
 import logging
 import os
-from typing import Tuple
-
-from app.services.disease_detection_service import detect_disease, get_disease_details
+import zipfile
+import zlib
+from io import BytesIO
+from typing import Any, Dict, List, Tuple
+
+from app.core.config import Config
+from app.ml_models.model_loader import (
+    get_disease_model, get_inference_scheduler, get_model_registry, is_model_loaded)
+from app.ml_models.prediction_cache import get_prediction_cache
+from app.services.disease_detection_service import (
+    detect_disease, detect_disease_batch, get_disease_details, image_error, summarize_detections)
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +73,116 @@ def detect_disease_endpoint() -> Tuple[dict, int]:
             'error_type': 'server_error'
         }), 500
 
+class BatchTooLarge(ValueError):
+    """Upload exceeds the batch image count or total size cap"""
+
+
+# Raised when reading one zip member (bad CRC, corrupt or truncated data,
+# encrypted or unsupported compression); the member is rejected on its own
+ARCHIVE_MEMBER_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError)
+
+
+def _collect_batch_images(max_total: int) -> Tuple[List[Tuple[str, bytes]], Dict[int, Dict[str, Any]]]:
+    """
+    Images of a batch upload: repeated ``images`` files and/or one ``archive`` zip
+    Returns:
+        (filename, bytes) of acceptable images, in upload order, and error
+        entries of rejected ones keyed by their position in the upload
+    Raises:
+        BatchTooLarge: Too many images or more than ``max_total`` bytes (uncompressed)
+    """
+    images: List[Tuple[str, bytes]] = []
+    rejected: Dict[int, Dict[str, Any]] = {}
+    total = 0
+
+    def _add(name: str, size: int, read: Any) -> None:
+        nonlocal total
+        if len(images) + len(rejected) >= Config.DETECT_BATCH_MAX_IMAGES:
+            raise BatchTooLarge(f'At most {Config.DETECT_BATCH_MAX_IMAGES} images per batch')
+        position = len(images) + len(rejected)
+        if not allowed_file(name):
+            rejected[position] = image_error(name, 'Invalid file type')
+        elif size > MAX_FILE_SIZE:
+            rejected[position] = image_error(name, f'File exceeds {MAX_FILE_SIZE // (1024 * 1024)} MB')
+        else:
+            total += size
+            if total > max_total:
+                raise BatchTooLarge(f'Batch exceeds {max_total // (1024 * 1024)} MB')
+            try:
+                images.append((name, read()))
+            except ARCHIVE_MEMBER_ERRORS as e:
+                logger.warning(f"⚠️ Unreadable archive entry {name}: {e}")
+                rejected[position] = image_error(name, f'Unreadable archive entry: {e}')
+
+    for file in request.files.getlist('images'):
+        if not file or not file.filename:
+            continue
+        data = file.read(MAX_FILE_SIZE + 1)
+        _add(file.filename, len(data), lambda data=data: data)
+
+    archive = request.files.get('archive')
+    if archive and archive.filename:
+        try:
+            with zipfile.ZipFile(BytesIO(archive.read())) as zf:
+                # Sizes come from the zip directory, so nothing is inflated past the caps
+                for info in zf.infolist():
+                    base = os.path.basename(info.filename)
+                    if info.is_dir() or not base or base.startswith('.') or info.filename.startswith('__MACOSX/'):
+                        continue
+                    _add(info.filename, info.file_size, lambda info=info: zf.read(info))
+        except zipfile.BadZipFile:
+            raise ValueError('archive is not a valid zip file') from None
+    return images, rejected
+
+
+@bp.route('/detect-batch', methods=['POST'])
+def detect_disease_batch_endpoint() -> Tuple[dict, int]:
+    """
+    Detect diseases in many leaf photos of one visit
+
+    Multipart form: repeated ``images`` files and/or one ``archive`` zip,
+    plus optional ``user_id``, ``field_id`` and ``batch_id``. Returns one
+    result per image (errors are reported per image) and a field-level
+    summary with disease prevalence and maximum severity.
+    """
+    try:
+        max_total = Config.DETECT_BATCH_MAX_TOTAL_MB * 1024 * 1024
+        if request.content_length and request.content_length > max_total + 1024 * 1024:
+            return jsonify({'error': f'Batch exceeds {Config.DETECT_BATCH_MAX_TOTAL_MB} MB'}), 413
+
+        try:
+            images, rejected = _collect_batch_images(max_total)
+        except BatchTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not images and not rejected:
+            return jsonify({'error': 'No images provided'}), 400
+        logger.info(f"🔄 Batch detection request: {len(images)} image(s), {len(rejected)} rejected")
+
+        detected = iter(detect_disease_batch(
+            images,
+            user_id=request.form.get('user_id', 'test_user'),
+            field_id=request.form.get('field_id', 'test_field'),
+            batch_id=request.form.get('batch_id'),
+        ))
+        # One result per upload, in upload order
+        results = [rejected[i] if i in rejected else next(detected)
+                   for i in range(len(images) + len(rejected))]
+
+        summary = summarize_detections(results)
+        logger.info(f"✅ Batch detection: {summary['analysed']}/{summary['total_images']} analysed, "
+                    f"prevalence {summary['disease_prevalence']:.0%}")
+        return jsonify({'status': 'success', 'results': results, 'summary': summary}), 200
+
+    except Exception as e:
+        logger.error(f"❌ Endpoint error: {e}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'error_type': 'server_error'
+        }), 500
+
 @bp.route('/details/<disease_name>', methods=['GET'])
 def get_disease_details_endpoint(disease_name: str) -> Tuple[dict, int]:
     """Get detailed information about a disease"""
@@ -82,6 +200,40 @@ def get_disease_details_endpoint(disease_name: str) -> Tuple[dict, int]:
         logger.error(f"Error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/metrics', methods=['GET'])
+def inference_metrics() -> Tuple[dict, int]:
+    """Inference metrics: interpreter pool usage, micro-batching (batch sizes, queue wait,
+    invoke latency and throughput) and prediction cache hit rates"""
+    try:
+        # Metrics never trigger the (lazy) model load
+        if not is_model_loaded():
+            return jsonify({'model_loaded': False}), 200
+        metrics = {
+            'model_loaded': True,
+            'backend': get_disease_model().backend.describe(),
+            'pool': get_disease_model().pool.snapshot(),
+            'batching': Config.INFERENCE_BATCHING_ENABLED,
+        }
+        if Config.INFERENCE_BATCHING_ENABLED:
+            metrics['scheduler'] = get_inference_scheduler().snapshot()
+        if Config.PREDICTION_CACHE_ENABLED:
+            metrics['prediction_cache'] = get_prediction_cache().snapshot()
+        metrics['models'] = get_model_registry().snapshot()
+        return jsonify(metrics), 200
+    except Exception as e:
+        logger.error(f"Metrics error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/models', methods=['GET'])
+def model_versions() -> Tuple[dict, int]:
+    """Model registry: registered versions, active version, shadow evaluation (agreement,
+    latency) and swap counters. Versions are switched with manage_models.py"""
+    try:
+        return jsonify(get_model_registry().snapshot()), 200
+    except Exception as e:
+        logger.error(f"Model registry error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/health', methods=['GET'])
 def health_check() -> Tuple[dict, int]:
     """Health check endpoint"""
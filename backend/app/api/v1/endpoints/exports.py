@@ -0,0 +1,80 @@
+"""Bulk data export API endpoints"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Tuple, Union
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from app.core.database import db
+from app.core.security import get_user_id, require_auth
+from app.services.export_service import (EXPORT_COLLECTIONS, MIME_TYPES, ExportError, export_scope,
+                                         stream_export)
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('exports', __name__, url_prefix='/exports')
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+@bp.route('/<collection>', methods=['GET'])
+@require_auth
+def export_collection(collection: str) -> Union[Response, Tuple[Response, int]]:
+    """
+    Stream a field's or batch's data as a file
+    Path: collection (sensor_readings, disease_detections, treatments)
+    Query params: field_id or batch_id, format (csv, arrow, parquet),
+    start / end (ISO date-time, UTC), columns (comma separated)
+    """
+    try:
+        user_id = get_user_id()
+        field_id = request.args.get('field_id')
+        batch_id = request.args.get('batch_id')
+        fmt = request.args.get('format', 'csv').lower()
+        columns = [c for c in request.args.get('columns', '').split(',') if c] or None
+
+        if collection not in EXPORT_COLLECTIONS:
+            return jsonify({'error': f'Unknown collection: {collection}'}), 404
+
+        # Verify ownership
+        owner_doc = db.get_document('crop_batches', batch_id) if batch_id else \
+            db.get_document('fields', field_id) if field_id else None
+        if batch_id or field_id:
+            if not owner_doc:
+                return jsonify({'error': 'Batch or field not found'}), 404
+            if owner_doc.get('user_id') != user_id:
+                return jsonify({'error': 'Unauthorized'}), 403
+
+        try:
+            start = _parse_time(request.args.get('start'))
+            end = _parse_time(request.args.get('end'))
+        except ValueError:
+            return jsonify({'error': 'start and end must be ISO date-times'}), 400
+
+        filters, season = export_scope(collection, field_id, batch_id)
+        if season:
+            start = max(start, season[0]) if start else season[0]
+            end = min(end, season[1]) if end else season[1]
+
+        chunks = stream_export(collection, fmt, filters, start, end, columns)
+
+        extension = {'csv': 'csv', 'arrow': 'arrows', 'parquet': 'parquet'}[fmt]
+        filename = f'{collection}_{batch_id or field_id}.{extension}'
+        return Response(
+            stream_with_context(chunks),
+            mimetype=MIME_TYPES[fmt],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:  # pylint: disable=broad-except
+        logger.error(f'Error exporting {collection}: {str(e)}')
+        return jsonify({'error': 'Failed to export data'}), 500
@@ -1,9 +1,34 @@
+from datetime import datetime, timedelta, timezone
+
 from flask import Blueprint, jsonify, request
+from app.core.database import db
+from app.core.security import get_user_id, require_auth
+from app.services.export_service import ExportError, batch_season
 from app.services.realtime_db import get_rtdb_service
+from app.services.sensor_query import QueryError, parse_aggregations, parse_channels, run_query
+from app.services.sensor_rollups import (CHANNELS, RESOLUTION_SECONDS, choose_resolution, rollup_percentiles,
+                                         rollup_series)
+from app.utils.downsampling import downsample_readings
 
 bp = Blueprint('sensors', __name__, url_prefix='/sensors')
 
 
+def _parse_time(value):
+    """ISO date-time (UTC when no offset is given), or None"""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _parse_percentiles(value):
+    """'10,50,90' -> [10.0, 50.0, 90.0]; raises ValueError outside [0, 100]"""
+    percentiles = [float(p) for p in value.split(',') if p.strip()]
+    if not percentiles or any(not 0 <= p <= 100 for p in percentiles):
+        raise ValueError('percentiles must be comma separated numbers in [0, 100]')
+    return percentiles
+
+
 @bp.route('/latest', methods=['GET'])
 def get_latest_sensor_reading():
     """
@@ -38,28 +63,207 @@ def get_latest_sensor_reading():
 def get_sensor_history():
     """
     Get historical sensor readings from RTDB
-    Query params: field_id, duration (e.g., '7d', '14d', '30d')
+    Query params: field_id, duration (e.g., '7d', '14d', '30d'),
+    resolution ('raw' (default), 'auto', 'hour', 'day'),
+    max_points (optional; returns LTTB-downsampled columnar 'series'
+    instead of 'readings'), percentiles (optional, e.g. '10,50,90'; adds
+    approximate per-channel 'percentiles' over the window from the daily
+    quantile sketches)
+
+    Rollups are opt-in: 'hour' and 'day' return bucket points, and 'auto'
+    the coarsest rollup resolution that still yields enough chart points.
+    Raw RTDB readings are returned when the rollups do not cover the whole
+    window.
     """
     field_id = request.args.get('field_id', 'field_123')
     duration = request.args.get('duration', '7d')
+    resolution = request.args.get('resolution', 'raw')
+    max_points = request.args.get('max_points', type=int)
+    percentiles = request.args.get('percentiles')
 
     # Parse duration
     duration_days = int(duration.replace('d', ''))
 
+    if resolution != 'auto' and resolution != 'raw' and resolution not in RESOLUTION_SECONDS:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid resolution: {resolution}'
+        }), 400
+
+    if max_points is not None and max_points < 3:
+        return jsonify({
+            'success': False,
+            'error': 'max_points must be at least 3'
+        }), 400
+
+    if percentiles is not None:
+        try:
+            percentiles = _parse_percentiles(percentiles)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+    try:
+        if resolution == 'auto':
+            resolution = choose_resolution(duration_days * 86400)
+
+        historical_data = []
+        series = None
+        if resolution != 'raw':
+            start = datetime.utcnow() - timedelta(days=duration_days)
+            historical_data = rollup_series(field_id, resolution, start)
+        if historical_data and max_points:
+            series = downsample_readings(historical_data, CHANNELS, max_points)
+        elif not historical_data:
+            # Fetch from RTDB
+            resolution = 'raw'
+            historical_data = get_rtdb_service().get_sensor_history(field_id, duration_days, max_points)
+            series = historical_data if max_points else None
+
+        data = {
+            'field_id': field_id,
+            'duration': duration,
+            'resolution': resolution,
+        }
+        if max_points:
+            data.update({'series': series, 'count': series['count']})
+        else:
+            data.update({'readings': historical_data, 'count': len(historical_data)})
+        if percentiles:
+            end = datetime.now(timezone.utc)
+            data['percentiles'] = rollup_percentiles(
+                [(field_id, end - timedelta(days=duration_days), end)], percentiles)
+
+        return jsonify({
+            'success': True,
+            'data': data
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@bp.route('/percentiles', methods=['GET'])
+@require_auth
+def get_sensor_percentiles():
+    """
+    Approximate percentiles merged across fields and/or batch seasons
+    Query params: field_id and/or batch_id (comma separated),
+    duration (field windows, default '30d'), percentiles (default '10,50,90')
+
+    Answered from the daily quantile sketches in the rollups, so the cost
+    depends on the number of days, not the number of readings. Windows are
+    widened to whole UTC days.
+    """
+    user_id = get_user_id()
+    field_ids = [f for f in request.args.get('field_id', '').split(',') if f]
+    batch_ids = [b for b in request.args.get('batch_id', '').split(',') if b]
+    duration = request.args.get('duration', '30d')
+
+    if not field_ids and not batch_ids:
+        return jsonify({
+            'success': False,
+            'error': 'field_id or batch_id is required'
+        }), 400
+
     try:
-        # Fetch from RTDB
-        historical_data = get_rtdb_service().get_sensor_history(field_id, duration_days)
+        percentiles = _parse_percentiles(request.args.get('percentiles', '10,50,90'))
+        duration_days = int(duration.replace('d', ''))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    try:
+        end = datetime.now(timezone.utc)
+        windows = []
+        for field_id in field_ids:
+            field = db.get_document('fields', field_id)
+            if not field or field.get('user_id') != user_id:
+                return jsonify({'success': False, 'error': f'Field not found: {field_id}'}), 404
+            windows.append((field_id, end - timedelta(days=duration_days), end))
+        for batch_id in batch_ids:
+            batch = db.get_document('crop_batches', batch_id)
+            if not batch or batch.get('user_id') != user_id:
+                return jsonify({'success': False, 'error': f'Batch not found: {batch_id}'}), 404
+            windows.append(batch_season(batch_id))
 
         return jsonify({
             'success': True,
             'data': {
-                'field_id': field_id,
-                'duration': duration,
-                'readings': historical_data,
-                'count': len(historical_data)
+                'field_ids': field_ids,
+                'batch_ids': batch_ids,
+                **rollup_percentiles(windows, percentiles)
             }
         }), 200
 
+    except ExportError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@bp.route('/query', methods=['GET'])
+@require_auth
+def query_sensor_data():
+    """
+    Bucketed aggregation over a time window
+    Query params: field_id, from / to (ISO date-time, UTC; default last 24h),
+    bucket ('15m', '1h' (default), '1d', ... or 'all'),
+    agg (comma separated: count, sum, mean, min, max, std, first, last,
+    p0-p100; default 'mean'), channels (comma separated; default all)
+
+    Returns bucket start timestamps (epoch ms) and one value array per
+    channel and aggregation; buckets without readings are omitted.
+    """
+    user_id = get_user_id()
+    field_id = request.args.get('field_id')
+    if not field_id:
+        return jsonify({
+            'success': False,
+            'error': 'field_id is required'
+        }), 400
+
+    try:
+        end = _parse_time(request.args.get('to'))
+        start = _parse_time(request.args.get('from')) or \
+            (end or datetime.now(timezone.utc)) - timedelta(days=1)
+        bucket = request.args.get('bucket', '1h')
+        aggregations = parse_aggregations(request.args.get('agg', 'mean'))
+        channels = parse_channels(request.args.get('channels'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    try:
+        field = db.get_document('fields', field_id)
+        if not field or field.get('user_id') != user_id:
+            return jsonify({'success': False, 'error': f'Field not found: {field_id}'}), 404
+
+        return jsonify({
+            'success': True,
+            'data': run_query(field_id, start, end, bucket, aggregations, channels)
+        }), 200
+
+    except QueryError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
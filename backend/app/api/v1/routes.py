@@ -9,7 +9,8 @@ from app.api.v1.endpoints import (
     knowledge_base,
     users,
     fields,
-    alerts
+    alerts,
+    exports
 )
 
 
@@ -28,5 +29,6 @@ def register_routes(app: Flask) -> None:
     api_v1.register_blueprint(users.bp)
     api_v1.register_blueprint(fields.bp)
     api_v1.register_blueprint(alerts.bp)
+    api_v1.register_blueprint(exports.bp)
 
     app.register_blueprint(api_v1)
@@ -36,6 +36,8 @@ class Config:
 
     # Firestore
     FIRESTORE_DATABASE = os.getenv('FIRESTORE_DATABASE', '(default)')
+    # 'firestore' or 'memory' (process-local stand-in for dev and benchmarks)
+    DATABASE_BACKEND = os.getenv('DATABASE_BACKEND', 'firestore').lower()
 
     # Cloud Storage
     CLOUD_STORAGE_BUCKET = os.getenv('CLOUD_STORAGE_BUCKET')
@@ -102,6 +104,58 @@ class Config:
     # Model output configuration
     NUM_DISEASE_CLASSES = 6
 
+    # JPEG draft decoding + direct writes into the input tensor (app/ml/preprocessing.py)
+    FAST_PREPROCESSING = os.getenv('FAST_PREPROCESSING', 'True').lower() == 'true'
+
+    # /disease/detect-batch limits and preprocessing workers
+    DETECT_BATCH_MAX_IMAGES = int(os.getenv('DETECT_BATCH_MAX_IMAGES', '100'))
+    DETECT_BATCH_MAX_TOTAL_MB = int(os.getenv('DETECT_BATCH_MAX_TOTAL_MB', '100'))
+    DETECT_BATCH_WORKERS = int(os.getenv('DETECT_BATCH_WORKERS', '4'))
+
+    # TFLite interpreter runtime: auto (litert > tflite_runtime > tensorflow) or one of those
+    INFERENCE_RUNTIME = os.getenv('INFERENCE_RUNTIME', 'auto')
+    # Load and warm the model in create_app instead of on the first detection
+    MODEL_WARMUP_ON_STARTUP = os.getenv('MODEL_WARMUP_ON_STARTUP', 'False').lower() == 'true'
+
+    # Inference backend per deployment: tflite (chili_disease_model.tflite) or onnxruntime (.onnx)
+    INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'tflite')
+    # ONNX Runtime: graph optimisation (disable|basic|extended|all), intra-op threads per run
+    # (0 = INFERENCE_NUM_THREADS), inter-op threads (>1 runs independent branches in parallel),
+    # IO binding into preallocated buffers
+    ORT_GRAPH_OPTIMIZATION_LEVEL = os.getenv('ORT_GRAPH_OPTIMIZATION_LEVEL', 'all')
+    ORT_INTRA_OP_THREADS = int(os.getenv('ORT_INTRA_OP_THREADS', '0'))
+    ORT_INTER_OP_THREADS = int(os.getenv('ORT_INTER_OP_THREADS', '1'))
+    ORT_IO_BINDING = os.getenv('ORT_IO_BINDING', 'True').lower() == 'true'
+
+    # Model registry: directory with manifest.json and versioned models ('' = bundled model only)
+    MODEL_REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', '')
+    # Seconds between manifest checks for a new active / shadow version (0 = never reload)
+    MODEL_REGISTRY_POLL_SECONDS = float(os.getenv('MODEL_REGISTRY_POLL_SECONDS', '10'))
+    # Queued shadow evaluations; further samples are dropped so shadowing never slows serving
+    SHADOW_MAX_PENDING = int(os.getenv('SHADOW_MAX_PENDING', '32'))
+
+    # Interpreter pool: concurrent inferences each get their own interpreter
+    # 0 = os.cpu_count() // INFERENCE_NUM_THREADS
+    INFERENCE_POOL_SIZE = int(os.getenv('INFERENCE_POOL_SIZE', '0'))
+    # Intra-op threads per interpreter
+    INFERENCE_NUM_THREADS = int(os.getenv('INFERENCE_NUM_THREADS', '1'))
+
+    # Inference micro-batching: concurrent detections share one interpreter invoke
+    INFERENCE_BATCHING_ENABLED = os.getenv('INFERENCE_BATCHING_ENABLED', 'True').lower() == 'true'
+    # Upper bound; models without a dynamic batch axis always run one image per invoke
+    INFERENCE_MAX_BATCH_SIZE = int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '16'))
+    # Longest a request waits for others to join its batch
+    INFERENCE_MAX_WAIT_MS = float(os.getenv('INFERENCE_MAX_WAIT_MS', '5'))
+
+    # Prediction cache for re-uploaded images, keyed by model version + SHA-256 of the bytes
+    PREDICTION_CACHE_ENABLED = os.getenv('PREDICTION_CACHE_ENABLED', 'True').lower() == 'true'
+    PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', '1024'))
+    # Optional disk tier shared by workers ('' = memory only)
+    PREDICTION_CACHE_DIR = os.getenv('PREDICTION_CACHE_DIR', '')
+    PREDICTION_CACHE_DISK_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_DISK_MAX_ENTRIES', '100000'))
+    # Near-duplicate tier: max Hamming distance between 64-bit perceptual hashes (-1 = off)
+    PREDICTION_CACHE_PHASH_DISTANCE = int(os.getenv('PREDICTION_CACHE_PHASH_DISTANCE', '-1'))
+
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
@@ -126,12 +180,85 @@ class Config:
     FCM_SERVER_KEY = os.getenv('FCM_SERVER_KEY')
     MAX_CRITICAL_ALERTS_PER_DAY = int(
           os.getenv('MAX_CRITICAL_ALERTS_PER_DAY', '5'))
+    MAX_ALERTS_PER_DAY = int(os.getenv('MAX_ALERTS_PER_DAY', '20'))
+    ALERT_COALESCE_WINDOW_MINUTES = int(
+          os.getenv('ALERT_COALESCE_WINDOW_MINUTES', '60'))
+    ALERT_DIGEST_INTERVAL_MINUTES = int(
+          os.getenv('ALERT_DIGEST_INTERVAL_MINUTES', '60'))
 
     # Sensor Settings
+    # Newest raw readings returned by a sensor history request
     SENSOR_CACHE_LIMIT = int(os.getenv('SENSOR_CACHE_LIMIT', '50'))
     SENSOR_UPDATE_INTERVAL_MINUTES = int(
           os.getenv('SENSOR_UPDATE_INTERVAL_MINUTES', '30'))
 
+    # Where raw readings are stored: 'flat' (sensor_readings), 'dual' (write
+    # both, read flat; migration) or 'field' (fields/{field_id}/readings)
+    READINGS_LAYOUT = os.getenv('READINGS_LAYOUT', 'flat').lower()
+
+    # Ingestion pipeline (backpressure between MQTT and Firestore)
+    INGEST_PIPELINE_ENABLED = os.getenv('INGEST_PIPELINE_ENABLED', 'True').lower() == 'true'
+    INGEST_QUEUE_MAXSIZE = int(os.getenv('INGEST_QUEUE_MAXSIZE', '10000'))
+    INGEST_HIGH_WATERMARK = int(os.getenv('INGEST_HIGH_WATERMARK', '8000'))
+    INGEST_LOW_WATERMARK = int(os.getenv('INGEST_LOW_WATERMARK', '2000'))
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '200'))
+    INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '1'))
+    # 'none' or 'downsample' (keep only the newest queued reading per field while paused)
+    INGEST_SHED_POLICY = os.getenv('INGEST_SHED_POLICY', 'none').lower()
+    # Must stay well below the MQTT keepalive (60s) or the broker drops us
+    INGEST_MAX_BLOCK_SECONDS = float(os.getenv('INGEST_MAX_BLOCK_SECONDS', '20'))
+
+    # Sensor rollups (hourly/daily aggregates)
+    ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', 'True').lower() == 'true'
+    # History uses the coarsest resolution that still yields this many points
+    ROLLUP_MIN_POINTS = int(os.getenv('ROLLUP_MIN_POINTS', '48'))
+    # Relative error of the daily quantile sketches (changing it needs a backfill)
+    ROLLUP_SKETCH_ACCURACY = float(os.getenv('ROLLUP_SKETCH_ACCURACY', '0.01'))
+
+    # /sensors/query result cache (entries are also invalidated by new readings)
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '256'))
+    QUERY_CACHE_TTL_SECONDS = float(os.getenv('QUERY_CACHE_TTL_SECONDS', '60'))
+
+    # Cold archive of raw readings (Gorilla-compressed monthly blocks)
+    # 'gcs' (Firebase Storage bucket) or 'local' (files under ARCHIVE_LOCAL_PATH)
+    ARCHIVE_BACKEND = os.getenv('ARCHIVE_BACKEND', 'gcs').lower()
+    ARCHIVE_LOCAL_PATH = os.getenv('ARCHIVE_LOCAL_PATH', 'sensor_archive')
+    ARCHIVE_PREFIX = os.getenv('ARCHIVE_PREFIX', 'sensor_archive')
+    # Readings older than this are moved out of Firestore by archive_readings.py
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '90'))
+
+    # Retention / compaction (compact_data.py or the in-process scheduler); 0 days keeps forever
+    # Raw readings older than this are folded into rollups and deleted (whole UTC days)
+    RETENTION_READINGS_DAYS = int(os.getenv('RETENTION_READINGS_DAYS', '180'))
+    # 'rollup' (delete after compaction into rollups) or 'archive' (move to the cold archive)
+    RETENTION_READINGS_MODE = os.getenv('RETENTION_READINGS_MODE', 'rollup').lower()
+    # Acknowledged / resolved alerts and sent notifications
+    RETENTION_ALERTS_DAYS = int(os.getenv('RETENTION_ALERTS_DAYS', '90'))
+    RETENTION_NOTIFICATIONS_DAYS = int(os.getenv('RETENTION_NOTIFICATIONS_DAYS', '30'))
+    RETENTION_SCHEDULER_ENABLED = os.getenv('RETENTION_SCHEDULER_ENABLED', 'False').lower() == 'true'
+    RETENTION_INTERVAL_HOURS = float(os.getenv('RETENTION_INTERVAL_HOURS', '24'))
+
+    # Hot window store (recent readings per field kept in memory)
+    HOT_WINDOW_ENABLED = os.getenv('HOT_WINDOW_ENABLED', 'True').lower() == 'true'
+    # Readings retained per field (2880 = 48h at one reading per minute)
+    HOT_WINDOW_CAPACITY = int(os.getenv('HOT_WINDOW_CAPACITY', '2880'))
+    HOT_WINDOW_MAX_FIELDS = int(os.getenv('HOT_WINDOW_MAX_FIELDS', '500'))
+    # Saved on exit and restored on start when set (e.g. 'hot_window.npz')
+    HOT_WINDOW_SNAPSHOT_PATH = os.getenv('HOT_WINDOW_SNAPSHOT_PATH', '')
+
+    # Streaming anomaly detection (sensor data quality)
+    ANOMALY_DETECTION_ENABLED = os.getenv('ANOMALY_DETECTION_ENABLED', 'True').lower() == 'true'
+    ANOMALY_EWMA_ALPHA = float(os.getenv('ANOMALY_EWMA_ALPHA', '0.05'))
+    ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', '6.0'))
+    ANOMALY_WARMUP_SAMPLES = int(os.getenv('ANOMALY_WARMUP_SAMPLES', '20'))
+    # Identical consecutive values before a probe is reported stuck
+    ANOMALY_STUCK_SAMPLES = int(os.getenv('ANOMALY_STUCK_SAMPLES', '60'))
+
+    # Alert Rules
+    ALERT_RULES_PATH = os.getenv(
+        'ALERT_RULES_PATH',
+        str(Path(__file__).resolve().parent.parent / 'services' / 'alert_rules.json'))
+
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -1,16 +1,21 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, List, Optional, Sequence, Tuple, TYPE_CHECKING, cast
+from typing import Any, Iterator, List, Mapping, Optional, Sequence, Tuple, TYPE_CHECKING, cast
 
 from google.cloud import firestore  # type: ignore[import-untyped]
+from app.core.config import Config
 from app.core.firebase import get_firestore_client
+from app.core.memory_store import InMemoryFirestoreClient
 
 if TYPE_CHECKING:  # pragma: no cover
     from flask import Flask
 
 logger = logging.getLogger(__name__)
 
+# Firestore rejects batches with more than 500 writes
+BATCH_WRITE_LIMIT = 500
+
 
 class FirestoreDB:
     """Firestore database wrapper"""
@@ -21,12 +26,22 @@ class FirestoreDB:
     def init_app(self, _: "Flask") -> None:
         """Initialize Firestore with Flask app"""
         try:
+            if Config.DATABASE_BACKEND == 'memory':
+                self.use_memory_backend()
+                return
             self.db = get_firestore_client()
             logger.info('Firestore database initialized')
         except Exception as e:  # pylint: disable=broad-except
             logger.error(f'Failed to initialize Firestore: {str(e)}')
             raise
 
+    def use_memory_backend(self) -> InMemoryFirestoreClient:
+        """Switch to the process-local in-memory backend (dev, benchmarks)"""
+        client = InMemoryFirestoreClient()
+        self.db = client
+        logger.info('Using in-memory database backend')
+        return client
+
     def collection(self, collection_name: str) -> firestore.CollectionReference:
         """Get collection reference"""
         if self.db is None:
@@ -70,6 +85,48 @@ class FirestoreDB:
             logger.error(f'Failed to create document: {str(e)}')
             raise
 
+    def create_documents(
+        self,
+        collection_name: str,
+        documents: Sequence[dict[str, Any]],
+    ) -> List[str]:
+        """Create many documents using batched writes (max 500 per batch)"""
+        if self.db is None:
+            raise RuntimeError('Firestore client not initialized')
+        try:
+            ids: List[str] = []
+            for start in range(0, len(documents), BATCH_WRITE_LIMIT):
+                batch = self.db.batch()
+                for data in documents[start:start + BATCH_WRITE_LIMIT]:
+                    doc_ref = self.collection(collection_name).document()
+                    batch.set(doc_ref, data)
+                    ids.append(cast(str, doc_ref.id))
+                batch.commit()
+            return ids
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f'Failed to create documents: {str(e)}')
+            raise
+
+    def set_documents(
+        self,
+        collection_name: str,
+        documents: Mapping[str, dict[str, Any]],
+        merge: bool = False,
+    ) -> None:
+        """Set documents by ID using batched writes (max 500 per batch)"""
+        if self.db is None:
+            raise RuntimeError('Firestore client not initialized')
+        try:
+            items = list(documents.items())
+            for start in range(0, len(items), BATCH_WRITE_LIMIT):
+                batch = self.db.batch()
+                for document_id, data in items[start:start + BATCH_WRITE_LIMIT]:
+                    batch.set(self.document(collection_name, document_id), data, merge=merge)
+                batch.commit()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f'Failed to set documents: {str(e)}')
+            raise
+
     def update_document(self, collection_name: str, document_id: str, data: dict[str, Any]) -> bool:
         """Update existing document"""
         try:
@@ -90,6 +147,20 @@ class FirestoreDB:
             logger.error(f'Failed to delete document: {str(e)}')
             return False
 
+    def delete_documents(self, collection_name: str, document_ids: Sequence[str]) -> None:
+        """Delete documents by ID using batched writes (max 500 per batch)"""
+        if self.db is None:
+            raise RuntimeError('Firestore client not initialized')
+        try:
+            for start in range(0, len(document_ids), BATCH_WRITE_LIMIT):
+                batch = self.db.batch()
+                for document_id in document_ids[start:start + BATCH_WRITE_LIMIT]:
+                    batch.delete(self.document(collection_name, document_id))
+                batch.commit()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f'Failed to delete documents: {str(e)}')
+            raise
+
     def query_collection(
         self,
         collection_name: str,
@@ -124,6 +195,50 @@ class FirestoreDB:
             logger.error(f'Failed to query collection: {str(e)}')
             return []
 
+    def stream_collection(
+        self,
+        collection_name: str,
+        filters: Optional[Sequence[Tuple[str, str, Any]]] = None,
+        page_size: int = 1000,
+        order_by: Optional[str] = None,
+        start_after: Optional[str] = None,
+        group: bool = False,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Iterate over all matching documents, one page at a time
+
+        Pages are ordered by document ID with a ``start_after`` cursor, so
+        equality filters need no composite index and the full result is
+        never held in memory. A range filter needs ``order_by`` on the same
+        field (then ID as tie-breaker) and a composite index with the
+        equality fields.
+
+        Args:
+            start_after: Resume after this document ID (ID ordering only)
+            group: Collection-group query over every collection named
+                ``collection_name``
+        """
+        if self.db is None:
+            raise RuntimeError('Firestore client not initialized')
+        query = self.db.collection_group(collection_name) if group else self.collection(collection_name)
+        if filters:
+            for field, operator, value in filters:
+                query = query.where(field, operator, value)
+        if order_by:
+            query = query.order_by(order_by)
+        query = query.order_by('__name__').limit(page_size)
+
+        last: Any = {'__name__': start_after} if start_after and not order_by else None
+        while True:
+            page = list((query.start_after(last) if last is not None else query).stream())
+            for doc in page:
+                data = doc.to_dict() or {}
+                data['id'] = doc.id
+                yield data
+            if len(page) < page_size:
+                return
+            last = page[-1]
+
     def query_collection_no_order(
         self,
         collection_name: str,
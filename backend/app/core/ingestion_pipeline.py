@@ -0,0 +1,323 @@
+"""Bounded ingestion pipeline between the MQTT network loop and storage
+
+Incoming readings go into two bounded lanes: a priority lane for
+alert-relevant readings and a normal lane for everything else. Worker
+threads drain the lanes (priority first) in batches and hand them to
+``store_sensor_readings``.
+
+Backpressure:
+    * When the queued depth reaches the high watermark the pipeline pauses
+      intake. ``submit`` is called on paho's network thread, so blocking
+      there stops reads from the socket and TCP flow control pushes back on
+      the broker. Intake resumes once workers drain to the low watermark.
+    * Blocking is capped at ``max_block_seconds`` (keep it well below the
+      MQTT keepalive) so the connection is never dropped for missing pings.
+    * With the ``downsample`` shed policy, a normal reading arriving while
+      paused replaces the queued reading of the same field instead of
+      waiting, so the newest value per field survives.
+    * At the hard ``maxsize`` the oldest normal reading is dropped.
+Every shed reading is counted in :attr:`IngestionPipeline.stats`.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SHED_POLICIES = ('none', 'downsample')
+
+Sink = Callable[[str, str, List[Dict[str, Any]]], Any]
+
+
+class IngestionItem:
+    """One queued sensor reading"""
+
+    __slots__ = ('field_id', 'sensor_type', 'payload', 'received_at', 'priority')
+
+    def __init__(self, field_id: str, sensor_type: str, payload: Dict[str, Any], priority: bool) -> None:
+        self.field_id = field_id
+        self.sensor_type = sensor_type
+        self.payload = payload
+        # Wall clock (epoch seconds): the reading's time when the device sent none
+        self.received_at = time.time()
+        self.priority = priority
+
+    def stamped_payload(self) -> Dict[str, Any]:
+        """Payload plus ``received_at``, for the sink"""
+        return {**self.payload, 'received_at': self.received_at}
+
+
+class IngestionPipeline:
+    """Bounded, prioritised, batching queue with high/low watermarks"""
+
+    def __init__(
+        self,
+        sink: Sink,
+        maxsize: int = 10000,
+        high_watermark: int = 8000,
+        low_watermark: int = 2000,
+        batch_size: int = 200,
+        workers: int = 1,
+        shed_policy: str = 'none',
+        max_block_seconds: float = 20.0,
+        is_priority: Optional[Callable[[str, Dict[str, Any]], bool]] = None,
+        on_processed: Optional[Callable[[List[IngestionItem]], None]] = None,
+    ) -> None:
+        if not 0 <= low_watermark < high_watermark <= maxsize:
+            raise ValueError('Watermarks must satisfy 0 <= low < high <= maxsize')
+        if shed_policy not in SHED_POLICIES:
+            raise ValueError(f'Unknown shed policy: {shed_policy}')
+
+        self.sink = sink
+        self.maxsize = maxsize
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.shed_policy = shed_policy
+        self.max_block_seconds = max_block_seconds
+        self.is_priority = is_priority
+        self.on_processed = on_processed
+
+        self._priority: Deque[IngestionItem] = deque()
+        self._normal: Deque[IngestionItem] = deque()
+        # Latest queued normal item per field, for downsampling
+        self._latest_normal: Dict[str, IngestionItem] = {}
+        self._cond = threading.Condition()
+        self._paused = False
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+
+        self.stats: Dict[str, float] = {
+            'submitted': 0,
+            'processed': 0,
+            'priority': 0,
+            'errors': 0,
+            'pauses': 0,
+            'blocked_seconds': 0.0,
+            'downsampled': 0,
+            'dropped_normal': 0,
+            'dropped_priority': 0,
+            'max_depth': 0,
+        }
+
+    # ------------------------------------------------------------------ intake
+
+    def submit(self, field_id: str, sensor_type: str, payload: Dict[str, Any]) -> bool:
+        """
+        Queue a reading; may block the caller while the pipeline is paused
+
+        Returns:
+            False if a reading was shed; a reading merged into a queued one
+            by the ``downsample`` policy counts as accepted
+        """
+        priority = False
+        if self.is_priority is not None:
+            try:
+                priority = self.is_priority(field_id, payload)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.debug(f'Priority check failed: {str(e)}')
+
+        with self._cond:
+            if self._closed:
+                return False
+            self.stats['submitted'] += 1
+
+            if self._depth() >= self.high_watermark and not self._paused:
+                self._paused = True
+                self.stats['pauses'] += 1
+                logger.warning(f'Ingestion paused at depth {self._depth()} (high watermark {self.high_watermark})')
+
+            if self._paused:
+                if not priority and self.shed_policy == 'downsample':
+                    queued = self._latest_normal.get(field_id)
+                    if queued is not None:
+                        queued.payload = payload
+                        queued.sensor_type = sensor_type
+                        queued.received_at = time.time()
+                        self.stats['downsampled'] += 1
+                        return True
+
+                # Flow control: hold the network thread until drained
+                started = time.monotonic()
+                deadline = started + self.max_block_seconds
+                while self._paused and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self.stats['blocked_seconds'] += time.monotonic() - started
+
+            shed = False
+            if self._depth() >= self.maxsize:
+                shed = self._drop_one(priority)
+                if not shed:
+                    # Only priority readings queued: shed the incoming normal one
+                    self.stats['dropped_normal'] += 1
+                    return False
+
+            item = IngestionItem(field_id, sensor_type, payload, priority)
+            if priority:
+                self._promote_field(field_id)
+                self._priority.append(item)
+                self.stats['priority'] += 1
+            else:
+                self._normal.append(item)
+                self._latest_normal[field_id] = item
+
+            depth = self._depth()
+            if depth > self.stats['max_depth']:
+                self.stats['max_depth'] = depth
+            self._cond.notify()
+            return not shed
+
+    def _promote_field(self, field_id: str) -> None:
+        """
+        Move the field's queued normal readings to the priority lane, ahead of
+        a promoted one, so readings of one field are stored in arrival order
+        """
+        if field_id not in self._latest_normal:
+            return
+        kept: Deque[IngestionItem] = deque()
+        for queued in self._normal:
+            (self._priority if queued.field_id == field_id else kept).append(queued)
+        self._normal = kept
+        del self._latest_normal[field_id]
+
+    def _drop_one(self, incoming_priority: bool) -> bool:
+        """Make room at the hard limit; returns True if something was dropped"""
+        if self._normal:
+            dropped = self._normal.popleft()
+            if self._latest_normal.get(dropped.field_id) is dropped:
+                del self._latest_normal[dropped.field_id]
+            self.stats['dropped_normal'] += 1
+            return True
+        if incoming_priority and self._priority:
+            self._priority.popleft()
+            self.stats['dropped_priority'] += 1
+            return True
+        return False
+
+    def _depth(self) -> int:
+        return len(self._priority) + len(self._normal)
+
+    @property
+    def depth(self) -> int:
+        with self._cond:
+            return self._depth()
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    # --------------------------------------------------------------- draining
+
+    def start(self) -> None:
+        """Start worker threads"""
+        with self._cond:
+            if self._threads:
+                return
+            self._closed = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'ingest-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f'Ingestion pipeline started with {self.workers} worker(s)')
+
+    def stop(self, drain: bool = True, timeout: Optional[float] = None) -> None:
+        """Stop workers, optionally after draining queued readings"""
+        with self._cond:
+            if drain:
+                end = None if timeout is None else time.monotonic() + timeout
+                while self._depth() and self._threads:
+                    remaining = None if end is None else end - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            self._closed = True
+            self._paused = False
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def _take_batch(self) -> Optional[List[IngestionItem]]:
+        with self._cond:
+            while not self._depth() and not self._closed:
+                self._cond.wait()
+            if not self._depth():
+                return None
+
+            batch: List[IngestionItem] = []
+            while self._priority and len(batch) < self.batch_size:
+                batch.append(self._priority.popleft())
+            while self._normal and len(batch) < self.batch_size:
+                item = self._normal.popleft()
+                if self._latest_normal.get(item.field_id) is item:
+                    del self._latest_normal[item.field_id]
+                batch.append(item)
+
+            if self._paused and self._depth() <= self.low_watermark:
+                self._paused = False
+                logger.info(f'Ingestion resumed at depth {self._depth()}')
+            self._cond.notify_all()
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+
+            groups: Dict[Tuple[str, str], List[IngestionItem]] = {}
+            for item in batch:
+                groups.setdefault((item.field_id, item.sensor_type), []).append(item)
+
+            for (field_id, sensor_type), items in groups.items():
+                try:
+                    self.sink(field_id, sensor_type, [item.stamped_payload() for item in items])
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.error(f'Failed to store {len(items)} readings for field {field_id}: {str(e)}')
+                    with self._cond:
+                        self.stats['errors'] += len(items)
+
+            with self._cond:
+                self.stats['processed'] += len(batch)
+                self._cond.notify_all()
+            if self.on_processed is not None:
+                self.on_processed(batch)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus current depth, for health endpoints and benchmarks"""
+        with self._cond:
+            stats: Dict[str, Any] = dict(self.stats)
+            stats.update({
+                'depth': self._depth(),
+                'priority_depth': len(self._priority),
+                'paused': self._paused,
+            })
+            return stats
+
+
+def create_ingestion_pipeline(**overrides: Any) -> IngestionPipeline:
+    """Build a pipeline from Config, storing via ``store_sensor_readings``"""
+    from app.core.config import Config
+    from app.services.sensor_data_service import is_alert_relevant, store_sensor_readings
+
+    options: Dict[str, Any] = {
+        'sink': store_sensor_readings,
+        'maxsize': Config.INGEST_QUEUE_MAXSIZE,
+        'high_watermark': Config.INGEST_HIGH_WATERMARK,
+        'low_watermark': Config.INGEST_LOW_WATERMARK,
+        'batch_size': Config.INGEST_BATCH_SIZE,
+        'workers': Config.INGEST_WORKERS,
+        'shed_policy': Config.INGEST_SHED_POLICY,
+        'max_block_seconds': Config.INGEST_MAX_BLOCK_SECONDS,
+        'is_priority': is_alert_relevant,
+    }
+    options.update(overrides)
+    return IngestionPipeline(**options)
@@ -0,0 +1,403 @@
+"""In-memory Firestore stand-in
+
+Implements the subset of the ``google.cloud.firestore.Client`` API that
+``FirestoreDB`` and the services use (collections, sub-collections,
+collection groups, where/order_by/limit/start_after queries, batched writes
+and the Increment/Maximum/Minimum/SERVER_TIMESTAMP/DELETE_FIELD transforms).
+
+Selected with ``DATABASE_BACKEND=memory``; used for local development and by
+the benchmarks so they exercise the real service code without a network.
+"""
+from __future__ import annotations
+
+import threading
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from google.cloud import firestore  # type: ignore[import-untyped]
+
+DOCUMENT_ID = '__name__'
+
+_MISSING = object()
+
+
+def _copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _type_rank(value: Any) -> int:
+    """Firestore cross-type ordering: null < bool < number < timestamp < string < ..."""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, (datetime, date)):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 7
+    return 8
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    rank = _type_rank(value)
+    if rank == 3 and isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    if rank in (0, 8):
+        return rank, 0
+    if rank == 7:
+        return rank, len(value)
+    return rank, value
+
+
+def _get_path(data: Dict[str, Any], path: str) -> Any:
+    current: Any = data
+    for part in path.split('.'):
+        if not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _compare(left: Any, op: str, right: Any) -> bool:
+    if op == '==':
+        return left is not _MISSING and _sort_key(left) == _sort_key(right)
+    if op == '!=':
+        return left is not _MISSING and left is not None and _sort_key(left) != _sort_key(right)
+    if op == 'in':
+        return left is not _MISSING and any(_sort_key(left) == _sort_key(v) for v in right)
+    if op == 'not-in':
+        return left is not _MISSING and left is not None and all(_sort_key(left) != _sort_key(v) for v in right)
+    if op == 'array_contains':
+        return isinstance(left, list) and right in left
+    if op == 'array_contains_any':
+        return isinstance(left, list) and any(v in left for v in right)
+
+    if left is _MISSING or _type_rank(left) != _type_rank(right):
+        return False
+    lk, rk = _sort_key(left), _sort_key(right)
+    if op == '<':
+        return lk < rk
+    if op == '<=':
+        return lk <= rk
+    if op == '>':
+        return lk > rk
+    if op == '>=':
+        return lk >= rk
+    raise ValueError(f'Unsupported operator: {op}')
+
+
+def _apply_value(target: Dict[str, Any], key: str, value: Any) -> None:
+    """Assign one field, resolving Firestore transform sentinels"""
+    current = target.get(key)
+    numeric = isinstance(current, (int, float)) and not isinstance(current, bool)
+    if value is firestore.DELETE_FIELD:
+        target.pop(key, None)
+    elif value is firestore.SERVER_TIMESTAMP:
+        target[key] = datetime.now(timezone.utc)
+    elif isinstance(value, firestore.Increment):
+        target[key] = (current if numeric else 0) + value.value
+    elif isinstance(value, firestore.Maximum):
+        target[key] = max(current, value.value) if numeric else value.value
+    elif isinstance(value, firestore.Minimum):
+        target[key] = min(current, value.value) if numeric else value.value
+    else:
+        target[key] = _copy(value)
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]) -> None:
+    for key, value in data.items():
+        if isinstance(value, dict) and value:
+            child = target.get(key)
+            if not isinstance(child, dict):
+                child = target[key] = {}
+            _merge(child, value)
+        else:
+            _apply_value(target, key, value)
+
+
+def _resolve(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve sentinels of a full (non-merge) write"""
+    result: Dict[str, Any] = {}
+    _merge(result, data)
+    return result
+
+
+class DocumentSnapshot:
+    """Read-only view of a stored document"""
+
+    def __init__(self, reference: 'DocumentReference', data: Optional[Dict[str, Any]]) -> None:
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        value = _get_path(self._data or {}, field_path)
+        return None if value is _MISSING else _copy(value)
+
+
+class DocumentReference:
+    """Reference to a document inside a collection path"""
+
+    def __init__(self, client: 'InMemoryFirestoreClient', collection_path: str, document_id: str) -> None:
+        self._client = client
+        self._collection_path = collection_path
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f'{self._collection_path}/{self.id}'
+
+    @property
+    def parent(self) -> 'CollectionReference':
+        return CollectionReference(self._client, self._collection_path)
+
+    def collection(self, name: str) -> 'CollectionReference':
+        return CollectionReference(self._client, f'{self.path}/{name}')
+
+    def get(self, transaction: Any = None) -> DocumentSnapshot:
+        _ = transaction
+        with self._client.lock:
+            data = self._client.collections.get(self._collection_path, {}).get(self.id)
+            return DocumentSnapshot(self, _copy(data) if data is not None else None)
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        with self._client.lock:
+            docs = self._client.collections.setdefault(self._collection_path, {})
+            if merge and self.id in docs:
+                _merge(docs[self.id], data)
+            else:
+                docs[self.id] = _resolve(data)
+            self._client.notify(self._collection_path, self.id, docs[self.id])
+
+    def update(self, data: Dict[str, Any]) -> None:
+        with self._client.lock:
+            docs = self._client.collections.get(self._collection_path, {})
+            if self.id not in docs:
+                raise KeyError(f'No document to update: {self.path}')
+            document = docs[self.id]
+            for field_path, value in data.items():
+                parts = field_path.split('.')
+                target = document
+                for part in parts[:-1]:
+                    child = target.get(part)
+                    if not isinstance(child, dict):
+                        child = target[part] = {}
+                    target = child
+                _apply_value(target, parts[-1], value)
+            self._client.notify(self._collection_path, self.id, document)
+
+    def delete(self) -> None:
+        with self._client.lock:
+            self._client.collections.get(self._collection_path, {}).pop(self.id, None)
+
+
+class Query:
+    """Immutable query over one collection or a collection group"""
+
+    def __init__(
+        self,
+        client: 'InMemoryFirestoreClient',
+        collection_path: str,
+        group: bool = False,
+        filters: Tuple[Tuple[str, str, Any], ...] = (),
+        orders: Tuple[Tuple[str, str], ...] = (),
+        limit_count: Optional[int] = None,
+        cursor: Optional[Tuple[Any, ...]] = None,
+    ) -> None:
+        self._client = client
+        self._collection_path = collection_path
+        self._group = group
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit_count
+        self._cursor = cursor
+
+    def _clone(self, **changes: Any) -> 'Query':
+        params = {
+            'group': self._group,
+            'filters': self._filters,
+            'orders': self._orders,
+            'limit_count': self._limit,
+            'cursor': self._cursor,
+        }
+        params.update(changes)
+        return Query(self._client, self._collection_path, **params)
+
+    def where(self, field_path: str, op_string: str, value: Any) -> 'Query':
+        return self._clone(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = 'ASCENDING') -> 'Query':
+        return self._clone(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> 'Query':
+        return self._clone(limit_count=count)
+
+    def start_after(self, document_fields_or_snapshot: Any) -> 'Query':
+        """Cursor after a snapshot or a dict of order-by field values"""
+        source = document_fields_or_snapshot
+        if isinstance(source, DocumentSnapshot):
+            values = source.to_dict() or {}
+            doc_id = source.id
+        else:
+            values = dict(source)
+            doc_id = values.get(DOCUMENT_ID, '')
+        fields = [f for f, _ in self._orders if f != DOCUMENT_ID]
+        cursor = tuple(_get_path(values, f) for f in fields) + (doc_id,)
+        return self._clone(cursor=cursor)
+
+    def _documents(self) -> List[Tuple[str, str, Dict[str, Any]]]:
+        collections = self._client.collections
+        if self._group:
+            paths = [p for p in collections if p.rsplit('/', 1)[-1] == self._collection_path]
+        else:
+            paths = [self._collection_path]
+        return [(path, doc_id, data)
+                for path in paths
+                for doc_id, data in collections.get(path, {}).items()]
+
+    def stream(self, transaction: Any = None) -> Iterator[DocumentSnapshot]:
+        _ = transaction
+        with self._client.lock:
+            matches = []
+            for path, doc_id, data in self._documents():
+                ok = True
+                for field_path, op, value in self._filters:
+                    left = doc_id if field_path == DOCUMENT_ID else _get_path(data, field_path)
+                    if not _compare(left, op, value):
+                        ok = False
+                        break
+                if ok:
+                    matches.append((path, doc_id, data))
+
+            order_fields = [(f, d) for f, d in self._orders if f != DOCUMENT_ID]
+            id_direction = next((d for f, d in self._orders if f == DOCUMENT_ID), 'ASCENDING')
+            # Documents missing an order_by field are excluded, as in Firestore
+            matches = [m for m in matches if all(_get_path(m[2], f) is not _MISSING for f, _ in order_fields)]
+            matches.sort(key=lambda m: m[1], reverse=_descending(id_direction))
+            for field_path, direction in reversed(order_fields):
+                matches.sort(key=lambda m, fp=field_path: _sort_key(_get_path(m[2], fp)),
+                             reverse=_descending(direction))
+
+            if self._cursor is not None:
+                matches = [m for m in matches if self._after_cursor(m, order_fields, id_direction)]
+            if self._limit is not None:
+                matches = matches[:self._limit]
+
+            snapshots = [DocumentSnapshot(DocumentReference(self._client, path, doc_id), _copy(data))
+                         for path, doc_id, data in matches]
+        return iter(snapshots)
+
+    def get(self, transaction: Any = None) -> List[DocumentSnapshot]:
+        return list(self.stream(transaction))
+
+    def _after_cursor(self, match: Tuple[str, str, Dict[str, Any]],
+                      order_fields: List[Tuple[str, str]], id_direction: str) -> bool:
+        assert self._cursor is not None
+        for (field_path, direction), cursor_value in zip(order_fields, self._cursor):
+            left = _sort_key(_get_path(match[2], field_path))
+            right = _sort_key(cursor_value)
+            if left != right:
+                return (left < right) if _descending(direction) else (left > right)
+        doc_id, cursor_id = match[1], self._cursor[-1]
+        return doc_id < cursor_id if _descending(id_direction) else doc_id > cursor_id
+
+
+class CollectionReference(Query):
+    """Reference to a (sub-)collection"""
+
+    def __init__(self, client: 'InMemoryFirestoreClient', path: str) -> None:
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._client, self._collection_path, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, data: Dict[str, Any]) -> Tuple[datetime, DocumentReference]:
+        ref = self.document()
+        ref.set(data)
+        return datetime.now(timezone.utc), ref
+
+    def list_documents(self) -> List[DocumentReference]:
+        with self._client.lock:
+            ids = list(self._client.collections.get(self._collection_path, {}))
+        return [self.document(doc_id) for doc_id in ids]
+
+
+class WriteBatch:
+    """Batched writes applied atomically on commit"""
+
+    def __init__(self, client: 'InMemoryFirestoreClient') -> None:
+        self._client = client
+        self._ops: List[Callable[[], None]] = []
+
+    def set(self, reference: DocumentReference, data: Dict[str, Any], merge: bool = False) -> None:
+        self._ops.append(lambda: reference.set(data, merge=merge))
+
+    def update(self, reference: DocumentReference, data: Dict[str, Any]) -> None:
+        self._ops.append(lambda: reference.update(data))
+
+    def delete(self, reference: DocumentReference) -> None:
+        self._ops.append(reference.delete)
+
+    def commit(self) -> List[Any]:
+        with self._client.lock:
+            for op in self._ops:
+                op()
+        committed, self._ops = self._ops, []
+        return committed
+
+
+class InMemoryFirestoreClient:
+    """Process-local Firestore replacement"""
+
+    def __init__(self) -> None:
+        self.collections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.lock = threading.RLock()
+        self._listeners: List[Callable[[str, str, Dict[str, Any]], None]] = []
+
+    def collection(self, path: str) -> CollectionReference:
+        return CollectionReference(self, path)
+
+    def document(self, path: str) -> DocumentReference:
+        collection_path, document_id = path.rsplit('/', 1)
+        return DocumentReference(self, collection_path, document_id)
+
+    def collection_group(self, collection_id: str) -> Query:
+        return Query(self, collection_id, group=True)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def add_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]) -> None:
+        """Register a callback invoked as ``listener(collection_path, doc_id, data)`` on writes"""
+        self._listeners.append(listener)
+
+    def notify(self, collection_path: str, document_id: str, data: Dict[str, Any]) -> None:
+        for listener in self._listeners:
+            listener(collection_path, document_id, data)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.collections.clear()
+
+
+def _descending(direction: Any) -> bool:
+    return str(direction).upper() == 'DESCENDING'
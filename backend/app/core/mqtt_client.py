@@ -1,9 +1,10 @@
 import logging
 import json
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 from app.services.sensor_data_service import store_sensor_reading
 from paho.mqtt import client as mqtt
 from app.core.config import Config
+from app.core.ingestion_pipeline import IngestionPipeline, create_ingestion_pipeline
 
 
 logger = logging.getLogger(__name__)
@@ -12,15 +13,28 @@ logger = logging.getLogger(__name__)
 class MQTTClient:
     """MQTT client for IoT sensor data"""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        client_factory: Callable[[], Any] = mqtt.Client,
+        pipeline: Optional[IngestionPipeline] = None,
+    ) -> None:
         self.client: Any = None
         self.connected = False
         self.callbacks: dict[str, Callable] = {}
+        # Injectable so benchmarks can drive ingestion with a fake paho client
+        self._client_factory = client_factory
+        # Bounded queue between the network loop and storage (None = store inline)
+        self.pipeline = pipeline
 
     def connect(self) -> None:
         """Connect to MQTT broker"""
         try:
-            self.client = mqtt.Client()
+            self.client = self._client_factory()
+
+            if self.pipeline is None and Config.INGEST_PIPELINE_ENABLED:
+                self.pipeline = create_ingestion_pipeline()
+            if self.pipeline is not None:
+                self.pipeline.start()
 
             # Set username and password if provided
             if Config.MQTT_USERNAME and Config.MQTT_PASSWORD:
@@ -60,6 +74,8 @@ class MQTTClient:
             self.client.loop_stop()
             self.client.disconnect()
             logger.info('Disconnected from MQTT broker')
+        if self.pipeline is not None:
+            self.pipeline.stop(drain=True)
 
     def subscribe(self, topic: str, callback: Callable) -> None:
         """Subscribe to MQTT topic"""
@@ -91,12 +107,12 @@ class MQTTClient:
             logger.error(
                 f'Failed to connect to MQTT broker, return code: {rc}')
 
-    def _on_disconnect(self, rc: int) -> None:
+    def _on_disconnect(self, client: mqtt.Client, userdata: Any, rc: int) -> None:
         """Callback for when client disconnects from broker"""
         self.connected = False
         logger.warning(f'Disconnected from MQTT broker, return code: {rc}')
 
-    def _on_message(self, msg: mqtt.MQTTMessage) -> None:
+    def _on_message(self, client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> None:
         """Callback for when message is received"""
         try:
             topic = msg.topic
@@ -143,10 +159,11 @@ class MQTTClient:
                 sensor_type = topic_parts[4] if len(
                     topic_parts) > 4 else 'unknown'
 
-                # Import here to avoid circular dependency
-
-                # Store sensor reading in database
-                store_sensor_reading(field_id, sensor_type, payload)
+                if self.pipeline is not None:
+                    # Queue for batched storage; blocks here under backpressure
+                    self.pipeline.submit(field_id, sensor_type, payload)
+                else:
+                    store_sensor_reading(field_id, sensor_type, payload)
 
         except Exception as e:
             logger.error(f'Error processing sensor data: {str(e)}')
@@ -4,4 +4,6 @@ ML Module
 Machine learning models and inference.
 """
 
-__all__ = []
+from app.ml.preprocessing import ImagePreprocessor, decode_image, preprocess_reference
+
+__all__ = ['ImagePreprocessor', 'decode_image', 'preprocess_reference']
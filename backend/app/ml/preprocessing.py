@@ -0,0 +1,95 @@
+"""
+Fast image preprocessing for the disease model
+==============================================
+Camera uploads are often 12 MP JPEGs while the model takes 224x224. Instead
+of decoding at full resolution and building several float copies, the fast
+path:
+
+1. asks the JPEG decoder for a downscaled image with ``Image.draft()``
+   (DCT scaling by 1/2, 1/4 or 1/8 while decoding, never below the target),
+2. box-downsamples by the largest integer factor that keeps both sides at or
+   above the target with ``Image.reduce()``,
+3. resizes the remainder with the same bicubic filter as before, and
+4. writes the pixels straight into a preallocated input tensor, in the
+   model's input dtype. Quantized inputs whose scale is 1/255 take the raw
+   uint8 pixels (or ``pixel - 128`` for int8) without any float conversion.
+
+Non-JPEG formats ignore ``draft()`` and still benefit from ``reduce()``.
+"""
+from __future__ import annotations
+
+from io import BytesIO
+from typing import Any, Dict, Tuple
+
+import numpy as np
+from PIL import Image
+
+IMG_SIZE = 224
+CHANNELS = 3
+
+
+def preprocess_reference(image_bytes: bytes, size: int = IMG_SIZE) -> np.ndarray:
+    """Original path (full decode, float32 / 255, expand_dims), kept for FAST_PREPROCESSING=false"""
+    img = Image.open(BytesIO(image_bytes)).convert('RGB')
+    img = img.resize((size, size))
+    img_array = np.array(img, dtype=np.float32) / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def decode_image(image_bytes: bytes, size: int = IMG_SIZE) -> Image.Image:
+    """Decode an image to RGB at ``size`` x ``size`` with as little full-resolution work as possible"""
+    img = Image.open(BytesIO(image_bytes))
+    # JPEG only: pick the DCT scale that still yields at least size x size
+    img.draft('RGB', (size, size))
+    img = img.convert('RGB')
+    factor = min(img.width // size, img.height // size)
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.size != (size, size):
+        img = img.resize((size, size), Image.Resampling.BICUBIC)
+    return img
+
+
+class ImagePreprocessor:
+    """Writes decoded images into model input tensors of a given dtype / quantization"""
+
+    def __init__(self, size: int = IMG_SIZE, dtype: Any = np.float32,
+                 quantization: Tuple[float, int] = (0.0, 0)) -> None:
+        self.size = size
+        self.dtype = np.dtype(dtype)
+        self.scale, self.zero_point = float(quantization[0]), int(quantization[1])
+        # Input scale of 1/255 means the quantized value is (a shift of) the raw pixel
+        pixel_scale = self.dtype.kind in 'iu' and abs(self.scale * 255.0 - 1.0) < 1e-6
+        self._copy_pixels = pixel_scale and self.dtype == np.uint8 and self.zero_point == 0
+        self._shift_pixels = pixel_scale and self.dtype == np.int8 and self.zero_point == -128
+
+    @classmethod
+    def from_input_details(cls, detail: Dict[str, Any]) -> 'ImagePreprocessor':
+        """Preprocessor matching a pool member's input (NHWC ``input_details[0]``)"""
+        shape = detail['shape']
+        return cls(int(shape[1]), detail['dtype'], tuple(detail.get('quantization', (0.0, 0))))
+
+    def allocate(self, batch_size: int = 1) -> np.ndarray:
+        """Uninitialised input tensor for ``batch_size`` images"""
+        return np.empty((batch_size, self.size, self.size, CHANNELS), dtype=self.dtype)
+
+    def preprocess_into(self, image_bytes: bytes, out: np.ndarray) -> None:
+        """Decode ``image_bytes`` into ``out`` (one ``size x size x 3`` slot of an input tensor)"""
+        pixels = np.asarray(decode_image(image_bytes, self.size))
+        if self.dtype.kind == 'f':
+            # Same arithmetic as the reference path: float32 pixels / 255
+            np.divide(pixels, np.float32(255.0), out=out, dtype=self.dtype)
+        elif self._copy_pixels:
+            np.copyto(out, pixels)
+        elif self._shift_pixels:
+            np.bitwise_xor(pixels, 0x80, out=out.view(np.uint8))
+        else:
+            info = np.iinfo(self.dtype)
+            values = np.rint(pixels / (255.0 * self.scale) + self.zero_point)
+            np.copyto(out, np.clip(values, info.min, info.max), casting='unsafe')
+
+    def preprocess(self, image_bytes: bytes) -> np.ndarray:
+        """Single image as a (1, size, size, 3) input tensor"""
+        out = self.allocate(1)
+        self.preprocess_into(image_bytes, out[0])
+        return out
@@ -4,13 +4,31 @@ ML Models module - TFLite disease detection model
 from app.ml_models.model_loader import (
     TFLiteModelLoader,
     get_disease_model,
+    get_inference_scheduler,
     predict_disease,
-    get_class_names
+    predict_images,
+    get_class_names,
+    get_model_registry,
+    is_model_loaded,
+    use_disease_model,
+    warmup_model
 )
+from app.ml_models.inference_scheduler import InferenceScheduler
+from app.ml_models.interpreter_pool import InterpreterPool
+from app.ml_models.model_registry import ModelRegistry
 
 __all__ = [
     'TFLiteModelLoader',
     'get_disease_model',
+    'get_inference_scheduler',
+    'InferenceScheduler',
+    'InterpreterPool',
+    'ModelRegistry',
     'predict_disease',
-    'get_class_names'
+    'predict_images',
+    'get_class_names',
+    'get_model_registry',
+    'is_model_loaded',
+    'use_disease_model',
+    'warmup_model'
 ]
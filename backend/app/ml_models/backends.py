@@ -0,0 +1,259 @@
+"""Inference backends for the disease model
+
+A backend turns a model file into an :class:`InterpreterPool` whose members
+share one API (``input_details`` / ``output_details`` in the TFLite format,
+``dynamic_batch``, ``resize_batch``, ``predict``), so the pool, micro-batching
+scheduler, preprocessor, registry and cache work unchanged on top of it:
+
+* ``tflite``      - TFLite interpreters from LiteRT / tflite_runtime / TensorFlow
+                    (``runtime.py``), one per pool member.
+* ``onnxruntime`` - one ONNX Runtime ``InferenceSession`` (thread-safe) shared
+                    by all members; each member has its own IO binding into
+                    preallocated input / output buffers, so a run copies the
+                    batch once into the bound input and ORT writes the output
+                    in place. Graph optimisation level and intra-/inter-op
+                    threads come from Config. Models exported channels-first
+                    (``pytorch_to_onnx``, NCHW) are transposed from the
+                    server's NHWC batches in the copy.
+
+``INFERENCE_BACKEND`` selects the backend per deployment; model registry
+entries may override it per version.
+"""
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import Config
+from app.ml_models.interpreter_pool import InterpreterPool
+from app.ml_models.runtime import create_interpreter, get_runtime
+
+logger = logging.getLogger(__name__)
+
+# Model file suffix per backend (bundled model, registry files)
+MODEL_SUFFIXES: Dict[str, str] = {'tflite': '.tflite', 'onnxruntime': '.onnx'}
+
+GRAPH_OPTIMIZATION_LEVELS = ('disable', 'basic', 'extended', 'all')
+
+# ONNX tensor type -> numpy dtype
+_ONNX_DTYPES: Dict[str, Any] = {
+    'tensor(float)': np.float32,
+    'tensor(float16)': np.float16,
+    'tensor(uint8)': np.uint8,
+    'tensor(int8)': np.int8,
+}
+
+
+class InferenceBackend:
+    """Creates interpreter pools for one runtime"""
+
+    name = ''
+
+    def create_pool(self, model_content: bytes, size: int, num_threads: int) -> InterpreterPool:
+        raise NotImplementedError
+
+    def describe(self) -> Dict[str, Any]:
+        """Backend and its settings, for logs and metrics"""
+        return {'backend': self.name}
+
+
+class TFLiteBackend(InferenceBackend):
+    """One TFLite interpreter per pool member, sharing the model buffer"""
+
+    name = 'tflite'
+
+    def create_pool(self, model_content: bytes, size: int, num_threads: int) -> InterpreterPool:
+        return InterpreterPool(model_content, create_interpreter, size=size, num_threads=num_threads)
+
+    def describe(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'runtime': get_runtime()[0]}
+
+
+class OnnxRuntimeSession:
+    """Pool member running a shared ``InferenceSession`` through its own IO binding
+
+    Exposes the model in the server's conventions: ``input_details[0]['shape']``
+    is NHWC ``(N, H, W, C)`` whatever the model's layout, so the preprocessor
+    and scheduler treat it like a TFLite model.
+    """
+
+    def __init__(self, session: Any, io_binding: bool = True) -> None:
+        self.session = session
+        model_input = session.get_inputs()[0]
+        model_output = session.get_outputs()[0]
+        self.input_name, self.output_name = model_input.name, model_output.name
+        if model_input.type not in _ONNX_DTYPES:
+            raise ValueError(f'Unsupported ONNX input type {model_input.type}')
+        self.dtype = np.dtype(_ONNX_DTYPES[model_input.type])
+        self.output_dtype = np.dtype(_ONNX_DTYPES.get(model_output.type, np.float32))
+
+        dims = list(model_input.shape)
+        # Symbolic / unknown dims are strings or None
+        self.channels_first = len(dims) == 4 and dims[1] == 3
+        spatial = dims[2:4] if self.channels_first else dims[1:3]
+        if not all(isinstance(d, int) for d in spatial):
+            raise ValueError(f'ONNX model needs fixed spatial input dims, got {dims}')
+        batch_dynamic = not isinstance(dims[0], int)
+        self.image_shape = (int(spatial[0]), int(spatial[1]), 3)
+        out_dims = list(model_output.shape)
+        self.num_classes = out_dims[-1] if isinstance(out_dims[-1], int) else None
+
+        batch = 1 if batch_dynamic else int(dims[0])
+        self.input_details = [{
+            'name': self.input_name, 'index': 0,
+            'shape': np.array([batch, *self.image_shape]),
+            'shape_signature': np.array([-1 if batch_dynamic else batch, *self.image_shape]),
+            'dtype': self.dtype.type, 'quantization': (0.0, 0),
+        }]
+        self.output_details = [{
+            'name': self.output_name, 'index': 0,
+            'shape': np.array([batch, self.num_classes or -1]),
+            'dtype': self.output_dtype.type, 'quantization': (0.0, 0),
+        }]
+
+        self.io_binding = io_binding
+        self._binding = session.io_binding() if io_binding else None
+        self._bound_batch: Optional[int] = None
+        # Input buffer in the model layout and output buffer (None: width unknown) sized for the
+        # largest batch so far; smaller batches bind a leading slice (still contiguous)
+        self._inputs: Optional[np.ndarray] = None
+        self._output: Optional[np.ndarray] = None
+
+    @property
+    def dynamic_batch(self) -> bool:
+        return int(self.input_details[0]['shape_signature'][0]) == -1
+
+    def resize_batch(self, batch_size: int) -> None:
+        """Switch to ``batch_size`` (ORT needs no re-allocation; only the bound buffers change)"""
+        if int(self.input_details[0]['shape'][0]) == batch_size:
+            return
+        if not self.dynamic_batch:
+            raise ValueError(f"Model has a fixed batch size of {self.input_details[0]['shape'][0]}; "
+                             f"got {batch_size}")
+        self.input_details[0]['shape'] = np.array([batch_size, *self.image_shape])
+        self.output_details[0]['shape'] = np.array([batch_size, self.num_classes or -1])
+
+    def _bind(self, batch_size: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Preallocated buffers for ``batch_size``, bound to this member's IO binding"""
+        if self._inputs is None or self._inputs.shape[0] < batch_size:
+            height, width, channels = self.image_shape
+            shape = (batch_size, channels, height, width) if self.channels_first else (batch_size, *self.image_shape)
+            self._inputs = np.empty(shape, dtype=self.dtype)
+            self._output = (np.empty((batch_size, self.num_classes), dtype=self.output_dtype)
+                            if self.num_classes else None)
+            self._bound_batch = None
+        inputs = self._inputs[:batch_size]
+        output = self._output[:batch_size] if self._output is not None else None
+        if self._bound_batch != batch_size:
+            self._binding.bind_input(self.input_name, 'cpu', 0, self.dtype, list(inputs.shape),
+                                     inputs.ctypes.data)
+            if output is not None:
+                self._binding.bind_output(self.output_name, 'cpu', 0, self.output_dtype,
+                                          list(output.shape), output.ctypes.data)
+            else:
+                # Unknown output width: let ORT allocate it
+                self._binding.bind_output(self.output_name, 'cpu')
+            self._bound_batch = batch_size
+        return inputs, output
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        """Run one batch of NHWC images; returns float32 outputs"""
+        batch_size = int(images.shape[0])
+        self.resize_batch(batch_size)
+        if not self.io_binding:
+            feed = images.transpose(0, 3, 1, 2) if self.channels_first else images
+            feed = np.ascontiguousarray(feed, dtype=self.dtype)
+            return self.session.run([self.output_name], {self.input_name: feed})[0].astype(np.float32)
+
+        inputs, output = self._bind(batch_size)
+        # The only copy of the batch: straight into the bound input (transposed if NCHW)
+        np.copyto(inputs, images.transpose(0, 3, 1, 2) if self.channels_first else images, casting='unsafe')
+        self.session.run_with_iobinding(self._binding)
+        if output is None:
+            return self._binding.copy_outputs_to_cpu()[0].astype(np.float32)
+        # Copy: the bound output buffer is reused by the next run
+        return output.astype(np.float32)
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """ONNX Runtime with configurable graph optimisation, threading and IO binding"""
+
+    name = 'onnxruntime'
+
+    def __init__(self, graph_optimization_level: str = 'all', intra_op_threads: int = 0,
+                 inter_op_threads: int = 1, io_binding: bool = True) -> None:
+        if graph_optimization_level not in GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unknown graph optimization level '{graph_optimization_level}'; "
+                             f"expected one of {', '.join(GRAPH_OPTIMIZATION_LEVELS)}")
+        self.graph_optimization_level = graph_optimization_level
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.io_binding = io_binding
+
+    def create_session(self, model_content: bytes, num_threads: int) -> Any:
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = {
+            'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[self.graph_optimization_level]
+        # 0 = INFERENCE_NUM_THREADS, like the TFLite interpreters
+        options.intra_op_num_threads = self.intra_op_threads or num_threads
+        options.inter_op_num_threads = max(1, self.inter_op_threads)
+        # Inter-op threads only run independent graph branches in parallel mode
+        options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if self.inter_op_threads > 1
+                                  else ort.ExecutionMode.ORT_SEQUENTIAL)
+        return ort.InferenceSession(model_content, sess_options=options, providers=['CPUExecutionProvider'])
+
+    def create_pool(self, model_content: bytes, size: int, num_threads: int) -> InterpreterPool:
+        # One session (weights loaded once, runs are thread-safe); bindings and buffers per member
+        session = self.create_session(model_content, num_threads)
+        return InterpreterPool(
+            model_content,
+            lambda content, threads: session,
+            size=size,
+            num_threads=num_threads,
+            member=lambda shared: OnnxRuntimeSession(shared, self.io_binding),
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        import onnxruntime as ort
+
+        return {
+            'backend': self.name,
+            'runtime': f'onnxruntime {ort.__version__}',
+            'graph_optimization_level': self.graph_optimization_level,
+            'intra_op_threads': self.intra_op_threads or Config.INFERENCE_NUM_THREADS,
+            'inter_op_threads': self.inter_op_threads,
+            'io_binding': self.io_binding,
+        }
+
+
+BACKENDS = ('tflite', 'onnxruntime')
+
+
+def get_inference_backend(name: Optional[str] = None) -> InferenceBackend:
+    """Backend ``name`` (default ``Config.INFERENCE_BACKEND``) with its Config settings"""
+    name = (name or Config.INFERENCE_BACKEND).lower()
+    if name == 'tflite':
+        return TFLiteBackend()
+    if name == 'onnxruntime':
+        return OnnxRuntimeBackend(
+            Config.ORT_GRAPH_OPTIMIZATION_LEVEL,
+            Config.ORT_INTRA_OP_THREADS,
+            Config.ORT_INTER_OP_THREADS,
+            Config.ORT_IO_BINDING,
+        )
+    raise ValueError(f"Unknown inference backend '{name}'; expected one of {', '.join(BACKENDS)}")
+
+
+def backend_for_model(path: Any) -> Optional[str]:
+    """Backend implied by a model file's suffix, if any"""
+    suffix = Path(path).suffix.lower()
+    return next((name for name, model_suffix in MODEL_SUFFIXES.items() if model_suffix == suffix), None)
@@ -0,0 +1,235 @@
+"""Dynamic micro-batching for disease model inference
+
+Concurrent requests each submit a small batch (usually one preprocessed
+image). A worker thread collects queued requests until ``max_batch_size``
+images are waiting or the oldest request has waited ``max_wait_ms``, stacks
+them along the batch axis, runs a single ``predict_batch`` call (one
+interpreter ``invoke()``) and scatters the output rows back to the waiting
+callers' futures.
+
+Batching amortises per-invoke overhead and keeps the interpreter busy with
+one large call instead of many contended small ones; the price is at most
+``max_wait_ms`` of extra latency for a lone request. The model must have a
+dynamic batch axis (see ``convert_to_tflite.py``) for batches larger than one.
+Counters and recent latency samples are exposed by :meth:`snapshot`.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PredictBatch = Callable[[np.ndarray], np.ndarray]
+
+# Recent samples kept for the latency percentiles and throughput
+_SAMPLE_WINDOW = 1024
+
+
+class InferenceRequest:
+    """Images of one caller waiting for a batch"""
+
+    __slots__ = ('images', 'future', 'enqueued_at')
+
+    def __init__(self, images: np.ndarray) -> None:
+        self.images = images
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return int(self.images.shape[0])
+
+
+class InferenceScheduler:
+    """Queue that merges concurrent inference requests into batched invokes"""
+
+    def __init__(
+        self,
+        predict_batch: PredictBatch,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        workers: int = 1,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size must be at least 1')
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.workers = max(1, workers)
+
+        self._queue: Deque[InferenceRequest] = deque()
+        self._queued_images = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+
+        self.stats: Dict[str, float] = {
+            'requests': 0,
+            'images': 0,
+            'batches': 0,
+            'errors': 0,
+            'max_depth': 0,
+        }
+        self._batch_sizes: Counter = Counter()
+        self._queue_waits: Deque[float] = deque(maxlen=_SAMPLE_WINDOW)
+        self._invoke_times: Deque[float] = deque(maxlen=_SAMPLE_WINDOW)
+        # (completed at, images) of recent batches, for throughput
+        self._completed: Deque[tuple] = deque(maxlen=_SAMPLE_WINDOW)
+
+    # ----------------------------------------------------------------- intake
+
+    def submit(self, images: np.ndarray) -> Future:
+        """Queue a batch of preprocessed images; the future resolves to their output rows"""
+        images = np.asarray(images)
+        if images.ndim < 1 or images.shape[0] < 1:
+            raise ValueError('Expected a non-empty batch of images')
+        request = InferenceRequest(images)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Inference scheduler is stopped')
+            if not self._threads:
+                self._start_locked()
+            self._queue.append(request)
+            self._queued_images += request.size
+            self.stats['requests'] += 1
+            self.stats['max_depth'] = max(self.stats['max_depth'], self._queued_images)
+            self._cond.notify_all()
+        return request.future
+
+    def predict(self, images: np.ndarray, timeout: Optional[float] = None) -> np.ndarray:
+        """Blocking :meth:`submit`"""
+        return self.submit(images).result(timeout)
+
+    # --------------------------------------------------------------- draining
+
+    def start(self) -> None:
+        """Start worker threads (also done lazily by the first ``submit``)"""
+        with self._cond:
+            self._start_locked()
+
+    def _start_locked(self) -> None:
+        if self._threads:
+            return
+        self._closed = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'inference-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f'Inference scheduler started: max batch {self.max_batch_size}, '
+                    f'max wait {self.max_wait * 1000:g} ms, {self.workers} worker(s)')
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop workers after the queued requests have been served"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def _take_batch(self) -> Optional[List[InferenceRequest]]:
+        with self._cond:
+            while True:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return None
+
+                # Wait for more requests until the batch is full or the oldest is due.
+                # Other workers may take queued requests meanwhile, so the head is
+                # re-read after every wait and an emptied queue starts over.
+                while self._queue and self._queued_images < self.max_batch_size and not self._closed:
+                    remaining = self._queue[0].enqueued_at + self.max_wait - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._queue:
+                    continue
+
+                batch: List[InferenceRequest] = [self._queue.popleft()]
+                size = batch[0].size
+                while self._queue and size + self._queue[0].size <= self.max_batch_size:
+                    request = self._queue.popleft()
+                    batch.append(request)
+                    size += request.size
+                self._queued_images -= size
+                return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            # One bad batch fails its own requests, never the worker
+            try:
+                self._run_batch(batch)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error(f'Inference batch of {len(batch)} request(s) failed: {str(e)}', exc_info=True)
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                with self._cond:
+                    self.stats['errors'] += len(batch)
+
+    def _run_batch(self, batch: List[InferenceRequest]) -> None:
+        started = time.monotonic()
+        futures = [r.future for r in batch if r.future.set_running_or_notify_cancel()]
+        images = batch[0].images if len(batch) == 1 else np.concatenate([r.images for r in batch])
+        try:
+            outputs = self.predict_batch(images)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f'Batched inference of {images.shape[0]} image(s) failed: {str(e)}')
+            for future in futures:
+                future.set_exception(e)
+            with self._cond:
+                self.stats['errors'] += len(batch)
+            return
+        finished = time.monotonic()
+
+        offset = 0
+        for request in batch:
+            if request.future.running():
+                request.future.set_result(outputs[offset:offset + request.size])
+            offset += request.size
+
+        with self._cond:
+            self.stats['batches'] += 1
+            self.stats['images'] += images.shape[0]
+            self._batch_sizes[int(images.shape[0])] += 1
+            self._queue_waits.extend(started - r.enqueued_at for r in batch)
+            self._invoke_times.append(finished - started)
+            self._completed.append((finished, int(images.shape[0])))
+
+    # ---------------------------------------------------------------- metrics
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, batch size distribution, queue wait / invoke latency and throughput"""
+        with self._cond:
+            stats: Dict[str, Any] = dict(self.stats)
+            waits = np.array(self._queue_waits) * 1000.0
+            invokes = np.array(self._invoke_times) * 1000.0
+            completed = list(self._completed)
+            stats.update({
+                'depth': self._queued_images,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batch_sizes': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                'mean_batch_size': stats['images'] / stats['batches'] if stats['batches'] else 0.0,
+            })
+        for name, samples in (('queue_wait_ms', waits), ('invoke_ms', invokes)):
+            stats[name] = {
+                'mean': float(samples.mean()) if samples.size else 0.0,
+                'p50': float(np.percentile(samples, 50)) if samples.size else 0.0,
+                'p95': float(np.percentile(samples, 95)) if samples.size else 0.0,
+            }
+        # Images per second over the recent batches
+        elapsed = completed[-1][0] - completed[0][0] if len(completed) > 1 else 0.0
+        stats['images_per_second'] = sum(n for _, n in completed[1:]) / elapsed if elapsed > 0 else 0.0
+        return stats
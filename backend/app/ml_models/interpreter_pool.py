@@ -0,0 +1,200 @@
+"""Pool of TFLite interpreters for concurrent inference
+
+A ``tf.lite.Interpreter`` is not thread-safe: concurrent ``set_tensor`` /
+``invoke`` calls on one instance corrupt each other's tensors. The pool
+holds N interpreters built from the same model buffer; callers check one
+out, use it exclusively and return it, so N inferences run in parallel and
+further callers wait for a free interpreter instead of racing.
+
+The model file is read once into an immutable ``bytes`` buffer that every
+interpreter references in place (TFLite uses the FlatBuffer without
+copying), so each extra interpreter only costs its tensor arena. Use
+``num_threads`` x pool size <= CPU cores to avoid oversubscription.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (model buffer, num_threads) -> interpreter with the tf.lite.Interpreter API
+InterpreterFactory = Callable[[bytes, int], Any]
+# Interpreter / session returned by the factory -> pool member (PooledInterpreter API)
+MemberFactory = Callable[[Any], Any]
+
+
+def load_model_buffer(model_path: Path) -> bytes:
+    """Read a model file once; the buffer is shared by every interpreter of a pool"""
+    return Path(model_path).read_bytes()
+
+
+def quantize(values: np.ndarray, detail: Dict[str, Any]) -> np.ndarray:
+    """Real values -> integer tensor of an input with (scale, zero_point) quantization"""
+    scale, zero_point = detail['quantization']
+    info = np.iinfo(detail['dtype'])
+    return np.clip(np.rint(values / scale + zero_point), info.min, info.max).astype(detail['dtype'])
+
+
+def dequantize(values: np.ndarray, detail: Dict[str, Any]) -> np.ndarray:
+    """Integer tensor of an output -> float32 real values"""
+    scale, zero_point = detail['quantization']
+    return ((values.astype(np.float32) - zero_point) * scale).astype(np.float32)
+
+
+def is_quantized(detail: Dict[str, Any]) -> bool:
+    return np.dtype(detail['dtype']).kind in 'iu' and float(detail.get('quantization', (0.0, 0))[0]) > 0
+
+
+class PooledInterpreter:
+    """One interpreter plus its tensor details, used by a single thread at a time
+
+    Full-integer models (uint8/int8 input and output) are supported: float
+    inputs are quantized with the input's scale / zero point, inputs already
+    in the input dtype (the fast preprocessor) are passed through, and
+    integer outputs are dequantized to float probabilities.
+
+    ``input_details[0]`` is NHWC ``(N, H, W, C)`` whatever the model's
+    layout. Channels-first models (``(N, 3, H, W)``, as exported through
+    ``pytorch_to_onnx`` and onnx-tf) get the server's NHWC batches
+    transposed before ``set_tensor``, as :class:`OnnxRuntimeSession` does.
+    """
+
+    def __init__(self, interpreter: Any) -> None:
+        self.interpreter = interpreter
+        self.interpreter.allocate_tensors()
+        self._read_details()
+
+    def _read_details(self) -> None:
+        model_inputs = self.interpreter.get_input_details()
+        shape = model_inputs[0]['shape']
+        self.channels_first = len(shape) == 4 and int(shape[1]) == 3 and int(shape[3]) != 3
+        # Model layout of the input, for resizing
+        self._model_shape = shape
+        if self.channels_first:
+            detail = dict(model_inputs[0])
+            for key in ('shape', 'shape_signature'):
+                if key in detail:
+                    n, c, h, w = detail[key]
+                    detail[key] = np.array([n, h, w, c], dtype=detail[key].dtype)
+            model_inputs = [detail, *model_inputs[1:]]
+        self.input_details = model_inputs
+        self.output_details = self.interpreter.get_output_details()
+
+    @property
+    def dynamic_batch(self) -> bool:
+        """Whether the batch axis is dynamic (-1 in the shape signature)"""
+        signature = self.input_details[0].get('shape_signature', self.input_details[0]['shape'])
+        return int(signature[0]) == -1
+
+    def resize_batch(self, batch_size: int) -> None:
+        """Resize the input tensor to ``batch_size`` (re-allocates only when it changes)"""
+        shape = self.input_details[0]['shape']
+        if int(shape[0]) == batch_size:
+            return
+        if not self.dynamic_batch:
+            raise ValueError(f'Model has a fixed batch size of {shape[0]}; got {batch_size}')
+        self.interpreter.resize_tensor_input(
+            self.input_details[0]['index'], [batch_size, *self._model_shape[1:]], strict=True)
+        self.interpreter.allocate_tensors()
+        self._read_details()
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        """Run one invoke over a batch of preprocessed images; returns float32 outputs"""
+        self.resize_batch(int(images.shape[0]))
+        detail = self.input_details[0]
+        if images.dtype != detail['dtype'] and is_quantized(detail):
+            images = quantize(images, detail)
+        if self.channels_first:
+            images = np.ascontiguousarray(images.transpose(0, 3, 1, 2))
+        self.interpreter.set_tensor(detail['index'], images.astype(detail['dtype'], copy=False))
+        self.interpreter.invoke()
+        output_detail = self.output_details[0]
+        outputs = self.interpreter.get_tensor(output_detail['index'])
+        if is_quantized(output_detail):
+            return dequantize(outputs, output_detail)
+        # Copy: the output buffer is reused by the next invoke
+        return outputs.copy()
+
+
+class InterpreterPool:
+    """Fixed-size pool of :class:`PooledInterpreter` with checkout/return semantics
+
+    Other backends plug in through ``member``, which wraps what ``factory``
+    returns in an object with the :class:`PooledInterpreter` API (see
+    ``backends.py``).
+    """
+
+    def __init__(
+        self,
+        model_content: bytes,
+        factory: InterpreterFactory,
+        size: int = 1,
+        num_threads: int = 1,
+        member: MemberFactory = PooledInterpreter,
+    ) -> None:
+        self.size = max(1, size)
+        self.num_threads = max(1, num_threads)
+        self.model_bytes = len(model_content)
+        self._members: List[PooledInterpreter] = [
+            member(factory(model_content, self.num_threads)) for _ in range(self.size)]
+        self._idle: 'queue.LifoQueue[PooledInterpreter]' = queue.LifoQueue()
+        for member in self._members:
+            self._idle.put(member)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {'checkouts': 0, 'waits': 0, 'wait_seconds': 0.0}
+        logger.info(f'Interpreter pool ready: {self.size} interpreter(s) x {self.num_threads} '
+                    f'thread(s), shared model buffer {self.model_bytes / 1e6:.1f} MB')
+
+    @property
+    def input_details(self) -> List[Dict[str, Any]]:
+        return self._members[0].input_details
+
+    @property
+    def output_details(self) -> List[Dict[str, Any]]:
+        return self._members[0].output_details
+
+    @property
+    def dynamic_batch(self) -> bool:
+        return self._members[0].dynamic_batch
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator[PooledInterpreter]:
+        """Borrow an interpreter exclusively; blocks while all are busy"""
+        try:
+            member = self._idle.get_nowait()
+            waited = 0.0
+        except queue.Empty:
+            started = time.monotonic()
+            try:
+                member = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f'No free interpreter within {timeout}s') from None
+            waited = time.monotonic() - started
+        with self._lock:
+            self.stats['checkouts'] += 1
+            if waited:
+                self.stats['waits'] += 1
+                self.stats['wait_seconds'] += waited
+        try:
+            yield member
+        finally:
+            self._idle.put(member)
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        """Run a batch on whichever interpreter is free"""
+        with self.checkout() as member:
+            return member.predict(images)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.stats)
+        stats.update({'size': self.size, 'num_threads': self.num_threads, 'idle': self._idle.qsize()})
+        return stats
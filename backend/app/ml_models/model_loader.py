@@ -1,41 +1,68 @@
 """
-Singleton TFLite model loader - loads model ONCE at startup
-Uses TensorFlow Lite for inference (faster + smaller)
+TFLite model loader - one loaded model version (interpreter pool, micro-batching
+scheduler and matching preprocessor), loaded on first use or at warmup
+Uses TensorFlow Lite for inference (faster + smaller) by default; the interpreter
+comes from LiteRT / tflite_runtime when installed, TensorFlow otherwise
+(runtime.py). INFERENCE_BACKEND=onnxruntime serves an ONNX model instead (backends.py).
+Which version serves requests is decided by the model registry
+(model_registry.py); the helpers below use its active model.
 """
 import os
+import hashlib
 import logging
+import threading
+import time
 import numpy as np
 from pathlib import Path
 import json
+from contextlib import ExitStack
+from typing import List, Optional, Sequence
+
+from app.core.config import Config
+from app.ml.preprocessing import ImagePreprocessor
+from app.ml_models.backends import MODEL_SUFFIXES, InferenceBackend, get_inference_backend
+from app.ml_models.inference_scheduler import InferenceScheduler
+from app.ml_models.interpreter_pool import InterpreterPool, load_model_buffer
+from app.ml_models.model_registry import ModelEntry, ModelRegistry
 
 logger = logging.getLogger(__name__)
 
-# Try TFLite import
-try:
-    import tensorflow as tf
-    TFLITE_AVAILABLE = True
-except ImportError:
-    logger.warning("TensorFlow not available")
-    TFLITE_AVAILABLE = False
+# Bundled model, served when no MODEL_REGISTRY_DIR is configured (.onnx for onnxruntime)
+DEFAULT_MODEL_PATH = Path(__file__).parent / 'chili_disease_model.tflite'
+DEFAULT_INFO_PATH = Path(__file__).parent / 'model_info.json'
+
+def inference_pool_size() -> int:
+    """Configured pool size (0 = one interpreter per INFERENCE_NUM_THREADS cores)"""
+    if Config.INFERENCE_POOL_SIZE > 0:
+        return Config.INFERENCE_POOL_SIZE
+    return max(1, (os.cpu_count() or 1) // max(1, Config.INFERENCE_NUM_THREADS))
 
 class TFLiteModelLoader:
-    _instance = None
-    _interpreter = None
-    _input_details = None
-    _output_details = None
-    _class_names = []
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(TFLiteModelLoader, cls).__new__(cls)
-            cls._instance._load_model()
-        return cls._instance
-
-    def _load_model(self):
-        """Load TFLite model and model info (runs ONCE)"""
+    def __init__(self, model_path: Optional[Path] = None, info_path: Optional[Path] = None,
+                 version: Optional[str] = None, pool_size: Optional[int] = None,
+                 backend: Optional[str] = None):
+        self.backend: InferenceBackend = get_inference_backend(backend)
+        self.model_path = (Path(model_path) if model_path else
+                           DEFAULT_MODEL_PATH.with_suffix(MODEL_SUFFIXES[self.backend.name]))
+        self.info_path = Path(info_path) if info_path else DEFAULT_INFO_PATH
+        self.model_version = version
+        self._pool = None
+        self._input_details = None
+        self._output_details = None
+        self._class_names = []
+        self._scheduler: Optional[InferenceScheduler] = None
+        self._preprocessor: Optional[ImagePreprocessor] = None
+        self._lock = threading.Lock()
+        # Maintained by the registry: requests using this version, and whether it was replaced
+        self.in_flight = 0
+        self.retired = False
+        self._load_model(pool_size or inference_pool_size())
+
+    def _load_model(self, pool_size: int):
+        """Load the model and model info (runs ONCE per version)"""
         try:
-            model_path = Path(__file__).parent / 'chili_disease_model.tflite'
-            info_path = Path(__file__).parent / 'model_info.json'
+            model_path = self.model_path
+            info_path = self.info_path
 
             if not model_path.exists():
                 raise FileNotFoundError(f"Model not found at {model_path}")
@@ -48,71 +75,205 @@ class TFLiteModelLoader:
                 model_info = json.load(f)
                 self._class_names = model_info.get('class_names', [])
 
+            # The preprocessor feeds [0, 1] pixels (or raw uint8 through the input quantization)
+            normalization = model_info.get('input_normalization', 'unit')
+            if normalization != 'unit':
+                raise ValueError(f"Model expects '{normalization}' input normalization; "
+                                 f"the server only feeds [0, 1] ('unit') inputs")
+
+            model_content = load_model_buffer(model_path)
+            # Keys cached predictions: the registry version, an explicit version in the
+            # model info, else the model's content hash
+            self.model_version = str(self.model_version or model_info.get('version') or
+                                     hashlib.sha256(model_content).hexdigest()[:16])
+
             logger.info(f"📋 Loaded class names: {self._class_names}")
-            logger.info(f"Loading TFLite model from {model_path}...")
+            logger.info(f"Loading model from {model_path} ({self.backend.describe()})...")
 
-            # Load TFLite model
-            self._interpreter = tf.lite.Interpreter(model_path=str(model_path))
-            self._interpreter.allocate_tensors()
+            # N interpreters (TFLite) / IO bindings of one session (ONNX Runtime) sharing the model
+            self._pool = self.backend.create_pool(model_content, pool_size, Config.INFERENCE_NUM_THREADS)
 
             # Get input and output details
-            self._input_details = self._interpreter.get_input_details()
-            self._output_details = self._interpreter.get_output_details()
+            self._input_details = self._pool.input_details
+            self._output_details = self._pool.output_details
+
+            # The preprocessor writes square RGB images into NHWC batches (channels-first
+            # models are transposed by the pool members)
+            shape = [int(d) for d in self._input_details[0]['shape']]
+            if len(shape) != 4 or shape[3] != 3 or shape[1] != shape[2]:
+                raise ValueError(f"Unsupported model input shape {shape}: expected square RGB images, "
+                                 f"(N, H, W, 3) or (N, 3, H, W)")
 
-            logger.info(f"✅ TFLite model loaded successfully")
+            logger.info(f"✅ {self.backend.name} model loaded successfully (version {self.model_version})")
             logger.info(f"   Input shape: {self._input_details[0]['shape']}")
             logger.info(f"   Output shape: {self._output_details[0]['shape']}")
+            logger.info(f"   Dynamic batch axis: {self.dynamic_batch}")
+            logger.info(f"   Input dtype: {np.dtype(self._input_details[0]['dtype']).name}, "
+                        f"quantization (scale, zero point): {self._input_details[0].get('quantization')}")
 
         except Exception as e:
-            logger.error(f"❌ Failed to load TFLite model: {e}")
+            logger.error(f"❌ Failed to load {self.backend.name} model: {e}")
             raise
 
+    @property
+    def dynamic_batch(self) -> bool:
+        """Whether the exported model's batch axis is dynamic (-1 in the shape signature)"""
+        return self._pool is not None and self._pool.dynamic_batch
+
+    @property
+    def pool(self) -> InterpreterPool:
+        if self._pool is None:
+            raise RuntimeError("Model not loaded")
+        return self._pool
+
+    @property
+    def preprocessor(self) -> ImagePreprocessor:
+        """Fast preprocessor matching this model's input tensor (dtype, quantization)"""
+        if self._preprocessor is None:
+            self._preprocessor = ImagePreprocessor.from_input_details(self.pool.input_details[0])
+        return self._preprocessor
+
+    @property
+    def scheduler(self) -> InferenceScheduler:
+        """Micro-batching scheduler in front of this model (created on first use)"""
+        if self._scheduler is None:
+            with self._lock:
+                if self._scheduler is None:
+                    max_batch_size = Config.INFERENCE_MAX_BATCH_SIZE if self.dynamic_batch else 1
+                    # One worker per interpreter, so batches run in parallel across the pool
+                    self._scheduler = InferenceScheduler(
+                        self.predict,
+                        max_batch_size=max_batch_size,
+                        max_wait_ms=Config.INFERENCE_MAX_WAIT_MS,
+                        workers=self.pool.size,
+                    )
+        return self._scheduler
+
     def predict(self, image_array: np.ndarray) -> np.ndarray:
         """
-        Run inference on preprocessed image
+        Run inference on preprocessed image(s)
         Args:
-            image_array: Preprocessed image (1, 224, 224, 3) with values [0, 1]
+            image_array: Preprocessed images (N, 224, 224, 3) with values [0, 1];
+                N > 1 needs a model with a dynamic batch axis
         Returns:
-            predictions: Softmax probabilities (1, 6)
+            predictions: Softmax probabilities (N, 6)
         """
-        if self._interpreter is None:
-            raise RuntimeError("Model not loaded")
-
-        # Ensure correct dtype
-        input_dtype = self._input_details[0]['dtype']
-        image_array = image_array.astype(input_dtype)
+        # Thread-safe: each call checks out its own interpreter
+        return self.pool.predict(image_array)
 
-        # Set input tensor
-        self._interpreter.set_tensor(
-            self._input_details[0]['index'],
-            image_array
-        )
+    def infer(self, image_array: np.ndarray) -> np.ndarray:
+        """:meth:`predict`, batched with concurrent requests when enabled"""
+        if Config.INFERENCE_BATCHING_ENABLED:
+            return self.scheduler.predict(image_array)
+        return self.predict(image_array)
 
-        # Run inference
-        self._interpreter.invoke()
+    def infer_many(self, images: Sequence[np.ndarray]) -> List[np.ndarray]:
+        """
+        Predict many preprocessed images, batched as the model allows
+        Args:
+            images: Arrays of shape (1, 224, 224, 3)
+        Returns:
+            Probabilities (1, 6) per image, in order
+        """
+        if Config.INFERENCE_BATCHING_ENABLED:
+            # The scheduler forms the batches (also merging other requests' images)
+            futures = [self.scheduler.submit(image) for image in images]
+            return [future.result() for future in futures]
+        chunk = Config.INFERENCE_MAX_BATCH_SIZE if self.dynamic_batch else 1
+        results: List[np.ndarray] = []
+        for start in range(0, len(images), chunk):
+            predictions = self.predict(np.concatenate(images[start:start + chunk]))
+            results.extend(predictions[i:i + 1] for i in range(predictions.shape[0]))
+        return results
 
-        # Get output tensor
-        predictions = self._interpreter.get_tensor(
-            self._output_details[0]['index']
-        )
+    def warmup(self) -> None:
+        """
+        Run synthetic inputs through every interpreter (largest batch first, then
+        one image), so the first requests pay neither first-invoke nor resize costs
+        """
+        started = time.perf_counter()
+        detail = self.pool.input_details[0]
+        batch_sizes = [Config.INFERENCE_MAX_BATCH_SIZE, 1] if self.dynamic_batch else [1]
+        rng = np.random.default_rng(0)
+        for batch_size in batch_sizes:
+            shape = (batch_size, *detail['shape'][1:])
+            if np.dtype(detail['dtype']).kind == 'f':
+                sample = rng.random(shape, dtype=np.float32)
+            else:
+                info = np.iinfo(detail['dtype'])
+                sample = rng.integers(info.min, info.max, shape, dtype=detail['dtype'], endpoint=True)
+            # Hold every interpreter at once, so each one is warmed (not the same one N times)
+            with ExitStack() as stack:
+                members = [stack.enter_context(self.pool.checkout()) for _ in range(self.pool.size)]
+                for member in members:
+                    member.predict(sample)
+        logger.info(f"🔥 Model {self.model_version} warmed up in "
+                    f"{(time.perf_counter() - started) * 1000:.0f} ms")
 
-        return predictions
+    def close(self) -> None:
+        """Stop the scheduler after its queued requests (once the version is retired)"""
+        if self._scheduler is not None:
+            self._scheduler.stop()
 
     def get_class_names(self):
         """Get list of class names"""
         return self._class_names
 
-# Singleton instance
-model_loader = TFLiteModelLoader()
+def _load_version(entry: Optional[ModelEntry], pool_size: Optional[int]) -> TFLiteModelLoader:
+    if entry is None:
+        return TFLiteModelLoader(pool_size=pool_size)
+    return TFLiteModelLoader(entry.model_path, entry.info_path, entry.model_version, pool_size, entry.backend)
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
 
-def get_disease_model():
-    """Helper function to get model loader"""
-    return model_loader
+def get_model_registry() -> ModelRegistry:
+    """Process-wide model registry (models load on first use of ``active``)"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(
+                    _load_version,
+                    Config.MODEL_REGISTRY_DIR or None,
+                    poll_seconds=Config.MODEL_REGISTRY_POLL_SECONDS,
+                    max_shadow_pending=Config.SHADOW_MAX_PENDING,
+                )
+    return _registry
+
+def get_disease_model() -> TFLiteModelLoader:
+    """Helper function to get the active model (loads it on first call)"""
+    return get_model_registry().active
+
+def use_disease_model():
+    """Context manager pinning the active model for one request (see ModelRegistry.use)"""
+    return get_model_registry().use()
+
+def is_model_loaded() -> bool:
+    """Whether a model is in memory, without triggering a load"""
+    return _registry is not None and _registry.loaded
+
+def warmup_model() -> TFLiteModelLoader:
+    """
+    Load the active model and run synthetic inferences on every interpreter,
+    so the first request pays neither the load nor the first-invoke cost
+    """
+    return get_disease_model()
+
+def get_inference_scheduler() -> InferenceScheduler:
+    """Micro-batching scheduler of the active model"""
+    return get_disease_model().scheduler
 
 def predict_disease(image_array: np.ndarray) -> np.ndarray:
-    """Helper function to run prediction"""
-    return model_loader.predict(image_array)
+    """Helper function to run prediction (batched with concurrent requests when enabled)"""
+    with use_disease_model() as model:
+        return model.infer(image_array)
 
 def get_class_names():
     """Helper function to get class names"""
-    return model_loader.get_class_names()
+    return get_disease_model().get_class_names()
+
+def predict_images(images: Sequence[np.ndarray]) -> List[np.ndarray]:
+    """Predict many preprocessed images (1, 224, 224, 3) with the active model"""
+    with use_disease_model() as model:
+        return model.infer_many(images)
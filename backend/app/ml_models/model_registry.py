@@ -0,0 +1,451 @@
+"""Versioned disease model registry with hot-swap, warmup and shadow evaluation
+
+The registry directory holds the model versions and a ``manifest.json``::
+
+    {
+      "active": "v2",
+      "shadow": {"version": "v3", "sample_rate": 0.1},
+      "models": {
+        "v2": {"model": "v2/5f1c0e9a2b7d/model.tflite", "info": "v2/5f1c0e9a2b7d/model_info.json",
+               "backend": "tflite", "revision": "5f1c0e9a2b7d"},
+        "v3": {"model": "v3/0d4e8b1f6a23/model.onnx", "info": "v3/0d4e8b1f6a23/model_info.json",
+               "backend": "onnxruntime", "revision": "0d4e8b1f6a23"}
+      }
+    }
+
+(paths are relative to the directory; ``manage_models.py`` maintains it).
+The revision is a content hash of the model and its info: a loaded model
+reports ``<version>+<revision>`` as its ``model_version``, so re-registering a
+version with a different artifact is hot-swapped like a new version and
+gets its own prediction cache entries.
+Every worker process watches the manifest and follows it:
+
+* **Hot-swap** - a new active version is loaded and warmed with synthetic
+  inputs on the watcher thread while the old one keeps serving, then the
+  reference is swapped under a lock. Requests pin the model they started
+  with (:meth:`ModelRegistry.use`), so in-flight requests finish on the old
+  version, which is closed once its last request is done.
+* **Shadow mode** - a candidate version gets a sample of the traffic on a
+  background thread: the served prediction is compared with the candidate's
+  (top-1 agreement, probability difference) and both models' invoke latency
+  is measured on the same image. Shadowing never delays the response;
+  samples beyond ``max_pending`` queued evaluations are dropped.
+
+Without a registry directory the bundled ``chili_disease_model.tflite`` is
+the only (active) version.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+
+# Log a shadow summary every N evaluated samples
+SHADOW_LOG_EVERY = 100
+
+# Shadow latency samples kept for the percentiles
+_SAMPLE_WINDOW = 1024
+
+
+class ModelEntry:
+    """One registered version: resolved model and info paths, its inference backend and revision"""
+
+    __slots__ = ('version', 'model_path', 'info_path', 'backend', 'revision')
+
+    def __init__(self, version: str, model_path: Path, info_path: Path,
+                 backend: Optional[str] = None, revision: Optional[str] = None) -> None:
+        self.version = version
+        self.model_path = model_path
+        self.info_path = info_path
+        # None = the deployment's INFERENCE_BACKEND
+        self.backend = backend
+        # Content hash of the artifact (None for versions registered without one)
+        self.revision = revision
+
+    @property
+    def model_version(self) -> str:
+        """Version the loaded model reports (and keys cached predictions with)"""
+        return f'{self.version}+{self.revision}' if self.revision else self.version
+
+
+# (entry or None for the bundled model, pool size or None for the default) -> loaded model
+ModelFactory = Callable[[Optional[ModelEntry], Optional[int]], Any]
+
+
+def read_manifest(registry_dir: Path) -> Dict[str, Any]:
+    """Manifest of a registry directory (empty registry when the file does not exist yet)"""
+    path = Path(registry_dir) / MANIFEST_FILE
+    if not path.exists():
+        return {'active': None, 'shadow': None, 'models': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest.setdefault('active', None)
+    manifest.setdefault('shadow', None)
+    manifest.setdefault('models', {})
+    return manifest
+
+
+def write_manifest(registry_dir: Path, manifest: Dict[str, Any]) -> None:
+    """Atomically replace the manifest (workers never read a partial file)"""
+    path = Path(registry_dir) / MANIFEST_FILE
+    manifest['updated_at'] = datetime.utcnow().isoformat()
+    tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def manifest_entry(registry_dir: Path, manifest: Dict[str, Any], version: str) -> ModelEntry:
+    """Resolve ``version`` of a manifest; KeyError if it is not registered"""
+    if version not in manifest['models']:
+        raise KeyError(f"Model version '{version}' is not registered")
+    spec = manifest['models'][version]
+    return ModelEntry(version, Path(registry_dir) / spec['model'], Path(registry_dir) / spec['info'],
+                      spec.get('backend'), spec.get('revision'))
+
+
+class ShadowEvaluator:
+    """Compares a candidate model with the served one on sampled requests"""
+
+    def __init__(self, candidate: Any, sample_rate: float, max_pending: int = 32) -> None:
+        self.candidate = candidate
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.max_pending = max(1, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats: Dict[str, Any] = {'sampled': 0, 'evaluated': 0, 'agreements': 0, 'dropped': 0, 'errors': 0}
+        self._disagreements: Counter = Counter()
+        self._prob_diffs: Deque[float] = deque(maxlen=_SAMPLE_WINDOW)
+        self._primary_ms: Deque[float] = deque(maxlen=_SAMPLE_WINDOW)
+        self._candidate_ms: Deque[float] = deque(maxlen=_SAMPLE_WINDOW)
+
+    @property
+    def version(self) -> str:
+        return self.candidate.model_version
+
+    def sample(self) -> bool:
+        """Whether this request should be shadowed (counts drops when the backlog is full)"""
+        if random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats['dropped'] += 1
+                return False
+            self._pending += 1
+            self.stats['sampled'] += 1
+        return True
+
+    def submit(self, job: Callable[[], None]) -> None:
+        self._executor.submit(job)
+
+    def evaluate(self, primary: Any, primary_input: np.ndarray, image_bytes: bytes,
+                 primary_probabilities: np.ndarray) -> None:
+        """Runs on the shadow thread: candidate prediction plus both invoke latencies"""
+        try:
+            candidate_input = self.candidate.preprocessor.preprocess(image_bytes)
+            started = time.perf_counter()
+            primary.predict(primary_input)
+            primary_ms = (time.perf_counter() - started) * 1000.0
+            started = time.perf_counter()
+            candidate_probabilities = self.candidate.predict(candidate_input)[0]
+            candidate_ms = (time.perf_counter() - started) * 1000.0
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning(f"⚠️ Shadow evaluation of model {self.version} failed: {e}")
+            with self._lock:
+                self._pending -= 1
+                self.stats['errors'] += 1
+            return
+
+        primary_class = int(np.argmax(primary_probabilities))
+        candidate_class = int(np.argmax(candidate_probabilities))
+        agree = primary_class == candidate_class
+        prob_diff = float(np.abs(np.asarray(primary_probabilities) - candidate_probabilities).mean())
+        with self._lock:
+            self._pending -= 1
+            self.stats['evaluated'] += 1
+            self.stats['agreements'] += int(agree)
+            self._prob_diffs.append(prob_diff)
+            self._primary_ms.append(primary_ms)
+            self._candidate_ms.append(candidate_ms)
+            if not agree:
+                self._disagreements[f'{self._class_name(primary, primary_class)} -> '
+                                    f'{self._class_name(self.candidate, candidate_class)}'] += 1
+            evaluated = self.stats['evaluated']
+
+        if not agree:
+            logger.debug(f"👥 Shadow {primary.model_version} vs {self.version} disagree: "
+                        f"{self._class_name(primary, primary_class)} vs "
+                        f"{self._class_name(self.candidate, candidate_class)} "
+                        f"({primary_ms:.1f} ms vs {candidate_ms:.1f} ms)")
+        if evaluated % SHADOW_LOG_EVERY == 0:
+            snapshot = self.snapshot()
+            logger.info(f"👥 Shadow {self.version}: {evaluated} samples, "
+                        f"agreement {snapshot['agreement_rate']:.2%}, "
+                        f"p50 {snapshot['primary_ms']['p50']:.1f} ms (served) vs "
+                        f"{snapshot['candidate_ms']['p50']:.1f} ms (candidate)")
+
+    @staticmethod
+    def _class_name(model: Any, class_id: int) -> str:
+        names = model.get_class_names()
+        return names[class_id] if class_id < len(names) else str(class_id)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Agreement, mean probability difference and latency of served vs candidate"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.stats)
+            diffs = np.array(self._prob_diffs)
+            primary_ms = np.array(self._primary_ms)
+            candidate_ms = np.array(self._candidate_ms)
+            stats['disagreements'] = dict(self._disagreements.most_common(20))
+            stats['pending'] = self._pending
+        stats.update({
+            'version': self.version,
+            'sample_rate': self.sample_rate,
+            'agreement_rate': stats['agreements'] / stats['evaluated'] if stats['evaluated'] else 0.0,
+            'mean_abs_prob_diff': float(diffs.mean()) if diffs.size else 0.0,
+        })
+        for name, samples in (('primary_ms', primary_ms), ('candidate_ms', candidate_ms)):
+            stats[name] = {
+                'mean': float(samples.mean()) if samples.size else 0.0,
+                'p50': float(np.percentile(samples, 50)) if samples.size else 0.0,
+                'p95': float(np.percentile(samples, 95)) if samples.size else 0.0,
+            }
+        return stats
+
+
+class ModelRegistry:
+    """Active (and optional shadow) model of this process, following the manifest"""
+
+    def __init__(self, factory: ModelFactory, registry_dir: Optional[str] = None,
+                 poll_seconds: float = 0.0, max_shadow_pending: int = 32) -> None:
+        self.factory = factory
+        self.registry_dir = Path(registry_dir) if registry_dir else None
+        self.poll_seconds = poll_seconds
+        self.max_shadow_pending = max_shadow_pending
+        self._active: Any = None
+        self._shadow: Optional[ShadowEvaluator] = None
+        self._lock = threading.Lock()
+        # Serialises loads, so the first request and the watcher never load twice
+        self._load_lock = threading.Lock()
+        self._manifest_mtime: Optional[float] = None
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {'swaps': 0, 'reloads': 0, 'reload_errors': 0, 'last_error': None}
+
+    # ----------------------------------------------------------- active model
+
+    @property
+    def loaded(self) -> bool:
+        return self._active is not None
+
+    @property
+    def active(self) -> Any:
+        """Serving model (loaded and warmed on first access)"""
+        if self._active is None:
+            with self._load_lock:
+                if self._active is None:
+                    self._load_initial()
+        return self._active
+
+    def _load_initial(self) -> None:
+        if self.registry_dir is None:
+            model = self.factory(None, None)
+            model.warmup()
+            self._active = model
+            return
+        self._manifest_mtime = self._mtime()
+        manifest = read_manifest(self.registry_dir)
+        if not manifest['active']:
+            raise FileNotFoundError(f"No active model in {self.registry_dir / MANIFEST_FILE}")
+        model = self.factory(manifest_entry(self.registry_dir, manifest, manifest['active']), None)
+        model.warmup()
+        self._active = model
+        try:
+            self._apply_shadow(manifest)
+        except Exception as e:  # pylint: disable=broad-except
+            # A broken candidate must not keep the active model from serving
+            logger.error(f"❌ Shadow model could not be loaded: {e}")
+        self.start_watcher()
+
+    @contextmanager
+    def use(self) -> Iterator[Any]:
+        """Pin the active model for one request; a swap meanwhile does not affect it"""
+        model = self.active
+        with self._lock:
+            model = self._active
+            model.in_flight += 1
+        try:
+            yield model
+        finally:
+            self._release(model)
+
+    def _release(self, model: Any) -> None:
+        with self._lock:
+            model.in_flight -= 1
+            close = model.retired and model.in_flight == 0
+        if close:
+            model.close()
+            logger.info(f"🗑️ Model {model.model_version} retired")
+
+    def _retire(self, model: Any) -> None:
+        with self._lock:
+            model.retired = True
+            close = model.in_flight == 0
+        if close:
+            model.close()
+            logger.info(f"🗑️ Model {model.model_version} retired")
+
+    def activate(self, version: str) -> Any:
+        """Load and warm ``version``, then make it the serving model"""
+        if self.registry_dir is None:
+            raise RuntimeError('MODEL_REGISTRY_DIR is not configured')
+        with self._load_lock:
+            entry = manifest_entry(self.registry_dir, read_manifest(self.registry_dir), version)
+            if self._active is not None and self._active.model_version == entry.model_version:
+                return self._active
+            started = time.perf_counter()
+            model = self.factory(entry, None)
+            model.warmup()
+            with self._lock:
+                previous, self._active = self._active, model
+                self.stats['swaps'] += 1
+        logger.info(f"🔁 Model {entry.model_version} active (loaded and warmed in "
+                    f"{(time.perf_counter() - started) * 1000:.0f} ms)"
+                    + (f", replacing {previous.model_version}" if previous is not None else ''))
+        if previous is not None:
+            self._retire(previous)
+        return model
+
+    # ----------------------------------------------------------------- shadow
+
+    def _apply_shadow(self, manifest: Dict[str, Any]) -> None:
+        spec = manifest.get('shadow') or {}
+        version = spec.get('version')
+        sample_rate = float(spec.get('sample_rate', 0.0))
+        entry = manifest_entry(self.registry_dir, manifest, version) if version else None
+        current = self._shadow
+        if current is not None and entry is not None and entry.model_version == current.version:
+            current.sample_rate = min(max(sample_rate, 0.0), 1.0)
+            return
+        shadow = None
+        if entry is not None and sample_rate > 0:
+            # One interpreter: the shadow thread runs one evaluation at a time
+            candidate = self.factory(entry, 1)
+            candidate.warmup()
+            shadow = ShadowEvaluator(candidate, sample_rate, self.max_shadow_pending)
+            logger.info(f"👥 Shadowing model {entry.model_version} on {sample_rate:.0%} of requests")
+        with self._lock:
+            self._shadow = shadow
+        if current is not None:
+            current.close()
+            self._retire(current.candidate)
+
+    def shadow(self, primary: Any, primary_input: np.ndarray, image_bytes: bytes,
+               primary_probabilities: np.ndarray) -> bool:
+        """Queue a shadow evaluation of one served prediction if it is sampled"""
+        shadow = self._shadow
+        if shadow is None or shadow.version == primary.model_version or not shadow.sample():
+            return False
+        with self._lock:
+            primary.in_flight += 1
+            shadow.candidate.in_flight += 1
+
+        def job() -> None:
+            try:
+                shadow.evaluate(primary, primary_input, image_bytes, primary_probabilities)
+            finally:
+                self._release(primary)
+                self._release(shadow.candidate)
+        try:
+            shadow.submit(job)
+        except RuntimeError:
+            # Shadow replaced in the meantime
+            self._release(primary)
+            self._release(shadow.candidate)
+            return False
+        return True
+
+    # ---------------------------------------------------------------- watcher
+
+    def _mtime(self) -> Optional[float]:
+        try:
+            return (self.registry_dir / MANIFEST_FILE).stat().st_mtime
+        except OSError:
+            return None
+
+    def reload(self) -> None:
+        """Follow the manifest: activate its active version and apply its shadow settings"""
+        with self._lock:
+            self.stats['reloads'] += 1
+        manifest = read_manifest(self.registry_dir)
+        if manifest['active']:
+            # No-op unless the active version or its revision changed
+            self.activate(manifest['active'])
+        with self._load_lock:
+            self._apply_shadow(manifest)
+
+    def start_watcher(self) -> None:
+        if self.registry_dir is None or self.poll_seconds <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+        self._watcher.start()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            mtime = self._mtime()
+            if mtime is None or mtime == self._manifest_mtime:
+                continue
+            self._manifest_mtime = mtime
+            try:
+                self.reload()
+                with self._lock:
+                    self.stats['last_error'] = None
+            except Exception as e:  # pylint: disable=broad-except
+                # Keep serving the current version
+                logger.error(f"❌ Model registry reload failed: {e}")
+                with self._lock:
+                    self.stats['reload_errors'] += 1
+                    self.stats['last_error'] = str(e)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # ---------------------------------------------------------------- metrics
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Registered versions, active model, shadow evaluation and swap counters"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.stats)
+            active, shadow = self._active, self._shadow
+        stats.update({
+            'registry_dir': str(self.registry_dir) if self.registry_dir else None,
+            'active': active.model_version if active is not None else None,
+            'in_flight': active.in_flight if active is not None else 0,
+            'shadow': shadow.snapshot() if shadow is not None else None,
+        })
+        if self.registry_dir is not None:
+            try:
+                stats['versions'] = sorted(read_manifest(self.registry_dir)['models'])
+            except (OSError, ValueError) as e:
+                stats['versions'] = None
+                stats['last_error'] = str(e)
+        return stats
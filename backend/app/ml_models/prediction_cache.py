@@ -0,0 +1,277 @@
+"""Content-addressed cache of disease model predictions
+
+Farmers re-upload the same photo after a flaky connection and the app
+retries, so identical bytes reach ``detect_disease`` repeatedly. Entries map
+(model version, SHA-256 of the image bytes) to the model's class
+probabilities, so a new model version never serves stale predictions and a
+hit skips both preprocessing and inference; the caller still builds a fresh
+detection record from the cached probabilities.
+
+Tiers, checked in order:
+
+1. memory        - LRU of ``max_entries`` exact digests
+2. disk          - optional directory (``<dir>/<model version>/<sha[:2]>/<sha>.json``),
+                   shared by workers and surviving restarts; hits are promoted
+                   to memory. Old model versions live in their own directory.
+3. near duplicate - optional: 64-bit difference hash (dHash) of the image
+                   within ``phash_distance`` bits of a memory entry, for
+                   re-encoded or resized copies of the same photo
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import Config
+
+logger = logging.getLogger(__name__)
+
+# dHash grid: 9x8 grayscale pixels -> 8x8 horizontal gradient bits
+_HASH_SIZE = 8
+
+
+def image_digest(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def perceptual_hash(image_bytes: bytes) -> int:
+    """64-bit dHash: sign of horizontal gradients of a 9x8 grayscale thumbnail"""
+    img = Image.open(BytesIO(image_bytes))
+    # JPEG only: decode at reduced scale, the thumbnail is tiny anyway
+    img.draft('L', (_HASH_SIZE * 8, _HASH_SIZE * 8))
+    pixels = np.asarray(img.convert('L').resize((_HASH_SIZE + 1, _HASH_SIZE), Image.Resampling.BOX),
+                        dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+class CacheLookup:
+    """Result of :meth:`PredictionCache.lookup`; pass it back to :meth:`PredictionCache.store`"""
+
+    __slots__ = ('model_version', 'digest', 'phash', 'probabilities', 'tier')
+
+    def __init__(self, model_version: str, digest: str, phash: Optional[int] = None,
+                 probabilities: Optional[np.ndarray] = None, tier: Optional[str] = None) -> None:
+        self.model_version = model_version
+        self.digest = digest
+        self.phash = phash
+        self.probabilities = probabilities
+        self.tier = tier
+
+    @property
+    def hit(self) -> bool:
+        return self.probabilities is not None
+
+
+class PredictionCache:
+    """Thread-safe memory LRU plus optional disk and near-duplicate tiers"""
+
+    def __init__(self, max_entries: int = 1024, disk_dir: Optional[str] = None,
+                 disk_max_entries: int = 100000, phash_distance: Optional[int] = None) -> None:
+        self.max_entries = max(1, max_entries)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_entries = disk_max_entries
+        self.phash_distance = phash_distance if phash_distance is not None and phash_distance >= 0 else None
+        # (model version, digest) -> (probabilities, dHash or None)
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[np.ndarray, Optional[int]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_counts: Dict[str, int] = {}
+        self.stats: Dict[str, int] = {
+            'lookups': 0, 'memory_hits': 0, 'disk_hits': 0, 'near_duplicate_hits': 0,
+            'misses': 0, 'stores': 0, 'evictions': 0, 'disk_errors': 0,
+        }
+
+    # ----------------------------------------------------------------- lookup
+
+    def lookup(self, model_version: str, image_bytes: bytes) -> CacheLookup:
+        """Find cached probabilities for ``image_bytes`` under ``model_version``"""
+        lookup = CacheLookup(model_version, image_digest(image_bytes))
+        key = (model_version, lookup.digest)
+        with self._lock:
+            self.stats['lookups'] += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                lookup.probabilities, lookup.tier = entry[0], 'memory'
+                return lookup
+
+        probabilities, phash = self._read_disk(model_version, lookup.digest)
+        if probabilities is not None:
+            self._remember(key, probabilities, phash)
+            with self._lock:
+                self.stats['disk_hits'] += 1
+            lookup.probabilities, lookup.tier = probabilities, 'disk'
+            return lookup
+
+        if self.phash_distance is not None:
+            try:
+                lookup.phash = perceptual_hash(image_bytes)
+            except Exception:  # pylint: disable=broad-except
+                lookup.phash = None  # undecodable: preprocessing reports the error
+            if lookup.phash is not None:
+                probabilities = self._nearest(model_version, lookup.phash)
+                if probabilities is not None:
+                    with self._lock:
+                        self.stats['near_duplicate_hits'] += 1
+                    lookup.probabilities, lookup.tier = probabilities, 'near_duplicate'
+                    return lookup
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return lookup
+
+    def _nearest(self, model_version: str, phash: int) -> Optional[np.ndarray]:
+        best: Optional[Tuple[int, np.ndarray]] = None
+        with self._lock:
+            for (version, _), (probabilities, other) in self._entries.items():
+                if version != model_version or other is None:
+                    continue
+                distance = (phash ^ other).bit_count()
+                if distance <= self.phash_distance and (best is None or distance < best[0]):
+                    best = (distance, probabilities)
+        return best[1] if best else None
+
+    # ------------------------------------------------------------------ store
+
+    def store(self, lookup: CacheLookup, probabilities: np.ndarray) -> None:
+        """Cache the model output for a missed lookup"""
+        probabilities = np.array(probabilities, dtype=np.float32).ravel()
+        probabilities.setflags(write=False)
+        self._remember((lookup.model_version, lookup.digest), probabilities, lookup.phash)
+        self._write_disk(lookup.model_version, lookup.digest, probabilities, lookup.phash)
+        with self._lock:
+            self.stats['stores'] += 1
+
+    def _remember(self, key: Tuple[str, str], probabilities: np.ndarray, phash: Optional[int]) -> None:
+        with self._lock:
+            self._entries[key] = (probabilities, phash)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    # ------------------------------------------------------------------- disk
+
+    def _disk_path(self, model_version: str, digest: str) -> Path:
+        return self.disk_dir / model_version / digest[:2] / f'{digest}.json'
+
+    def _read_disk(self, model_version: str, digest: str) -> Tuple[Optional[np.ndarray], Optional[int]]:
+        if self.disk_dir is None:
+            return None, None
+        path = self._disk_path(model_version, digest)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            probabilities = np.asarray(entry['probabilities'], dtype=np.float32)
+        except FileNotFoundError:
+            return None, None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Unreadable prediction cache entry {path}: {e}")
+            with self._lock:
+                self.stats['disk_errors'] += 1
+            return None, None
+        probabilities.setflags(write=False)
+        return probabilities, entry.get('phash')
+
+    def _write_disk(self, model_version: str, digest: str, probabilities: np.ndarray,
+                    phash: Optional[int]) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(model_version, digest)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename, so concurrent workers never read a partial file
+            tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'model_version': model_version, 'probabilities': probabilities.tolist(),
+                           'phash': phash}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Prediction cache write failed ({path}): {e}")
+            with self._lock:
+                self.stats['disk_errors'] += 1
+            return
+        with self._lock:
+            if model_version not in self._disk_counts:
+                self._disk_counts[model_version] = sum(1 for _ in (self.disk_dir / model_version).rglob('*.json'))
+            else:
+                self._disk_counts[model_version] += 1
+            over = self._disk_counts[model_version] > self.disk_max_entries
+        if over:
+            self._prune_disk(model_version)
+
+    def _prune_disk(self, model_version: str) -> None:
+        """Delete the oldest tenth of a version's disk entries once over ``disk_max_entries``"""
+        files: List[Tuple[float, Path]] = []
+        for path in (self.disk_dir / model_version).rglob('*.json'):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        files.sort()
+        excess = len(files) - int(self.disk_max_entries * 0.9)
+        removed = 0
+        for _, path in files[:max(0, excess)]:
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                continue
+        with self._lock:
+            self._disk_counts[model_version] = len(files) - removed
+        logger.info(f"🧹 Prediction cache: pruned {removed} disk entries of model {model_version}")
+
+    # ---------------------------------------------------------------- metrics
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, hit rates per tier and memory occupancy"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        hits = stats['memory_hits'] + stats['disk_hits'] + stats['near_duplicate_hits']
+        lookups = stats['lookups']
+        stats.update({
+            'max_entries': self.max_entries,
+            'disk': str(self.disk_dir) if self.disk_dir else None,
+            'near_duplicate_distance': self.phash_distance,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'memory_hit_rate': round(stats['memory_hits'] / lookups, 4) if lookups else 0.0,
+            'disk_hit_rate': round(stats['disk_hits'] / lookups, 4) if lookups else 0.0,
+            'near_duplicate_hit_rate': round(stats['near_duplicate_hits'] / lookups, 4) if lookups else 0.0,
+        })
+        return stats
+
+    def clear(self) -> None:
+        """Drop the memory tier (disk entries stay)"""
+        with self._lock:
+            self._entries.clear()
+
+
+_cache: Optional[PredictionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache() -> PredictionCache:
+    """Lazily create the process-wide prediction cache from Config"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache(
+                    Config.PREDICTION_CACHE_MAX_ENTRIES,
+                    Config.PREDICTION_CACHE_DIR or None,
+                    Config.PREDICTION_CACHE_DISK_MAX_ENTRIES,
+                    Config.PREDICTION_CACHE_PHASH_DISTANCE,
+                )
+    return _cache
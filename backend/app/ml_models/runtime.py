@@ -0,0 +1,76 @@
+"""TFLite interpreter runtime resolution
+
+Full TensorFlow costs seconds of import time and hundreds of MB of RSS per
+process, although the backend only needs ``Interpreter``. The standalone
+runtimes ship the same interpreter API without the rest of TensorFlow:
+
+* ``litert``         - ``ai_edge_litert.interpreter`` (LiteRT, successor of tflite-runtime)
+* ``tflite_runtime`` - ``tflite_runtime.interpreter``
+* ``tensorflow``     - ``tensorflow.lite`` (fallback)
+
+``INFERENCE_RUNTIME=auto`` picks the first one installed in that order. The
+import happens on first use, not when this module is imported, so processes
+that never run inference never load a runtime.
+"""
+from __future__ import annotations
+
+import importlib
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Runtime name -> (module, attribute holding the Interpreter class), in preference order
+RUNTIMES: Dict[str, Tuple[str, str]] = {
+    'litert': ('ai_edge_litert.interpreter', 'Interpreter'),
+    'tflite_runtime': ('tflite_runtime.interpreter', 'Interpreter'),
+    'tensorflow': ('tensorflow', 'lite.Interpreter'),
+}
+
+_resolved: Optional[Tuple[str, Any]] = None
+_lock = threading.Lock()
+
+
+def _load(name: str) -> Any:
+    module_name, attribute = RUNTIMES[name]
+    target: Any = importlib.import_module(module_name)
+    for part in attribute.split('.'):
+        target = getattr(target, part)
+    return target
+
+
+def resolve_runtime(preference: Optional[str] = None) -> Tuple[str, Any]:
+    """(runtime name, Interpreter class) for ``preference`` (default ``Config.INFERENCE_RUNTIME``)"""
+    preference = (preference or Config.INFERENCE_RUNTIME).lower()
+    if preference != 'auto' and preference not in RUNTIMES:
+        raise ValueError(f"Unknown inference runtime '{preference}'; "
+                         f"expected auto or one of {', '.join(RUNTIMES)}")
+    candidates = list(RUNTIMES) if preference == 'auto' else [preference]
+    errors = []
+    for name in candidates:
+        try:
+            return name, _load(name)
+        except ImportError as e:
+            errors.append(f'{name}: {e}')
+    raise ImportError(f"No TFLite runtime available ({'; '.join(errors)}). "
+                      f"Install ai-edge-litert, tflite-runtime or tensorflow.")
+
+
+def get_runtime() -> Tuple[str, Any]:
+    """Configured runtime, imported once per process"""
+    global _resolved
+    if _resolved is None:
+        with _lock:
+            if _resolved is None:
+                _resolved = resolve_runtime()
+                logger.info(f"🧠 TFLite runtime: {_resolved[0]}")
+    return _resolved
+
+
+def create_interpreter(model_content: bytes, num_threads: int) -> Any:
+    """Interpreter factory for :class:`~app.ml_models.interpreter_pool.InterpreterPool`"""
+    _, interpreter_class = get_runtime()
+    return interpreter_class(model_content=model_content, num_threads=num_threads)
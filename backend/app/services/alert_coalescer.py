@@ -0,0 +1,188 @@
+"""Alert coalescing and per-user notification rate limiting
+
+Repeated alerts for the same field, alert type, parameter and source
+(the alert rule, or the fault of a device-health alert) inside
+``ALERT_COALESCE_WINDOW_MINUTES`` are merged into a single alert document
+with an occurrence count. Push notifications are rate limited per user to
+``MAX_CRITICAL_ALERTS_PER_DAY`` (critical alerts) and ``MAX_ALERTS_PER_DAY``
+(everything else) in any 24 hours; alerts over the cap are deferred into a
+digest that a timer sends as one notification later
+(``notification_service.start_alert_digest_scheduler``).
+
+All of this state lives in the worker process: every worker has its own
+windows, caps and digests, and they start empty after a restart. With N
+workers a user can get up to N times the daily cap, and an undelivered
+digest is lost on restart.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+SECONDS_PER_DAY = 86400.0
+
+# (field_id, alert_type, parameter, rule_id / fault code or '')
+AlertKey = Tuple[str, str, str, str]
+
+
+class DailyCap:
+    """
+    At most ``capacity`` events in any sliding 24 h window
+
+    Keeps the times of the last ``capacity`` allowed events; a new one is
+    allowed once the oldest of them is a day old. (A continuously refilled
+    token bucket that starts full lets through up to twice the cap in 24 h.)
+
+    The cap is per worker process and in memory only: it is not shared
+    between workers and resets when the process restarts.
+    """
+
+    __slots__ = ('capacity', 'sent')
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(0, int(capacity))
+        self.sent: Deque[float] = deque(maxlen=self.capacity or 1)
+
+    def try_consume(self, now: float) -> bool:
+        """Record an event at ``now`` if it stays within the cap"""
+        if self.capacity == 0:
+            return False
+        if len(self.sent) >= self.capacity and now - self.sent[0] < SECONDS_PER_DAY:
+            return False
+        self.sent.append(now)
+        return True
+
+
+class _OpenAlert:
+    __slots__ = ('alert_id', 'first_seen', 'occurrences')
+
+    def __init__(self, alert_id: Optional[str], first_seen: float) -> None:
+        self.alert_id = alert_id
+        self.first_seen = first_seen
+        self.occurrences = 1
+
+
+class AlertCoalescer:
+    """In-process coalescing window, rate limiter and digest queue"""
+
+    def __init__(
+        self,
+        window_seconds: float,
+        critical_per_day: int,
+        other_per_day: int,
+        digest_interval_seconds: float,
+    ) -> None:
+        self.window_seconds = window_seconds
+        self.critical_per_day = critical_per_day
+        self.other_per_day = other_per_day
+        self.digest_interval_seconds = digest_interval_seconds
+
+        self._open: Dict[AlertKey, _OpenAlert] = {}
+        self._caps: Dict[Tuple[str, bool], DailyCap] = {}
+        self._digests: Dict[str, List[Dict[str, Any]]] = {}
+        self._digest_started: Dict[str, float] = {}
+        self._last_prune = time.time()
+        self._lock = threading.Lock()
+
+        self.stats = {'created': 0, 'coalesced': 0, 'notified': 0, 'deferred': 0}
+
+    def record(self, key: AlertKey, now: Optional[float] = None) -> Tuple[Optional[str], bool]:
+        """
+        Register an occurrence of an alert
+
+        Returns:
+            (alert_id, is_new). ``alert_id`` is None for a new alert until
+            :meth:`bind` is called with the stored document ID.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._prune(now)
+            entry = self._open.get(key)
+            if entry is not None and entry.alert_id and now - entry.first_seen < self.window_seconds:
+                entry.occurrences += 1
+                self.stats['coalesced'] += 1
+                return entry.alert_id, False
+
+            self._open[key] = _OpenAlert(None, now)
+            self.stats['created'] += 1
+            return None, True
+
+    def bind(self, key: AlertKey, alert_id: str) -> None:
+        """Attach the stored alert document to an open coalescing window"""
+        with self._lock:
+            entry = self._open.get(key)
+            if entry is not None:
+                entry.alert_id = alert_id
+
+    def forget(self, key: AlertKey) -> None:
+        """Close the coalescing window (e.g. when storing the alert failed)"""
+        with self._lock:
+            self._open.pop(key, None)
+
+    def forget_alert(self, alert_id: str) -> None:
+        """Close the window bound to ``alert_id`` (acknowledged or resolved alerts take no repeats)"""
+        with self._lock:
+            for key in [k for k, v in self._open.items() if v.alert_id == alert_id]:
+                del self._open[key]
+
+    def allow_notification(self, user_id: str, severity: str, now: Optional[float] = None) -> bool:
+        """Count a notification against the user's daily cap for its severity tier"""
+        now = time.time() if now is None else now
+        critical = severity == 'critical'
+        with self._lock:
+            cap = self._caps.get((user_id, critical))
+            if cap is None:
+                cap = self._caps[(user_id, critical)] = DailyCap(
+                    self.critical_per_day if critical else self.other_per_day)
+            allowed = cap.try_consume(now)
+            self.stats['notified' if allowed else 'deferred'] += 1
+            return allowed
+
+    def defer(self, user_id: str, item: Dict[str, Any], now: Optional[float] = None) -> None:
+        """Queue an alert that was over the cap for the user's next digest"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._digests.setdefault(user_id, []).append(item)
+            self._digest_started.setdefault(user_id, now)
+
+    def due_digests(self, now: Optional[float] = None, force: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Pop digests whose interval has elapsed (or all of them if ``force``)"""
+        now = time.time() if now is None else now
+        due: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for user_id, started in list(self._digest_started.items()):
+                if force or now - started >= self.digest_interval_seconds:
+                    due[user_id] = self._digests.pop(user_id, [])
+                    del self._digest_started[user_id]
+        return due
+
+    def _prune(self, now: float) -> None:
+        if now - self._last_prune < self.window_seconds:
+            return
+        expired = [k for k, v in self._open.items() if now - v.first_seen >= self.window_seconds]
+        for key in expired:
+            del self._open[key]
+        self._last_prune = now
+
+
+# Lazy singleton instance
+_coalescer: Optional[AlertCoalescer] = None
+_coalescer_lock = threading.Lock()
+
+
+def get_alert_coalescer() -> AlertCoalescer:
+    """Get or create the coalescer singleton from Config"""
+    global _coalescer
+    if _coalescer is None:
+        with _coalescer_lock:
+            if _coalescer is None:
+                from app.core.config import Config
+                _coalescer = AlertCoalescer(
+                    window_seconds=Config.ALERT_COALESCE_WINDOW_MINUTES * 60,
+                    critical_per_day=Config.MAX_CRITICAL_ALERTS_PER_DAY,
+                    other_per_day=Config.MAX_ALERTS_PER_DAY,
+                    digest_interval_seconds=Config.ALERT_DIGEST_INTERVAL_MINUTES * 60,
+                )
+    return _coalescer
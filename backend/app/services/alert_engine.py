@@ -0,0 +1,376 @@
+"""Declarative alert rule engine for sensor readings
+
+Rules are loaded from data (see ``alert_rules.json``) instead of being
+hardcoded. The engine keeps per-field, per-rule state so that only state
+transitions (``firing`` / ``resolved``) are emitted, which means a sensor
+hovering around a threshold produces one alert instead of one per reading.
+
+Supported rule types:
+    threshold       value crosses ``threshold``; clears at ``clear`` (hysteresis)
+    rate_of_change  change per minute crosses ``threshold`` in ``direction``
+    duration        threshold breach that must hold for ``for_seconds``
+
+Every rule accepts ``debounce_seconds``: a breach must persist that long
+before the alert fires.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from app.utils.helpers import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+RULE_TYPES = ('threshold', 'rate_of_change', 'duration')
+RATE_DIRECTIONS = ('rise', 'fall', 'any')
+
+# Loads {rule_id: alert_id} of alerts still open for a field (e.g. after restart)
+StateLoader = Callable[[str], Dict[str, str]]
+
+
+class _RuleState:
+    """Mutable evaluation state of one rule for one field"""
+
+    __slots__ = ('raw', 'raw_since', 'active', 'alert_id', 'last_value', 'last_ts')
+
+    def __init__(self) -> None:
+        self.raw = False            # breach state after hysteresis, before debounce
+        self.raw_since = 0.0        # epoch seconds when ``raw`` last changed
+        self.active = False         # confirmed (alert firing)
+        self.alert_id: Optional[str] = None
+        self.last_value = math.nan  # last valid sample, used by rate rules
+        self.last_ts = math.nan
+
+
+class AlertRule:
+    """A single declarative alert rule"""
+
+    def __init__(
+        self,
+        rule_id: str,
+        rule_type: str,
+        parameter: str,
+        threshold: float,
+        operator: str = '>',
+        clear: Optional[float] = None,
+        direction: str = 'any',
+        debounce_seconds: float = 0.0,
+        severity: str = 'critical',
+        label: Optional[str] = None,
+        message: Optional[str] = None,
+    ) -> None:
+        if rule_type not in RULE_TYPES:
+            raise ValueError(f'Unknown rule type {rule_type!r} for rule {rule_id}')
+        if rule_type == 'rate_of_change':
+            if direction not in RATE_DIRECTIONS:
+                raise ValueError(f'Invalid direction {direction!r} for rule {rule_id}')
+            operator = '>'
+        if operator not in ('<', '>'):
+            raise ValueError(f'Invalid operator {operator!r} for rule {rule_id}')
+        if rule_type == 'duration' and debounce_seconds <= 0:
+            raise ValueError(f'Duration rule {rule_id} requires for_seconds > 0')
+
+        clear = threshold if clear is None else clear
+        if (operator == '>' and clear > threshold) or (operator == '<' and clear < threshold):
+            raise ValueError(f'Clear level of rule {rule_id} must lie on the safe side of the threshold')
+
+        self.rule_id = rule_id
+        self.rule_type = rule_type
+        self.parameter = parameter
+        self.threshold = float(threshold)
+        self.operator = operator
+        self.clear = float(clear)
+        self.direction = direction
+        self.debounce_seconds = float(debounce_seconds)
+        self.severity = severity
+        self.label = label or parameter
+        self.message = message or f'{self.label} alert ({rule_id}): {{value:.2f}}'
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> 'AlertRule':
+        """Create rule from its JSON definition"""
+        rule_type = data.get('type', 'threshold')
+        debounce = data.get('for_seconds') if rule_type == 'duration' else data.get('debounce_seconds')
+        return AlertRule(
+            rule_id=data['id'],
+            rule_type=rule_type,
+            parameter=data['parameter'],
+            threshold=data['threshold'],
+            operator=data.get('operator', '>'),
+            clear=data.get('clear'),
+            direction=data.get('direction', 'any'),
+            debounce_seconds=float(debounce or 0),
+            severity=data.get('severity', 'critical'),
+            label=data.get('label'),
+            message=data.get('message'),
+        )
+
+    def _signal(self, ts: np.ndarray, values: np.ndarray, state: _RuleState) -> np.ndarray:
+        """Series the rule compares against its threshold"""
+        if self.rule_type != 'rate_of_change':
+            return values
+
+        # Rate against the previous valid sample (possibly from an earlier batch)
+        n = values.size
+        valid = ~np.isnan(values)
+        pos = np.where(valid, np.arange(n), -1)
+        np.maximum.accumulate(pos, out=pos)
+        prev_pos = np.concatenate(([-1], pos[:-1]))
+        prev_values = np.where(prev_pos >= 0, values[prev_pos], state.last_value)
+        prev_ts = np.where(prev_pos >= 0, ts[prev_pos], state.last_ts)
+
+        minutes = (ts - prev_ts) / 60.0
+        rate = np.full(n, np.nan)
+        np.divide(values - prev_values, minutes, out=rate, where=minutes > 0)
+
+        # A late batch of older readings must not move the reference back in time
+        if pos[-1] >= 0 and not ts[pos[-1]] < state.last_ts:
+            state.last_value = float(values[pos[-1]])
+            state.last_ts = float(ts[pos[-1]])
+
+        if self.direction == 'fall':
+            return -rate
+        if self.direction == 'any':
+            return np.abs(rate)
+        return rate
+
+    def evaluate(
+        self,
+        field_id: str,
+        ts: np.ndarray,
+        values: np.ndarray,
+        readings: Sequence[Dict[str, Any]],
+        state: _RuleState,
+    ) -> List[Dict[str, Any]]:
+        """
+        Evaluate the rule over a time-ordered batch in one vectorised pass
+
+        Args:
+            field_id: Field the readings belong to
+            ts: Epoch seconds, ascending
+            values: Channel values (NaN where missing)
+            readings: Original readings, aligned with ``ts``
+            state: Rule state carried over from previous batches
+
+        Returns:
+            List of transitions (usually empty)
+        """
+        signal = self._signal(ts, values, state)
+        n = signal.size
+
+        with np.errstate(invalid='ignore'):
+            if self.operator == '>':
+                enter = signal > self.threshold
+                leave = signal <= self.clear
+            else:
+                enter = signal < self.threshold
+                leave = signal >= self.clear
+
+        # Hysteresis: between the clear level and the threshold the previous
+        # state holds, so forward-fill the last explicit enter/leave event.
+        events = np.full(n, -1, dtype=np.int8)
+        events[leave] = 0
+        events[enter] = 1
+        pos = np.where(events >= 0, np.arange(n), -1)
+        np.maximum.accumulate(pos, out=pos)
+        raw = np.where(pos >= 0, events[pos], int(state.raw)).astype(bool)
+
+        # Walk runs of constant raw state; there are only a handful per batch.
+        previous = np.concatenate(([state.raw], raw[:-1]))
+        changes = np.flatnonzero(raw != previous)
+        bounds = np.concatenate(([0], changes[changes > 0], [n]))
+
+        transitions: List[Dict[str, Any]] = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            start, end = int(start), int(end)
+            if start > 0 or (changes.size and changes[0] == 0):
+                state.raw = bool(raw[start])
+                state.raw_since = float(ts[start])
+
+            if state.raw and not state.active:
+                fire_at = state.raw_since + self.debounce_seconds
+                idx = start + int(np.searchsorted(ts[start:end], fire_at, side='left'))
+                if idx < end:
+                    state.active = True
+                    transitions.append(self._transition(field_id, 'firing', signal[idx], readings[idx], state))
+            elif not state.raw and state.active:
+                state.active = False
+                transitions.append(self._transition(field_id, 'resolved', signal[start], readings[start], state))
+                state.alert_id = None
+
+        return transitions
+
+    def _transition(
+        self,
+        field_id: str,
+        new_state: str,
+        value: float,
+        reading: Dict[str, Any],
+        state: _RuleState,
+    ) -> Dict[str, Any]:
+        value = float(value)
+        try:
+            message = self.message.format(value=value)
+        except (KeyError, ValueError, IndexError):
+            message = f'{self.label}: {value:.2f}'
+        return {
+            'field_id': field_id,
+            'rule_id': self.rule_id,
+            'rule_type': self.rule_type,
+            'state': new_state,
+            'parameter': self.label,
+            'channel': self.parameter,
+            'severity': self.severity,
+            'value': value,
+            'message': message,
+            'timestamp': reading.get('timestamp'),
+            'alert_id': state.alert_id,
+        }
+
+
+class AlertRuleEngine:
+    """Evaluates declarative rules incrementally, per field"""
+
+    def __init__(self, rules: Iterable[AlertRule], state_loader: Optional[StateLoader] = None) -> None:
+        self._rules = list(rules)
+        self._channels = sorted({rule.parameter for rule in self._rules})
+        self._state_loader = state_loader
+        self._states: Dict[str, Dict[str, _RuleState]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: Any, state_loader: Optional[StateLoader] = None) -> 'AlertRuleEngine':
+        """Load rules from a JSON file with a top-level ``rules`` list"""
+        with open(path, 'r', encoding='utf-8') as f:
+            definitions = json.load(f).get('rules', [])
+        rules = [AlertRule.from_dict(d) for d in definitions]
+        logger.info(f'Loaded {len(rules)} alert rules from {path}')
+        return cls(rules, state_loader)
+
+    @property
+    def rules(self) -> List[AlertRule]:
+        return list(self._rules)
+
+    def evaluate(self, field_id: str, readings: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Evaluate all rules over a batch of readings for one field
+
+        Args:
+            field_id: Field ID
+            readings: Sensor readings with a ``timestamp`` (any order)
+
+        Returns:
+            State transitions ordered by time
+        """
+        if not readings or not self._rules:
+            return []
+
+        ts = np.array([to_epoch_seconds(r.get('timestamp')) for r in readings], dtype=np.float64)
+        order = np.argsort(ts, kind='stable')
+        ts = ts[order]
+        ordered = [readings[i] for i in order]
+        # Values flagged by the data-quality stage must not trigger alerts
+        columns = {
+            channel: np.array([
+                math.nan if channel in (r.get('quality_flags') or ()) else _as_float(r.get(channel))
+                for r in ordered
+            ], dtype=np.float64)
+            for channel in self._channels
+        }
+
+        transitions: List[Dict[str, Any]] = []
+        with self._lock:
+            states = self._field_states(field_id)
+            for rule in self._rules:
+                transitions.extend(
+                    rule.evaluate(field_id, ts, columns[rule.parameter], ordered, states[rule.rule_id]))
+
+        transitions.sort(key=lambda t: to_epoch_seconds(t.get('timestamp')))
+        return transitions
+
+    def is_alert_relevant(self, field_id: str, reading: Dict[str, Any]) -> bool:
+        """
+        Cheap check used to prioritise readings during ingestion
+
+        True when a threshold/duration rule's channel is outside its clear
+        level, or when any rule is currently firing for the field (so the
+        reading that resolves it is not delayed).
+        """
+        states = self._states.get(field_id)
+        if states and any(state.active for state in states.values()):
+            return True
+        for rule in self._rules:
+            if rule.rule_type == 'rate_of_change':
+                continue
+            value = _as_float(reading.get(rule.parameter))
+            if math.isnan(value):
+                continue
+            if (rule.operator == '>' and value > rule.clear) or (rule.operator == '<' and value < rule.clear):
+                return True
+        return False
+
+    def bind_alert(self, field_id: str, rule_id: str, alert_id: str) -> None:
+        """Remember the stored alert of a firing rule so it can be resolved later"""
+        with self._lock:
+            state = self._states.get(field_id, {}).get(rule_id)
+            if state is not None and state.active:
+                state.alert_id = alert_id
+
+    def reset(self, field_id: Optional[str] = None) -> None:
+        """Drop state for one field or for all fields"""
+        with self._lock:
+            if field_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(field_id, None)
+
+    def _field_states(self, field_id: str) -> Dict[str, _RuleState]:
+        states = self._states.get(field_id)
+        if states is not None:
+            return states
+
+        states = {rule.rule_id: _RuleState() for rule in self._rules}
+        if self._state_loader is not None:
+            try:
+                for rule_id, alert_id in self._state_loader(field_id).items():
+                    state = states.get(rule_id)
+                    if state is not None:
+                        state.raw = state.active = True
+                        state.raw_since = -math.inf
+                        state.alert_id = alert_id
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error(f'Failed to load open alerts for field {field_id}: {str(e)}')
+        self._states[field_id] = states
+        return states
+
+
+def _as_float(value: Any) -> float:
+    if value is None or isinstance(value, bool):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+# Lazy singleton instance
+_alert_engine: Optional[AlertRuleEngine] = None
+_alert_engine_lock = threading.Lock()
+
+
+def get_alert_engine(state_loader: Optional[StateLoader] = None) -> AlertRuleEngine:
+    """Get or create the alert engine singleton from ``Config.ALERT_RULES_PATH``"""
+    global _alert_engine
+    if _alert_engine is None:
+        with _alert_engine_lock:
+            if _alert_engine is None:
+                from app.core.config import Config
+                _alert_engine = AlertRuleEngine.from_file(Path(Config.ALERT_RULES_PATH), state_loader)
+    return _alert_engine
@@ -0,0 +1,200 @@
+"""Streaming data-quality checks for ingested sensor readings
+
+Each (field, channel) series keeps O(1) state: an EWMA mean and variance,
+an EWMA of absolute deviations (a streaming stand-in for the MAD) and a
+run counter for repeated values. Per reading and channel it flags:
+
+    out_of_range  value outside the physically plausible range
+    spike         robust z-score (against both the EWMA std and the scaled
+                  absolute deviation) above ``z_threshold``
+    stuck         identical value for ``stuck_samples`` readings in a row
+
+Flags are written to the reading as ``quality_flags`` ({channel: flag}) and
+``quality`` ('ok' / 'suspect'). Spikes are winsorised before updating the
+statistics, so one bad sample does not widen the band. Entering or leaving
+the ``stuck`` / ``out_of_range`` state is reported as a device-health
+transition.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import Config
+from app.services.sensor_rollups import CHANNELS
+
+logger = logging.getLogger(__name__)
+
+# Physically plausible ranges; anything outside is a probe or wiring fault
+PLAUSIBLE_RANGES: Dict[str, Tuple[float, float]] = {
+    'ph': (2.0, 11.0),
+    'nitrogen': (0.0, 2000.0),
+    'phosphorus': (0.0, 2000.0),
+    'potassium': (0.0, 2000.0),
+    'moisture': (0.0, 100.0),
+    'temperature': (-10.0, 70.0),
+    'humidity': (0.0, 100.0),
+}
+
+# Mean absolute deviation of a normal distribution is sigma * sqrt(2 / pi)
+_MAD_TO_SIGMA = math.sqrt(math.pi / 2.0)
+
+FAULTS = ('stuck', 'out_of_range')
+
+
+class _SeriesState:
+    """EWMA statistics of one field channel"""
+
+    __slots__ = ('n', 'mean', 'var', 'mad', 'last', 'run', 'fault', 'alert_id')
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.mad = 0.0
+        self.last = math.nan
+        self.run = 0                # consecutive identical values
+        self.fault: Optional[str] = None
+        self.alert_id: Optional[str] = None
+
+
+class AnomalyDetector:
+    """Per-field, per-channel online anomaly detector"""
+
+    def __init__(
+        self,
+        alpha: float = 0.05,
+        z_threshold: float = 6.0,
+        warmup: int = 20,
+        stuck_samples: int = 60,
+        ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> None:
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.stuck_samples = stuck_samples
+        self.ranges = PLAUSIBLE_RANGES if ranges is None else ranges
+        self._states: Dict[str, List[_SeriesState]] = {}
+        self._lock = threading.Lock()
+
+    def _check(self, state: _SeriesState, x: float, low: float, high: float) -> Optional[str]:
+        """Update one series with ``x`` and return its flag (or None)"""
+        if x < low or x > high:
+            return 'out_of_range'
+
+        state.run = state.run + 1 if x == state.last else 1
+        state.last = x
+
+        n = state.n
+        if n == 0:
+            state.n = 1
+            state.mean = x
+            return None
+
+        alpha = self.alpha if n >= self.warmup else 1.0 / (n + 1)
+        mean = state.mean
+        delta = x - mean
+        flag = None
+        if n >= self.warmup:
+            sigma = math.sqrt(state.var)
+            scale = max(sigma, state.mad * _MAD_TO_SIGMA)
+            limit = self.z_threshold * scale
+            if scale > 0.0 and abs(delta) > limit:
+                flag = 'spike'
+                # Winsorise so a single outlier does not widen the band
+                delta = limit if delta > 0 else -limit
+
+        state.n = n + 1
+        state.mean = mean + alpha * delta
+        state.var = (1.0 - alpha) * (state.var + alpha * delta * delta)
+        state.mad += alpha * (abs(delta) - state.mad)
+
+        if state.run >= self.stuck_samples:
+            return 'stuck'
+        return flag
+
+    def inspect(self, field_id: str, readings: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Tag readings (in arrival order) with quality flags
+
+        Args:
+            field_id: Field ID
+            readings: ``sensor_readings`` documents, modified in place
+
+        Returns:
+            Device-health transitions: dicts with field_id, channel, fault,
+            state ('firing' / 'resolved'), value, device_id and alert_id
+        """
+        transitions: List[Dict[str, Any]] = []
+        ranges = self.ranges
+        with self._lock:
+            states = self._states.get(field_id)
+            if states is None:
+                states = self._states[field_id] = [_SeriesState() for _ in CHANNELS]
+
+            for reading in readings:
+                flags: Dict[str, str] = {}
+                for channel, state in zip(CHANNELS, states):
+                    value = reading.get(channel)
+                    if value is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+                        continue
+                    low, high = ranges.get(channel, (-math.inf, math.inf))
+                    flag = self._check(state, float(value), low, high)
+                    if flag is not None:
+                        flags[channel] = flag
+
+                    fault = flag if flag in FAULTS else None
+                    if fault != state.fault:
+                        transitions.append({
+                            'field_id': field_id,
+                            'channel': channel,
+                            'fault': fault or state.fault,
+                            'state': 'firing' if fault else 'resolved',
+                            'value': float(value),
+                            'device_id': reading.get('device_id'),
+                            'alert_id': state.alert_id,
+                        })
+                        if not fault:
+                            state.alert_id = None
+                        state.fault = fault
+
+                reading['quality_flags'] = flags
+                reading['quality'] = 'suspect' if flags else 'ok'
+        return transitions
+
+    def bind_alert(self, field_id: str, channel: str, alert_id: str) -> None:
+        """Remember the device-health alert raised for a series"""
+        with self._lock:
+            states = self._states.get(field_id)
+            if states is not None and channel in CHANNELS:
+                states[CHANNELS.index(channel)].alert_id = alert_id
+
+    def reset(self, field_id: Optional[str] = None) -> None:
+        """Forget state of one field, or of all fields"""
+        with self._lock:
+            if field_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(field_id, None)
+
+
+# Lazy singleton instance
+_anomaly_detector: Optional[AnomalyDetector] = None
+_anomaly_detector_lock = threading.Lock()
+
+
+def get_anomaly_detector() -> AnomalyDetector:
+    """Get or create the detector singleton configured from ``Config``"""
+    global _anomaly_detector
+    if _anomaly_detector is None:
+        with _anomaly_detector_lock:
+            if _anomaly_detector is None:
+                _anomaly_detector = AnomalyDetector(
+                    alpha=Config.ANOMALY_EWMA_ALPHA,
+                    z_threshold=Config.ANOMALY_Z_THRESHOLD,
+                    warmup=Config.ANOMALY_WARMUP_SAMPLES,
+                    stuck_samples=Config.ANOMALY_STUCK_SAMPLES,
+                )
+    return _anomaly_detector
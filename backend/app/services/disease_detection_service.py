@@ -3,13 +3,17 @@ Disease detection service - TFLite inference
 """
 import logging
 import numpy as np
-from PIL import Image
-from io import BytesIO
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 
-from app.ml_models.model_loader import predict_disease, get_class_names
+from app.core.config import Config
+from app.ml.preprocessing import ImagePreprocessor, preprocess_reference
+from app.ml_models.model_loader import (
+    TFLiteModelLoader, get_disease_model, get_model_registry, use_disease_model)
+from app.ml_models.prediction_cache import get_prediction_cache
 from app.utils.disease_metadata import get_disease_by_class, DISEASE_CLASSES
 
 logger = logging.getLogger(__name__)
@@ -17,27 +21,25 @@ logger = logging.getLogger(__name__)
 # Image preprocessing constants
 IMG_SIZE = 224
 
-def preprocess_image(image_bytes: bytes) -> np.ndarray:
+# Least to most severe (the 'None' severity of healthy leaves is not ranked)
+SEVERITY_ORDER = ('Low', 'Medium', 'High', 'Critical')
+
+def get_preprocessor(model: Optional[TFLiteModelLoader] = None) -> ImagePreprocessor:
+    """Fast preprocessor matching the model's input tensor (dtype, quantization); default: active model"""
+    return (model or get_disease_model()).preprocessor
+
+def preprocess_image(image_bytes: bytes, model: Optional[TFLiteModelLoader] = None) -> np.ndarray:
     """
     Preprocess image for TFLite model inference
-    Input: Raw image bytes
-    Output: Preprocessed numpy array (1, 224, 224, 3) with values [0, 1]
+    Input: Raw image bytes (and the model it is for; default: active model)
+    Output: Preprocessed numpy array (1, 224, 224, 3) in the model's input dtype
+            (values [0, 1] for float models)
     """
     try:
-        # Load image
-        img = Image.open(BytesIO(image_bytes)).convert('RGB')
-
-        # Resize to model input size (224x224)
-        img = img.resize((IMG_SIZE, IMG_SIZE))
-
-        # Convert to numpy array
-        img_array = np.array(img, dtype=np.float32)
-
-        # Normalize to [0, 1]
-        img_array = img_array / 255.0
-
-        # Add batch dimension: (224, 224, 3) -> (1, 224, 224, 3)
-        img_array = np.expand_dims(img_array, axis=0)
+        if Config.FAST_PREPROCESSING:
+            img_array = get_preprocessor(model).preprocess(image_bytes)
+        else:
+            img_array = preprocess_reference(image_bytes, IMG_SIZE)
 
         logger.info(f"✅ Image preprocessed: shape={img_array.shape}, dtype={img_array.dtype}")
         return img_array
@@ -46,6 +48,71 @@ def preprocess_image(image_bytes: bytes) -> np.ndarray:
         logger.error(f"❌ Image preprocessing failed: {e}")
         raise ValueError(f"Invalid image: {str(e)}")
 
+def build_detection_result(probabilities: np.ndarray,
+                           user_id: Optional[str] = None,
+                           field_id: Optional[str] = None,
+                           batch_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Detection result for one image from the model's class probabilities
+
+    Raises:
+        ValueError: If the predicted class has no disease metadata
+    """
+    # Step 3: Get prediction results
+    class_id = int(np.argmax(probabilities))
+    confidence = float(np.max(probabilities))
+
+    logger.info(f"✅ Prediction complete: class={class_id}, confidence={confidence:.4f}")
+
+    # Step 4: Get disease metadata
+    disease_info = get_disease_by_class(class_id)
+
+    if not disease_info:
+        raise ValueError(f"Unknown disease class: {class_id}")
+
+    # Step 5: Calculate severity based on confidence
+    if confidence > 0.95:
+        severity_level = 'Critical'
+    elif confidence > 0.85:
+        severity_level = disease_info.get('severity', 'High')
+    elif confidence > 0.70:
+        severity_level = 'Medium'
+    else:
+        severity_level = 'Low'
+
+    # Step 6: Calculate affected area percentage
+    # Higher confidence = higher affected area
+    affected_area = min(confidence * 100, 95.0)
+
+    # Step 7: Generate detection ID
+    detection_id = str(uuid.uuid4())
+
+    # Step 8: Construct result
+    return {
+        'detection_id': detection_id,
+        'disease_name': disease_info.get('name', 'Unknown'),
+        'disease_class': class_id,
+        'scientific_name': disease_info.get('scientific_name', ''),
+        'description': disease_info.get('description', ''),
+        'confidence': round(confidence, 4),
+        'severity': severity_level,
+        'affected_area_percentage': round(affected_area, 2),
+        'symptoms': disease_info.get('symptoms', []),
+        'causes': disease_info.get('causes', []),
+        'treatments': disease_info.get('treatments', []),
+        'recommendations': disease_info.get('recommendations', []),
+        'user_id': user_id,
+        'field_id': field_id,
+        'batch_id': batch_id,
+        'timestamp': datetime.utcnow().isoformat(),
+        'model_info': {
+            'type': 'TFLite',
+            'input_size': IMG_SIZE,
+            'num_classes': 6
+        },
+        'status': 'success'
+    }
+
 def detect_disease(image_bytes: bytes,
                   user_id: Optional[str] = None,
                   field_id: Optional[str] = None,
@@ -74,70 +141,32 @@ def detect_disease(image_bytes: bytes,
         }
     """
     try:
-        # Step 1: Preprocess image
-        logger.info("🔄 Step 1: Preprocessing image...")
-        preprocessed_img = preprocess_image(image_bytes)
+        # The whole request uses one model version, even if a new one is activated meanwhile
+        with use_disease_model() as model:
+            # Re-uploaded image: reuse the model output, still build a fresh detection record
+            lookup = None
+            if Config.PREDICTION_CACHE_ENABLED:
+                lookup = get_prediction_cache().lookup(model.model_version, image_bytes)
+                if lookup.hit:
+                    logger.info(f"♻️ Prediction cache hit ({lookup.tier}), skipping inference")
+                    result = build_detection_result(lookup.probabilities, user_id, field_id, batch_id)
+                    result['prediction_cache'] = lookup.tier
+                    return result
 
-        # Step 2: Run TFLite inference
-        logger.info("🔄 Step 2: Running TFLite model inference...")
-        predictions = predict_disease(preprocessed_img)
+            # Step 1: Preprocess image
+            logger.info("🔄 Step 1: Preprocessing image...")
+            preprocessed_img = preprocess_image(image_bytes, model)
 
-        # Step 3: Get prediction results
-        class_id = int(np.argmax(predictions[0]))
-        confidence = float(np.max(predictions[0]))
-
-        logger.info(f"✅ Prediction complete: class={class_id}, confidence={confidence:.4f}")
-
-        # Step 4: Get disease metadata
-        disease_info = get_disease_by_class(class_id)
-
-        if not disease_info:
-            raise ValueError(f"Unknown disease class: {class_id}")
-
-        # Step 5: Calculate severity based on confidence
-        if confidence > 0.95:
-            severity_level = 'Critical'
-        elif confidence > 0.85:
-            severity_level = disease_info.get('severity', 'High')
-        elif confidence > 0.70:
-            severity_level = 'Medium'
-        else:
-            severity_level = 'Low'
-
-        # Step 6: Calculate affected area percentage
-        # Higher confidence = higher affected area
-        affected_area = min(confidence * 100, 95.0)
-
-        # Step 7: Generate detection ID
-        detection_id = str(uuid.uuid4())
-
-        # Step 8: Construct result
-        result = {
-            'detection_id': detection_id,
-            'disease_name': disease_info.get('name', 'Unknown'),
-            'disease_class': class_id,
-            'scientific_name': disease_info.get('scientific_name', ''),
-            'description': disease_info.get('description', ''),
-            'confidence': round(confidence, 4),
-            'severity': severity_level,
-            'affected_area_percentage': round(affected_area, 2),
-            'symptoms': disease_info.get('symptoms', []),
-            'causes': disease_info.get('causes', []),
-            'treatments': disease_info.get('treatments', []),
-            'recommendations': disease_info.get('recommendations', []),
-            'user_id': user_id,
-            'field_id': field_id,
-            'batch_id': batch_id,
-            'timestamp': datetime.utcnow().isoformat(),
-            'model_info': {
-                'type': 'TFLite',
-                'input_size': IMG_SIZE,
-                'num_classes': 6
-            },
-            'status': 'success'
-        }
+            # Step 2: Run TFLite inference
+            logger.info("🔄 Step 2: Running TFLite model inference...")
+            predictions = model.infer(preprocessed_img)
+            if lookup is not None:
+                get_prediction_cache().store(lookup, predictions[0])
+            get_model_registry().shadow(model, preprocessed_img, image_bytes, predictions[0])
 
-        logger.info(f"✅ Disease detected: {disease_info.get('name')} ({confidence:.2%} confidence)")
+        # Steps 3-8: Interpret the prediction
+        result = build_detection_result(predictions[0], user_id, field_id, batch_id)
+        logger.info(f"✅ Disease detected: {result['disease_name']} ({result['confidence']:.2%} confidence)")
         return result
 
     except ValueError as ve:
@@ -155,6 +184,119 @@ def detect_disease(image_bytes: bytes,
             'error_type': 'detection_error'
         }
 
+_preprocess_executor: Optional[ThreadPoolExecutor] = None
+_preprocess_lock = threading.Lock()
+
+def _get_preprocess_executor() -> ThreadPoolExecutor:
+    """Shared worker pool for decoding/preprocessing batch uploads (PIL releases the GIL)"""
+    global _preprocess_executor
+    if _preprocess_executor is None:
+        with _preprocess_lock:
+            if _preprocess_executor is None:
+                _preprocess_executor = ThreadPoolExecutor(
+                    max_workers=Config.DETECT_BATCH_WORKERS, thread_name_prefix='preprocess')
+    return _preprocess_executor
+
+def _try_preprocess(image_bytes: bytes, out: Optional[np.ndarray] = None,
+                    model: Optional[TFLiteModelLoader] = None) -> Any:
+    try:
+        if out is None:
+            return preprocess_image(image_bytes, model)
+        # Fast path: decode straight into the slot of the preallocated batch tensor
+        get_preprocessor(model).preprocess_into(image_bytes, out[0])
+        return out
+    except Exception as e:
+        return e if isinstance(e, ValueError) else ValueError(f"Invalid image: {str(e)}")
+
+def image_error(filename: str, message: str, error_type: str = 'validation_error') -> Dict[str, Any]:
+    """Per-image error entry of a batch detection"""
+    return {'filename': filename, 'status': 'error', 'message': message, 'error_type': error_type}
+
+def detect_disease_batch(images: Sequence[Tuple[str, bytes]],
+                         user_id: Optional[str] = None,
+                         field_id: Optional[str] = None,
+                         batch_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Detect diseases in many images of one scouting visit
+
+    Images are decoded and preprocessed in parallel on a worker pool, then
+    inferred in batches. A failing image yields an error entry and does not
+    affect the others.
+
+    Args:
+        images: (filename, raw bytes) pairs
+
+    Returns:
+        One result per image, in order (``detect_disease`` fields plus
+        ``filename``, or an error entry)
+    """
+    with use_disease_model() as model:
+        slots: List[Optional[np.ndarray]] = [None] * len(images)
+        if Config.FAST_PREPROCESSING and images:
+            batch = get_preprocessor(model).allocate(len(images))
+            slots = [batch[i:i + 1] for i in range(len(images))]
+        preprocessed = list(_get_preprocess_executor().map(
+            _try_preprocess, [data for _, data in images], slots, [model] * len(images)))
+        valid = [i for i, array in enumerate(preprocessed) if isinstance(array, np.ndarray)]
+
+        results: List[Dict[str, Any]] = [
+            image_error(name, str(preprocessed[i])) for i, (name, _) in enumerate(images)]
+        try:
+            predictions = model.infer_many([preprocessed[i] for i in valid])
+        except Exception as e:
+            logger.error(f"❌ Batch inference of {len(valid)} image(s) failed: {e}", exc_info=True)
+            for i in valid:
+                results[i] = image_error(images[i][0], f"Detection failed: {str(e)}", 'detection_error')
+            return results
+        for i, probabilities in zip(valid, predictions):
+            get_model_registry().shadow(model, preprocessed[i], images[i][1], probabilities[0])
+
+    for i, probabilities in zip(valid, predictions):
+        try:
+            results[i] = {'filename': images[i][0],
+                          **build_detection_result(probabilities[0], user_id, field_id, batch_id)}
+        except ValueError as ve:
+            results[i] = image_error(images[i][0], str(ve))
+    logger.info(f"✅ Batch detection: {len(valid)}/{len(images)} image(s) analysed")
+    return results
+
+def summarize_detections(results: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Field-level aggregate of batch detections
+
+    Returns:
+        Image counts, disease prevalence (share of analysed images with a
+        disease), per-disease counts/prevalence/mean confidence, the most
+        common disease and the maximum severity among diseased images
+    """
+    analysed = [r for r in results if r.get('status') == 'success']
+    diseased = [r for r in analysed
+                if (get_disease_by_class(r['disease_class']) or {}).get('severity') != 'None']
+
+    by_disease: Dict[str, Dict[str, Any]] = {}
+    for result in analysed:
+        entry = by_disease.setdefault(result['disease_name'], {'count': 0, 'confidence_sum': 0.0})
+        entry['count'] += 1
+        entry['confidence_sum'] += result['confidence']
+    for entry in by_disease.values():
+        entry['prevalence'] = round(entry['count'] / len(analysed), 4)
+        entry['mean_confidence'] = round(entry.pop('confidence_sum') / entry['count'], 4)
+
+    severities = [r['severity'] for r in diseased if r['severity'] in SEVERITY_ORDER]
+    disease_names = {r['disease_name'] for r in diseased}
+    return {
+        'total_images': len(results),
+        'analysed': len(analysed),
+        'failed': len(results) - len(analysed),
+        'healthy': len(analysed) - len(diseased),
+        'diseased': len(diseased),
+        'disease_prevalence': round(len(diseased) / len(analysed), 4) if analysed else 0.0,
+        'by_disease': by_disease,
+        'dominant_disease': max(disease_names, key=lambda name: by_disease[name]['count'])
+        if disease_names else None,
+        'max_severity': max(severities, key=SEVERITY_ORDER.index) if severities else None,
+    }
+
 def get_disease_details(disease_name: str) -> Dict[str, Any]:
     """Get detailed info about a disease by name"""
     for disease_info in DISEASE_CLASSES.values():
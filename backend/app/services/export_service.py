@@ -0,0 +1,326 @@
+"""Streaming bulk export of field / batch data
+
+Exports ``sensor_readings``, ``disease_detections`` and ``treatments`` as
+chunked CSV, Arrow IPC stream or Parquet. Sensor readings moved to the cold
+archive are decoded and exported ahead of the live documents. Documents are read with a
+cursor-based iterator (``FirestoreDB.stream_collection``) and encoded one
+chunk at a time, so memory stays bounded by ``chunk_size`` regardless of the
+size of the export. Arrow and Parquet need ``pyarrow`` (imported lazily).
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.database import db
+from app.services.reading_store import stream_all_readings, stream_readings
+from app.services.sensor_archive import iter_all_archived, iter_archived
+from app.services.sensor_rollups import CHANNELS
+from app.utils.helpers import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'arrow', 'parquet')
+
+MIME_TYPES = {
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Per collection: time column used for date ranges, default columns, further columns
+# that may be requested, column types
+EXPORT_COLLECTIONS: Dict[str, Dict[str, Any]] = {
+    'sensor_readings': {
+        'time_field': 'timestamp',
+        'columns': ('id', 'field_id', 'device_id', 'timestamp', *CHANNELS, 'quality'),
+        'optional_columns': ('timestamp_ms', 'ec', 'quality_flags'),
+        'types': {'timestamp': 'timestamp', 'timestamp_ms': 'float', 'ec': 'float',
+                  **{channel: 'float' for channel in CHANNELS}},
+    },
+    'disease_detections': {
+        'time_field': 'timestamp',
+        'columns': ('id', 'field_id', 'batch_id', 'timestamp', 'disease_name', 'confidence',
+                    'severity', 'affected_area_percent', 'model_type', 'image_url'),
+        'types': {'timestamp': 'timestamp', 'confidence': 'float', 'affected_area_percent': 'float'},
+    },
+    'treatments': {
+        'time_field': 'application_date',
+        'columns': ('id', 'batch_id', 'detection_id', 'application_date', 'treatment_name',
+                    'treatment_type', 'dosage', 'application_method', 'effectiveness_rating', 'cost'),
+        'types': {'application_date': 'timestamp', 'effectiveness_rating': 'float', 'cost': 'float'},
+    },
+}
+
+
+class ExportError(ValueError):
+    """Invalid export request"""
+
+
+def export_scope(
+    collection: str,
+    field_id: Optional[str] = None,
+    batch_id: Optional[str] = None,
+) -> Tuple[List[Tuple[str, str, Any]], Optional[Tuple[datetime, datetime]]]:
+    """
+    Equality filters (and the batch's season window) for an export
+
+    Sensor readings belong to fields, so a batch export of readings uses the
+    batch's field and its planting-to-harvest window. Treatments only carry
+    ``batch_id``.
+    """
+    if collection not in EXPORT_COLLECTIONS:
+        raise ExportError(f'Unknown collection: {collection}')
+    if not field_id and not batch_id:
+        raise ExportError('field_id or batch_id is required')
+
+    if batch_id:
+        if collection != 'sensor_readings':
+            return [('batch_id', '==', batch_id)], None
+        batch_field, start, end = batch_season(batch_id)
+        return [('field_id', '==', batch_field)], (start, end)
+
+    if collection == 'treatments':
+        raise ExportError('Treatments are exported per batch; pass batch_id')
+    return [('field_id', '==', field_id)], None
+
+
+def batch_season(batch_id: str) -> Tuple[str, datetime, datetime]:
+    """Field and planting-to-harvest window (open seasons end now) of a batch"""
+    batch = db.get_document('crop_batches', batch_id)
+    if not batch or not batch.get('field_id'):
+        raise ExportError(f'Batch not found: {batch_id}')
+    start = _as_datetime(batch.get('planting_date')) or datetime.min.replace(tzinfo=timezone.utc)
+    harvest = _as_datetime(batch.get('actual_harvest_date'))
+    end = harvest + timedelta(days=1) if harvest else datetime.now(timezone.utc)
+    return batch['field_id'], start, end
+
+
+def iter_records(
+    collection: str,
+    filters: Sequence[Tuple[str, str, Any]],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    page_size: int = 1000,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Documents matching ``filters`` with ``start <= time < end``
+
+    Sensor readings are range-filtered and ordered on ``timestamp_ms`` in the
+    query (index: field_id + timestamp_ms), oldest first. The other
+    collections store their time column as strings of mixed precision, so
+    their range is checked in Python.
+    """
+    if collection == 'sensor_readings':
+        yield from _iter_readings(filters, start, end, page_size)
+        return
+    time_field = EXPORT_COLLECTIONS[collection]['time_field']
+    lower = to_epoch_seconds(start) if start is not None else None
+    upper = to_epoch_seconds(end) if end is not None else None
+    for doc in db.stream_collection(collection, filters, page_size):
+        if lower is not None or upper is not None:
+            value = doc.get(time_field)
+            if value is None:
+                continue
+            ts = to_epoch_seconds(_as_datetime(value) or value)
+            if (lower is not None and ts < lower) or (upper is not None and ts >= upper):
+                continue
+        yield doc
+
+
+def _iter_readings(
+    filters: Sequence[Tuple[str, str, Any]],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    page_size: int,
+) -> Iterator[Dict[str, Any]]:
+    """Archived then live readings, oldest first (archived ones streamed block by block)"""
+    window = [*filters]
+    if start is not None:
+        window.append(('timestamp_ms', '>=', int(round(to_epoch_seconds(start) * 1000))))
+    if end is not None:
+        window.append(('timestamp_ms', '<', int(round(to_epoch_seconds(end) * 1000))))
+    # Readings live where READINGS_LAYOUT puts them (reading_store), not
+    # necessarily in the flat collection
+    field_id = next((value for field, operator, value in filters
+                     if field == 'field_id' and operator == '=='), None)
+    # Archive blocks hold only readings, so the equality filters are checked here
+    equal = [(field, value) for field, operator, value in filters if operator == '==']
+    archived = iter_all_archived(start, end) if field_id is None else iter_archived(field_id, start, end)
+    for reading in archived:
+        if all(reading.get(field) == value for field, value in equal):
+            yield reading
+    if field_id is None:
+        yield from stream_all_readings(window, page_size, order_by='timestamp_ms')
+        return
+    others = [f for f in window if f[:2] != ('field_id', '==')]
+    yield from stream_readings(field_id, others, page_size, order_by='timestamp_ms')
+
+
+def _chunks(records: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _cell(value: Any, kind: str) -> Any:
+    """Normalise one value to the column type (float / timestamp / string)"""
+    if value is None:
+        return None
+    if kind == 'float':
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if kind == 'timestamp':
+        return _as_datetime(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if isinstance(value, str):
+        try:
+            return _as_datetime(datetime.fromisoformat(value.replace('Z', '+00:00')))
+        except ValueError:
+            return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(to_epoch_seconds(value), tz=timezone.utc)
+    return None
+
+
+class _ChunkSink:
+    """Write-only file object whose bytes are drained after every chunk"""
+
+    def __init__(self) -> None:
+        self._buffer = io.BytesIO()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self._buffer.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def _arrow_schema(columns: Sequence[str], types: Dict[str, str]) -> Any:
+    try:
+        import pyarrow as pa  # type: ignore[import-untyped]
+    except ImportError as e:
+        raise ExportError('Arrow and Parquet exports require pyarrow') from e
+    arrow_types = {'float': pa.float64(), 'timestamp': pa.timestamp('ms', tz='UTC')}
+    return pa.schema([(c, arrow_types.get(types.get(c, ''), pa.string())) for c in columns])
+
+
+def stream_export(
+    collection: str,
+    fmt: str,
+    filters: Sequence[Tuple[str, str, Any]],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[Sequence[str]] = None,
+    chunk_size: int = 5000,
+) -> Iterator[bytes]:
+    """
+    Encode an export as a stream of byte chunks
+
+    Args:
+        collection: One of ``EXPORT_COLLECTIONS``
+        fmt: 'csv', 'arrow' (IPC stream) or 'parquet' (one row group per chunk)
+        filters: Equality filters, see :func:`export_scope`
+        start: Inclusive lower bound on the collection's time field
+        end: Exclusive upper bound on the collection's time field
+        columns: Columns to export (default: the collection's standard set)
+        chunk_size: Records per CSV chunk / Arrow batch / Parquet row group
+
+    Yields:
+        Encoded bytes, ready to write to a file or HTTP response
+
+    Raises:
+        ExportError: Unknown format or column names
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f'Unsupported format: {fmt}')
+    spec = EXPORT_COLLECTIONS[collection]
+    allowed = (*spec['columns'], *spec.get('optional_columns', ()))
+    unknown = [c for c in columns or () if c not in allowed]
+    if unknown:
+        raise ExportError(f"Unknown column(s) {', '.join(unknown)}; allowed: {', '.join(allowed)}")
+    columns = list(columns or spec['columns'])
+    types = spec['types']
+    schema = _arrow_schema(columns, types) if fmt != 'csv' else None
+    records = iter_records(collection, filters, start, end)
+    return _encode(fmt, records, columns, types, schema, chunk_size)
+
+
+def _encode(fmt: str, records: Iterator[Dict[str, Any]], columns: List[str], types: Dict[str, str],
+            schema: Any, chunk_size: int) -> Iterator[bytes]:
+    if fmt == 'csv':
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        for chunk in _chunks(records, chunk_size):
+            for record in chunk:
+                row = [_cell(record.get(c), types.get(c, '')) for c in columns]
+                writer.writerow(['' if v is None else v.isoformat() if isinstance(v, datetime) else v for v in row])
+            yield text.getvalue().encode('utf-8')
+            text.seek(0)
+            text.truncate()
+        if text.tell():
+            yield text.getvalue().encode('utf-8')
+        return
+
+    import pyarrow as pa  # type: ignore[import-untyped]
+    import pyarrow.ipc  # type: ignore[import-untyped]  # noqa: F401
+    import pyarrow.parquet as pq  # type: ignore[import-untyped]
+
+    sink = _ChunkSink()
+    if fmt == 'arrow':
+        writer = pa.ipc.new_stream(sink, schema)
+    else:
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    rows = 0
+    try:
+        for chunk in _chunks(records, chunk_size):
+            arrays = {c: [_cell(r.get(c), types.get(c, '')) for r in chunk] for c in columns}
+            table = pa.Table.from_pydict(arrays, schema=schema)
+            writer.write_table(table)
+            rows += table.num_rows
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+    logger.info(f'Exported {rows} rows as {fmt}')
@@ -0,0 +1,327 @@
+"""In-process columnar store of the most recent readings per field
+
+Fed by ingestion, so "the last N hours for field X" can be answered without
+a Firestore or RTDB round trip. Each field has NumPy ring buffers for the
+sensor channels (``WINDOW_CHANNELS``: the rollup channels plus ``ec``),
+timestamps and document IDs. Channels flagged by the data-quality stage
+(``quality_flags``) are held as NaN, as ``reading_columns`` does for the raw
+path, so a query gives the same result from memory or the database.
+
+Buffers are mirrored (every sample is written at ``i`` and
+``i + capacity``), so the retained window is always one contiguous slice:
+appends are O(1) and range queries return zero-copy views.
+
+The store only knows what this process ingested (or restored from a
+snapshot): ``covers`` reports whether a window can be served from memory,
+otherwise callers fall back to the database. Coverage is per process: when
+several processes ingest readings of the same field, each window holds only
+its own share, so enable the store (``HOT_WINDOW_ENABLED``) only where one
+process ingests each field. Least recently used fields are evicted when
+``max_fields`` is exceeded.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import Config
+from app.services.sensor_rollups import CHANNELS
+from app.utils.helpers import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+# Channels held per reading; the rollup channels come first, so their column
+# index is the same as in ``CHANNELS``
+WINDOW_CHANNELS = CHANNELS + ('ec',)
+
+
+class FieldWindow:
+    """Mirrored ring buffer of one field's recent readings"""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._ts = np.zeros(2 * capacity, dtype=np.float64)
+        self._values = np.full((2 * capacity, len(WINDOW_CHANNELS)), np.nan, dtype=np.float32)
+        self._ids = np.full(2 * capacity, '', dtype=object)
+        self._head = 0   # next write position in [0, capacity)
+        self.size = 0
+        # Every reading at or after this time is retained (NaN = nothing yet)
+        self.covered_since = np.nan
+
+    def _write(self, pos: int, ts: float, row: np.ndarray, doc_id: str) -> None:
+        self._ts[pos] = self._ts[pos + self.capacity] = ts
+        self._values[pos] = self._values[pos + self.capacity] = row
+        self._ids[pos] = self._ids[pos + self.capacity] = doc_id
+
+    def append(self, ts: float, row: np.ndarray, doc_id: str = '') -> None:
+        """Add one reading; O(1) unless it arrives out of order"""
+        if self.size and ts < self._ts[self._head + self.capacity - 1]:
+            self._insert(ts, row, doc_id)
+            return
+        if self.size == self.capacity:
+            # Oldest sample is overwritten; coverage now starts after it
+            self.covered_since = float(self.timestamps()[1])
+        elif not self.size:
+            self.covered_since = ts
+        self._write(self._head, ts, row, doc_id)
+        self._head = (self._head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _insert(self, ts: float, row: np.ndarray, doc_id: str) -> None:
+        """Rare path for late readings: rebuild the window in order"""
+        if ts < self.covered_since:
+            return  # older than what we claim to cover; the database has it
+        timestamps, values, ids = self.timestamps(), self.values(), self.ids()
+        pos = int(np.searchsorted(timestamps, ts, side='right'))
+        timestamps = np.insert(timestamps, pos, ts)
+        values = np.insert(values, pos, row, axis=0)
+        ids = np.insert(ids, pos, doc_id)
+        if timestamps.size > self.capacity:
+            timestamps, values, ids = timestamps[1:], values[1:], ids[1:]
+            self.covered_since = float(timestamps[0])
+        self._load(timestamps, values, ids)
+
+    def _load(self, timestamps: np.ndarray, values: np.ndarray, ids: Optional[np.ndarray] = None) -> None:
+        n = min(timestamps.size, self.capacity)
+        timestamps, values = timestamps[-n:], values[-n:]
+        if values.shape[1] < len(WINDOW_CHANNELS):
+            # Snapshot from before a channel was added: the new channels are unknown
+            values = np.pad(values, ((0, 0), (0, len(WINDOW_CHANNELS) - values.shape[1])),
+                            constant_values=np.nan)
+        ids = np.full(n, '', dtype=object) if ids is None else np.asarray(ids, dtype=object)[-n:]
+        self._ts[:n] = self._ts[self.capacity:self.capacity + n] = timestamps
+        self._values[:n] = self._values[self.capacity:self.capacity + n] = values
+        self._ids[:n] = self._ids[self.capacity:self.capacity + n] = ids
+        self._head = n % self.capacity
+        self.size = n
+
+    def _span(self) -> Tuple[int, int]:
+        # The mirror makes the last ``size`` writes contiguous ending at head + capacity
+        end = self._head + self.capacity
+        return end - self.size, end
+
+    def timestamps(self) -> np.ndarray:
+        """Retained timestamps (epoch seconds, ascending) as a view"""
+        start, end = self._span()
+        return self._ts[start:end]
+
+    def values(self) -> np.ndarray:
+        """Retained values, one column per channel in ``WINDOW_CHANNELS``, as a view"""
+        start, end = self._span()
+        return self._values[start:end]
+
+    def ids(self) -> np.ndarray:
+        """Retained document IDs ('' when unknown) as a view"""
+        start, end = self._span()
+        return self._ids[start:end]
+
+    def bounds(self, start: float, end: Optional[float] = None) -> Tuple[int, int]:
+        """Positions ``[lo, hi)`` of readings with ``start <= ts < end``"""
+        timestamps = self.timestamps()
+        lo = int(np.searchsorted(timestamps, start, side='left'))
+        hi = timestamps.size if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        return lo, hi
+
+    def range(self, start: float, end: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Zero-copy views of readings with ``start <= ts < end``"""
+        lo, hi = self.bounds(start, end)
+        return self.timestamps()[lo:hi], self.values()[lo:hi]
+
+
+class HotWindowStore:
+    """Memory-bounded per-field hot windows with LRU eviction"""
+
+    def __init__(self, capacity: int = 2880, max_fields: int = 500) -> None:
+        self.capacity = capacity
+        self.max_fields = max_fields
+        self._fields: 'OrderedDict[str, FieldWindow]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _window(self, field_id: str, create: bool = False) -> Optional[FieldWindow]:
+        window = self._fields.get(field_id)
+        if window is None and create:
+            window = self._fields[field_id] = FieldWindow(self.capacity)
+            while len(self._fields) > self.max_fields:
+                evicted, _ = self._fields.popitem(last=False)
+                logger.debug(f'Evicted hot window of field {evicted}')
+        if window is not None:
+            self._fields.move_to_end(field_id)
+        return window
+
+    def append(self, field_id: str, readings: Sequence[Dict[str, Any]],
+               ids: Optional[Sequence[str]] = None) -> None:
+        """
+        Add stored readings (``sensor_readings`` documents) for a field; flagged channels become NaN
+
+        Args:
+            ids: Document IDs of ``readings`` (default: their ``id`` key)
+        """
+        rows = np.full((len(readings), len(WINDOW_CHANNELS)), np.nan, dtype=np.float32)
+        ts = np.empty(len(readings), dtype=np.float64)
+        if ids is None:
+            ids = [reading.get('id', '') for reading in readings]
+        for i, reading in enumerate(readings):
+            ts[i] = to_epoch_seconds(reading.get('timestamp'))
+            flags = reading.get('quality_flags') or ()
+            for j, channel in enumerate(WINDOW_CHANNELS):
+                if channel in flags:
+                    continue
+                value = reading.get(channel)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    rows[i, j] = value
+        order = np.argsort(ts, kind='stable')
+        with self._lock:
+            window = self._window(field_id, create=True)
+            assert window is not None
+            for i in order:
+                window.append(float(ts[i]), rows[i], ids[i])
+
+    def covers(self, field_id: str, start: datetime) -> bool:
+        """
+        Whether every reading this process ingested since ``start`` is held in memory
+
+        Readings ingested by other processes are not seen (see the module docstring).
+        """
+        with self._lock:
+            window = self._fields.get(field_id)
+            return window is not None and window.size > 0 and window.covered_since <= to_epoch_seconds(start)
+
+    def latest(self, field_id: str) -> Optional[Dict[str, Any]]:
+        """Most recent reading of a field, or None if not held"""
+        with self._lock:
+            window = self._window(field_id)
+            if window is None or not window.size:
+                return None
+            return _to_reading(field_id, window.timestamps()[-1], window.values()[-1], window.ids()[-1])
+
+    def range(self, field_id: str, start: datetime,
+              end: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Timestamps and channel values of ``start <= ts < end``
+
+        Returns copies (taken under the lock) so callers are unaffected by
+        concurrent appends; see :meth:`view` for the zero-copy variant.
+        """
+        with self._lock:
+            window = self._window(field_id)
+            if window is None:
+                return np.empty(0), np.empty((0, len(WINDOW_CHANNELS)), dtype=np.float32)
+            timestamps, values = window.range(
+                to_epoch_seconds(start), None if end is None else to_epoch_seconds(end))
+            return timestamps.copy(), values.copy()
+
+    def view(self, field_id: str, start: datetime,
+             end: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Zero-copy views of ``start <= ts < end``
+
+        The views alias the ring buffer, so consume them before further
+        appends to the field can wrap over the slice.
+        """
+        with self._lock:
+            window = self._window(field_id)
+            if window is None:
+                return np.empty(0), np.empty((0, len(WINDOW_CHANNELS)), dtype=np.float32)
+            return window.range(to_epoch_seconds(start), None if end is None else to_epoch_seconds(end))
+
+    def readings(self, field_id: str, start: datetime,
+                 end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Readings of a window as dicts, newest first"""
+        with self._lock:
+            window = self._window(field_id)
+            if window is None:
+                return []
+            lo, hi = window.bounds(to_epoch_seconds(start), None if end is None else to_epoch_seconds(end))
+            timestamps, values = window.timestamps()[lo:hi].copy(), window.values()[lo:hi].copy()
+            ids = window.ids()[lo:hi].copy()
+        return [_to_reading(field_id, timestamps[i], values[i], ids[i]) for i in range(timestamps.size - 1, -1, -1)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'fields': len(self._fields),
+                'readings': sum(w.size for w in self._fields.values()),
+                'bytes': sum(w._ts.nbytes + w._values.nbytes for w in self._fields.values()),
+            }
+
+    def snapshot(self, path: str) -> None:
+        """Persist all windows to a ``.npz`` file"""
+        arrays: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for i, (field_id, window) in enumerate(self._fields.items()):
+                arrays[f'id_{i}'] = np.array(field_id)
+                arrays[f'ts_{i}'] = window.timestamps().copy()
+                arrays[f'values_{i}'] = window.values().copy()
+                arrays[f'ids_{i}'] = window.ids().astype(str)
+                arrays[f'covered_{i}'] = np.array(window.covered_since)
+            count = len(self._fields)
+        tmp = f'{path}.tmp.npz'
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+        logger.info(f'Saved hot window snapshot with {count} fields to {path}')
+
+    def restore(self, path: str) -> None:
+        """Load windows saved by :meth:`snapshot` (missing file is ignored)"""
+        if not os.path.exists(path):
+            return
+        with np.load(path) as data, self._lock:
+            count = sum(1 for key in data.files if key.startswith('id_'))
+            for i in range(count):
+                window = self._window(str(data[f'id_{i}']), create=True)
+                assert window is not None
+                ids = data[f'ids_{i}'] if f'ids_{i}' in data.files else None
+                window._load(data[f'ts_{i}'], data[f'values_{i}'], ids)
+                window.covered_since = float(data[f'covered_{i}'])
+        logger.info(f'Restored hot windows of {count} fields from {path}')
+
+
+def _to_reading(field_id: str, ts: float, row: np.ndarray, doc_id: str) -> Dict[str, Any]:
+    # Same shape as a stored document: ISO timestamp plus epoch ms
+    moment = datetime.fromtimestamp(float(ts), tz=timezone.utc)
+    reading: Dict[str, Any] = {
+        'id': str(doc_id),
+        'field_id': field_id,
+        'timestamp': moment.isoformat(),
+        'timestamp_ms': int(round(float(ts) * 1000)),
+    }
+    for j, channel in enumerate(WINDOW_CHANNELS):
+        value = float(row[j])
+        reading[channel] = None if np.isnan(value) else value
+    return reading
+
+
+# Lazy singleton instance
+_hot_store: Optional[HotWindowStore] = None
+_hot_store_lock = threading.Lock()
+
+
+def get_hot_window_store() -> HotWindowStore:
+    """Get or create the store; restores and saves ``Config.HOT_WINDOW_SNAPSHOT_PATH``"""
+    global _hot_store
+    if _hot_store is None:
+        with _hot_store_lock:
+            if _hot_store is None:
+                store = HotWindowStore(Config.HOT_WINDOW_CAPACITY, Config.HOT_WINDOW_MAX_FIELDS)
+                path = Config.HOT_WINDOW_SNAPSHOT_PATH
+                if path:
+                    try:
+                        store.restore(path)
+                    except Exception as e:  # pylint: disable=broad-except
+                        logger.error(f'Failed to restore hot window snapshot: {str(e)}')
+                    atexit.register(_save_snapshot, store, path)
+                _hot_store = store
+    return _hot_store
+
+
+def _save_snapshot(store: HotWindowStore, path: str) -> None:
+    try:
+        store.snapshot(path)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.error(f'Failed to save hot window snapshot: {str(e)}')
@@ -2,12 +2,15 @@
 from __future__ import annotations
 
 import logging
+import threading
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
 from firebase_admin import messaging  # type: ignore[import-untyped]
+from google.cloud import firestore  # type: ignore[import-untyped]
 
 from app.core.database import db
+from app.services.alert_coalescer import get_alert_coalescer
 
 logger = logging.getLogger(__name__)
 
@@ -102,6 +105,18 @@ def send_alert_notification(
         if not isinstance(user_id, str):
             return
 
+        # Enforce per-user daily caps; overflow goes into the next digest
+        coalescer = get_alert_coalescer()
+        if not coalescer.allow_notification(user_id, severity):
+            coalescer.defer(user_id, {
+                'field_id': field_id,
+                'alert_type': alert_type,
+                'message': message,
+                'severity': severity
+            })
+            logger.info(f'Notification cap reached for user {user_id}, deferred to digest')
+            return
+
         # Determine priority and emoji
         priority_map: Dict[str, Tuple[str, str]] = {
             'normal': ('normal', '📊'),
@@ -133,33 +148,70 @@ def create_alert(
         alert_type: str,
         parameter: str,
         message: str,
-        severity: str = 'normal') -> str:
+        severity: str = 'normal',
+        extra: Optional[Dict[str, Any]] = None) -> str:
     """
     Create and store alert in database
 
+    Repeats of the same field/alert type/parameter/source (``rule_id`` of a
+    rule alert, ``fault`` of a device-health alert) inside the coalescing
+    window update the existing alert's occurrence count instead of writing
+    a new document, and do not send another push notification. Different
+    rules on one parameter stay separate alerts, so resolving one never
+    resolves the other. Only open alerts take repeats: once an alert is
+    acknowledged or resolved, the next occurrence creates a new alert.
+
     Args:
         field_id: Field ID
         alert_type: Type of alert
         parameter: Related parameter (pH, moisture, etc.)
         message: Alert message
         severity: Alert severity
+        extra: Additional fields stored on the alert document
 
     Returns:
         Alert ID
     """
+    coalescer = get_alert_coalescer()
+    source = (extra or {}).get('rule_id') or (extra or {}).get('fault') or ''
+    key = (field_id, alert_type, parameter, str(source))
     try:
+        now = datetime.utcnow()
+        alert_id, is_new = coalescer.record(key)
+
+        if not is_new and alert_id:
+            # Another worker may have seen the acknowledgement or resolution
+            current = db.get_document('alerts', alert_id)
+            if current and _is_open(current):
+                db.update_document('alerts', alert_id, {
+                    **(extra or {}),
+                    'message': message,
+                    'severity': severity,
+                    'last_seen': now,
+                    'occurrences': firestore.Increment(1)
+                })
+                logger.debug(f'Coalesced alert into {alert_id} for field {field_id}')
+                return alert_id
+            coalescer.forget(key)
+            coalescer.record(key)
+
         alert_data = {
+            **(extra or {}),
             'field_id': field_id,
             'alert_type': alert_type,
             'parameter': parameter,
             'message': message,
             'severity': severity,
-            'timestamp': datetime.utcnow(),
+            'timestamp': now,
+            'first_seen': now,
+            'last_seen': now,
+            'occurrences': 1,
             'acknowledged': False,
             'acknowledged_at': None
         }
 
         alert_id = db.create_document('alerts', alert_data)
+        coalescer.bind(key, alert_id)
 
         # Send push notification
         send_alert_notification(field_id, alert_type, message, severity)
@@ -168,10 +220,112 @@ def create_alert(
         return alert_id
 
     except Exception as e:  # pylint: disable=broad-except
+        coalescer.forget(key)
         logger.error(f'Error creating alert: {str(e)}')
         raise
 
 
+def _is_open(alert: Dict[str, Any]) -> bool:
+    return not alert.get('acknowledged') and alert.get('status', 'active') != 'resolved'
+
+
+def resolve_alert(alert_id: str, resolved_at: Optional[datetime] = None) -> None:
+    """Mark an alert resolved and close its coalescing window"""
+    db.update_document('alerts', alert_id, {
+        'status': 'resolved',
+        'resolved_at': resolved_at or datetime.utcnow()
+    })
+    get_alert_coalescer().forget_alert(alert_id)
+
+
+def flush_alert_digests(force: bool = False) -> int:
+    """
+    Send one digest notification per user for alerts deferred by the cap
+
+    Args:
+        force: Send all pending digests regardless of the digest interval
+
+    Returns:
+        Number of digests sent
+    """
+    sent = 0
+    for user_id, items in get_alert_coalescer().due_digests(force=force).items():
+        if not items:
+            continue
+        try:
+            critical = any(item.get('severity') == 'critical' for item in items)
+            preview = '; '.join(item.get('message', '') for item in items[:3])
+            more = f' (+{len(items) - 3} more)' if len(items) > 3 else ''
+
+            if send_push_notification(
+                user_id=user_id,
+                title=f'🔔 {len(items)} alerts while notifications were paused',
+                body=f'{preview}{more}',
+                data={
+                    'type': 'alert_digest',
+                    'count': str(len(items)),
+                    'field_ids': ','.join(sorted({str(item.get('field_id')) for item in items}))
+                },
+                priority='high' if critical else 'normal'
+            ):
+                sent += 1
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f'Error sending alert digest to user {user_id}: {str(e)}')
+    return sent
+
+
+class AlertDigestScheduler:
+    """
+    Daemon thread that sends due alert digests (:func:`flush_alert_digests`)
+
+    Digests are otherwise only flushed when the next alert is created, so a
+    quiet period after the cap was hit would hold them back indefinitely.
+    """
+
+    def __init__(self, check_seconds: float) -> None:
+        self.check_seconds = max(1.0, check_seconds)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='alert-digest-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f'Alert digest scheduler started (every {self.check_seconds:g}s)')
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.check_seconds):
+            try:
+                sent = flush_alert_digests()
+                if sent:
+                    logger.info(f'Sent {sent} alert digest(s)')
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error(f'Scheduled alert digest flush failed: {str(e)}')
+
+
+_digest_scheduler: Optional[AlertDigestScheduler] = None
+_digest_scheduler_lock = threading.Lock()
+
+
+def start_alert_digest_scheduler() -> AlertDigestScheduler:
+    """Start the digest timer once per process (checks at most a minute apart)"""
+    global _digest_scheduler
+    with _digest_scheduler_lock:
+        if _digest_scheduler is None:
+            interval = get_alert_coalescer().digest_interval_seconds
+            _digest_scheduler = AlertDigestScheduler(min(60.0, interval))
+            _digest_scheduler.start()
+    return _digest_scheduler
+
+
 def get_user_alerts(
         user_id: str, unacknowledged_only: bool = False) -> List[Dict[str, Any]]:
     """Get all alerts for user's fields"""
@@ -224,6 +378,8 @@ def acknowledge_alert(alert_id: str, user_id: str) -> bool:
             'acknowledged': True,
             'acknowledged_at': datetime.utcnow()
         })
+        # Repeats of the condition now raise a new alert
+        get_alert_coalescer().forget_alert(alert_id)
 
         return True
 
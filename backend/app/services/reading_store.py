@@ -0,0 +1,111 @@
+"""Storage layout of raw sensor readings
+
+``READINGS_LAYOUT`` selects where readings live:
+
+- ``flat``: one top-level ``sensor_readings`` collection filtered by
+  ``field_id`` (legacy). Every field appends monotonically increasing
+  timestamps to the same collection, which is a Firestore write hotspot.
+- ``dual``: migration mode; writes go to both layouts, reads use ``flat``.
+- ``field``: ``fields/{field_id}/readings/{id}``; each field is its own
+  collection, so write throughput scales with the number of fields and
+  per-field queries need no ``field_id`` filter or composite index.
+
+Readings keep their ``field_id`` in both layouts and share document IDs, so
+cross-field analytics can use a collection-group query on ``readings``.
+Migration: switch to ``dual``, run ``copy_readings.py``, then switch to
+``field``.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from app.core.config import Config
+from app.core.database import db
+
+FLAT_COLLECTION = 'sensor_readings'
+FIELD_SUBCOLLECTION = 'readings'
+LAYOUTS = ('flat', 'dual', 'field')
+
+Filters = Sequence[Tuple[str, str, Any]]
+
+
+def field_readings_path(field_id: str) -> str:
+    return f'fields/{field_id}/{FIELD_SUBCOLLECTION}'
+
+
+def _layout() -> str:
+    layout = Config.READINGS_LAYOUT
+    if layout not in LAYOUTS:
+        raise ValueError(f'Unknown READINGS_LAYOUT: {layout}')
+    return layout
+
+
+def read_target(field_id: str) -> Tuple[str, List[Tuple[str, str, Any]]]:
+    """Collection path and base filters for reading one field's readings"""
+    if _layout() == 'field':
+        return field_readings_path(field_id), []
+    return FLAT_COLLECTION, [('field_id', '==', field_id)]
+
+
+def write_targets(field_id: str) -> List[str]:
+    """Collection paths a field's readings are written to"""
+    layout = _layout()
+    if layout == 'flat':
+        return [FLAT_COLLECTION]
+    if layout == 'field':
+        return [field_readings_path(field_id)]
+    return [FLAT_COLLECTION, field_readings_path(field_id)]
+
+
+def write_readings(field_id: str, readings: Sequence[Dict[str, Any]]) -> List[str]:
+    """Store readings under freshly generated IDs (the same IDs in every target)"""
+    targets = write_targets(field_id)
+    ids = [db.collection(targets[-1]).document().id for _ in readings]
+    for target in targets:
+        db.set_documents(target, dict(zip(ids, readings)))
+    return ids
+
+
+def update_readings(field_id: str, updates: Mapping[str, Dict[str, Any]]) -> None:
+    """Merge field updates into existing readings (by ID) in every target"""
+    for target in write_targets(field_id):
+        db.set_documents(target, updates, merge=True)
+
+
+def delete_readings(field_id: str, reading_ids: Sequence[str]) -> None:
+    """Delete readings by ID from every target"""
+    for target in write_targets(field_id):
+        db.delete_documents(target, reading_ids)
+
+
+def query_readings(
+    field_id: str,
+    filters: Filters = (),
+    order_by: Optional[Sequence[Tuple[str, Any]]] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """One field's readings matching ``filters`` (see ``FirestoreDB.query_collection``)"""
+    collection, base = read_target(field_id)
+    return db.query_collection(collection, filters=[*base, *filters], order_by=order_by, limit=limit)
+
+
+def stream_readings(
+    field_id: str,
+    filters: Filters = (),
+    page_size: int = 1000,
+    order_by: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """One field's readings, page by page (see ``FirestoreDB.stream_collection``)"""
+    collection, base = read_target(field_id)
+    return db.stream_collection(collection, [*base, *filters], page_size, order_by=order_by)
+
+
+def stream_all_readings(
+    filters: Filters = (),
+    page_size: int = 1000,
+    order_by: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Readings of every field (a collection-group query in the ``field`` layout)"""
+    if _layout() == 'field':
+        return db.stream_collection(FIELD_SUBCOLLECTION, filters, page_size, order_by=order_by, group=True)
+    return db.stream_collection(FLAT_COLLECTION, filters, page_size, order_by=order_by)
@@ -1,7 +1,11 @@
 import firebase_admin
 from firebase_admin import db
 import os
-from datetime import datetime
+from datetime import datetime, timezone
+from app.core.config import Config
+from app.services.hot_window_store import get_hot_window_store
+from app.services.sensor_rollups import CHANNELS
+from app.utils.downsampling import downsample_readings
 
 class RealtimeDBService:
     """Service to interact with Firebase Realtime Database for sensor data"""
@@ -51,33 +55,58 @@ class RealtimeDBService:
             print(f"Error fetching from RTDB: {e}")
             return None
 
-    def get_sensor_history(self, field_id, duration_days=7):
+    def get_sensor_history(self, field_id, duration_days=7, max_points=None):
         """
         Get historical sensor readings from RTDB
+
+        With max_points, returns a columnar series per channel reduced with
+        LTTB (see app.utils.downsampling) instead of a list of readings.
+        Served from the in-process hot window when it covers the duration.
         """
         # Use field_id as-is (no mapping needed)
         rtdb_field_id = field_id
 
         try:
-            sensor_ref = self.ref.child('sensorData')
-
             # Calculate timestamp threshold (7 days ago)
             from datetime import timedelta
-            threshold_timestamp = int((datetime.now() - timedelta(days=duration_days)).timestamp() * 1000)
+            threshold = datetime.now() - timedelta(days=duration_days)
+            threshold_timestamp = int(threshold.timestamp() * 1000)
+
+            if Config.HOT_WINDOW_ENABLED:
+                hot_store = get_hot_window_store()
+                start = datetime.fromtimestamp(threshold_timestamp / 1000.0, tz=timezone.utc)
+                if hot_store.covers(field_id, start):
+                    matching_readings = [
+                        self._to_rtdb_reading(reading, rtdb_field_id)
+                        for reading in hot_store.readings(field_id, start)
+                    ]
+                    if max_points:
+                        return downsample_readings(matching_readings, CHANNELS, max_points)
+                    return [self._normalize_sensor_data(r, field_id) for r in matching_readings]
+
+            sensor_ref = self.ref.child('sensorData')
 
             # Get all readings without query (Firebase query requires index)
             all_data = sensor_ref.get()
 
             if not all_data:
-                return []
+                return downsample_readings([], CHANNELS, max_points) if max_points else []
 
             # Filter by field_id AND timestamp in Python
-            historical_data = []
-            for reading in all_data.values():
+            matching_readings = [
+                reading for reading in all_data.values()
                 if (reading.get('field_id') == rtdb_field_id and
-                    reading.get('timestamp', 0) >= threshold_timestamp):
-                    normalized = self._normalize_sensor_data(reading, field_id)
-                    historical_data.append(normalized)
+                    reading.get('timestamp', 0) >= threshold_timestamp)
+            ]
+
+            if max_points:
+                # Raw epoch-ms timestamps, so no local-time conversion
+                return downsample_readings(matching_readings, CHANNELS, max_points)
+
+            historical_data = [
+                self._normalize_sensor_data(reading, field_id)
+                for reading in matching_readings
+            ]
 
             # Sort by timestamp descending
             historical_data.sort(key=lambda x: x['timestamp'], reverse=True)
@@ -86,7 +115,20 @@ class RealtimeDBService:
 
         except Exception as e:
             print(f"Error fetching history from RTDB: {e}")
-            return []
+            return downsample_readings([], CHANNELS, max_points) if max_points else []
+
+    @staticmethod
+    def _to_rtdb_reading(reading, rtdb_field_id):
+        """
+        Convert a hot window reading to the RTDB record shape (epoch ms)
+        """
+        record = {
+            'field_id': rtdb_field_id,
+            'timestamp': reading['timestamp_ms'],
+        }
+        # Leave missing channels out so normalization falls back to defaults
+        record.update({k: v for k, v in reading.items() if k in CHANNELS and v is not None})
+        return record
 
     def _normalize_sensor_data(self, rtdb_data, app_field_id):
         """
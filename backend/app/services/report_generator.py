@@ -16,6 +16,8 @@ from reportlab.platypus import (Paragraph, SimpleDocTemplate, Spacer,  # type: i
 
 from app.core.database import db
 from app.core.firebase import get_storage_bucket
+from app.services.sensor_query import run_query
+from app.services.sensor_rollups import rollup_percentiles, summarize_rollups
 
 logger = logging.getLogger(__name__)
 
@@ -185,44 +187,47 @@ def _get_sensor_summary(
         start_datetime = datetime.combine(planting_date_parsed, datetime.min.time())
         end_datetime = datetime.combine(harvest_date_parsed, datetime.max.time())
 
-        # Get all sensor readings in date range
-        readings = db.query_collection(
-            'sensor_readings',
-            filters=[
-                ('field_id', '==', field_id),
-                ('timestamp', '>=', start_datetime),
-                ('timestamp', '<=', end_datetime)
-            ]
-        )
-
-        if not readings:
+        # Season windows are whole days, so daily rollups answer this directly
+        rollup = summarize_rollups(field_id, start_datetime, end_datetime)
+        if rollup['count']:
+            channels = rollup['channels']
+
+            def _mean(key: str) -> float:
+                return channels[key]['mean'] if key in channels else 0
+
+            spread = rollup_percentiles([(field_id, start_datetime, end_datetime)], (10, 50, 90))
+            return {
+                'status': 'available',
+                'source': 'rollups',
+                'total_readings': rollup['count'],
+                'avg_ph': _mean('ph'),
+                'avg_nitrogen': _mean('nitrogen'),
+                'avg_phosphorus': _mean('phosphorus'),
+                'avg_potassium': _mean('potassium'),
+                'avg_moisture': _mean('moisture'),
+                'avg_temperature': _mean('temperature'),
+                'percentiles': spread['channels']}
+
+        # No rollups: aggregate the raw (and archived) readings in one bucket
+        summary = run_query(field_id, start_datetime, end_datetime, bucket='all',
+                            aggregations=('count', 'mean'))
+        if not summary['count']:
             return {'status': 'no_data'}
 
-        # Calculate averages
-        def _collect_numeric(key: str) -> List[float]:
-            values: List[float] = []
-            for record in readings:
-                value = record.get(key)
-                if isinstance(value, (int, float)):
-                    values.append(float(value))
-            return values
-
-        ph_values = _collect_numeric('ph')
-        n_values = _collect_numeric('nitrogen')
-        p_values = _collect_numeric('phosphorus')
-        k_values = _collect_numeric('potassium')
-        moisture_values = _collect_numeric('moisture')
-        temp_values = _collect_numeric('temperature')
+        def _raw_mean(key: str) -> float:
+            value = summary['channels'][key]['mean'][0]
+            return value if value is not None else 0
 
         return {
             'status': 'available',
-            'total_readings': len(readings),
-            'avg_ph': sum(ph_values) / len(ph_values) if ph_values else 0,
-            'avg_nitrogen': sum(n_values) / len(n_values) if n_values else 0,
-            'avg_phosphorus': sum(p_values) / len(p_values) if p_values else 0,
-            'avg_potassium': sum(k_values) / len(k_values) if k_values else 0,
-            'avg_moisture': sum(moisture_values) / len(moisture_values) if moisture_values else 0,
-            'avg_temperature': sum(temp_values) / len(temp_values) if temp_values else 0}
+            'source': summary['source'],
+            'total_readings': int(max(c['count'][0] or 0 for c in summary['channels'].values())),
+            'avg_ph': _raw_mean('ph'),
+            'avg_nitrogen': _raw_mean('nitrogen'),
+            'avg_phosphorus': _raw_mean('phosphorus'),
+            'avg_potassium': _raw_mean('potassium'),
+            'avg_moisture': _raw_mean('moisture'),
+            'avg_temperature': _raw_mean('temperature')}
 
     except Exception as e:  # pylint: disable=broad-except
         logger.error(f'Error getting sensor summary: {str(e)}')
@@ -415,6 +420,12 @@ def _generate_pdf_report(
                 ['Soil Moisture:', f"{sensor_summary.get('avg_moisture', 0):.1f}%"],
                 ['Temperature:', f"{sensor_summary.get('avg_temperature', 0):.1f}°C"]
             ]
+            # Typical range (P10-P90) from the rollup sketches, when available
+            spread = sensor_summary.get('percentiles') or {}
+            for row, channel in zip(soil_data, ('ph', 'nitrogen', 'phosphorus', 'potassium',
+                                                'moisture', 'temperature')):
+                if channel in spread:
+                    row[1] += f" (P10-P90: {spread[channel]['p10']:.1f} - {spread[channel]['p90']:.1f})"
 
             soil_table = Table(soil_data, colWidths=[2 * inch, 4 * inch])
             soil_table.setStyle(TableStyle([
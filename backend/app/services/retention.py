@@ -0,0 +1,355 @@
+"""Retention and compaction of append-only collections
+
+``notifications``, ``alerts`` and raw sensor readings only ever grow, which
+makes every scan and count slower as the fleet ages. :func:`run_compaction`
+applies one policy per collection:
+
+- ``sensor_readings``: readings older than ``RETENTION_READINGS_DAYS`` are
+  compacted into the hourly/daily rollups (days the rollups do not fully
+  cover are rewritten first, see ``ensure_day_rollups``) and then deleted, or
+  moved to the cold archive with ``RETENTION_READINGS_MODE=archive``.
+- ``alerts``: acknowledged or resolved alerts older than
+  ``RETENTION_ALERTS_DAYS`` are deleted; active alerts are kept, even when
+  they were acknowledged long ago.
+- ``notifications``: notifications sent more than
+  ``RETENTION_NOTIFICATIONS_DAYS`` ago are deleted.
+
+Each policy pages through its collection with a range filter on a single
+timestamp field and a query cursor, deleting one page at a time in batched
+writes, so a run never loads the collection into memory and needs no
+composite index. A policy with 0 days is disabled.
+
+Run it from cron / Cloud Scheduler with ``compact_data.py`` or in-process
+with ``RETENTION_SCHEDULER_ENABLED`` (see :class:`RetentionScheduler`).
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from google.cloud import firestore  # type: ignore[import-untyped]
+
+from app.core.config import Config
+from app.core.database import db
+from app.services.reading_store import delete_readings, stream_readings
+from app.services.sensor_query import bump_data_version
+from app.services.sensor_rollups import RESOLUTION_SECONDS, ensure_day_rollups
+from app.utils.helpers import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_COLLECTION = 'maintenance'
+RETENTION_RUN = 'retention'
+READINGS_MODES = ('rollup', 'archive')
+
+# Policy name -> (collection, timestamp field) for the plain delete policies;
+# alerts are deleted once acknowledged or resolved, whichever happened
+DELETE_POLICIES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    'alerts': ('alerts', ('acknowledged_at', 'resolved_at')),
+    'notifications': ('notifications', ('sent_at',)),
+}
+
+# Policy name -> documents a delete policy keeps although they are past the
+# cutoff (checked per document, so the range query needs no composite index)
+KEEP_POLICIES: Dict[str, Callable[[Dict[str, Any]], bool]] = {
+    'alerts': lambda alert: alert.get('status') == 'active',
+}
+
+
+def retention_days() -> Dict[str, int]:
+    """Configured retention per policy (0 disables the policy)"""
+    return {
+        'sensor_readings': Config.RETENTION_READINGS_DAYS,
+        'alerts': Config.RETENTION_ALERTS_DAYS,
+        'notifications': Config.RETENTION_NOTIFICATIONS_DAYS,
+    }
+
+
+def _new_report(collection: str, cutoff: datetime) -> Dict[str, Any]:
+    return {'collection': collection, 'cutoff': cutoff.isoformat(),
+            'scanned': 0, 'deleted': 0, 'kept': 0, 'pages': 0, 'complete': True}
+
+
+def _delete_old(
+    collection: str,
+    field: str,
+    cutoff: datetime,
+    report: Dict[str, Any],
+    page_size: int,
+    limit: Optional[int],
+    dry_run: bool,
+    seen: Set[str],
+    keep: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> None:
+    pending: List[str] = []
+
+    def _flush() -> None:
+        if pending and not dry_run:
+            db.delete_documents(collection, pending)
+        report['pages'] += 1 if pending else 0
+        pending.clear()
+
+    documents = db.stream_collection(collection, [(field, '<', cutoff)], page_size, order_by=field)
+    for document in documents:
+        if limit is not None and report['scanned'] >= limit:
+            report['complete'] = False
+            break
+        report['scanned'] += 1
+        if document['id'] in seen:
+            continue
+        if keep is not None and keep(document):
+            # Counted once, although it matches every timestamp field of the policy
+            seen.add(document['id'])
+            report['kept'] += 1
+            continue
+        if dry_run:
+            # Nothing is deleted, so a later pass would count the document again
+            seen.add(document['id'])
+        report['deleted'] += 1
+        pending.append(document['id'])
+        if len(pending) >= page_size:
+            _flush()
+    _flush()
+
+
+def compact_collection(
+    name: str,
+    cutoff: datetime,
+    page_size: int = 500,
+    limit: Optional[int] = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Delete the documents of a delete policy (``alerts`` / ``notifications``) older than ``cutoff``
+
+    Args:
+        name: Key of ``DELETE_POLICIES``
+        cutoff: Delete documents whose policy timestamp is before this time
+        page_size: Documents read and deleted per batch (max 500)
+        limit: Stop after this many documents; the next run continues
+        dry_run: Count without deleting
+
+    Returns:
+        Report with scanned / deleted (would-be deleted in a dry run) / kept
+        (past the cutoff but kept by ``KEEP_POLICIES``) counts
+    """
+    collection, fields = DELETE_POLICIES[name]
+    report = _new_report(collection, cutoff)
+    seen: Set[str] = set()
+    for field in fields:
+        if not report['complete']:
+            break
+        _delete_old(collection, field, cutoff, report, page_size, limit, dry_run, seen,
+                    KEEP_POLICIES.get(name))
+    return report
+
+
+def compact_readings(
+    cutoff: datetime,
+    field_ids: Optional[Sequence[str]] = None,
+    page_size: int = 500,
+    limit: Optional[int] = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Compact raw readings older than ``cutoff`` into rollups and delete them
+
+    ``cutoff`` is rounded down to midnight UTC, so only whole days are
+    removed and a later ``backfill_rollups`` over the remaining readings
+    never overwrites a day with a partial aggregate. Readings are collected
+    whole days at a time until at least ``page_size`` are pending, then the
+    days' rollups are checked and the readings deleted in batches.
+
+    Args:
+        cutoff: Compact readings with ``timestamp < cutoff``
+        field_ids: Fields to compact (default: every document in ``fields``)
+        page_size: Raw readings per query page and delete batch
+        limit: Stop at the first day boundary after this many readings (per run,
+            across fields); the next run continues
+        dry_run: Count without touching rollups or deleting readings
+
+    Returns:
+        Report with scanned / deleted counts, rewritten rollup days and fields
+    """
+    day = RESOLUTION_SECONDS['day']
+    cutoff = datetime.fromtimestamp(math.floor(to_epoch_seconds(cutoff) / day) * day, tz=timezone.utc)
+    cutoff_ms = int(to_epoch_seconds(cutoff) * 1000)
+    report = _new_report('sensor_readings', cutoff)
+    report.update({'rollup_days': 0, 'fields': 0})
+    if field_ids is None:
+        field_ids = [f['id'] for f in db.query_collection('fields')]
+
+    batch: List[Dict[str, Any]] = []
+    for field_id in field_ids:
+        current_day: Optional[int] = None
+        deleted_before = report['deleted']
+
+        def _flush(field_id: str = field_id) -> None:
+            if batch and not dry_run:
+                report['rollup_days'] += ensure_day_rollups(field_id, batch)
+                ids = [r['id'] for r in batch]
+                for start in range(0, len(ids), page_size):
+                    delete_readings(field_id, ids[start:start + page_size])
+                    report['pages'] += 1
+            report['deleted'] += len(batch)
+            batch.clear()
+
+        old_readings = stream_readings(
+            field_id, [('timestamp_ms', '<', cutoff_ms)], page_size, order_by='timestamp_ms')
+        for reading in old_readings:
+            reading_day = int(reading['timestamp_ms'] // (day * 1000))
+            if reading_day != current_day:
+                # Flush whole days, at least a page at a time
+                if len(batch) >= page_size:
+                    _flush()
+                current_day = reading_day
+                if limit is not None and report['scanned'] >= limit:
+                    _flush()
+                    report['complete'] = False
+                    break
+            report['scanned'] += 1
+            batch.append(reading)
+        else:
+            # The cutoff is at midnight, so the last day is complete too
+            _flush()
+
+        if report['deleted'] > deleted_before:
+            report['fields'] += 1
+            if not dry_run:
+                bump_data_version(field_id)
+        if not report['complete']:
+            break
+    return report
+
+
+def _archive_readings(cutoff: datetime, page_size: int, dry_run: bool) -> Dict[str, Any]:
+    # Imported here: archiving pulls in the Cloud Storage client
+    from app.services.sensor_archive import archive_readings
+
+    archived = archive_readings(cutoff, page_size=page_size, dry_run=dry_run)
+    report = _new_report('sensor_readings', cutoff)
+    report.update({'scanned': sum(archived.values()), 'deleted': sum(archived.values()),
+                   'fields': sum(1 for count in archived.values() if count), 'archived': True})
+    return report
+
+
+def run_compaction(
+    dry_run: bool = False,
+    policies: Optional[Sequence[str]] = None,
+    page_size: int = 500,
+    limit: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Apply the retention policies
+
+    Args:
+        dry_run: Report what would be deleted without writing anything
+        policies: Policy names to run (default: every enabled policy)
+        page_size: Documents per query page and delete batch (max 500)
+        limit: Maximum documents handled per policy in this run
+        now: Reference time for the cutoffs (default: current UTC time)
+
+    Returns:
+        One report per policy that ran
+    """
+    now = now or datetime.now(timezone.utc)
+    days = retention_days()
+    unknown = set(policies or ()) - set(days)
+    if unknown:
+        raise ValueError(f'Unknown retention policies: {", ".join(sorted(unknown))}')
+    if Config.RETENTION_READINGS_MODE not in READINGS_MODES:
+        raise ValueError(f'Unknown RETENTION_READINGS_MODE: {Config.RETENTION_READINGS_MODE}')
+
+    handlers: Dict[str, Callable[[datetime], Dict[str, Any]]] = {
+        'alerts': lambda cutoff: compact_collection('alerts', cutoff, page_size, limit, dry_run),
+        'notifications': lambda cutoff: compact_collection(
+            'notifications', cutoff, page_size, limit, dry_run),
+        'sensor_readings': lambda cutoff: _archive_readings(cutoff, page_size, dry_run)
+        if Config.RETENTION_READINGS_MODE == 'archive'
+        else compact_readings(cutoff, page_size=page_size, limit=limit, dry_run=dry_run),
+    }
+
+    reports: Dict[str, Dict[str, Any]] = {}
+    for name in policies or days:
+        if days[name] <= 0:
+            continue
+        try:
+            reports[name] = handlers[name](now - timedelta(days=days[name]))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f'Retention policy {name} failed: {str(e)}')
+            reports[name] = {'error': str(e)}
+        logger.info(f'Retention {name}{" (dry run)" if dry_run else ""}: {reports[name]}')
+
+    if not dry_run:
+        db.set_documents(MAINTENANCE_COLLECTION, {RETENTION_RUN: {
+            'last_run_at': now,
+            'reports': reports,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        }}, merge=True)
+    return reports
+
+
+class RetentionScheduler:
+    """
+    Daemon thread that runs :func:`run_compaction` every ``interval_hours``
+
+    Every worker process may start one; before running, the scheduler checks
+    ``maintenance/retention`` and skips if another process ran the job within
+    the interval. Concurrent runs are harmless (deletes are idempotent),
+    just wasted reads.
+    """
+
+    def __init__(self, interval_hours: float) -> None:
+        self.interval = timedelta(hours=interval_hours)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='retention-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f'Retention scheduler started (every {self.interval})')
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def due(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now(timezone.utc)
+        last = (db.get_document(MAINTENANCE_COLLECTION, RETENTION_RUN) or {}).get('last_run_at')
+        return last is None or to_epoch_seconds(now) - to_epoch_seconds(last) >= self.interval.total_seconds()
+
+    def _run(self) -> None:
+        # First check shortly after start-up, then once per interval
+        wait = 60.0
+        while not self._stop.wait(wait):
+            wait = self.interval.total_seconds()
+            try:
+                if self.due():
+                    run_compaction()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error(f'Scheduled compaction failed: {str(e)}')
+
+
+_scheduler: Optional[RetentionScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def start_retention_scheduler() -> Optional[RetentionScheduler]:
+    """Start the in-process scheduler once per process if ``RETENTION_SCHEDULER_ENABLED``"""
+    global _scheduler
+    if not Config.RETENTION_SCHEDULER_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RetentionScheduler(Config.RETENTION_INTERVAL_HOURS)
+            _scheduler.start()
+    return _scheduler
@@ -0,0 +1,319 @@
+"""Cold-storage archive of raw sensor readings
+
+Readings older than a cutoff are packed into one block per field and month
+(``{ARCHIVE_PREFIX}/{field_id}/{YYYY-MM}.gor``), compressed with Gorilla
+encoding (:mod:`app.utils.gorilla`), written to Cloud Storage (or a local
+directory with ``ARCHIVE_BACKEND=local``) and then deleted from Firestore in
+batches.
+
+Block layout::
+
+    b'CGA1' | uint32 header length | JSON header | timestamp stream | channel streams
+
+The header holds the point count, the byte length of each stream, device IDs
+(run-length encoded) and the sparse ``quality_flags``. Channels that are
+missing from a reading are stored as NaN. Other document fields (IDs,
+server metadata) are not archived.
+
+``sensor_archives/{field_id}`` indexes the archived months and the cutoff,
+so readers only touch Cloud Storage for windows older than the cutoff.
+Rollups are computed at ingestion time and are not affected by archiving.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from google.cloud import firestore  # type: ignore[import-untyped]
+
+from app.core.config import Config
+from app.core.database import db
+from app.services.reading_store import delete_readings, stream_readings
+from app.services.sensor_rollups import CHANNELS
+from app.utils.gorilla import decode_floats, decode_timestamps, encode_floats, encode_timestamps
+from app.utils.helpers import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_INDEX_COLLECTION = 'sensor_archives'
+ARCHIVE_CHANNELS = CHANNELS + ('ec',)
+BLOCK_MAGIC = b'CGA1'
+
+
+class LocalArchiveStore:
+    """Archive blocks as files under a directory (development stand-in for GCS)"""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def put(self, name: str, data: bytes) -> None:
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.root, name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class CloudArchiveStore:
+    """Archive blocks as objects in the Firebase Cloud Storage bucket"""
+
+    def __init__(self) -> None:
+        from app.core.firebase import get_storage_bucket
+        self.bucket = get_storage_bucket()
+
+    def put(self, name: str, data: bytes) -> None:
+        self.bucket.blob(name).upload_from_string(data, content_type='application/octet-stream')
+
+    def get(self, name: str) -> Optional[bytes]:
+        blob = self.bucket.blob(name)
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+
+
+_store: Optional[Any] = None
+_store_lock = threading.Lock()
+
+
+def get_archive_store() -> Any:
+    """Lazily create the archive store selected by ``ARCHIVE_BACKEND``"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if Config.ARCHIVE_BACKEND == 'local':
+                    _store = LocalArchiveStore(Config.ARCHIVE_LOCAL_PATH)
+                else:
+                    _store = CloudArchiveStore()
+    return _store
+
+
+def _block_name(field_id: str, month: str) -> str:
+    return f'{Config.ARCHIVE_PREFIX}/{field_id}/{month}.gor'
+
+
+def _month(epoch_seconds: float) -> str:
+    return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc).strftime('%Y-%m')
+
+
+def encode_block(field_id: str, month: str, readings: Sequence[Dict[str, Any]]) -> bytes:
+    """Gorilla-compress readings (any order) into one archive block"""
+    readings = sorted(readings, key=lambda r: to_epoch_seconds(r.get('timestamp')))
+    timestamps = [int(round(to_epoch_seconds(r.get('timestamp')) * 1000)) for r in readings]
+    streams: List[Tuple[str, bytes]] = [('timestamp', encode_timestamps(timestamps))]
+    for channel in ARCHIVE_CHANNELS:
+        values = [r.get(channel) for r in readings]
+        if all(v is None for v in values):
+            continue
+        streams.append((channel, encode_floats([
+            float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+            for v in values])))
+
+    devices: List[List[Any]] = []
+    for i, reading in enumerate(readings):
+        device_id = reading.get('device_id')
+        if not devices or devices[-1][1] != device_id:
+            devices.append([i, device_id])
+    header = {
+        'field_id': field_id,
+        'month': month,
+        'count': len(readings),
+        'streams': [[name, len(data)] for name, data in streams],
+        'devices': devices,
+        'flags': {str(i): r['quality_flags'] for i, r in enumerate(readings) if r.get('quality_flags')},
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return b''.join([BLOCK_MAGIC, struct.pack('>I', len(header_bytes)), header_bytes,
+                     *(data for _, data in streams)])
+
+
+def decode_block(data: bytes) -> List[Dict[str, Any]]:
+    """Readings of an archive block, oldest first"""
+    if data[:4] != BLOCK_MAGIC:
+        raise ValueError('Not a sensor archive block')
+    (header_length,) = struct.unpack('>I', data[4:8])
+    header = json.loads(data[8:8 + header_length])
+    count = header['count']
+
+    offset = 8 + header_length
+    columns: Dict[str, Any] = {}
+    for name, length in header['streams']:
+        chunk = data[offset:offset + length]
+        offset += length
+        columns[name] = decode_timestamps(chunk, count) if name == 'timestamp' else decode_floats(chunk, count)
+
+    device_starts = [start for start, _ in header['devices']]
+    device_ids = [device_id for _, device_id in header['devices']]
+    flags = header.get('flags', {})
+
+    readings = []
+    for i, ts_ms in enumerate(columns['timestamp']):
+        reading: Dict[str, Any] = {
+            'field_id': header['field_id'],
+            'device_id': device_ids[int(np.searchsorted(device_starts, i, side='right')) - 1],
+            'timestamp': datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc),
+            'timestamp_ms': ts_ms,
+            'archived': True,
+        }
+        for channel in ARCHIVE_CHANNELS:
+            if channel in columns:
+                value = float(columns[channel][i])
+                reading[channel] = None if np.isnan(value) else value
+        if str(i) in flags:
+            reading['quality_flags'] = flags[str(i)]
+            reading['quality'] = 'suspect'
+        readings.append(reading)
+    return readings
+
+
+def _reading_key(reading: Dict[str, Any]) -> Tuple[Any, ...]:
+    # Identity used to drop duplicates when a crashed run is retried
+    return (round(to_epoch_seconds(reading.get('timestamp')) * 1000), reading.get('device_id'),
+            *(reading.get(channel) for channel in ARCHIVE_CHANNELS))
+
+
+def archive_readings(
+    cutoff: datetime,
+    field_ids: Optional[Sequence[str]] = None,
+    page_size: int = 1000,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    Move readings older than ``cutoff`` from Firestore into archive blocks
+
+    Readings are streamed oldest first and archived one month at a time, so
+    at most one month of a field is held in memory. Blocks of months that
+    were archived before are decoded, merged with the new readings and
+    rewritten. A month's Firestore documents are only deleted after its
+    block is written and indexed, so an interrupted run can be repeated.
+
+    Args:
+        cutoff: Archive readings with ``timestamp < cutoff``
+        field_ids: Fields to archive (default: every document in ``fields``)
+        page_size: Raw readings fetched per query page
+        dry_run: Count what would be archived without writing or deleting
+
+    Returns:
+        Number of readings archived per field
+    """
+    if field_ids is None:
+        field_ids = [f['id'] for f in db.query_collection('fields')]
+    cutoff_ms = int(round(to_epoch_seconds(cutoff) * 1000))
+    store = get_archive_store()
+
+    archived: Dict[str, int] = {}
+    for field_id in field_ids:
+        count = months = 0
+        old_readings = stream_readings(
+            field_id, [('timestamp_ms', '<', cutoff_ms)], page_size, order_by='timestamp_ms')
+        for month, group in groupby(old_readings, key=lambda r: _month(r['timestamp_ms'] / 1000.0)):
+            readings = list(group)
+            count += len(readings)
+            months += 1
+            if not dry_run:
+                _archive_month(store, field_id, month, readings, min(_month_end(month), _as_utc(cutoff)))
+        archived[field_id] = count
+        if months and not dry_run:
+            logger.info(f'Archived {count} readings of field {field_id} '
+                        f'in {months} monthly block(s)')
+    return archived
+
+
+def _archive_month(store: Any, field_id: str, month: str,
+                   readings: List[Dict[str, Any]], until: datetime) -> None:
+    """Write one month's block, index it up to ``until`` and delete its documents"""
+    name = _block_name(field_id, month)
+    ids = [r['id'] for r in readings]
+    existing = store.get(name)
+    if existing:
+        merged = {_reading_key(r): r for r in decode_block(existing)}
+        merged.update((_reading_key(r), r) for r in readings)
+        readings = list(merged.values())
+    store.put(name, encode_block(field_id, month, readings))
+
+    # The month's count is the block's size, so re-archiving a month (a
+    # retried run) overwrites it instead of adding to it
+    index = db.get_document(ARCHIVE_INDEX_COLLECTION, field_id) or {}
+    previous = index.get('archived_until')
+    db.set_documents(ARCHIVE_INDEX_COLLECTION, {field_id: {
+        'field_id': field_id,
+        'months': {month: len(readings)},
+        'archived_until': max(until, _as_utc(previous)) if previous else until,
+        'updated_at': firestore.SERVER_TIMESTAMP,
+    }}, merge=True)
+
+    delete_readings(field_id, ids)
+
+
+def _month_end(month: str) -> datetime:
+    """Start of the month after ``month`` (YYYY-MM)"""
+    year, number = map(int, month.split('-'))
+    return datetime(year + number // 12, number % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def archived_until(field_id: str) -> Optional[datetime]:
+    """Cutoff below which the field's readings live in the archive (None if never archived)"""
+    index = db.get_document(ARCHIVE_INDEX_COLLECTION, field_id)
+    return _as_utc(index['archived_until']) if index and index.get('archived_until') else None
+
+
+def iter_archived(
+    field_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Archived readings with ``start <= timestamp < end``, oldest first, one block at a time"""
+    index = db.get_document(ARCHIVE_INDEX_COLLECTION, field_id)
+    if not index or not index.get('months'):
+        return
+    lower = to_epoch_seconds(start) if start is not None else -np.inf
+    upper = to_epoch_seconds(end) if end is not None else np.inf
+    first = _month(lower) if start is not None else ''
+    last = _month(upper) if end is not None else '9999-12'
+
+    store = get_archive_store()
+    for month in sorted(index['months']):
+        if not first <= month <= last:
+            continue
+        data = store.get(_block_name(field_id, month))
+        if not data:
+            logger.warning(f'Archive block missing: {_block_name(field_id, month)}')
+            continue
+        for reading in decode_block(data):
+            if lower <= to_epoch_seconds(reading['timestamp']) < upper:
+                yield reading
+
+
+def iter_all_archived(start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """Archived readings of every archived field in a window, field by field, one block at a time"""
+    for index in db.stream_collection(ARCHIVE_INDEX_COLLECTION):
+        yield from iter_archived(index['id'], start, end)
+
+
+def read_archived(field_id: str, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Archived readings in a window, oldest first (empty when the window is not archived)"""
+    cutoff = archived_until(field_id)
+    if cutoff is None or (start is not None and to_epoch_seconds(start) >= to_epoch_seconds(cutoff)):
+        return []
+    return list(iter_archived(field_id, start, end))
+
+
+def _as_utc(value: Any) -> datetime:
+    return datetime.fromtimestamp(to_epoch_seconds(value), tz=timezone.utc)
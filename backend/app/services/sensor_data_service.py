@@ -2,13 +2,30 @@
 from __future__ import annotations
 
 import logging
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+from app.core.config import Config
 from app.core.database import db
+from app.services.alert_engine import get_alert_engine
+from app.services.anomaly_detector import get_anomaly_detector
+from app.services.hot_window_store import get_hot_window_store
+from app.services.notification_service import create_alert, resolve_alert
+from app.services.reading_store import query_readings, write_readings
+from app.services.sensor_archive import read_archived
+from app.services.sensor_query import bump_data_version
+from app.services.sensor_rollups import CHANNELS, choose_resolution, rollup_series, update_rollups
+from app.utils.downsampling import downsample_readings
+from app.utils.helpers import normalize_timestamp, to_epoch_seconds
 
 logger = logging.getLogger(__name__)
 
+# Device timestamps outside [_EARLIEST_DEVICE_TIME, now + _MAX_CLOCK_SKEW] are
+# treated as a missing clock (e.g. millis() since boot)
+_EARLIEST_DEVICE_TIME = datetime(2000, 1, 1, tzinfo=timezone.utc)
+_MAX_CLOCK_SKEW = timedelta(minutes=5)
+
 
 def get_latest_sensor_data(
     field_id: str, user_id: str) -> Optional[Dict[str, Any]]:
@@ -30,47 +47,58 @@ def get_latest_sensor_data(
             logger.warning(f'Unauthorized access to field {field_id} by user {user_id}')
             return None
 
-        # ⭐ FIX: Query WITHOUT order_by to avoid index
-        readings = db.query_collection_no_order(
-            'sensor_readings',
-            filters=[('field_id', '==', field_id)],
-            limit=10  # Fetch 10 docs, will sort in Python
+        if Config.HOT_WINDOW_ENABLED:
+            latest = get_hot_window_store().latest(field_id)
+            if latest is not None:
+                return _format_latest(field_id, latest)
+
+        # Newest by the normalised epoch-ms field
+        readings = query_readings(
+            field_id,
+            order_by=[('timestamp_ms', 'DESCENDING')],
+            limit=1
         )
 
         if not readings:
             logger.info(f'No sensor readings found for field {field_id}')
             return None
 
-        # ⭐ FIX: Sort by timestamp in Python (not Firestore)
-        latest = sorted(
-            readings,
-            key=lambda x: x.get('timestamp', datetime.utcnow()),
-            reverse=True
-        )[0]
-
-        # Format response
-        return {
-            'field_id': field_id,
-            'ph': latest.get('ph'),
-            'nitrogen': latest.get('nitrogen'),
-            'phosphorus': latest.get('phosphorus'),
-            'potassium': latest.get('potassium'),
-            'moisture': latest.get('moisture'),
-            'temperature': latest.get('temperature'),
-            'humidity': latest.get('humidity'),
-            'timestamp': latest.get('timestamp'),
-        }
+        return _format_latest(field_id, readings[0])
 
     except Exception as e:  # pylint: disable=broad-except
         logger.error(f'Error fetching latest sensor data: {str(e)}')
         raise
 
 
+def _format_latest(field_id: str, latest: Dict[str, Any]) -> Dict[str, Any]:
+    """Format the latest reading response"""
+    return {
+        'field_id': field_id,
+        'ph': latest.get('ph'),
+        'nitrogen': latest.get('nitrogen'),
+        'phosphorus': latest.get('phosphorus'),
+        'potassium': latest.get('potassium'),
+        'moisture': latest.get('moisture'),
+        'temperature': latest.get('temperature'),
+        'humidity': latest.get('humidity'),
+        'timestamp': _iso_timestamp(latest.get('timestamp')),
+    }
+
+
 def get_sensor_history(field_id: str, user_id: str,
-                       duration: str = '7d') -> List[Dict[str, Any]]:
+                       duration: str = '7d',
+                       resolution: str = 'raw',
+                       max_points: Optional[int] = None) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """
     Get historical sensor readings for a field
     ⭐ FIXED: Handles STRING timestamps from Firestore
+
+    ``resolution`` is 'raw' (default), 'hour', 'day' or 'auto' (coarsest
+    rollup that still gives ``Config.ROLLUP_MIN_POINTS`` points). Falls back
+    to raw readings when the rollups do not cover the whole window.
+
+    With ``max_points`` the result is a columnar series per channel reduced
+    with LTTB instead of a list of readings.
     """
     try:
         # Verify field belongs to user
@@ -84,77 +112,52 @@ def get_sensor_history(field_id: str, user_id: str,
         days = _parse_duration(duration)
         start_date = datetime.utcnow() - timedelta(days=days)
 
+        if resolution == 'auto':
+            resolution = choose_resolution(days * 86400)
+        if resolution != 'raw':
+            points = rollup_series(field_id, resolution, start_date)
+            if points:
+                logger.info(f'📊 Returning {len(points)} {resolution} rollup points')
+                return downsample_readings(points, CHANNELS, max_points) if max_points else points
+
         logger.info(f'📅 Fetching readings since: {start_date.isoformat()}')
 
-        # ⭐ FIX: Query WITHOUT timestamp filter (no order_by)
-        readings = db.query_collection_no_order(
-            'sensor_readings',
-            filters=[('field_id', '==', field_id)],
-            limit=50  # Fetch up to 50 docs
+        limit = Config.SENSOR_CACHE_LIMIT
+        hot_store = get_hot_window_store() if Config.HOT_WINDOW_ENABLED else None
+        if hot_store is not None and hot_store.covers(field_id, start_date):
+            recent = hot_store.readings(field_id, start_date)[:limit]
+            logger.info(f'📊 Serving {len(recent)} readings from the hot window')
+            results = _format_history(field_id, recent)
+            if max_points:
+                return downsample_readings(results, CHANNELS, max_points)
+            return results
+
+        # Date filtering happens in the query on the normalised epoch-ms
+        # field, newest first, capped at the raw page size
+        sorted_readings = query_readings(
+            field_id,
+            filters=[('timestamp_ms', '>=', int(round(to_epoch_seconds(start_date) * 1000)))],
+            order_by=[('timestamp_ms', 'DESCENDING')],
+            limit=limit
         )
 
-        logger.info(f'📊 Retrieved {len(readings)} total documents')
-
-        # ⭐ CRITICAL FIX: Handle STRING timestamps from Firestore
-        filtered_readings = []
-        for reading in readings:
-            timestamp_str = reading.get('timestamp')
-
-            try:
-                # ⭐ CONVERT STRING to datetime
-                if isinstance(timestamp_str, str):
-                    # Parse ISO format string
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                elif isinstance(timestamp_str, datetime):
-                    timestamp = timestamp_str
-                else:
-                    logger.warning(f'Unknown timestamp format: {type(timestamp_str)}')
-                    continue
-
-                # ⭐ NOW check if within date range
-                if timestamp >= start_date:
-                    filtered_readings.append(reading)
-                    logger.debug(f'✅ Included: {reading.get("id")} - {timestamp.isoformat()}')
-                else:
-                    logger.debug(f'⏭️ Skipped (too old): {reading.get("id")} - {timestamp.isoformat()}')
-
-            except Exception as parse_err:
-                logger.warning(f'⚠️ Failed to parse timestamp: {timestamp_str} - {str(parse_err)}')
-                continue
-
-        logger.info(f'📊 Found {len(filtered_readings)} readings after date filtering')
-
-        # ⭐ FIX: Sort by timestamp in Python
-        sorted_readings = sorted(
-            filtered_readings,
-            key=lambda x: x.get('timestamp', ''),
-            reverse=True
-        )
+        logger.info(f'📊 Found {len(sorted_readings)} readings since {start_date.isoformat()}')
+
+        # Readings older than the archive cutoff live in Cloud Storage; they
+        # are all older than the live ones, so they go last (newest first)
+        # and only fill what the live page left of the limit
+        remaining = limit - len(sorted_readings)
+        archived = read_archived(field_id, start_date) if remaining > 0 else []
+        if archived:
+            archived = archived[::-1][:remaining]
+            logger.info(f'📦 Adding {len(archived)} archived readings')
+            sorted_readings.extend(archived)
 
-        # ⭐ CRITICAL FIX: Format each document properly
-        results = []
-        for doc in sorted_readings:
-            try:
-                formatted_doc = {
-                    'id': doc.get('id', ''),
-                    'field_id': doc.get('field_id', field_id),
-                    'timestamp': doc.get('timestamp', ''),
-                    'ph': float(doc.get('ph', 0)),
-                    'nitrogen': float(doc.get('nitrogen', 0)),
-                    'phosphorus': float(doc.get('phosphorus', 0)),
-                    'potassium': float(doc.get('potassium', 0)),
-                    'moisture': float(doc.get('moisture', 0)),
-                    'temperature': float(doc.get('temperature', 0)),
-                    'ec': float(doc.get('ec', 0)),
-                }
-                results.append(formatted_doc)
-                logger.debug(f'✅ Formatted: {formatted_doc["id"]}')
-
-            except (ValueError, KeyError, TypeError) as e:
-                logger.warning(f'⚠️ Skipping malformed doc: {str(e)}')
-                continue
+        results = _format_history(field_id, sorted_readings)
 
         logger.info(f'✅ Returning {len(results)} formatted readings')
+        if max_points:
+            return downsample_readings(results, CHANNELS, max_points)
         return results
 
     except Exception as e:  # pylint: disable=broad-except
@@ -164,6 +167,45 @@ def get_sensor_history(field_id: str, user_id: str,
 
 
 
+HISTORY_CHANNELS = ('ph', 'nitrogen', 'phosphorus', 'potassium', 'moisture', 'temperature', 'ec')
+
+
+def _format_history(field_id: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Format stored documents and hot-window readings alike
+
+    Missing, empty (None / NaN) and quality-flagged channels are reported as
+    0.0, the same for both sources (the hot window holds flagged channels as NaN).
+    """
+    results = []
+    for doc in docs:
+        try:
+            flags = doc.get('quality_flags') or ()
+            formatted_doc = {
+                'id': doc.get('id', ''),
+                'field_id': doc.get('field_id', field_id),
+                'timestamp': _iso_timestamp(doc.get('timestamp', '')),
+            }
+            for channel in HISTORY_CHANNELS:
+                value = None if channel in flags else doc.get(channel)
+                value = 0.0 if value is None else float(value)
+                formatted_doc[channel] = 0.0 if math.isnan(value) else value
+            results.append(formatted_doc)
+            logger.debug(f'✅ Formatted: {formatted_doc["id"]}')
+
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f'⚠️ Skipping malformed doc: {str(e)}')
+            continue
+    return results
+
+
+def _iso_timestamp(value: Any) -> Any:
+    """Stored timestamps as ISO strings (datetimes are UTC); legacy strings pass through"""
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+    return value
+
+
 def store_sensor_reading(field_id: str, sensor_type: str,
                          data: Dict[str, Any]) -> str:
     """
@@ -179,26 +221,22 @@ def store_sensor_reading(field_id: str, sensor_type: str,
     """
     try:
         _ = sensor_type  # reserved for contextual processing
-        reading_data = {
-            'field_id': field_id,
-            'device_id': data.get('device_id'),
-            'ph': data.get('ph'),
-            'nitrogen': data.get('nitrogen'),
-            'phosphorus': data.get('phosphorus'),
-            'potassium': data.get('potassium'),
-            'moisture': data.get('moisture'),
-            'temperature': data.get('temperature'),
-            'humidity': data.get('humidity'),
-            'timestamp': datetime.utcnow()
-        }
+        reading_data = _build_reading(field_id, data)
+        health = _inspect_quality(field_id, [reading_data])
 
         # Store in Firestore
-        reading_id = db.create_document('sensor_readings', reading_data)
+        reading_id = write_readings(field_id, [reading_data])[0]
+        if Config.HOT_WINDOW_ENABLED:
+            get_hot_window_store().append(field_id, [reading_data], [reading_id])
 
         logger.info(f'Stored sensor reading {reading_id} for field {field_id}')
 
+        update_rollups(field_id, [reading_data])
+        bump_data_version(field_id)
+
         # Check for critical alerts
-        _check_sensor_alerts(field_id, reading_data)
+        _check_sensor_alerts(field_id, [reading_data])
+        _raise_device_health_alerts(field_id, health)
 
         return reading_id
 
@@ -207,6 +245,86 @@ def store_sensor_reading(field_id: str, sensor_type: str,
         raise
 
 
+def store_sensor_readings(field_id: str, sensor_type: str,
+                          payloads: List[Dict[str, Any]]) -> List[str]:
+    """
+    Store a batch of sensor readings for one field
+
+    Uses one batched write and evaluates alert rules over the whole batch
+    in a single pass.
+
+    Args:
+        field_id: Field ID
+        sensor_type: Type of sensor
+        payloads: Sensor data payloads
+
+    Returns:
+        Reading IDs
+    """
+    try:
+        _ = sensor_type  # reserved for contextual processing
+        readings = [_build_reading(field_id, data) for data in payloads]
+        if not readings:
+            return []
+        health = _inspect_quality(field_id, readings)
+
+        reading_ids = write_readings(field_id, readings)
+        if Config.HOT_WINDOW_ENABLED:
+            get_hot_window_store().append(field_id, readings, reading_ids)
+
+        logger.info(f'Stored {len(reading_ids)} sensor readings for field {field_id}')
+
+        update_rollups(field_id, readings)
+        bump_data_version(field_id)
+        _check_sensor_alerts(field_id, readings)
+        _raise_device_health_alerts(field_id, health)
+
+        return reading_ids
+
+    except Exception as e:  # pylint: disable=broad-except
+        logger.error(f'Error storing sensor readings: {str(e)}')
+        raise
+
+
+def _build_reading(field_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map an IoT payload to the sensor_readings document schema
+
+    ``timestamp`` is always an aware UTC datetime (a Firestore Timestamp) and
+    ``timestamp_ms`` the same instant in epoch milliseconds, used for range
+    queries and ordering. It is the device's ``timestamp`` when the payload
+    has a plausible one, else the time the ingestion pipeline received it
+    (``received_at``, epoch seconds), else now; rate-of-change rules and
+    history rely on it being the measurement time, not the store time.
+    """
+    timestamp, timestamp_ms = _reading_time(data)
+    return {
+        'field_id': field_id,
+        'device_id': data.get('device_id'),
+        'ph': data.get('ph'),
+        'nitrogen': data.get('nitrogen'),
+        'phosphorus': data.get('phosphorus'),
+        'potassium': data.get('potassium'),
+        'moisture': data.get('moisture'),
+        'temperature': data.get('temperature'),
+        'humidity': data.get('humidity'),
+        'timestamp': timestamp,
+        'timestamp_ms': timestamp_ms,
+    }
+
+
+def _reading_time(data: Dict[str, Any]) -> Tuple[datetime, int]:
+    """Measurement time of a payload (see ``_build_reading``)"""
+    now = datetime.now(timezone.utc)
+    device_time = normalize_timestamp(data.get('timestamp'))
+    if device_time is not None and _EARLIEST_DEVICE_TIME <= device_time[0] <= now + _MAX_CLOCK_SKEW:
+        return device_time
+    received_at = data.get('received_at')
+    if isinstance(received_at, (int, float)) and not isinstance(received_at, bool):
+        return normalize_timestamp(received_at * 1000.0)
+    return normalize_timestamp(now)
+
+
 def _parse_duration(duration: str) -> int:
     """Parse duration string to days"""
     duration = duration.lower()
@@ -220,51 +338,86 @@ def _parse_duration(duration: str) -> int:
     return 7  # Default 7 days
 
 
-def _check_sensor_alerts(field_id: str, reading: Dict[str, Any]) -> None:
-    """Check sensor readings for critical conditions"""
+def _load_open_alerts(field_id: str) -> Dict[str, str]:
+    """Open rule alerts for a field, so a restart does not re-fire them"""
+    alerts = db.query_collection(
+        'alerts',
+        filters=[('field_id', '==', field_id), ('status', '==', 'active')]
+    )
+    return {a['rule_id']: a['id'] for a in alerts if a.get('rule_id')}
+
+
+def is_alert_relevant(field_id: str, payload: Dict[str, Any]) -> bool:
+    """Whether a reading should take the ingestion priority lane"""
+    return get_alert_engine(state_loader=_load_open_alerts).is_alert_relevant(field_id, payload)
+
+
+def _inspect_quality(field_id: str, readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Tag readings with quality flags; returns device-health transitions"""
+    if not Config.ANOMALY_DETECTION_ENABLED:
+        return []
+    try:
+        return get_anomaly_detector().inspect(field_id, readings)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.error(f'Error inspecting sensor data quality: {str(e)}')
+        return []
+
+
+def _raise_device_health_alerts(field_id: str, transitions: List[Dict[str, Any]]) -> None:
+    """Persist stuck / out-of-range probe faults as device-health alerts"""
+    detector = get_anomaly_detector()
+    for transition in transitions:
+        try:
+            channel = transition['channel']
+            if transition['state'] == 'firing':
+                fault = 'stuck' if transition['fault'] == 'stuck' else 'out of range'
+                alert_id = create_alert(
+                    field_id,
+                    alert_type='device_health',
+                    parameter=channel,
+                    message=f'{channel} sensor {fault} (value {transition["value"]:.2f}); check the probe',
+                    severity='warning',
+                    extra={
+                        'fault': transition['fault'],
+                        'device_id': transition['device_id'],
+                        'value': transition['value'],
+                        'status': 'active',
+                        'resolved_at': None
+                    }
+                )
+                detector.bind_alert(field_id, channel, alert_id)
+                logger.warning(f'Device health alert for field {field_id}: {channel} {fault}')
+            elif transition['alert_id']:
+                resolve_alert(transition['alert_id'])
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f'Error raising device health alert: {str(e)}')
+
+
+def _check_sensor_alerts(field_id: str, readings: List[Dict[str, Any]]) -> None:
+    """Evaluate alert rules and persist only state transitions"""
     try:
-        from app.core.config import Config
-
-        alerts = []
-
-        # pH alerts
-        if reading.get('ph'):
-            if reading['ph'] < Config.CHILLI_PH_MIN - 0.5:
-                alerts.append({
-                    'type': 'critical',
-                    'parameter': 'pH',
-                    'message': f'pH critically low: {reading["ph"]:.1f}'
-                })
-            elif reading['ph'] > Config.CHILLI_PH_MAX + 0.5:
-                alerts.append({
-                    'type': 'critical',
-                    'parameter': 'pH',
-                    'message': f'pH critically high: {reading["ph"]:.1f}'
-                })
-
-        # Moisture alerts
-        if reading.get('moisture'):
-            if reading['moisture'] < Config.CHILLI_MOISTURE_MIN - 10:
-                alerts.append({
-                    'type': 'critical',
-                    'parameter': 'moisture',
-                    'message': f'Soil moisture critically low: {reading["moisture"]:.1f}%'
-                })
-
-        # Store alerts if any
-        if alerts:
-            for alert in alerts:
-                db.create_document('alerts', {
-                    'field_id': field_id,
-                    'alert_type': alert['type'],
-                    'parameter': alert['parameter'],
-                    'message': alert['message'],
-                    'timestamp': datetime.utcnow(),
-                    'acknowledged': False
-                })
-                logger.warning(
-                    f'Alert created for field {field_id}: {
-                        alert["message"]}')
+        engine = get_alert_engine(state_loader=_load_open_alerts)
+
+        for transition in engine.evaluate(field_id, readings):
+            if transition['state'] == 'firing':
+                alert_id = create_alert(
+                    field_id,
+                    alert_type='sensor',
+                    parameter=transition['parameter'],
+                    message=transition['message'],
+                    severity=transition['severity'],
+                    extra={
+                        'rule_id': transition['rule_id'],
+                        'value': transition['value'],
+                        'status': 'active',
+                        'resolved_at': None
+                    }
+                )
+                engine.bind_alert(field_id, transition['rule_id'], alert_id)
+                logger.warning(f'Alert created for field {field_id}: {transition["message"]}')
+            elif transition['alert_id']:
+                resolve_alert(transition['alert_id'], transition['timestamp'])
+                logger.info(f'Alert {transition["alert_id"]} resolved for field {field_id}')
 
     except Exception as e:  # pylint: disable=broad-except
         logger.error(f'Error checking sensor alerts: {str(e)}')
@@ -0,0 +1,176 @@
+"""Resumable bulk migrations of ``sensor_readings``
+
+Each migration walks the collection in document-ID order and records its
+cursor in ``migrations/{name}`` after every page, so an interrupted run
+resumes where it stopped. Rewrites are idempotent, so re-running over
+already migrated documents is safe.
+"""
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from google.cloud import firestore  # type: ignore[import-untyped]
+
+from app.core.database import db
+from app.services.reading_store import FLAT_COLLECTION, field_readings_path
+from app.utils.helpers import normalize_timestamp
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = 'migrations'
+TIMESTAMP_MIGRATION = 'sensor_reading_timestamps'
+LAYOUT_MIGRATION = 'sensor_readings_field_layout'
+
+
+def _is_canonical(reading: Dict[str, Any], timestamp_ms: int) -> bool:
+    timestamp = reading.get('timestamp')
+    return isinstance(timestamp, datetime) and timestamp.tzinfo is not None \
+        and reading.get('timestamp_ms') == timestamp_ms
+
+
+def migrate_reading_timestamps(
+    page_size: int = 500,
+    limit: Optional[int] = None,
+    dry_run: bool = False,
+    restart: bool = False,
+) -> Dict[str, Any]:
+    """
+    Rewrite ``timestamp`` as an aware UTC datetime and add ``timestamp_ms``
+
+    Legacy documents store ISO strings or naive datetimes; after the
+    migration every reading can be range-filtered and ordered server-side on
+    ``timestamp_ms``. Runs on the flat ``sensor_readings`` collection;
+    :func:`copy_readings_to_fields` normalises while copying.
+
+    Args:
+        page_size: Documents read and written per batch (max 500)
+        limit: Stop after this many documents (the checkpoint allows resuming)
+        dry_run: Count without writing documents or the checkpoint
+        restart: Ignore the stored checkpoint and start from the first document
+
+    Returns:
+        Counts of scanned / updated / already canonical / unparseable documents,
+        the last document ID and whether the collection was exhausted
+    """
+    checkpoint = None if restart else db.get_document(MIGRATIONS_COLLECTION, TIMESTAMP_MIGRATION)
+    cursor = (checkpoint or {}).get('last_id')
+    stats: Dict[str, Any] = {'scanned': 0, 'updated': 0, 'canonical': 0, 'invalid': 0,
+                             'last_id': cursor, 'complete': False}
+    if checkpoint and checkpoint.get('complete'):
+        stats['complete'] = True
+        return stats
+
+    updates: Dict[str, Dict[str, Any]] = {}
+
+    def _flush() -> None:
+        if not dry_run:
+            if updates:
+                db.set_documents(FLAT_COLLECTION, updates, merge=True)
+            db.set_documents(MIGRATIONS_COLLECTION, {TIMESTAMP_MIGRATION: {
+                'last_id': stats['last_id'],
+                'complete': stats['complete'],
+                'updated': firestore.Increment(len(updates)),
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            }}, merge=True)
+        updates.clear()
+
+    exhausted = True
+    for reading in db.stream_collection(FLAT_COLLECTION, page_size=page_size, start_after=cursor):
+        if limit is not None and stats['scanned'] >= limit:
+            exhausted = False
+            break
+        stats['scanned'] += 1
+        stats['last_id'] = reading['id']
+        normalized = normalize_timestamp(reading.get('timestamp'))
+        if normalized is None:
+            stats['invalid'] += 1
+            logger.warning(f'Unparseable timestamp in sensor_readings/{reading["id"]}: '
+                           f'{reading.get("timestamp")!r}')
+        elif _is_canonical(reading, normalized[1]):
+            stats['canonical'] += 1
+        else:
+            updates[reading['id']] = {'timestamp': normalized[0], 'timestamp_ms': normalized[1]}
+            stats['updated'] += 1
+        if stats['scanned'] % page_size == 0:
+            _flush()
+
+    stats['complete'] = exhausted
+    _flush()
+    logger.info(f'Timestamp migration: {stats}')
+    return stats
+
+
+def copy_readings_to_fields(
+    page_size: int = 500,
+    limit: Optional[int] = None,
+    dry_run: bool = False,
+    restart: bool = False,
+) -> Dict[str, Any]:
+    """
+    Copy ``sensor_readings`` into ``fields/{field_id}/readings`` (same IDs)
+
+    Run with ``READINGS_LAYOUT=dual`` so readings ingested during the copy
+    land in both layouts; copies are idempotent ``set`` writes, so overlap
+    with dual writes is harmless. Timestamps are normalised on the way.
+
+    Args:
+        page_size: Documents read per page (writes are batched per field)
+        limit: Stop after this many documents (the checkpoint allows resuming)
+        dry_run: Count without writing documents or the checkpoint
+        restart: Ignore the stored checkpoint and start from the first document
+
+    Returns:
+        Counts of scanned / copied / skipped (no ``field_id``) documents, the
+        last document ID and whether the collection was exhausted
+    """
+    checkpoint = None if restart else db.get_document(MIGRATIONS_COLLECTION, LAYOUT_MIGRATION)
+    cursor = (checkpoint or {}).get('last_id')
+    stats: Dict[str, Any] = {'scanned': 0, 'copied': 0, 'skipped': 0, 'fields': 0,
+                             'last_id': cursor, 'complete': False}
+    if checkpoint and checkpoint.get('complete'):
+        stats['complete'] = True
+        return stats
+
+    pending: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+    fields = set()
+
+    def _flush() -> None:
+        if not dry_run:
+            for field_id, documents in pending.items():
+                db.set_documents(field_readings_path(field_id), documents)
+            db.set_documents(MIGRATIONS_COLLECTION, {LAYOUT_MIGRATION: {
+                'last_id': stats['last_id'],
+                'complete': stats['complete'],
+                'copied': firestore.Increment(sum(len(d) for d in pending.values())),
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            }}, merge=True)
+        pending.clear()
+
+    exhausted = True
+    for reading in db.stream_collection(FLAT_COLLECTION, page_size=page_size, start_after=cursor):
+        if limit is not None and stats['scanned'] >= limit:
+            exhausted = False
+            break
+        stats['scanned'] += 1
+        stats['last_id'] = reading_id = reading.pop('id')
+        field_id = reading.get('field_id')
+        if not isinstance(field_id, str) or not field_id:
+            stats['skipped'] += 1
+        else:
+            normalized = normalize_timestamp(reading.get('timestamp'))
+            if normalized is not None:
+                reading['timestamp'], reading['timestamp_ms'] = normalized
+            pending[field_id][reading_id] = reading
+            fields.add(field_id)
+            stats['copied'] += 1
+        if stats['scanned'] % page_size == 0:
+            _flush()
+
+    stats['complete'] = exhausted
+    stats['fields'] = len(fields)
+    _flush()
+    logger.info(f'Readings layout copy: {stats}')
+    return stats
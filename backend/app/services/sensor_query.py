@@ -0,0 +1,394 @@
+"""Ad-hoc time-series queries with bucketed aggregation
+
+One engine for charts and summaries: a window of readings is loaded as
+columns and aggregated per bucket with vectorised NumPy: readings are
+time-ordered, so each bucket is a contiguous group and order statistics
+come from one sort plus group offsets.
+
+The window is read from the cheapest source that can answer it exactly:
+
+- ``rollups``: hourly/daily rollup buckets, when the bucket width and the
+  window edges are whole hours and every aggregation is derivable from the
+  rollup statistics
+- ``hot_window``: the in-memory store, when it covers the window start
+- ``readings``: raw ``sensor_readings`` streamed from Firestore plus any
+  archived range
+
+Results are cached (LRU + TTL) under the query and the field's data
+version, which ingestion bumps after every write.
+"""
+from __future__ import annotations
+
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import Config
+from app.services.hot_window_store import get_hot_window_store
+from app.services.reading_store import stream_readings
+from app.services.sensor_archive import archived_until, iter_archived
+from app.services.sensor_rollups import CHANNELS, RESOLUTIONS, get_rollups, reading_columns
+from app.utils.helpers import to_epoch_seconds
+
+AGGREGATIONS = ('count', 'sum', 'mean', 'min', 'max', 'std', 'first', 'last')
+# Aggregations that can be rebuilt exactly from rollup bucket statistics
+ROLLUP_AGGREGATIONS = frozenset(('count', 'sum', 'mean', 'min', 'max', 'std', 'last'))
+_PERCENTILE = re.compile(r'^p(\d{1,2}(?:\.\d+)?|100)$')
+_BUCKET = re.compile(r'^(\d+)([smhd])$')
+_UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Readings converted to columns at a time when loading a raw window
+RAW_PAGE_SIZE = 1000
+
+
+class QueryError(ValueError):
+    """Invalid query parameters"""
+
+
+def parse_bucket(value: str) -> Optional[int]:
+    """'15m' / '1h' / '1d' -> seconds; 'all' -> None (one bucket for the window)"""
+    if value == 'all':
+        return None
+    match = _BUCKET.match(value or '')
+    if not match or int(match.group(1)) <= 0:
+        raise QueryError(f'Invalid bucket: {value} (use e.g. 15m, 1h, 1d or all)')
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+
+
+def parse_aggregations(value: str) -> Tuple[str, ...]:
+    """'mean,min,p90' -> ('mean', 'min', 'p90')"""
+    aggregations = tuple(a.strip() for a in (value or '').split(',') if a.strip())
+    if not aggregations:
+        raise QueryError('At least one aggregation is required')
+    for aggregation in aggregations:
+        if aggregation not in AGGREGATIONS and not _PERCENTILE.match(aggregation):
+            raise QueryError(f'Unknown aggregation: {aggregation}')
+    return aggregations
+
+
+def parse_channels(value: Optional[str]) -> Tuple[str, ...]:
+    if not value:
+        return CHANNELS
+    channels = tuple(c.strip() for c in value.split(',') if c.strip())
+    unknown = [c for c in channels if c not in CHANNELS]
+    if unknown:
+        raise QueryError(f'Unknown channel(s): {", ".join(unknown)}')
+    return channels
+
+
+_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+
+
+def bump_data_version(field_id: str) -> None:
+    """Invalidate cached query results of a field (call after writing readings)"""
+    with _versions_lock:
+        _versions[field_id] = _versions.get(field_id, 0) + 1
+
+
+def data_version(field_id: str) -> int:
+    with _versions_lock:
+        return _versions.get(field_id, 0)
+
+
+class QueryCache:
+    """Thread-safe LRU of query results with a time-to-live"""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 60.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[Tuple[Any, ...], Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[Any, ...], value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache: Optional[QueryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache:
+    """Lazily create the process-wide query result cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryCache(Config.QUERY_CACHE_MAX_ENTRIES, Config.QUERY_CACHE_TTL_SECONDS)
+    return _cache
+
+
+def _groups(bucket_index: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Distinct buckets of a sorted index array with each group's start and end offsets"""
+    if not bucket_index.size:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    starts = np.flatnonzero(np.r_[True, bucket_index[1:] != bucket_index[:-1]])
+    ends = np.r_[starts[1:], bucket_index.size]
+    return bucket_index[starts], starts, ends
+
+
+def _aggregate_raw(bucket_index: np.ndarray, values: np.ndarray, n_buckets: int,
+                   aggregations: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Aggregations of ``values`` (time-ordered, NaN = missing) per bucket"""
+    valid = ~np.isnan(values)
+    idx = bucket_index[valid]
+    vals = values[valid]
+    present, starts, ends = _groups(idx)
+    counts = np.bincount(idx, minlength=n_buckets).astype(np.float64)
+    sums = np.bincount(idx, weights=vals, minlength=n_buckets)
+
+    result: Dict[str, np.ndarray] = {}
+    need_sorted = any(_PERCENTILE.match(a) for a in aggregations) or 'min' in aggregations \
+        or 'max' in aggregations
+    if need_sorted and vals.size:
+        # Values sorted within each bucket: min/max/percentiles by offset
+        order = np.lexsort((vals, idx))
+        sorted_vals = vals[order]
+    for aggregation in aggregations:
+        out = np.full(n_buckets, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if aggregation == 'count':
+                out = counts.copy()
+            elif aggregation == 'sum':
+                out[present] = sums[present]
+            elif aggregation == 'mean':
+                out = sums / counts
+            elif aggregation == 'std':
+                mean = sums / counts
+                sum_sq = np.bincount(idx, weights=vals * vals, minlength=n_buckets)
+                out = np.sqrt(np.maximum(sum_sq / counts - mean * mean, 0.0))
+            elif not present.size:
+                pass
+            elif aggregation == 'first':
+                out[present] = vals[starts]
+            elif aggregation == 'last':
+                out[present] = vals[ends - 1]
+            elif aggregation == 'min':
+                out[present] = sorted_vals[starts]
+            elif aggregation == 'max':
+                out[present] = sorted_vals[ends - 1]
+            else:
+                q = float(_PERCENTILE.match(aggregation).group(1)) / 100.0
+                # Linear interpolation between the closest ranks (numpy's default)
+                rank = starts + q * (ends - 1 - starts)
+                lower = np.floor(rank).astype(np.int64)
+                upper = np.minimum(lower + 1, ends - 1)
+                frac = rank - lower
+                out[present] = sorted_vals[lower] * (1 - frac) + sorted_vals[upper] * frac
+        result[aggregation] = out
+    return result
+
+
+def _aggregate_rollups(bucket_index: np.ndarray, stats: Dict[str, np.ndarray], n_buckets: int,
+                       aggregations: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Aggregations per query bucket from rollup bucket statistics (time-ordered)"""
+    has = stats['count'] > 0
+    idx = bucket_index[has]
+    counts = np.bincount(idx, weights=stats['count'][has], minlength=n_buckets)
+    sums = np.bincount(idx, weights=stats['sum'][has], minlength=n_buckets)
+    present, starts, ends = _groups(idx)
+
+    result: Dict[str, np.ndarray] = {}
+    for aggregation in aggregations:
+        out = np.full(n_buckets, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if aggregation == 'count':
+                out = counts
+            elif aggregation == 'sum':
+                out[present] = sums[present]
+            elif aggregation == 'mean':
+                out = sums / counts
+            elif aggregation == 'std':
+                sum_sq = np.bincount(idx, weights=stats['sum_sq'][has], minlength=n_buckets)
+                mean = sums / counts
+                out = np.sqrt(np.maximum(sum_sq / counts - mean * mean, 0.0))
+            elif not present.size:
+                pass
+            elif aggregation == 'min':
+                out[present] = np.minimum.reduceat(stats['min'][has], starts)
+            elif aggregation == 'max':
+                out[present] = np.maximum.reduceat(stats['max'][has], starts)
+            elif aggregation == 'last':
+                out[present] = stats['last'][has][ends - 1]
+        result[aggregation] = out
+    return result
+
+
+def _rollup_resolution(lower: float, upper: float, bucket_seconds: Optional[int],
+                       aggregations: Sequence[str]) -> Optional[str]:
+    """Coarsest rollup resolution that answers the query exactly (None if none does)"""
+    if not Config.ROLLUPS_ENABLED or not set(aggregations) <= ROLLUP_AGGREGATIONS:
+        return None
+    for resolution, seconds in RESOLUTIONS:
+        if lower % seconds == 0 and upper % seconds == 0 \
+                and (bucket_seconds is None or bucket_seconds % seconds == 0):
+            return resolution
+    return None
+
+
+def _raw_window(field_id: str, start: datetime, end: datetime,
+                channels: Sequence[str]) -> Tuple[str, np.ndarray, Dict[str, np.ndarray]]:
+    """Time-ordered timestamps and channel columns of raw readings in ``[start, end)``"""
+    hot_store = get_hot_window_store() if Config.HOT_WINDOW_ENABLED else None
+    if hot_store is not None and hot_store.covers(field_id, start):
+        ts, values = hot_store.range(field_id, start, end)
+        return 'hot_window', ts, {c: values[:, CHANNELS.index(c)].astype(np.float64) for c in channels}
+
+    lower, upper = to_epoch_seconds(start), to_epoch_seconds(end)
+    cutoff = archived_until(field_id)
+    archived = iter_archived(field_id, start, end) \
+        if cutoff is not None and lower < to_epoch_seconds(cutoff) else iter(())
+    live = stream_readings(field_id, [
+        ('timestamp_ms', '>=', int(round(lower * 1000))),
+        ('timestamp_ms', '<', int(round(upper * 1000))),
+    ], order_by='timestamp_ms', page_size=RAW_PAGE_SIZE)
+    ts, columns = _accumulate_columns(chain(archived, live), channels)
+    return 'readings', ts, columns
+
+
+def _accumulate_columns(readings: Iterable[Dict[str, Any]],
+                        channels: Sequence[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Time-ordered timestamp and channel columns, converted one page at a time
+
+    Only one page of reading dicts is alive at once; the window itself is
+    held as float arrays of the requested channels.
+    """
+    readings = iter(readings)
+    ts_parts: List[np.ndarray] = []
+    parts: Dict[str, List[np.ndarray]] = {c: [] for c in channels}
+    while True:
+        page = list(islice(readings, RAW_PAGE_SIZE))
+        if not page:
+            break
+        page_ts, page_columns = reading_columns(page)
+        ts_parts.append(page_ts)
+        for channel in channels:
+            parts[channel].append(page_columns[channel])
+    if not ts_parts:
+        return np.empty(0), {c: np.empty(0) for c in channels}
+    ts = np.concatenate(ts_parts)
+    # Archived readings precede live ones and each page is sorted; keep the order exact regardless
+    order = np.argsort(ts, kind='stable')
+    return ts[order], {c: np.concatenate(parts[c])[order] for c in channels}
+
+
+def run_query(
+    field_id: str,
+    start: datetime,
+    end: Optional[datetime] = None,
+    bucket: str = '1h',
+    aggregations: Sequence[str] = ('mean', 'min', 'max'),
+    channels: Optional[Sequence[str]] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Bucketed aggregation of a field's readings over ``[start, end)``
+
+    Args:
+        field_id: Field ID
+        start: Window start
+        end: Window end (default: now)
+        bucket: Bucket width ('15m', '1h', '1d', ...) or 'all' for one bucket;
+            buckets are aligned to the Unix epoch (UTC)
+        aggregations: Any of ``AGGREGATIONS`` and percentiles 'p0'..'p100'
+        channels: Channels to aggregate (default: all)
+        use_cache: Serve from / store in the query cache
+
+    Returns:
+        Columnar result: ``timestamps`` (bucket starts, epoch ms) and
+        ``channels: {channel: {aggregation: [value | None, ...]}}``; buckets
+        without readings are omitted
+    """
+    bucket_seconds = parse_bucket(bucket)
+    aggregations = tuple(aggregations)
+    channels = tuple(channels or CHANNELS)
+    lower = to_epoch_seconds(start)
+    upper = to_epoch_seconds(end) if end is not None else time.time()
+    if upper <= lower:
+        raise QueryError('from must be before to')
+
+    cache = get_query_cache() if use_cache else None
+    key = (field_id, lower, to_epoch_seconds(end) if end is not None else None, bucket,
+           aggregations, channels, data_version(field_id))
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return {**cached, 'cached': True}
+
+    window_start = datetime.fromtimestamp(lower, tz=timezone.utc)
+    window_end = datetime.fromtimestamp(upper, tz=timezone.utc)
+    resolution = _rollup_resolution(lower, upper, bucket_seconds, aggregations)
+    if resolution is not None:
+        source = f'rollups:{resolution}'
+        buckets = get_rollups(field_id, resolution, window_start, window_end)
+        ts = np.array([to_epoch_seconds(b['bucket_start']) for b in buckets], dtype=np.float64)
+    else:
+        source, ts, columns = _raw_window(field_id, window_start, window_end, channels)
+
+    if bucket_seconds is None:
+        bucket_starts = np.zeros(ts.size)
+    else:
+        bucket_starts = np.floor(ts / bucket_seconds) * bucket_seconds
+    starts, inverse = np.unique(bucket_starts, return_inverse=True)
+    if bucket_seconds is None and starts.size:
+        starts = np.array([lower])
+
+    result_channels: Dict[str, Dict[str, List[Optional[float]]]] = {}
+    for channel in channels:
+        if resolution is not None:
+            stats = {name: np.array([
+                b.get('channels', {}).get(channel, {}).get(name, default) for b in buckets], dtype=np.float64)
+                for name, default in (('count', 0), ('sum', 0.0), ('sum_sq', 0.0),
+                                      ('min', math.inf), ('max', -math.inf), ('last', math.nan))}
+            aggregated = _aggregate_rollups(inverse, stats, starts.size, aggregations)
+        else:
+            aggregated = _aggregate_raw(inverse, columns[channel], starts.size, aggregations)
+        result_channels[channel] = {
+            name: [None if math.isnan(v) else float(v) for v in values.tolist()]
+            for name, values in aggregated.items()
+        }
+
+    result = {
+        'field_id': field_id,
+        'from': window_start.isoformat(),
+        'to': window_end.isoformat(),
+        'bucket': bucket,
+        'aggregations': list(aggregations),
+        'source': source,
+        'count': int(starts.size),
+        'timestamps': [int(s * 1000) for s in starts.tolist()],
+        'channels': result_channels,
+        'cached': False,
+    }
+    if cache is not None:
+        cache.put(key, result)
+    return result
@@ -0,0 +1,484 @@
+"""Hourly and daily rollups of sensor readings
+
+Aggregates live in ``sensor_rollups/{field_id}/{resolution}/{bucket}`` where
+``resolution`` is ``hour`` or ``day`` and ``bucket`` is the bucket start in
+epoch seconds (zero padded, so IDs sort chronologically). Each bucket holds,
+per channel, ``count``, ``min``, ``max``, ``sum``, ``sum_sq`` and ``last``;
+mean and standard deviation are derived on read. Daily buckets also carry a
+mergeable quantile sketch per channel (``sketches``, see
+:mod:`app.utils.quantile_sketch`) for percentiles over long windows.
+
+Ingestion updates buckets incrementally with Firestore transforms
+(Increment / Minimum / Maximum), so concurrent writers never lose counts;
+sketch bins are plain counters and use Increment too.
+``backfill_rollups`` recomputes buckets from raw readings.
+
+Range reads filter on the single ``bucket_start`` field of a per-field
+subcollection, so no composite index is required.
+"""
+from __future__ import annotations
+
+import logging
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from google.cloud import firestore  # type: ignore[import-untyped]
+
+from app.core.config import Config
+from app.core.database import db
+from app.services.reading_store import stream_readings
+from app.utils.helpers import to_epoch_seconds
+from app.utils.quantile_sketch import DDSketch
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = 'sensor_rollups'
+CHANNELS = ('ph', 'nitrogen', 'phosphorus', 'potassium', 'moisture', 'temperature', 'humidity')
+# Coarsest first
+RESOLUTIONS: Tuple[Tuple[str, int], ...] = (('day', 86400), ('hour', 3600))
+RESOLUTION_SECONDS = dict(RESOLUTIONS)
+# Resolution whose buckets carry quantile sketches
+SKETCH_RESOLUTION = 'day'
+
+# Aggregates of one resolution: (bucket starts, readings per bucket, {channel: stats arrays})
+Aggregates = Tuple[np.ndarray, np.ndarray, Dict[str, Dict[str, np.ndarray]]]
+
+
+def _collection(field_id: str, resolution: str) -> str:
+    return f'{ROLLUP_COLLECTION}/{field_id}/{resolution}'
+
+
+def _bucket_id(bucket_start: float) -> str:
+    return f'{int(bucket_start):012d}'
+
+
+def reading_columns(readings: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Time-ordered timestamp and channel arrays (NaN where missing or flagged)"""
+    ts = np.array([to_epoch_seconds(r.get('timestamp')) for r in readings], dtype=np.float64)
+    order = np.argsort(ts, kind='stable')
+    columns = {}
+    for channel in CHANNELS:
+        values = np.full(len(readings), np.nan)
+        for i, reading in enumerate(readings):
+            value = reading.get(channel)
+            if channel in (reading.get('quality_flags') or ()):
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[i] = value
+        columns[channel] = values[order]
+    return ts[order], columns
+
+
+def aggregate(ts: np.ndarray, columns: Dict[str, np.ndarray], seconds: int) -> Aggregates:
+    """
+    Per-bucket statistics in one vectorised pass
+
+    Args:
+        ts: Epoch seconds, ascending
+        columns: Channel values aligned with ``ts``
+        seconds: Bucket width
+
+    Returns:
+        Bucket starts, readings per bucket and, per channel, arrays of
+        count/min/max/sum/sum_sq/last
+    """
+    starts, inverse = np.unique(np.floor(ts / seconds) * seconds, return_inverse=True)
+    size = starts.size
+    stats: Dict[str, Dict[str, np.ndarray]] = {}
+    for channel, values in columns.items():
+        valid = ~np.isnan(values)
+        idx = inverse[valid]
+        vals = values[valid]
+        minimum = np.full(size, np.inf)
+        maximum = np.full(size, -np.inf)
+        np.minimum.at(minimum, idx, vals)
+        np.maximum.at(maximum, idx, vals)
+        # Input is time-ordered, so the highest position per bucket is the latest
+        last_pos = np.full(size, -1)
+        np.maximum.at(last_pos, idx, np.arange(vals.size))
+        last = np.full(size, np.nan)
+        has_last = last_pos >= 0
+        last[has_last] = vals[last_pos[has_last]]
+        stats[channel] = {
+            'count': np.bincount(idx, minlength=size),
+            'min': minimum,
+            'max': maximum,
+            'sum': np.bincount(idx, weights=vals, minlength=size),
+            'sum_sq': np.bincount(idx, weights=vals * vals, minlength=size),
+            'last': last,
+        }
+    return starts, np.bincount(inverse, minlength=size), stats
+
+
+def bucket_sketches(ts: np.ndarray, columns: Dict[str, np.ndarray], seconds: int,
+                    relative_accuracy: float) -> Dict[float, Dict[str, Dict[str, Any]]]:
+    """
+    Serialised sketch bins per bucket and channel in one vectorised pass
+
+    Returns:
+        ``{bucket_start: {channel: {'p': {bin: n}, 'n': {bin: n}, 'z': n}}}``
+    """
+    starts, inverse = np.unique(np.floor(ts / seconds) * seconds, return_inverse=True)
+    binner = DDSketch(relative_accuracy)
+    sketches: Dict[float, Dict[str, Dict[str, Any]]] = {}
+    for channel, values in columns.items():
+        valid = ~np.isnan(values)
+        if not valid.any():
+            continue
+        sign, index = binner.bins(values[valid])
+        keys, counts = np.unique(np.stack([inverse[valid], sign, index], axis=1), axis=0, return_counts=True)
+        for (b, s, i), count in zip(keys.tolist(), counts.tolist()):
+            sketch = sketches.setdefault(float(starts[b]), {}).setdefault(
+                channel, {'p': {}, 'n': {}, 'z': 0})
+            if s == 0:
+                sketch['z'] += count
+            else:
+                sketch['p' if s > 0 else 'n'][str(i)] = count
+    return sketches
+
+
+def _bucket_documents(field_id: str, resolution: str, aggregates: Aggregates, incremental: bool,
+                      sketches: Optional[Dict[float, Dict[str, Dict[str, Any]]]] = None,
+                      ) -> Dict[str, Dict[str, Any]]:
+    starts, totals, stats = aggregates
+    documents: Dict[str, Dict[str, Any]] = {}
+    for b, start in enumerate(starts):
+        channels: Dict[str, Any] = {}
+        for channel, channel_stats in stats.items():
+            count = int(channel_stats['count'][b])
+            if not count:
+                continue
+            values = {
+                'count': count,
+                'min': float(channel_stats['min'][b]),
+                'max': float(channel_stats['max'][b]),
+                'sum': float(channel_stats['sum'][b]),
+                'sum_sq': float(channel_stats['sum_sq'][b]),
+            }
+            if incremental:
+                values = {
+                    'count': firestore.Increment(values['count']),
+                    'min': firestore.Minimum(values['min']),
+                    'max': firestore.Maximum(values['max']),
+                    'sum': firestore.Increment(values['sum']),
+                    'sum_sq': firestore.Increment(values['sum_sq']),
+                }
+            # Latest batch wins; late out-of-order batches are corrected by a backfill
+            values['last'] = float(channel_stats['last'][b])
+            channels[channel] = values
+        if not channels:
+            continue
+        documents[_bucket_id(start)] = {
+            'field_id': field_id,
+            'resolution': resolution,
+            'bucket_start': datetime.fromtimestamp(float(start), tz=timezone.utc),
+            'count': firestore.Increment(int(totals[b])) if incremental else int(totals[b]),
+            'channels': channels,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        }
+        bucket_sketch = (sketches or {}).get(float(start))
+        if bucket_sketch:
+            if incremental:
+                bucket_sketch = {channel: {
+                    'p': {k: firestore.Increment(v) for k, v in sketch['p'].items()},
+                    'n': {k: firestore.Increment(v) for k, v in sketch['n'].items()},
+                    'z': firestore.Increment(sketch['z']),
+                } for channel, sketch in bucket_sketch.items()}
+            documents[_bucket_id(start)].update({
+                'sketches': bucket_sketch,
+                'sketch_accuracy': Config.ROLLUP_SKETCH_ACCURACY,
+            })
+    return documents
+
+
+def _rollup_documents(field_id: str, ts: np.ndarray, columns: Dict[str, np.ndarray],
+                      incremental: bool) -> Iterable[Tuple[str, Dict[str, Dict[str, Any]]]]:
+    for resolution, seconds in RESOLUTIONS:
+        sketches = bucket_sketches(ts, columns, seconds, Config.ROLLUP_SKETCH_ACCURACY) \
+            if resolution == SKETCH_RESOLUTION else None
+        yield resolution, _bucket_documents(
+            field_id, resolution, aggregate(ts, columns, seconds), incremental, sketches)
+
+
+def update_rollups(field_id: str, readings: Sequence[Dict[str, Any]]) -> None:
+    """Fold newly stored readings into the hourly and daily buckets"""
+    if not Config.ROLLUPS_ENABLED or not readings:
+        return
+    try:
+        ts, columns = reading_columns(readings)
+        for resolution, documents in _rollup_documents(field_id, ts, columns, incremental=True):
+            db.set_documents(_collection(field_id, resolution), documents, merge=True)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.error(f'Error updating sensor rollups for field {field_id}: {str(e)}')
+
+
+def backfill_rollups(
+    field_ids: Optional[Sequence[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    page_size: int = 1000,
+) -> Dict[str, int]:
+    """
+    Recompute rollups from raw readings, overwriting the affected buckets
+
+    ``start`` and ``end`` are widened to whole days so no bucket is
+    overwritten with a partial aggregate. Archived readings (see
+    :mod:`app.services.sensor_archive`) are included.
+
+    Args:
+        field_ids: Fields to backfill (default: every document in ``fields``)
+        start: Only readings at or after this time
+        end: Only readings before this time
+        page_size: Raw readings fetched per query page
+
+    Returns:
+        Number of readings processed per field
+    """
+    # Imported here: the archive module depends on CHANNELS
+    from app.services.sensor_archive import read_archived
+
+    if field_ids is None:
+        field_ids = [f['id'] for f in db.query_collection('fields')]
+    day = RESOLUTION_SECONDS['day']
+    lower = math.floor(to_epoch_seconds(start) / day) * day if start is not None else -math.inf
+    upper = math.ceil(to_epoch_seconds(end) / day) * day if end is not None else math.inf
+
+    processed: Dict[str, int] = {}
+    for field_id in field_ids:
+        readings = [r for r in stream_readings(field_id, page_size=page_size)
+                    if lower <= to_epoch_seconds(r.get('timestamp')) < upper]
+        readings.extend(read_archived(field_id, _utc(lower) if start is not None else None,
+                                      _utc(upper) if end is not None else None))
+        processed[field_id] = len(readings)
+        if not readings:
+            continue
+        ts, columns = reading_columns(readings)
+        for resolution, documents in _rollup_documents(field_id, ts, columns, incremental=False):
+            db.set_documents(_collection(field_id, resolution), documents)
+        logger.info(f'Backfilled rollups for field {field_id} from {len(readings)} readings')
+    return processed
+
+
+def ensure_day_rollups(field_id: str, readings: Sequence[Dict[str, Any]]) -> int:
+    """
+    Make sure the rollups cover ``readings`` before they are deleted
+
+    Readings are grouped by UTC day; a day whose daily bucket is missing or
+    counts fewer readings than given (e.g. data from before rollups existed)
+    gets its hourly and daily buckets rewritten from these readings. Callers
+    must pass whole days.
+
+    Returns:
+        Number of days rewritten
+    """
+    if not readings:
+        return 0
+    ts, columns = reading_columns(readings)
+    day = RESOLUTION_SECONDS['day']
+    day_starts = np.floor(ts / day) * day
+    stale = []
+    for start in np.unique(day_starts):
+        bucket = db.get_document(_collection(field_id, 'day'), _bucket_id(start))
+        if int((bucket or {}).get('count') or 0) < int(np.count_nonzero(day_starts == start)):
+            stale.append(start)
+    if not stale:
+        return 0
+    mask = np.isin(day_starts, stale)
+    for resolution, documents in _rollup_documents(
+            field_id, ts[mask], {c: v[mask] for c, v in columns.items()}, incremental=False):
+        db.set_documents(_collection(field_id, resolution), documents)
+    logger.info(f'Rewrote rollups of {len(stale)} day(s) for field {field_id} before compaction')
+    return len(stale)
+
+
+def choose_resolution(window_seconds: float, min_points: Optional[int] = None) -> str:
+    """Coarsest resolution that still yields ``min_points`` buckets ('raw' if none)"""
+    min_points = Config.ROLLUP_MIN_POINTS if min_points is None else min_points
+    for resolution, seconds in RESOLUTIONS:
+        if window_seconds / seconds >= min_points:
+            return resolution
+    return 'raw'
+
+
+def get_rollups(field_id: str, resolution: str, start: datetime,
+                end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Bucket documents with ``start <= bucket_start < end``, oldest first"""
+    if resolution not in RESOLUTION_SECONDS:
+        raise ValueError(f'Unknown rollup resolution: {resolution}')
+    filters = [('bucket_start', '>=', _as_utc(start))]
+    if end is not None:
+        filters.append(('bucket_start', '<', _as_utc(end)))
+    buckets = db.query_collection(_collection(field_id, resolution), filters=filters)
+    return sorted(buckets, key=lambda b: to_epoch_seconds(b.get('bucket_start')))
+
+
+def rollup_series(field_id: str, resolution: str, start: datetime,
+                  end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Chart points (per-channel mean plus min/max) for each bucket, newest first
+
+    Empty unless the buckets reach back to the first one starting at or
+    after ``start``: a window the rollups only partly cover (e.g. before a
+    backfill finished) is left to the raw readings rather than served
+    truncated.
+    """
+    buckets = get_rollups(field_id, resolution, start, end)
+    seconds = RESOLUTION_SECONDS[resolution]
+    first_bucket = math.ceil(to_epoch_seconds(start) / seconds) * seconds
+    if not buckets or to_epoch_seconds(buckets[0]['bucket_start']) > first_bucket:
+        return []
+    points = []
+    for bucket in buckets:
+        channels = bucket.get('channels', {})
+        point: Dict[str, Any] = {
+            'field_id': field_id,
+            'timestamp': _as_utc(bucket['bucket_start']).isoformat(),
+            'resolution': resolution,
+            'count': bucket.get('count', 0),
+            'min': {},
+            'max': {},
+        }
+        for channel in CHANNELS:
+            stats = channels.get(channel)
+            if not stats or not stats.get('count'):
+                continue
+            point[channel] = stats['sum'] / stats['count']
+            point['min'][channel] = stats['min']
+            point['max'][channel] = stats['max']
+        points.append(point)
+    points.reverse()
+    return points
+
+
+def _combine(buckets: Iterable[Dict[str, Any]], totals: Dict[str, Dict[str, float]]) -> int:
+    count = 0
+    for bucket in buckets:
+        count += int(bucket.get('count', 0))
+        for channel, stats in bucket.get('channels', {}).items():
+            total = totals.setdefault(channel, {
+                'count': 0, 'sum': 0.0, 'sum_sq': 0.0, 'min': math.inf, 'max': -math.inf})
+            total['count'] += stats.get('count', 0)
+            total['sum'] += stats.get('sum', 0.0)
+            total['sum_sq'] += stats.get('sum_sq', 0.0)
+            total['min'] = min(total['min'], stats.get('min', math.inf))
+            total['max'] = max(total['max'], stats.get('max', -math.inf))
+            total['last'] = stats.get('last')
+    return count
+
+
+def summarize_rollups(field_id: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    """
+    Aggregate statistics over ``[start, end)`` from the coarsest buckets
+
+    Whole days come from daily buckets and the partial days at either edge
+    from hourly buckets; the edges are widened to whole hours.
+
+    Returns:
+        ``{'count': n, 'channels': {channel: {count, mean, std, min, max, last}}}``
+    """
+    day = RESOLUTION_SECONDS['day']
+    hour = RESOLUTION_SECONDS['hour']
+    lower = math.floor(to_epoch_seconds(start) / hour) * hour
+    upper = math.ceil(to_epoch_seconds(end) / hour) * hour
+    day_lower = math.ceil(lower / day) * day
+    day_upper = math.floor(upper / day) * day
+
+    totals: Dict[str, Dict[str, float]] = {}
+    count = 0
+    if day_lower < day_upper:
+        # Oldest first so ``last`` ends up as the latest value
+        count += _combine(get_rollups(field_id, 'hour', _utc(lower), _utc(day_lower)), totals)
+        count += _combine(get_rollups(field_id, 'day', _utc(day_lower), _utc(day_upper)), totals)
+        count += _combine(get_rollups(field_id, 'hour', _utc(day_upper), _utc(upper)), totals)
+    else:
+        count += _combine(get_rollups(field_id, 'hour', _utc(lower), _utc(upper)), totals)
+
+    channels: Dict[str, Dict[str, Any]] = {}
+    for channel, total in totals.items():
+        n = total['count']
+        if not n:
+            continue
+        mean = total['sum'] / n
+        channels[channel] = {
+            'count': int(n),
+            'mean': mean,
+            'std': math.sqrt(max(total['sum_sq'] / n - mean * mean, 0.0)),
+            'min': total['min'],
+            'max': total['max'],
+            'last': total.get('last'),
+        }
+    return {'count': count, 'channels': channels}
+
+
+def merge_sketches(
+    windows: Iterable[Tuple[str, datetime, datetime]],
+) -> Tuple[Dict[str, DDSketch], int]:
+    """
+    Merge the daily sketches of several ``(field_id, start, end)`` windows
+
+    Windows are widened to whole UTC days. Buckets written with a different
+    sketch accuracy than the first one seen are skipped (logged).
+
+    Returns:
+        Merged sketch per channel and the number of daily buckets merged
+    """
+    day = RESOLUTION_SECONDS[SKETCH_RESOLUTION]
+    merged: Dict[str, DDSketch] = {}
+    buckets = 0
+    for field_id, start, end in windows:
+        lower = math.floor(to_epoch_seconds(start) / day) * day
+        upper = math.ceil(to_epoch_seconds(end) / day) * day
+        for bucket in get_rollups(field_id, SKETCH_RESOLUTION, _utc(lower), _utc(upper)):
+            accuracy = bucket.get('sketch_accuracy')
+            if not accuracy or not bucket.get('sketches'):
+                continue
+            try:
+                for channel, data in bucket['sketches'].items():
+                    sketch = DDSketch.from_dict(data, accuracy)
+                    if channel in merged:
+                        merged[channel].merge(sketch)
+                    else:
+                        merged[channel] = sketch
+                buckets += 1
+            except ValueError as e:
+                logger.warning(f'Skipping sketch of {field_id}/{bucket.get("id")}: {str(e)}')
+    return merged, buckets
+
+
+def rollup_percentiles(
+    windows: Iterable[Tuple[str, datetime, datetime]],
+    percentiles: Sequence[float] = (10, 50, 90),
+) -> Dict[str, Any]:
+    """
+    Approximate per-channel percentiles over one or more field windows
+
+    Args:
+        windows: ``(field_id, start, end)`` tuples; several fields or batch
+            seasons are merged into one distribution
+        percentiles: Percentiles in [0, 100]
+
+    Returns:
+        ``{'days': n, 'relative_accuracy': a, 'channels': {channel: {'count': n, 'p50': v, ...}}}``
+    """
+    merged, buckets = merge_sketches(windows)
+    channels: Dict[str, Dict[str, Any]] = {}
+    accuracy = None
+    for channel in CHANNELS:
+        sketch = merged.get(channel)
+        if sketch is None or sketch.count <= 0:
+            continue
+        accuracy = sketch.relative_accuracy
+        values = sketch.quantiles([p / 100.0 for p in percentiles])
+        channels[channel] = {'count': int(sketch.count)}
+        channels[channel].update({f'p{p:g}': values[p / 100.0] for p in percentiles})
+    return {'days': buckets, 'relative_accuracy': accuracy, 'channels': channels}
+
+
+def _utc(epoch_seconds: float) -> datetime:
+    return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc)
+
+
+def _as_utc(value: Any) -> datetime:
+    return _utc(to_epoch_seconds(value))
@@ -0,0 +1,96 @@
+"""Largest-Triangle-Three-Buckets downsampling for chart series"""
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from app.utils.helpers import to_epoch_seconds
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the points LTTB keeps, first and last always included
+
+    Each bucket keeps the point forming the largest triangle with the point
+    kept in the previous bucket and the average of the next bucket, so peaks
+    and troughs survive.
+
+    Args:
+        x: Ascending x values (e.g. epoch ms)
+        y: Values aligned with ``x`` (no NaN)
+        n_out: Number of points to keep
+
+    Returns:
+        Ascending indices into ``x``/``y``
+    """
+    n = x.size
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets between the fixed first and last points
+    every = (n - 2) / (n_out - 2)
+    bounds = np.floor(np.arange(n_out - 1) * every).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    sizes = np.diff(bounds)
+    avg_x = np.add.reduceat(x[:n - 1], bounds[:-1]) / sizes
+    avg_y = np.add.reduceat(y[:n - 1], bounds[:-1]) / sizes
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        if i + 1 < n_out - 2:
+            cx, cy = avg_x[i + 1], avg_y[i + 1]
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        # Twice the triangle area; the constant factor does not change argmax
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_readings(
+    readings: Sequence[Dict[str, Any]],
+    channels: Sequence[str],
+    max_points: Optional[int],
+    timestamp_key: str = 'timestamp',
+) -> Dict[str, Any]:
+    """
+    Columnar per-channel series, each reduced to ``max_points`` with LTTB
+
+    Returns:
+        ``{'format': 'columnar', 'count': n, 'max_points': m,
+        'channels': {channel: {'timestamps': [epoch ms], 'values': [...]}}}``
+        with timestamps ascending. Missing values are skipped per channel.
+    """
+    ts = np.array([to_epoch_seconds(r.get(timestamp_key)) * 1000.0 for r in readings], dtype=np.float64)
+    order = np.argsort(ts, kind='stable')
+    ts = ts[order]
+
+    series: Dict[str, Dict[str, list]] = {}
+    for channel in channels:
+        values = np.full(len(readings), np.nan)
+        for i, j in enumerate(order):
+            value = readings[j].get(channel)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[i] = value
+        valid = ~np.isnan(values)
+        x, y = ts[valid], values[valid]
+        if max_points:
+            keep = lttb_indices(x, y, max_points)
+            x, y = x[keep], y[keep]
+        series[channel] = {
+            'timestamps': x.astype(np.int64).tolist(),
+            'values': y.tolist(),
+        }
+
+    return {
+        'format': 'columnar',
+        'count': len(readings),
+        'max_points': max_points,
+        'channels': series,
+    }
@@ -0,0 +1,178 @@
+"""Gorilla time-series compression (Pelkonen et al., VLDB 2015)
+
+Timestamps (integer milliseconds) are stored as delta-of-deltas in
+variable-length buckets, and float64 values as the XOR with the previous
+value, keeping only the meaningful bits. Regularly sampled series with
+slowly changing values compress to a few bits per point.
+
+Streams are independent: one timestamp stream plus one value stream per
+channel, each decoded given the point count.
+"""
+from __future__ import annotations
+
+from typing import List, Sequence
+
+import numpy as np
+
+_MASK64 = (1 << 64) - 1
+
+# Delta-of-delta buckets: (control bits, control length, value bits, offset)
+_DOD_BUCKETS = (
+    (0b10, 2, 7, 63),
+    (0b110, 3, 9, 255),
+    (0b1110, 4, 12, 2047),
+)
+
+
+class BitWriter:
+    """Append-only bit stream (most significant bit first)"""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value: int, nbits: int) -> None:
+        self._acc = (self._acc << nbits) | (value & ((1 << nbits) - 1))
+        self._bits += nbits
+        while self._bits >= 8:
+            self._bits -= 8
+            self._buffer.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def getvalue(self) -> bytes:
+        if self._bits:
+            return bytes(self._buffer) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self._buffer)
+
+
+class BitReader:
+    """Sequential reader for :class:`BitWriter` output (zero padded at the end)"""
+
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+        self._pos = 0
+        self._acc = 0
+        self._bits = 0
+
+    def read(self, nbits: int) -> int:
+        while self._bits < nbits:
+            byte = self._data[self._pos] if self._pos < len(self._data) else 0
+            self._pos += 1
+            self._acc = (self._acc << 8) | byte
+            self._bits += 8
+        self._bits -= nbits
+        value = self._acc >> self._bits
+        self._acc &= (1 << self._bits) - 1
+        return value
+
+    def read_bit(self) -> int:
+        return self.read(1)
+
+
+def _signed64(value: int) -> int:
+    return value - (1 << 64) if value >> 63 else value
+
+
+def encode_timestamps(timestamps_ms: Sequence[int]) -> bytes:
+    """Delta-of-delta encode integer millisecond timestamps"""
+    writer = BitWriter()
+    previous = 0
+    delta = 0
+    for i, ts in enumerate(timestamps_ms):
+        ts = int(ts)
+        if i == 0:
+            writer.write(ts & _MASK64, 64)
+            previous = ts
+            continue
+        new_delta = ts - previous
+        dod = new_delta - delta
+        if dod == 0:
+            writer.write(0, 1)
+        else:
+            for control, control_bits, value_bits, offset in _DOD_BUCKETS:
+                if -offset <= dod <= offset + 1:
+                    writer.write(control, control_bits)
+                    writer.write(dod + offset, value_bits)
+                    break
+            else:
+                writer.write(0b1111, 4)
+                writer.write(dod & _MASK64, 64)
+        delta = new_delta
+        previous = ts
+    return writer.getvalue()
+
+
+def decode_timestamps(data: bytes, count: int) -> List[int]:
+    """Inverse of :func:`encode_timestamps`"""
+    if count <= 0:
+        return []
+    reader = BitReader(data)
+    previous = _signed64(reader.read(64))
+    timestamps = [previous]
+    delta = 0
+    for _ in range(count - 1):
+        # Unary control prefix: 0, 10, 110, 1110, 1111
+        dod = 0
+        if reader.read_bit():
+            for _control, _control_bits, value_bits, offset in _DOD_BUCKETS:
+                if not reader.read_bit():
+                    dod = reader.read(value_bits) - offset
+                    break
+            else:
+                dod = _signed64(reader.read(64))
+        delta += dod
+        previous += delta
+        timestamps.append(previous)
+    return timestamps
+
+
+def encode_floats(values: Sequence[float]) -> bytes:
+    """XOR encode float64 values (NaN marks missing values and is preserved)"""
+    writer = BitWriter()
+    bits = np.asarray(values, dtype=np.float64).view(np.uint64).tolist()
+    previous = 0
+    leading = trailing = -1
+    for i, value in enumerate(bits):
+        if i == 0:
+            writer.write(value, 64)
+            previous = value
+            continue
+        xor = value ^ previous
+        previous = value
+        if xor == 0:
+            writer.write(0, 1)
+            continue
+        new_leading = min(64 - xor.bit_length(), 31)
+        new_trailing = (xor & -xor).bit_length() - 1
+        if leading >= 0 and new_leading >= leading and new_trailing >= trailing:
+            # Fits the previous meaningful-bit window
+            writer.write(0b10, 2)
+            writer.write(xor >> trailing, 64 - leading - trailing)
+        else:
+            leading, trailing = new_leading, new_trailing
+            meaningful = 64 - leading - trailing
+            writer.write(0b11, 2)
+            writer.write(leading, 5)
+            writer.write(meaningful & 0x3F, 6)  # 64 is stored as 0
+            writer.write(xor >> trailing, meaningful)
+    return writer.getvalue()
+
+
+def decode_floats(data: bytes, count: int) -> np.ndarray:
+    """Inverse of :func:`encode_floats`"""
+    if count <= 0:
+        return np.empty(0, dtype=np.float64)
+    reader = BitReader(data)
+    previous = reader.read(64)
+    bits = [previous]
+    leading = trailing = 0
+    for _ in range(count - 1):
+        if reader.read_bit():
+            if reader.read_bit():
+                leading = reader.read(5)
+                meaningful = reader.read(6) or 64
+                trailing = 64 - leading - meaningful
+            previous ^= reader.read(64 - leading - trailing) << trailing
+        bits.append(previous)
+    return np.array(bits, dtype=np.uint64).view(np.float64)
@@ -4,8 +4,8 @@ from __future__ import annotations
 import logging
 import re
 import uuid
-from datetime import date, datetime
-from typing import Any, Optional
+from datetime import date, datetime, timezone
+from typing import Any, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +36,44 @@ def parse_date(date_str: Any) -> Optional[date]:
         return None
 
 
+def to_epoch_seconds(value: Any) -> float:
+    """Convert datetime / ISO string / epoch-ms timestamps to epoch seconds (naive = UTC)"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) / 1000.0
+    if isinstance(value, str):
+        try:
+            return to_epoch_seconds(datetime.fromisoformat(value.replace('Z', '+00:00')))
+        except ValueError:
+            pass
+    return datetime.now(timezone.utc).timestamp()
+
+
+def normalize_timestamp(value: Any) -> Optional[Tuple[datetime, int]]:
+    """
+    Canonical stored form of a timestamp: aware UTC datetime and epoch ms
+
+    Accepts datetimes (naive = UTC), ISO strings and epoch milliseconds;
+    returns None when the value cannot be parsed.
+    """
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, str):
+        try:
+            moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        moment = datetime.fromtimestamp(float(value) / 1000.0, tz=timezone.utc)
+    else:
+        return None
+    moment = moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+    return moment, int(round(moment.timestamp() * 1000))
+
+
 def calculate_percentage(
     value: float,
     min_val: float,
@@ -0,0 +1,116 @@
+"""Mergeable quantile sketch with relative-error guarantees (DDSketch)
+
+Values are counted in logarithmic bins: bin ``i`` covers
+``(gamma**(i-1), gamma**i]`` with ``gamma = (1 + a) / (1 - a)``, so every
+quantile is returned within relative error ``a`` of a true sample value.
+Negative values use a mirrored store and zeros a separate counter.
+
+Merging is plain addition of bin counts, which makes sketches mergeable
+across days, fields and batches, and lets Firestore ``Increment`` transforms
+update a stored sketch without read-modify-write.
+
+Serialised form: ``{'p': {bin: count}, 'n': {bin: count}, 'z': count}`` with
+string bin keys (Firestore map keys must be strings).
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Magnitudes below this are counted as zero
+MIN_VALUE = 1e-9
+
+
+class DDSketch:
+    """Relative-accuracy quantile sketch"""
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be in (0, 1)')
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, float] = {}
+        self.negative: Dict[int, float] = {}
+        self.zero = 0.0
+
+    @property
+    def count(self) -> float:
+        return self.zero + sum(self.positive.values()) + sum(self.negative.values())
+
+    def bins(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Sign (-1 / 0 / 1) and bin index of each value, vectorised"""
+        values = np.asarray(values, dtype=np.float64)
+        magnitude = np.abs(values)
+        sign = np.where(magnitude < MIN_VALUE, 0, np.sign(values)).astype(np.int64)
+        index = np.zeros(values.size, dtype=np.int64)
+        nonzero = sign != 0
+        index[nonzero] = np.ceil(np.log(magnitude[nonzero]) / self._log_gamma).astype(np.int64)
+        return sign, index
+
+    def add(self, values: Iterable[float]) -> 'DDSketch':
+        """Add samples (NaN ignored)"""
+        values = np.asarray(list(values) if not isinstance(values, np.ndarray) else values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return self
+        sign, index = self.bins(values)
+        self.zero += float(np.count_nonzero(sign == 0))
+        for store, s in ((self.positive, 1), (self.negative, -1)):
+            keys, counts = np.unique(index[sign == s], return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                store[key] = store.get(key, 0.0) + count
+        return self
+
+    def merge(self, other: 'DDSketch') -> 'DDSketch':
+        """Add another sketch's counts into this one (same accuracy required)"""
+        if not math.isclose(other.gamma, self.gamma):
+            raise ValueError('Cannot merge sketches with different relative accuracy')
+        self.zero += other.zero
+        for store, incoming in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in incoming.items():
+                store[key] = store.get(key, 0.0) + count
+        return self
+
+    def _value(self, index: int) -> float:
+        # Midpoint (in relative terms) of bin ``index``
+        return 2.0 * self.gamma ** index / (self.gamma + 1.0)
+
+    def quantiles(self, qs: Sequence[float]) -> Dict[float, Optional[float]]:
+        """Approximate quantiles for ``qs`` in [0, 1] (None when empty)"""
+        total = self.count
+        if total <= 0:
+            return {q: None for q in qs}
+
+        # Ascending order: most negative first, then zeros, then positives
+        ordered = [(-self._value(k), c) for k, c in sorted(self.negative.items(), reverse=True)]
+        ordered.append((0.0, self.zero))
+        ordered.extend((self._value(k), c) for k, c in sorted(self.positive.items()))
+        values = np.array([v for v, _ in ordered])
+        cumulative = np.cumsum([c for _, c in ordered])
+
+        result: Dict[float, Optional[float]] = {}
+        for q in qs:
+            rank = min(max(q, 0.0), 1.0) * (total - 1)
+            result[q] = float(values[int(np.searchsorted(cumulative, rank, side='right'))])
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[q]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'p': {str(k): v for k, v in self.positive.items()},
+            'n': {str(k): v for k, v in self.negative.items()},
+            'z': self.zero,
+        }
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any], relative_accuracy: float = 0.01) -> 'DDSketch':
+        sketch = DDSketch(relative_accuracy)
+        sketch.positive = {int(k): float(v) for k, v in (data.get('p') or {}).items()}
+        sketch.negative = {int(k): float(v) for k, v in (data.get('n') or {}).items()}
+        sketch.zero = float(data.get('z') or 0)
+        return sketch
@@ -0,0 +1,51 @@
+"""
+Move old raw sensor readings from Firestore into the compressed cold archive.
+
+Readings older than the cutoff are packed into per-field, per-month
+Gorilla-compressed blocks in Cloud Storage (or ARCHIVE_LOCAL_PATH with
+ARCHIVE_BACKEND=local) and deleted from Firestore. History, export and
+rollup backfill read archived ranges transparently.
+
+Usage:
+  cd backend
+  python archive_readings.py                             # older than ARCHIVE_AFTER_DAYS
+  python archive_readings.py --field field_123 --before 2025-06-01
+  python archive_readings.py --dry-run
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import Config  # noqa: E402
+from app.core.database import db  # noqa: E402
+from app.services.sensor_archive import archive_readings  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Archive old sensor_readings to compressed blocks')
+    parser.add_argument('--field', action='append', dest='fields',
+                        help='Field ID to archive (repeatable; default: all fields)')
+    parser.add_argument('--before', type=datetime.fromisoformat,
+                        help=f'ISO date/time (UTC) cutoff (default: now - {Config.ARCHIVE_AFTER_DAYS} days)')
+    parser.add_argument('--page-size', type=int, default=1000, help='Raw readings per query page')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the readings to archive')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    db.init_app(None)
+
+    cutoff = args.before or datetime.now(timezone.utc) - timedelta(days=Config.ARCHIVE_AFTER_DAYS)
+    archived = archive_readings(cutoff, args.fields, args.page_size, args.dry_run)
+    for field_id, count in archived.items():
+        print(f'{"🔍" if args.dry_run else "✅"} {field_id}: {count} readings')
+    print(f'{"Would archive" if args.dry_run else "Archived"} {sum(archived.values())} readings '
+          f'older than {cutoff.isoformat()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Rebuild hourly and daily sensor rollups from raw Firestore readings.
+
+Run after enabling rollups on an existing deployment, or to repair buckets
+after late or out-of-order data. Buckets in the window are overwritten.
+
+Usage:
+  cd backend
+  python backfill_rollups.py                         # every field, all history
+  python backfill_rollups.py --field field_123 --start 2025-06-01 --end 2025-10-01
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import db  # noqa: E402
+from app.services.sensor_rollups import backfill_rollups  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Backfill sensor_rollups from sensor_readings')
+    parser.add_argument('--field', action='append', dest='fields',
+                        help='Field ID to backfill (repeatable; default: all fields)')
+    parser.add_argument('--start', type=datetime.fromisoformat, help='ISO date/time (UTC), inclusive')
+    parser.add_argument('--end', type=datetime.fromisoformat, help='ISO date/time (UTC), exclusive')
+    parser.add_argument('--page-size', type=int, default=1000, help='Raw readings per query page')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    db.init_app(None)
+
+    processed = backfill_rollups(args.fields, args.start, args.end, args.page_size)
+    for field_id, count in processed.items():
+        print(f'✅ {field_id}: {count} readings')
+    print(f'Backfilled {len(processed)} field(s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+"""
+Benchmarks
+==========
+Offline performance harnesses for the backend. Run from the ``backend``
+directory, e.g. ``python -m benchmarks.ingestion_benchmark --help``.
+"""
@@ -0,0 +1,158 @@
+"""
+Inference backend benchmark
+===========================
+Compares the TFLite and ONNX Runtime backends (``app/ml_models/backends.py``)
+on this machine: per-invoke latency percentiles at each batch size and
+thread count, and sustained throughput with ``--concurrency`` callers
+sharing one pool (as the API workers do). ONNX Runtime cases also sweep the
+graph optimisation level and IO binding on/off.
+
+Inputs are synthetic tensors in the model's input dtype; the models are
+the exported ones (``convert_to_tflite.py`` writes both the .tflite and
+the .onnx). Backends whose model file is missing or whose runtime is not
+installed are reported as skipped. Each case runs in a fresh process.
+
+Usage:
+  cd backend
+  python -m benchmarks.backend_benchmark --tflite-model app/ml_models/chili_disease_model.tflite \
+      --onnx-model ../ml_training/models/exported/disease_detection_v1.onnx
+  python -m benchmarks.backend_benchmark --backends onnxruntime --threads 1 2 4 --batch-sizes 1 8 \
+      --ort-optimization basic all --io-binding on off --output backends.json
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.common import environment, latency_summary, peak_rss_mb, write_report
+
+
+def synthetic_batch(detail: Dict[str, Any], batch_size: int, seed: int = 0) -> np.ndarray:
+    """Random NHWC input batch in the pool's input dtype"""
+    rng = np.random.default_rng(seed)
+    shape = (batch_size, *detail['shape'][1:])
+    if np.dtype(detail['dtype']).kind == 'f':
+        return rng.random(shape, dtype=np.float32).astype(detail['dtype'])
+    info = np.iinfo(detail['dtype'])
+    return rng.integers(info.min, info.max, shape, dtype=detail['dtype'], endpoint=True)
+
+
+def _run_case(case: Dict[str, Any], iterations: int, concurrency: int, duration: float) -> Dict[str, Any]:
+    # Runs in a child process
+    from app.ml_models.backends import OnnxRuntimeBackend, TFLiteBackend
+
+    if case['backend'] == 'onnxruntime':
+        backend = OnnxRuntimeBackend(case['optimization'], case['threads'], 1, case['io_binding'])
+    else:
+        backend = TFLiteBackend()
+    content = Path(case['model']).read_bytes()
+    try:
+        t0 = time.perf_counter()
+        pool = backend.create_pool(content, concurrency, case['threads'])
+        load_ms = (time.perf_counter() - t0) * 1000.0
+    except ImportError as e:
+        return {'skipped': str(e)}
+    if case['batch_size'] > 1 and not pool.dynamic_batch:
+        return {'skipped': 'model has a fixed batch size'}
+
+    batch = synthetic_batch(pool.input_details[0], case['batch_size'])
+    for _ in range(3):
+        pool.predict(batch)
+
+    samples: List[float] = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        pool.predict(batch)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+
+    # Sustained throughput: `concurrency` callers sharing the pool
+    counts = [0] * concurrency
+    deadline = time.perf_counter() + duration
+
+    def caller(index: int) -> None:
+        while time.perf_counter() < deadline:
+            pool.predict(batch)
+            counts[index] += case['batch_size']
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latency = latency_summary(samples)
+    return {
+        'load_ms': round(load_ms, 1),
+        'latency_ms': latency,
+        'per_image_p50_ms': round(latency['p50'] / case['batch_size'], 3),
+        'images_per_second': round(1000.0 * case['batch_size'] * len(samples) / sum(samples), 1),
+        'throughput_images_per_second': round(sum(counts) / elapsed, 1),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def build_cases(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    cases: List[Dict[str, Any]] = []
+    for backend in args.backends:
+        model: Optional[str] = args.tflite_model if backend == 'tflite' else args.onnx_model
+        variants = [{}] if backend == 'tflite' else [
+            {'optimization': level, 'io_binding': binding == 'on'}
+            for level in args.ort_optimization for binding in args.io_binding]
+        for threads in args.threads:
+            for batch_size in args.batch_sizes:
+                for variant in variants:
+                    cases.append({'backend': backend, 'model': model, 'threads': threads,
+                                  'batch_size': batch_size, **variant})
+    return cases
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for case in build_cases(args):
+        if not case['model'] or not Path(case['model']).exists():
+            results.append({**case, 'skipped': f"model file not found: {case['model']}"})
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(_run_case, case, args.iterations, args.concurrency, args.duration).result()
+        results.append({**case, **result})
+    return {
+        'benchmark': 'inference_backends',
+        'config': vars(args),
+        'environment': environment(),
+        'cases': results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark TFLite vs ONNX Runtime inference backends')
+    parser.add_argument('--backends', nargs='+', default=['tflite', 'onnxruntime'],
+                        choices=['tflite', 'onnxruntime'])
+    parser.add_argument('--tflite-model', default='app/ml_models/chili_disease_model.tflite')
+    parser.add_argument('--onnx-model', default='app/ml_models/chili_disease_model.onnx')
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, 2, 4],
+                        help='Intra-op threads per interpreter / session')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8])
+    parser.add_argument('--ort-optimization', nargs='+', default=['all'],
+                        choices=['disable', 'basic', 'extended', 'all'])
+    parser.add_argument('--io-binding', nargs='+', default=['on', 'off'], choices=['on', 'off'])
+    parser.add_argument('--iterations', type=int, default=50, help='Timed sequential invokes per case')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Pool size and concurrent callers for the throughput run')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds of the throughput run')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+    write_report(run(args), args.output)
+
+
+if __name__ == '__main__':
+    main()
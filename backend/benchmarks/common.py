@@ -0,0 +1,101 @@
+"""Shared helpers for benchmark reporting"""
+from __future__ import annotations
+
+import json
+import logging
+import platform
+import resource
+import sys
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+
+def latency_summary(samples_ms: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99/max/mean of latency samples in milliseconds"""
+    if not samples_ms:
+        return {'count': 0}
+    values = np.asarray(samples_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': int(values.size),
+        'mean': round(float(values.mean()), 3),
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3),
+        'max': round(float(values.max()), 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return round(usage / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _proc_status_mb(key: str) -> Optional[float]:
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith(key + ':'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_mb() -> float:
+    """Current resident set size in MB (falls back to the peak off Linux)"""
+    rss = _proc_status_mb('VmRSS')
+    return rss if rss is not None else peak_rss_mb()
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the kernel's peak RSS (VmHWM) so :func:`window_peak_rss_mb` measures
+    only what follows, e.g. one stage after heavy imports. Linux only.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def window_peak_rss_mb() -> float:
+    """Peak RSS since :func:`reset_peak_rss` (process peak where unsupported)"""
+    peak = _proc_status_mb('VmHWM')
+    return peak if peak is not None else peak_rss_mb()
+
+
+def environment() -> Dict[str, Any]:
+    """Host details recorded alongside every report"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'numpy': np.__version__,
+        'timestamp': datetime.utcnow().isoformat(),
+    }
+
+
+def write_report(report: Dict[str, Any], output: Optional[str] = None) -> None:
+    """Write a JSON report to ``output`` or stdout"""
+    text = json.dumps(report, indent=2, default=str)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        logging.getLogger(__name__).info('Report written to %s', output)
+    else:
+        print(text)
+
+
+def configure_logging(level: str) -> None:
+    """Keep service logging quiet so it does not dominate the measurement"""
+    logging.basicConfig(
+        level=getattr(logging, level.upper(), logging.WARNING),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
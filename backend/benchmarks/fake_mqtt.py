@@ -0,0 +1,158 @@
+"""Local stand-in for a paho MQTT client and broker
+
+``LocalBroker`` queues published messages and delivers them on a single
+network thread, the way paho's ``loop_start()`` thread calls
+``on_message``. ``FakePahoClient`` exposes the paho 1.x surface that
+``MQTTClient`` uses, so the real ingestion code runs unmodified.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+MQTT_ERR_SUCCESS = 0
+
+
+class FakeMessage:
+    """Mirror of ``paho.mqtt.client.MQTTMessage`` fields used by ingestion"""
+
+    __slots__ = ('topic', 'payload', 'qos', 'retain', 'mid', 'sent_at')
+
+    def __init__(self, topic: str, payload: bytes, qos: int = 0, mid: int = 0) -> None:
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = False
+        self.mid = mid
+        self.sent_at = time.perf_counter()
+
+
+class PublishResult:
+    __slots__ = ('rc', 'mid')
+
+    def __init__(self, rc: int, mid: int) -> None:
+        self.rc = rc
+        self.mid = mid
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """MQTT wildcard matching for ``+`` and ``#``"""
+    pattern_parts = pattern.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(pattern_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts) or (part != '+' and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class LocalBroker:
+    """In-process broker with one delivery (network loop) thread per client"""
+
+    def __init__(self) -> None:
+        self._clients: List['FakePahoClient'] = []
+        self._mid = 0
+        self._lock = threading.Lock()
+
+    def attach(self, client: 'FakePahoClient') -> None:
+        with self._lock:
+            self._clients.append(client)
+
+    def detach(self, client: 'FakePahoClient') -> None:
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0) -> PublishResult:
+        with self._lock:
+            self._mid += 1
+            mid = self._mid
+            clients = list(self._clients)
+        for client in clients:
+            if any(topic_matches(sub, topic) for sub in client.subscriptions):
+                client.enqueue(FakeMessage(topic, payload, qos, mid))
+        return PublishResult(MQTT_ERR_SUCCESS, mid)
+
+
+class FakePahoClient:
+    """Subset of ``paho.mqtt.client.Client`` driven by :class:`LocalBroker`"""
+
+    def __init__(self, broker: LocalBroker) -> None:
+        self.on_connect: Optional[Callable[..., None]] = None
+        self.on_disconnect: Optional[Callable[..., None]] = None
+        self.on_message: Optional[Callable[..., None]] = None
+        self.subscriptions: List[str] = []
+        self.delivered = 0
+        self._broker = broker
+        self._inbox: 'queue.Queue[Optional[FakeMessage]]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.on_delivered: Optional[Callable[[FakeMessage], None]] = None
+
+    # --- paho API -----------------------------------------------------------
+
+    def username_pw_set(self, username: str, password: Optional[str] = None) -> None:
+        _ = (username, password)
+
+    def connect(self, host: str, port: int = 1883, keepalive: int = 60) -> int:
+        _ = (host, port, keepalive)
+        self._broker.attach(self)
+        return MQTT_ERR_SUCCESS
+
+    def loop_start(self) -> int:
+        if self._thread is not None:
+            return 1
+        self._thread = threading.Thread(target=self._loop, name='fake-paho-loop', daemon=True)
+        self._thread.start()
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+        return MQTT_ERR_SUCCESS
+
+    def loop_stop(self, force: bool = False) -> int:
+        _ = force
+        if self._thread is None:
+            return 1
+        self._inbox.put(None)
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+        self._thread = None
+        return MQTT_ERR_SUCCESS
+
+    def disconnect(self) -> int:
+        self._broker.detach(self)
+        if self.on_disconnect:
+            self.on_disconnect(self, None, 0)
+        return MQTT_ERR_SUCCESS
+
+    def subscribe(self, topic: str, qos: int = 0) -> tuple:
+        _ = qos
+        if topic not in self.subscriptions:
+            self.subscriptions.append(topic)
+        return MQTT_ERR_SUCCESS, 1
+
+    def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False) -> PublishResult:
+        _ = retain
+        data = payload.encode() if isinstance(payload, str) else (payload or b'')
+        return self._broker.publish(topic, data, qos)
+
+    # --- harness hooks ------------------------------------------------------
+
+    def enqueue(self, message: FakeMessage) -> None:
+        self._inbox.put(message)
+
+    def backlog(self) -> int:
+        """Messages published but not yet handed to ``on_message``"""
+        return self._inbox.qsize()
+
+    def _loop(self) -> None:
+        while True:
+            message = self._inbox.get()
+            if message is None:
+                return
+            if self.on_message:
+                self.on_message(self, None, message)
+            self.delivered += 1
+            if self.on_delivered:
+                self.on_delivered(message)
@@ -0,0 +1,265 @@
+"""
+Disease detection inference benchmark
+=====================================
+Offline benchmark of the three stages of a detection, on synthetic images
+(no dataset and no running server needed):
+
+* ``preprocess`` - ``preprocess_image`` per image size and format.
+* ``predict``    - ``TFLiteModelLoader.predict`` per batch size (one pool invoke).
+* ``detect``     - ``detect_disease`` end to end (preprocessing, the
+  micro-batching scheduler, inference and the detection record), plus
+  ``--concurrency`` callers sharing the model for sustained images/s.
+
+Each (backend, threads) case loads the model in a fresh process, the way an
+API worker does (``INFERENCE_BACKEND``, ``INFERENCE_NUM_THREADS``, model
+registry); the prediction cache is disabled so every call runs the model.
+Other settings (batching, pool size, ORT_*) come from the environment.
+The report has latency percentiles and images/s per stage, a per-image
+breakdown of the detect p50 into its stages, the load time and the peak
+RSS growth of loading, of one preprocessing call and of the whole case.
+Backends whose model file is missing are reported as skipped.
+
+Usage:
+  cd backend
+  python -m benchmarks.inference_benchmark
+  python -m benchmarks.inference_benchmark --backends onnxruntime \
+      --onnx-model ../ml_training/models/exported/disease_detection_v1.onnx \
+      --sizes 4000x3000 1280x960 --formats JPEG PNG --batch-sizes 1 4 16 --threads 1 2 4 \
+      --output inference.json
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.common import (
+    configure_logging, current_rss_mb, environment, latency_summary, peak_rss_mb, reset_peak_rss,
+    window_peak_rss_mb, write_report)
+from benchmarks.preprocess_benchmark import parse_size, synthetic_image
+
+ML_MODELS_DIR = Path(__file__).resolve().parent.parent / 'app' / 'ml_models'
+
+
+def _timed(run, iterations: int) -> List[float]:
+    samples: List[float] = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+
+def _images_per_second(samples: List[float], batch_size: int = 1) -> float:
+    return round(1000.0 * batch_size * len(samples) / sum(samples), 1)
+
+
+def _run_case(case: Dict[str, Any], images: Dict[str, bytes], args: argparse.Namespace) -> Dict[str, Any]:
+    # Runs in a child process. The app reads its Config at import, so the
+    # environment is set up first: a one-version registry serving case['model']
+    registry_dir = tempfile.mkdtemp(prefix='inference-benchmark-')
+    os.environ.update({
+        'INFERENCE_BACKEND': case['backend'],
+        'INFERENCE_NUM_THREADS': str(case['threads']),
+        'MODEL_REGISTRY_DIR': registry_dir,
+        'PREDICTION_CACHE_ENABLED': 'False',
+    })
+    configure_logging(args.log_level)
+
+    from app.core.config import Config
+    from app.ml_models.model_loader import get_disease_model
+    from app.ml_models.model_registry import write_manifest
+    from app.services.disease_detection_service import detect_disease, preprocess_image
+
+    write_manifest(Path(registry_dir), {
+        'active': 'benchmark',
+        'shadow': None,
+        'models': {'benchmark': {
+            'model': str(Path(case['model']).resolve()),
+            'info': str(Path(args.model_info).resolve()),
+            'backend': case['backend'],
+        }},
+    })
+
+    # Load (and warm up) the model as the first request would
+    baseline_rss = current_rss_mb()
+    reset_peak_rss()
+    t0 = time.perf_counter()
+    try:
+        model = get_disease_model()
+    except ImportError as e:
+        shutil.rmtree(registry_dir, ignore_errors=True)
+        return {'skipped': str(e)}
+    load_ms = (time.perf_counter() - t0) * 1000.0
+    load_growth = window_peak_rss_mb() - baseline_rss
+
+    # predict: one pool invoke per batch, on real preprocessed pixels
+    sample = preprocess_image(next(iter(images.values())), model)
+    predict: Dict[str, Any] = {}
+    for batch_size in args.batch_sizes:
+        if batch_size > 1 and not model.dynamic_batch:
+            predict[str(batch_size)] = {'skipped': 'model has a fixed batch size'}
+            continue
+        batch = np.repeat(sample, batch_size, axis=0)
+        for _ in range(3):
+            model.predict(batch)
+        samples = _timed(lambda: model.predict(batch), args.iterations)
+        latency = latency_summary(samples)
+        predict[str(batch_size)] = {
+            'latency_ms': latency,
+            'per_image_p50_ms': round(latency['p50'] / batch_size, 3),
+            'images_per_second': _images_per_second(samples, batch_size),
+        }
+    inference_p50 = predict.get('1', {}).get('latency_ms', {}).get('p50')
+
+    per_image: Dict[str, Any] = {}
+    for name, image in images.items():
+        # First call measured on its own: peak memory of one decode
+        rss = current_rss_mb()
+        reset_peak_rss()
+        preprocess_image(image, model)
+        preprocess_growth = window_peak_rss_mb() - rss
+        preprocess_samples = _timed(lambda: preprocess_image(image, model), args.iterations)
+
+        status = detect_disease(image).get('status')
+        if status != 'success':
+            per_image[name] = {'error': f'detect_disease returned {status}'}
+            continue
+        detect_samples = _timed(lambda: detect_disease(image), args.iterations)
+
+        preprocess_latency = latency_summary(preprocess_samples)
+        detect_latency = latency_summary(detect_samples)
+        breakdown: Dict[str, Any] = {'preprocess_ms': preprocess_latency['p50']}
+        if inference_p50 is not None:
+            # The rest of a detection: scheduler queueing (up to INFERENCE_MAX_WAIT_MS for a
+            # lone request), postprocessing and building the record
+            other = max(0.0, detect_latency['p50'] - preprocess_latency['p50'] - inference_p50)
+            breakdown.update({'inference_ms': inference_p50, 'other_ms': round(other, 3)})
+            breakdown['shares'] = {stage[:-3]: round(value / detect_latency['p50'], 3)
+                                   for stage, value in breakdown.items() if stage.endswith('_ms')}
+        per_image[name] = {
+            'preprocess': {
+                'latency_ms': preprocess_latency,
+                'images_per_second': _images_per_second(preprocess_samples),
+                'peak_rss_growth_mb': round(preprocess_growth, 1),
+            },
+            'detect': {
+                'latency_ms': detect_latency,
+                'images_per_second': _images_per_second(detect_samples),
+            },
+            'detect_p50_breakdown': breakdown,
+        }
+
+    result: Dict[str, Any] = {
+        'model_version': model.model_version,
+        'dynamic_batch': model.dynamic_batch,
+        'pool_size': model.pool.size,
+        'backend_settings': model.backend.describe(),
+        'load_ms': round(load_ms, 1),
+        'load_peak_rss_growth_mb': round(load_growth, 1),
+        'predict': predict,
+        'images': per_image,
+    }
+
+    # Sustained detect throughput: `concurrency` callers cycling through the images
+    if args.concurrency > 0 and args.duration > 0:
+        payloads = list(images.values())
+        counts = [0] * args.concurrency
+        latencies: List[List[float]] = [[] for _ in range(args.concurrency)]
+        deadline = time.perf_counter() + args.duration
+
+        def caller(index: int) -> None:
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                detect_disease(payloads[counts[index] % len(payloads)])
+                latencies[index].append((time.perf_counter() - t0) * 1000.0)
+                counts[index] += 1
+
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(args.concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        result['concurrent_detect'] = {
+            'callers': args.concurrency,
+            'latency_ms': latency_summary([sample for samples in latencies for sample in samples]),
+            'images_per_second': round(sum(counts) / elapsed, 1),
+            'scheduler': model.scheduler.snapshot() if Config.INFERENCE_BATCHING_ENABLED else None,
+        }
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    shutil.rmtree(registry_dir, ignore_errors=True)
+    return result
+
+
+def build_cases(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    models: Dict[str, Optional[str]] = {'tflite': args.tflite_model, 'onnxruntime': args.onnx_model}
+    return [{'backend': backend, 'model': models[backend], 'threads': threads}
+            for backend in args.backends for threads in args.threads]
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    images: Dict[str, bytes] = {}
+    image_info: Dict[str, Any] = {}
+    for width, height in map(parse_size, args.sizes):
+        for fmt in args.formats:
+            name = f'{width}x{height} {fmt}'
+            images[name] = synthetic_image(width, height, fmt)
+            image_info[name] = {'megapixels': round(width * height / 1e6, 1), 'bytes': len(images[name])}
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for case in build_cases(args):
+        if not case['model'] or not Path(case['model']).exists():
+            results.append({**case, 'skipped': f"model file not found: {case['model']}"})
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(_run_case, case, images, args).result()
+        results.append({**case, **result})
+    return {
+        'benchmark': 'inference',
+        'config': vars(args),
+        'environment': environment(),
+        'images': image_info,
+        'cases': results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark disease detection preprocessing, inference and detection')
+    parser.add_argument('--backends', nargs='+', default=['tflite', 'onnxruntime'],
+                        choices=['tflite', 'onnxruntime'])
+    parser.add_argument('--tflite-model', default=str(ML_MODELS_DIR / 'chili_disease_model.tflite'))
+    parser.add_argument('--onnx-model', default=str(ML_MODELS_DIR / 'chili_disease_model.onnx'))
+    parser.add_argument('--model-info', default=str(ML_MODELS_DIR / 'model_info.json'))
+    parser.add_argument('--sizes', nargs='+', default=['4000x3000', '1920x1080', '640x480'],
+                        help='Synthetic image sizes (WIDTHxHEIGHT)')
+    parser.add_argument('--formats', nargs='+', default=['JPEG', 'PNG'], choices=['JPEG', 'PNG', 'WEBP'])
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4, 16],
+                        help='Batch sizes of the predict stage')
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, 2, 4],
+                        help='INFERENCE_NUM_THREADS per case')
+    parser.add_argument('--iterations', type=int, default=20, help='Timed runs per stage')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Concurrent detect_disease callers for the throughput run (0 = skip)')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds of the throughput run')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    write_report(run(args), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Ingestion throughput benchmark
+==============================
+Drives the real ``MQTTClient`` -> ingestion pipeline -> ``store_sensor_readings``
+-> alert path with a local MQTT stand-in (``benchmarks.fake_mqtt``) and the
+in-memory database backend, replaying synthetic streams built from
+``seed_rtdb_data.generate_realistic_reading``.
+
+Reports msgs/s, p50/p99 end-to-end lag (publish -> stored), CPU per message
+and the pipeline counters (pauses, shed readings, max queue depth).
+
+Usage:
+  cd backend
+  python -m benchmarks.ingestion_benchmark --devices 50 --rate 2 --duration 30
+  python -m benchmarks.ingestion_benchmark --devices 200 --rate 0 --messages 20000 --output ingest.json
+  python -m benchmarks.ingestion_benchmark --rate 0 --messages 50000 --high-watermark 2000 \
+      --low-watermark 500 --shed-policy downsample
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from benchmarks.common import configure_logging, environment, latency_summary, peak_rss_mb, write_report
+from benchmarks.fake_mqtt import FakeMessage, FakePahoClient, LocalBroker
+
+
+def build_payloads(devices: int, per_device: int, fault_rate: float, seed: int) -> List[List[Dict[str, Any]]]:
+    """Pre-generate synthetic readings so generation cost stays out of the timing"""
+    from seed_rtdb_data import generate_realistic_reading
+
+    random.seed(seed)
+    base = datetime.utcnow() - timedelta(days=1)
+    streams: List[List[Dict[str, Any]]] = []
+    for device in range(devices):
+        stream = []
+        for i in range(per_device):
+            when = base + timedelta(minutes=i)
+            reading = generate_realistic_reading(when, is_daytime=6 <= when.hour < 18, day_offset=0)
+            reading['device_id'] = f'bench_device_{device}'
+            if random.random() < fault_rate:
+                reading['ph'] = 4.2  # trips the ph_critical_low rule
+            stream.append(reading)
+        streams.append(stream)
+    return streams
+
+
+def seed_fields(db: Any, fields: int) -> None:
+    """Field and owner documents so the alert notification path is exercised"""
+    db.create_document('users', {'user_id': 'bench_user', 'name': 'Benchmark'}, 'bench_user')
+    for i in range(fields):
+        field_id = f'bench_field_{i}'
+        db.create_document('fields', {'field_id': field_id, 'user_id': 'bench_user'}, field_id)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.core.config import Config
+    from app.core.database import db
+    from app.core.ingestion_pipeline import IngestionItem, create_ingestion_pipeline
+    from app.core.mqtt_client import MQTTClient
+
+    db.use_memory_backend()
+    seed_fields(db, args.fields)
+
+    total = args.messages or int(args.devices * args.rate * args.duration)
+    if total <= 0:
+        raise SystemExit('Nothing to send: use --messages, or --rate > 0 with --duration')
+    per_device = -(-total // args.devices)
+    streams = build_payloads(args.devices, per_device, args.fault_rate, args.seed)
+
+    broker = LocalBroker()
+    fake = FakePahoClient(broker)
+    lags_ms: List[float] = []
+    priority_lags_ms: List[float] = []
+    done = threading.Event()
+    shed = {'count': 0}
+
+    def on_processed(items: List[IngestionItem]) -> None:
+        now = time.perf_counter()
+        for item in items:
+            lag = (now - item.payload['_sent_at']) * 1000.0
+            (priority_lags_ms if item.priority else lags_ms).append(lag)
+        if len(lags_ms) + len(priority_lags_ms) + shed['count'] >= total:
+            done.set()
+
+    def on_delivered(_: FakeMessage) -> None:
+        stats = pipeline.stats
+        shed['count'] = int(stats['downsampled'] + stats['dropped_normal'] + stats['dropped_priority'])
+        if len(lags_ms) + len(priority_lags_ms) + shed['count'] >= total:
+            done.set()
+
+    pipeline = create_ingestion_pipeline(
+        maxsize=args.queue_size,
+        high_watermark=args.high_watermark,
+        low_watermark=args.low_watermark,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        shed_policy=args.shed_policy,
+        on_processed=on_processed,
+    )
+    fake.on_delivered = on_delivered
+
+    client = MQTTClient(client_factory=lambda: fake, pipeline=pipeline)
+    client.connect()
+
+    total_rate = args.devices * args.rate
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+
+    for k in range(total):
+        device = k % args.devices
+        field_id = f'bench_field_{device % args.fields}'
+        topic = f'{Config.MQTT_TOPIC_PREFIX}/{field_id}/sensors/soil'
+        reading = streams[device][k // args.devices]
+        reading['_sent_at'] = time.perf_counter()
+        broker.publish(topic, json.dumps(reading).encode())
+        if total_rate > 0:
+            delay = wall_start + (k + 1) / total_rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    publish_seconds = time.perf_counter() - wall_start
+    finished = done.wait(timeout=args.timeout)
+    wall_seconds = time.perf_counter() - wall_start
+    cpu_seconds = time.process_time() - cpu_start
+    client.disconnect()
+
+    processed = len(lags_ms) + len(priority_lags_ms)
+    return {
+        'benchmark': 'ingestion',
+        'config': vars(args),
+        'environment': environment(),
+        'messages_published': total,
+        'messages_processed': processed,
+        'completed': finished,
+        'publish_seconds': round(publish_seconds, 3),
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_msgs_per_s': round(processed / wall_seconds, 1) if wall_seconds else 0,
+        'lag_ms': latency_summary(lags_ms + priority_lags_ms),
+        'priority_lag_ms': latency_summary(priority_lags_ms),
+        'normal_lag_ms': latency_summary(lags_ms),
+        'pipeline': pipeline.snapshot(),
+        'cpu_us_per_msg': round(cpu_seconds / processed * 1e6, 1) if processed else None,
+        'readings_stored': len(db.query_collection('sensor_readings')),
+        'alerts_stored': len(db.query_collection('alerts')),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark MQTT sensor ingestion throughput')
+    parser.add_argument('--devices', type=int, default=50, help='Number of simulated devices')
+    parser.add_argument('--fields', type=int, default=None, help='Number of fields (default: one per device)')
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help='Messages per second per device (0 = publish as fast as possible)')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of traffic to generate')
+    parser.add_argument('--messages', type=int, default=None, help='Total messages (overrides --duration)')
+    parser.add_argument('--fault-rate', type=float, default=0.01,
+                        help='Fraction of readings with an out-of-range pH, to exercise alerts')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Max seconds to wait for the backlog')
+    parser.add_argument('--queue-size', type=int, default=10000, help='Hard limit of the ingestion queue')
+    parser.add_argument('--high-watermark', type=int, default=8000, help='Queue depth that pauses intake')
+    parser.add_argument('--low-watermark', type=int, default=2000, help='Queue depth that resumes intake')
+    parser.add_argument('--batch-size', type=int, default=200, help='Readings per storage batch')
+    parser.add_argument('--workers', type=int, default=1, help='Storage worker threads')
+    parser.add_argument('--shed-policy', choices=('none', 'downsample'), default='none',
+                        help='What to do with normal readings while intake is paused')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+    args.fields = args.fields or args.devices
+
+    configure_logging(args.log_level)
+    write_report(run(args), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Image preprocessing benchmark
+=============================
+Compares the reference ``preprocess_reference`` path (full decode, float32
+copies) with the fast ``ImagePreprocessor`` (JPEG draft decoding, reduce,
+direct writes into the input tensor) on synthetic camera-sized images.
+
+Each (image, path) case runs in a fresh process, and the peak RSS is reset
+after imports (Linux), so ``peak_rss_growth_mb`` is the extra memory one
+preprocessing call needs at its peak. The report also has per-image latency
+percentiles, images/s and the mean absolute difference of the fast output
+against the reference.
+
+Usage:
+  cd backend
+  python -m benchmarks.preprocess_benchmark
+  python -m benchmarks.preprocess_benchmark --sizes 4000x3000 1600x1200 --formats JPEG PNG \
+      --iterations 30 --output preprocess.json
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from benchmarks.common import (
+    current_rss_mb, environment, latency_summary, reset_peak_rss, window_peak_rss_mb, write_report)
+
+# Path name -> (input dtype, quantization) of the fast preprocessor; None = reference path
+PATHS: Dict[str, Any] = {
+    'reference': None,
+    'fast_float32': (np.float32, (0.0, 0)),
+    'fast_uint8': (np.uint8, (1.0 / 255.0, 0)),
+}
+
+
+def synthetic_image(width: int, height: int, fmt: str, seed: int = 0) -> bytes:
+    """Leaf-like test image: smooth gradients plus noise, so codecs behave as on photos"""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    green = 120 + 80 * np.sin(x / max(width, 1) * 6.0) * np.cos(y / max(height, 1) * 4.0)
+    pixels = np.stack([green * 0.5, green, green * 0.3], axis=-1)
+    pixels += rng.normal(0.0, 12.0, pixels.shape).astype(np.float32)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    buffer = BytesIO()
+    image.save(buffer, fmt, **({'quality': 90} if fmt == 'JPEG' else {}))
+    return buffer.getvalue()
+
+
+def _run_case(image: bytes, path: str, iterations: int, size: int) -> Dict[str, Any]:
+    # Runs in a child process
+    from app.ml.preprocessing import ImagePreprocessor, preprocess_reference
+
+    if PATHS[path] is None:
+        run = lambda: preprocess_reference(image, size)  # noqa: E731
+    else:
+        dtype, quantization = PATHS[path]
+        preprocessor = ImagePreprocessor(size, dtype, quantization)
+        out = preprocessor.allocate(1)
+        run = lambda: preprocessor.preprocess_into(image, out[0]) or out  # noqa: E731
+
+    # First call measured on its own: peak memory of one image, no reused heap
+    baseline_rss = current_rss_mb()
+    reset_peak_rss()
+    run()
+    peak_growth = window_peak_rss_mb() - baseline_rss
+
+    samples: List[float] = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        result = run()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+
+    reference = preprocess_reference(image, size)
+    as_float = result.astype(np.float32) / (255.0 if result.dtype == np.uint8 else 1.0)
+    return {
+        'latency_ms': latency_summary(samples),
+        'images_per_second': round(1000.0 * len(samples) / sum(samples), 1),
+        'peak_rss_growth_mb': round(peak_growth, 1),
+        'mean_abs_diff_vs_reference': round(float(np.abs(as_float - reference).mean()), 5),
+    }
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    context = multiprocessing.get_context('spawn')
+    cases = []
+    for width, height in map(parse_size, args.sizes):
+        for fmt in args.formats:
+            image = synthetic_image(width, height, fmt)
+            results = {}
+            for path in args.paths:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    results[path] = executor.submit(
+                        _run_case, image, path, args.iterations, args.input_size).result()
+            reference_p50 = results.get('reference', {}).get('latency_ms', {}).get('p50')
+            for path, result in results.items():
+                if reference_p50 and path != 'reference':
+                    result['speedup_p50'] = round(reference_p50 / result['latency_ms']['p50'], 2)
+            cases.append({
+                'image': f'{width}x{height}',
+                'format': fmt,
+                'megapixels': round(width * height / 1e6, 1),
+                'bytes': len(image),
+                'paths': results,
+            })
+    return {
+        'benchmark': 'preprocess',
+        'config': vars(args),
+        'environment': environment(),
+        'cases': cases,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark disease image preprocessing paths')
+    parser.add_argument('--sizes', nargs='+', default=['4000x3000', '1920x1080', '640x480'],
+                        help='Synthetic image sizes (WIDTHxHEIGHT)')
+    parser.add_argument('--formats', nargs='+', default=['JPEG', 'PNG'], choices=['JPEG', 'PNG', 'WEBP'])
+    parser.add_argument('--paths', nargs='+', default=list(PATHS), choices=list(PATHS))
+    parser.add_argument('--iterations', type=int, default=20, help='Timed runs per case')
+    parser.add_argument('--input-size', type=int, default=224)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+    write_report(run(args), args.output)
+
+
+if __name__ == '__main__':
+    main()
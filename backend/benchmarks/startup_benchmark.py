@@ -0,0 +1,139 @@
+"""
+Startup benchmark
+=================
+Measures what an API process pays before serving its first request, each
+stage in a fresh process:
+
+* ``runtime_import`` - importing each installed TFLite runtime on its own.
+  The ``tensorflow`` row is what every process paid at import time when
+  ``model_loader`` imported TensorFlow and built the model on import.
+* ``app_import``     - ``import app`` (blueprints, services, model loader);
+  ``runtime_modules`` lists any runtime it pulled in (none with lazy loading).
+* ``model_load``     - per runtime, after the app import: constructing the
+  bundled ``TFLiteModelLoader`` (``load_ms``), its first invoke on a cold
+  interpreter (``first_invoke_ms``), ``warmup()`` after that (``warmup_ms``,
+  the rest of the pool and any larger batch) and one warm invoke
+  (``warm_invoke_ms``). The loader is built directly, not through
+  ``get_disease_model()``, whose registry warms the model before returning
+  it. Skipped when no model file is present.
+
+Each row has wall time and RSS growth over the bare interpreter + numpy.
+
+Usage:
+  cd backend
+  python -m benchmarks.startup_benchmark
+  python -m benchmarks.startup_benchmark --runtimes litert tensorflow --repeat 3 --output startup.json
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import current_rss_mb, environment, latency_summary, write_report
+
+# Kept in sync with app.ml_models.runtime.RUNTIMES; not imported from there so
+# that the child processes do not import the app before measuring
+RUNTIME_MODULES: Dict[str, str] = {
+    'litert': 'ai_edge_litert.interpreter',
+    'tflite_runtime': 'tflite_runtime.interpreter',
+    'tensorflow': 'tensorflow',
+}
+
+MODEL_PATH = Path(__file__).resolve().parent.parent / 'app' / 'ml_models' / 'chili_disease_model.tflite'
+
+
+def _loaded_runtimes() -> List[str]:
+    return [name for name, module in RUNTIME_MODULES.items() if module in sys.modules]
+
+
+def _stage(stage: str, runtime: Optional[str]) -> Dict[str, Any]:
+    # Runs in a child process
+    if runtime:
+        os.environ['INFERENCE_RUNTIME'] = runtime
+    baseline_rss = current_rss_mb()
+    result: Dict[str, Any] = {'stage': stage, 'runtime': runtime, 'baseline_rss_mb': baseline_rss}
+    t0 = time.perf_counter()
+    try:
+        if stage == 'runtime_import':
+            importlib.import_module(RUNTIME_MODULES[runtime])
+        else:
+            import app  # noqa: F401
+        result['import_ms'] = round((time.perf_counter() - t0) * 1000.0, 1)
+        if stage == 'model_load':
+            import numpy as np
+            from app.ml_models.model_loader import TFLiteModelLoader
+
+            t1 = time.perf_counter()
+            loader = TFLiteModelLoader()
+            result['load_ms'] = round((time.perf_counter() - t1) * 1000.0, 1)
+            detail = loader.pool.input_details[0]
+            sample = np.zeros((1, *detail['shape'][1:]), dtype=detail['dtype'])
+            for key, step in (('first_invoke_ms', lambda: loader.predict(sample)),
+                              ('warmup_ms', loader.warmup),
+                              ('warm_invoke_ms', lambda: loader.predict(sample))):
+                t2 = time.perf_counter()
+                step()
+                result[key] = round((time.perf_counter() - t2) * 1000.0, 1)
+    except ImportError as e:
+        return {'stage': stage, 'runtime': runtime, 'skipped': str(e)}
+    result['total_ms'] = round((time.perf_counter() - t0) * 1000.0, 1)
+    result['rss_growth_mb'] = round(current_rss_mb() - baseline_rss, 1)
+    result['runtime_modules'] = _loaded_runtimes()
+    return result
+
+
+def _summarise(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if 'skipped' in samples[0]:
+        return samples[0]
+    summary = {key: samples[0][key] for key in ('stage', 'runtime', 'runtime_modules')}
+    for key in ('import_ms', 'load_ms', 'first_invoke_ms', 'warmup_ms', 'warm_invoke_ms', 'total_ms',
+                'rss_growth_mb'):
+        if key in samples[0]:
+            summary[key] = latency_summary([s[key] for s in samples])['p50']
+    summary['baseline_rss_mb'] = samples[0]['baseline_rss_mb']
+    return summary
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    context = multiprocessing.get_context('spawn')
+    cases = [('runtime_import', runtime) for runtime in args.runtimes]
+    cases.append(('app_import', None))
+    if MODEL_PATH.exists():
+        cases.extend(('model_load', runtime) for runtime in args.runtimes)
+
+    stages = []
+    for stage, runtime in cases:
+        samples = []
+        for _ in range(args.repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                samples.append(executor.submit(_stage, stage, runtime).result())
+            if 'skipped' in samples[-1]:
+                break
+        stages.append(_summarise(samples))
+    return {
+        'benchmark': 'startup',
+        'config': vars(args),
+        'environment': environment(),
+        'model_present': MODEL_PATH.exists(),
+        'stages': stages,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark API process startup time and RSS')
+    parser.add_argument('--runtimes', nargs='+', default=list(RUNTIME_MODULES), choices=list(RUNTIME_MODULES))
+    parser.add_argument('--repeat', type=int, default=3, help='Fresh processes per stage (p50 reported)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+    write_report(run(args), args.output)
+
+
+if __name__ == '__main__':
+    main()
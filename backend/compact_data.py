@@ -0,0 +1,56 @@
+"""
+Apply the retention policies to sensor_readings, alerts and notifications.
+
+Raw readings older than RETENTION_READINGS_DAYS are compacted into the
+hourly/daily rollups and deleted (or archived with
+RETENTION_READINGS_MODE=archive); acknowledged/resolved alerts and old
+notifications are deleted in batches. Schedule it daily (cron / Cloud
+Scheduler) or set RETENTION_SCHEDULER_ENABLED=true to run it in-process.
+
+Usage:
+  cd backend
+  python compact_data.py --dry-run                       # report only
+  python compact_data.py
+  python compact_data.py --policy alerts --policy notifications
+  python compact_data.py --limit 50000                   # bound one run; re-run to continue
+"""
+import argparse
+import logging
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import db  # noqa: E402
+from app.services.retention import retention_days, run_compaction  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compact and delete data past its retention period')
+    parser.add_argument('--policy', action='append', dest='policies', choices=sorted(retention_days()),
+                        help='Policy to run (repeatable; default: every enabled policy)')
+    parser.add_argument('--page-size', type=int, default=500, help='Documents per page and delete batch')
+    parser.add_argument('--limit', type=int, help='Maximum documents per policy in this run')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    db.init_app(None)
+
+    days = retention_days()
+    reports = run_compaction(args.dry_run, args.policies, args.page_size, args.limit)
+    for name, report in reports.items():
+        if 'error' in report:
+            print(f'❌ {name}: {report["error"]}')
+            continue
+        extra = f', {report["rollup_days"]} rollup day(s) rewritten' if report.get('rollup_days') else ''
+        print(f'{"🔍" if args.dry_run else "✅"} {name} (> {days[name]} days, before {report["cutoff"]}): '
+              f'{"would delete" if args.dry_run else "deleted"} {report["deleted"]} of '
+              f'{report["scanned"]} scanned{extra}{"" if report["complete"] else " (limit reached)"}')
+    for name in sorted(set(args.policies or days) - set(reports)):
+        print(f'⏭️  {name}: disabled (0 days)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Copy sensor_readings into the per-field layout (fields/{field_id}/readings).
+
+Rollout:
+  1. Deploy with READINGS_LAYOUT=dual (new readings are written to both layouts)
+  2. python copy_readings.py              (resumable; re-run until complete)
+  3. Deploy with READINGS_LAYOUT=field    (reads and writes use the subcollections)
+
+Progress is checkpointed in ``migrations/sensor_readings_field_layout``.
+
+Usage:
+  cd backend
+  python copy_readings.py --dry-run
+  python copy_readings.py --limit 200000
+  python copy_readings.py --restart
+"""
+import argparse
+import logging
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import Config  # noqa: E402
+from app.core.database import db  # noqa: E402
+from app.services.sensor_migrations import copy_readings_to_fields  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Copy sensor_readings into fields/{field_id}/readings')
+    parser.add_argument('--page-size', type=int, default=500, help='Documents per read page')
+    parser.add_argument('--limit', type=int, help='Stop after this many documents')
+    parser.add_argument('--dry-run', action='store_true', help='Only count documents to copy')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    db.init_app(None)
+
+    if Config.READINGS_LAYOUT != 'dual' and not args.dry_run:
+        print(f'⚠️  READINGS_LAYOUT is {Config.READINGS_LAYOUT!r}; readings ingested during the copy '
+              f'are only in both layouts with READINGS_LAYOUT=dual')
+
+    stats = copy_readings_to_fields(args.page_size, args.limit, args.dry_run, args.restart)
+    print(f'{"🔍" if args.dry_run else "✅"} scanned {stats["scanned"]}, '
+          f'{"would copy" if args.dry_run else "copied"} {stats["copied"]} into {stats["fields"]} field(s), '
+          f'skipped {stats["skipped"]} without field_id')
+    print('Complete' if stats['complete'] else f'Stopped after {stats["last_id"]}; re-run to resume')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Export a field's or batch's data from Firestore to CSV, Arrow IPC or Parquet.
+
+Documents are streamed page by page and written chunk by chunk, so season-
+long exports run in bounded memory.
+
+Usage:
+  cd backend
+  python export_data.py sensor_readings --field field_123 --format parquet -o readings.parquet
+  python export_data.py disease_detections --batch <batch_id> --format csv -o detections.csv
+  python export_data.py sensor_readings --field field_123 --start 2025-06-01 --end 2025-07-01 \\
+      --columns timestamp,ph,moisture --format arrow -o june.arrows
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import db  # noqa: E402
+from app.services.export_service import (EXPORT_COLLECTIONS, EXPORT_FORMATS, export_scope,  # noqa: E402
+                                         stream_export)
+
+
+def _utc(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Stream Firestore data to CSV / Arrow / Parquet')
+    parser.add_argument('collection', choices=sorted(EXPORT_COLLECTIONS))
+    scope = parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument('--field', help='Field ID')
+    scope.add_argument('--batch', help='Crop batch ID')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--start', type=_utc, help='ISO date/time (UTC), inclusive')
+    parser.add_argument('--end', type=_utc, help='ISO date/time (UTC), exclusive')
+    parser.add_argument('--columns', help='Comma separated columns (default: standard set)')
+    parser.add_argument('--chunk-size', type=int, default=5000,
+                        help='Rows per CSV chunk / Arrow batch / Parquet row group')
+    parser.add_argument('-o', '--output', required=True, help='Output file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    db.init_app(None)
+
+    filters, season = export_scope(args.collection, args.field, args.batch)
+    start, end = args.start, args.end
+    if season:
+        start = max(start, season[0]) if start else season[0]
+        end = min(end, season[1]) if end else season[1]
+    columns = args.columns.split(',') if args.columns else None
+
+    written = 0
+    with open(args.output, 'wb') as f:
+        for chunk in stream_export(args.collection, args.format, filters, start, end, columns, args.chunk_size):
+            f.write(chunk)
+            written += len(chunk)
+    print(f'✅ Wrote {written} bytes to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
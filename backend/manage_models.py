@@ -0,0 +1,166 @@
+"""
+Manage the versioned disease model registry (MODEL_REGISTRY_DIR).
+
+Registering copies a .tflite (TFLite) or .onnx (ONNX Runtime) model and
+its model_info.json into <registry>/<version>/<revision>/ and records it in
+manifest.json with the backend that serves it. The revision is a content
+hash of both files, so `register --force` with a new artifact changes the
+served model version (<version>+<revision>): workers hot-swap to it and
+cached predictions of the old artifact are not reused. Activating or
+shadowing only rewrites the manifest: every API worker polls it
+(MODEL_REGISTRY_POLL_SECONDS), loads and warms the new version in the
+background and swaps it in without dropping in-flight requests.
+
+Usage:
+  cd backend
+  python manage_models.py list
+  python manage_models.py register v2 models/exported/disease_detection_v2_int8.tflite \
+      --info app/ml_models/model_info.json
+  python manage_models.py register v3 models/exported/disease_detection_v3.onnx
+  python manage_models.py shadow v2 --sample-rate 0.1     # compare v2 on 10% of requests
+  python manage_models.py activate v2
+  python manage_models.py unshadow
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import Config  # noqa: E402
+from app.ml_models.backends import MODEL_SUFFIXES, backend_for_model  # noqa: E402
+from app.ml_models.model_registry import read_manifest, write_manifest  # noqa: E402
+
+
+def cmd_list(registry_dir: Path, args: argparse.Namespace) -> None:
+    manifest = read_manifest(registry_dir)
+    shadow = manifest.get('shadow') or {}
+    if not manifest['models']:
+        print(f'📭 No models registered in {registry_dir}')
+    for version, spec in sorted(manifest['models'].items()):
+        marks = []
+        if version == manifest['active']:
+            marks.append('active')
+        if version == shadow.get('version'):
+            marks.append(f'shadow {float(shadow.get("sample_rate", 0)):.0%}')
+        print(f'{"✅" if "active" in marks else "📦"} {version}'
+              f'{"+" + spec["revision"] if spec.get("revision") else ""}: {spec["model"]} '
+              f'[{spec.get("backend") or Config.INFERENCE_BACKEND}] '
+              f'(registered {spec.get("registered_at", "?")}){" [" + ", ".join(marks) + "]" if marks else ""}')
+
+
+def artifact_revision(*paths: Path) -> str:
+    """Content hash of the files of a version (first 12 hex digits of their SHA-256)"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def cmd_register(registry_dir: Path, args: argparse.Namespace) -> None:
+    manifest = read_manifest(registry_dir)
+    if args.version in manifest['models'] and not args.force:
+        sys.exit(f'❌ Version {args.version} is already registered (use --force to replace it)')
+    backend = backend_for_model(args.model)
+    if backend is None:
+        sys.exit(f'❌ Unsupported model file {args.model} (expected {", ".join(MODEL_SUFFIXES.values())})')
+    # A new directory per revision: files a worker is still serving are never overwritten
+    revision = artifact_revision(args.model, args.info)
+    target = registry_dir / args.version / revision
+    target.mkdir(parents=True, exist_ok=True)
+    model_file = f'model{MODEL_SUFFIXES[backend]}'
+    for source, name in ((args.model, model_file), (args.info, 'model_info.json')):
+        if not (target / name).exists():
+            shutil.copy2(source, target / f'{name}.tmp')
+            os.replace(target / f'{name}.tmp', target / name)
+    manifest['models'][args.version] = {
+        'model': f'{args.version}/{revision}/{model_file}',
+        'info': f'{args.version}/{revision}/model_info.json',
+        'backend': backend,
+        'revision': revision,
+        'source': str(args.model),
+        'registered_at': datetime.utcnow().isoformat(),
+    }
+    if manifest['active'] is None:
+        manifest['active'] = args.version
+    write_manifest(registry_dir, manifest)
+    print(f'✅ Registered {args.version}+{revision}{" (active)" if manifest["active"] == args.version else ""}')
+
+
+def cmd_activate(registry_dir: Path, args: argparse.Namespace) -> None:
+    manifest = read_manifest(registry_dir)
+    if args.version not in manifest['models']:
+        sys.exit(f'❌ Version {args.version} is not registered')
+    previous, manifest['active'] = manifest['active'], args.version
+    if (manifest.get('shadow') or {}).get('version') == args.version:
+        manifest['shadow'] = None
+    write_manifest(registry_dir, manifest)
+    print(f'🔁 Active model: {previous} -> {args.version} (workers switch within '
+          f'{Config.MODEL_REGISTRY_POLL_SECONDS:g}s)')
+
+
+def cmd_shadow(registry_dir: Path, args: argparse.Namespace) -> None:
+    manifest = read_manifest(registry_dir)
+    if args.version not in manifest['models']:
+        sys.exit(f'❌ Version {args.version} is not registered')
+    if args.version == manifest['active']:
+        sys.exit(f'❌ Version {args.version} is already active')
+    if not 0 < args.sample_rate <= 1:
+        sys.exit('❌ --sample-rate must be in (0, 1]')
+    manifest['shadow'] = {'version': args.version, 'sample_rate': args.sample_rate}
+    write_manifest(registry_dir, manifest)
+    print(f'👥 Shadowing {args.version} on {args.sample_rate:.0%} of requests; '
+          f'agreement and latency at GET /api/v1/disease/models')
+
+
+def cmd_unshadow(registry_dir: Path, args: argparse.Namespace) -> None:
+    manifest = read_manifest(registry_dir)
+    manifest['shadow'] = None
+    write_manifest(registry_dir, manifest)
+    print('✅ Shadow evaluation stopped')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Manage versioned disease models')
+    parser.add_argument('--registry-dir', default=Config.MODEL_REGISTRY_DIR,
+                        help='Registry directory (default: MODEL_REGISTRY_DIR)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help='Show registered versions').set_defaults(func=cmd_list)
+
+    register = commands.add_parser('register', help='Copy a model into the registry')
+    register.add_argument('version')
+    register.add_argument('model', type=Path, help='.tflite or .onnx file')
+    register.add_argument('--info', type=Path, default=Path('app/ml_models/model_info.json'),
+                          help='model_info.json with the class names')
+    register.add_argument('--force', action='store_true', help='Replace an existing version')
+    register.set_defaults(func=cmd_register)
+
+    activate = commands.add_parser('activate', help='Serve a version (hot-swapped by the workers)')
+    activate.add_argument('version')
+    activate.set_defaults(func=cmd_activate)
+
+    shadow = commands.add_parser('shadow', help='Evaluate a candidate on a fraction of traffic')
+    shadow.add_argument('version')
+    shadow.add_argument('--sample-rate', type=float, default=0.05)
+    shadow.set_defaults(func=cmd_shadow)
+
+    commands.add_parser('unshadow', help='Stop shadow evaluation').set_defaults(func=cmd_unshadow)
+
+    args = parser.parse_args()
+    if not args.registry_dir:
+        sys.exit('❌ Set MODEL_REGISTRY_DIR or pass --registry-dir')
+    registry_dir = Path(args.registry_dir)
+    registry_dir.mkdir(parents=True, exist_ok=True)
+    args.func(registry_dir, args)
+
+
+if __name__ == '__main__':
+    main()
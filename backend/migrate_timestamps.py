@@ -0,0 +1,50 @@
+"""
+Normalise sensor_readings timestamps (resumable).
+
+Rewrites legacy ISO-string / naive timestamps as UTC Firestore Timestamps and
+adds the integer ``timestamp_ms`` field that history, latest-reading and
+query paths filter and order on. Progress is checkpointed in
+``migrations/sensor_reading_timestamps`` after every page; re-running
+resumes from the checkpoint.
+
+Deploy the composite indexes in database/firestore/indexes.json first.
+
+Usage:
+  cd backend
+  python migrate_timestamps.py --dry-run
+  python migrate_timestamps.py                  # resume / run to completion
+  python migrate_timestamps.py --limit 100000   # bounded run, resume later
+  python migrate_timestamps.py --restart        # rescan from the beginning
+"""
+import argparse
+import logging
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import db  # noqa: E402
+from app.services.sensor_migrations import migrate_reading_timestamps  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Normalise sensor_readings timestamps')
+    parser.add_argument('--page-size', type=int, default=500, help='Documents per read page / write batch')
+    parser.add_argument('--limit', type=int, help='Stop after this many documents')
+    parser.add_argument('--dry-run', action='store_true', help='Only count documents needing rewrite')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    db.init_app(None)
+
+    stats = migrate_reading_timestamps(args.page_size, args.limit, args.dry_run, args.restart)
+    print(f'{"🔍" if args.dry_run else "✅"} scanned {stats["scanned"]}, '
+          f'{"would update" if args.dry_run else "updated"} {stats["updated"]}, '
+          f'already canonical {stats["canonical"]}, unparseable {stats["invalid"]}')
+    print('Complete' if stats['complete'] else f'Stopped after {stats["last_id"]}; re-run to resume')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,8 +4,11 @@ Run this ONCE to populate Firestore with sample data
 """
 
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from app.core.database import db as database
 from app.core.firebase import get_firestore_client
+from app.services.reading_store import write_readings
+from app.utils.helpers import normalize_timestamp
 
 def seed_demo_user():
     """Create demo user"""
@@ -45,14 +48,16 @@ def seed_field():
 
 def seed_sensor_readings():
     """Create sample sensor readings for the last 7 days"""
-    db = get_firestore_client()
+    # Written through the reading store, so they land in the READINGS_LAYOUT collections
+    if database.db is None:
+        database.init_app(None)
 
     # Generate readings for past 7 days
     readings = []
-    base_time = datetime.now()
+    base_time = datetime.now(timezone.utc)
 
     for i in range(7):
-        timestamp = (base_time - timedelta(days=i)).isoformat()
+        timestamp, timestamp_ms = normalize_timestamp(base_time - timedelta(days=i))
 
         reading = {
             'field_id': 'field_123',
@@ -64,12 +69,12 @@ def seed_sensor_readings():
             'temperature': 28.5 + (i % 2),  # Temperature: 28-30°C
             'ec': 0.8 + (i * 0.05),  # Electrical Conductivity (dS/m)
             'timestamp': timestamp,
+            'timestamp_ms': timestamp_ms,
         }
         readings.append(reading)
 
-        # Add to Firestore
-        doc_id = f"reading_{i}_{int(base_time.timestamp())}"
-        db.collection('sensor_readings').document(doc_id).set(reading)
+    # Add to Firestore
+    write_readings('field_123', readings)
 
     print(f"✅ {len(readings)} sensor readings created (7 days of data)")
 
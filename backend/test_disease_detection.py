@@ -2,10 +2,14 @@
 Test script for disease detection API
 IMPORTANT: Backend (run.py) must be running in separate terminal!
 
+For offline latency/throughput numbers (no server, synthetic images) use
+benchmarks/inference_benchmark.py instead.
+
 Usage:
   cd backend
-  python test_disease_detection.py
+  TEST_IMAGE_PATH=test_images/leaf.jpg python test_disease_detection.py
 """
+import os
 import requests
 import json
 from pathlib import Path
@@ -14,8 +18,8 @@ import time
 BASE_URL = "http://localhost:5000"
 API_ENDPOINT = f"{BASE_URL}/api/v1/disease/detect"
 
-# ⚠️ CHANGE THIS to your actual test image path
-TEST_IMAGE_PATH = "D:/DOWNLOADS/KJ SOMAIYA/SEM 7/FINAL YEAR Project/Perplexity Made/chilliguard/backend/test_images/images.jpg"  # Relative to backend folder
+# Test image path (relative to the backend folder), override with TEST_IMAGE_PATH
+TEST_IMAGE_PATH = os.getenv("TEST_IMAGE_PATH", "test_images/images.jpg")
 
 def print_header(title):
     """Print formatted header"""
@@ -92,7 +96,7 @@ def test_image_upload():
         print(f"   1. Download a chilli leaf image from Google")
         print(f"   2. Save it as: {TEST_IMAGE_PATH}")
         print(f"   3. Place it in: {Path.cwd()}")
-        print(f"\n   OR change TEST_IMAGE_PATH in this script")
+        print(f"\n   OR set the TEST_IMAGE_PATH environment variable")
         print(f"\n   SKIPPING this test...")
         return None
 
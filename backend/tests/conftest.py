@@ -0,0 +1,17 @@
+"""Shared pytest setup: make the ``app`` package importable from backend/"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def memory_db():
+    """The global ``db`` on a fresh in-memory backend"""
+    from app.core.database import db
+    previous = db.db
+    db.use_memory_backend()
+    yield db
+    db.db = previous
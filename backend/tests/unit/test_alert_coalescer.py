@@ -0,0 +1,66 @@
+"""Alert coalescing windows, daily caps and acknowledgement"""
+import pytest
+
+from app.services import alert_coalescer, notification_service
+from app.services.alert_coalescer import AlertCoalescer, DailyCap, SECONDS_PER_DAY
+
+KEY = ('f1', 'sensor', 'ph', 'ph_low')
+
+
+def test_daily_cap_allows_capacity_in_any_24h():
+    cap = DailyCap(3)
+    assert [cap.try_consume(t) for t in (0, 10, 20, 30)] == [True, True, True, False]
+    assert not cap.try_consume(SECONDS_PER_DAY - 1)
+    assert cap.try_consume(SECONDS_PER_DAY)
+    assert not cap.try_consume(SECONDS_PER_DAY + 5)
+
+
+def test_window_coalesces_until_it_expires_or_the_alert_is_closed():
+    coalescer = AlertCoalescer(window_seconds=60, critical_per_day=1, other_per_day=1,
+                               digest_interval_seconds=60)
+    assert coalescer.record(KEY, now=0) == (None, True)
+    coalescer.bind(KEY, 'a1')
+    assert coalescer.record(KEY, now=30) == ('a1', False)
+    assert coalescer.record(KEY, now=61) == (None, True)
+    coalescer.bind(KEY, 'a2')
+    coalescer.forget_alert('a2')
+    assert coalescer.record(KEY, now=62) == (None, True)
+
+
+@pytest.fixture
+def alerts(memory_db, monkeypatch):
+    monkeypatch.setattr(alert_coalescer, '_coalescer', AlertCoalescer(3600, 5, 20, 3600))
+    pushes = []
+    monkeypatch.setattr(notification_service, 'send_alert_notification', lambda *args: pushes.append(args))
+    memory_db.create_document('fields', {'user_id': 'u1'}, 'f1')
+    return pushes
+
+
+def _fire():
+    return notification_service.create_alert('f1', 'sensor', 'ph', 'pH low', 'warning',
+                                             extra={'rule_id': 'ph_low', 'status': 'active'})
+
+
+def test_acknowledged_alert_takes_no_repeats(alerts, memory_db):
+    first = _fire()
+    assert _fire() == first and len(alerts) == 1
+    assert memory_db.get_document('alerts', first)['occurrences'] == 2
+
+    assert notification_service.acknowledge_alert(first, 'u1')
+    second = _fire()
+    assert second != first and len(alerts) == 2
+    assert memory_db.get_document('alerts', first)['acknowledged']
+
+
+def test_firing_resolved_refire_creates_a_new_alert(alerts, memory_db):
+    first = _fire()
+    notification_service.resolve_alert(first)
+    second = _fire()
+    assert second != first and len(alerts) == 2
+    assert memory_db.get_document('alerts', first)['status'] == 'resolved'
+
+
+def test_alert_closed_by_another_worker_is_not_reopened(alerts, memory_db):
+    first = _fire()
+    memory_db.update_document('alerts', first, {'acknowledged': True})
+    assert _fire() != first
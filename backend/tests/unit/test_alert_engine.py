@@ -0,0 +1,109 @@
+"""Alert rule engine: hysteresis, debounce and state transitions"""
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from app.services.alert_engine import AlertRule, AlertRuleEngine
+
+T0 = 1_767_225_600.0
+
+
+def _readings(values, channel='ph', step=60.0, start=T0):
+    return [{'timestamp': datetime.fromtimestamp(start + step * i, tz=timezone.utc), channel: value}
+            for i, value in enumerate(values)]
+
+
+def _states(transitions):
+    return [(t['state'], t['value']) for t in transitions]
+
+
+def _low_ph(**kwargs):
+    return AlertRule('ph_low', 'threshold', 'ph', threshold=5.0, operator='<', clear=5.2, **kwargs)
+
+
+def test_hysteresis_ignores_values_between_threshold_and_clear():
+    engine = AlertRuleEngine([_low_ph()])
+
+    transitions = engine.evaluate('f1', _readings([6.0, 4.9, 5.1, 4.95, 5.15, 5.0, 5.3]))
+
+    assert _states(transitions) == [('firing', 4.9), ('resolved', 5.3)]
+
+
+def test_firing_resolved_refire_across_batches():
+    engine = AlertRuleEngine([_low_ph()])
+
+    assert _states(engine.evaluate('f1', _readings([6.0, 4.8]))) == [('firing', 4.8)]
+    engine.bind_alert('f1', 'ph_low', 'alert-1')
+    assert engine.evaluate('f1', _readings([4.7, 5.1], start=T0 + 120)) == []
+
+    resolved = engine.evaluate('f1', _readings([5.25], start=T0 + 240))
+    assert _states(resolved) == [('resolved', 5.25)]
+    assert resolved[0]['alert_id'] == 'alert-1'
+
+    refired = engine.evaluate('f1', _readings([5.1, 4.9], start=T0 + 300))
+    assert _states(refired) == [('firing', 4.9)]
+    assert refired[0]['alert_id'] is None
+
+
+def test_debounce_requires_breach_to_persist():
+    engine = AlertRuleEngine([_low_ph(debounce_seconds=300)])
+
+    # Breaches of 4 minutes never fire
+    assert engine.evaluate('f1', _readings([4.9] * 5 + [5.3] + [4.9] * 5)) == []
+
+    # Cleared, then breached from T0 + 720: fires five minutes later
+    transitions = engine.evaluate('f1', _readings([5.3] + [4.9] * 6, start=T0 + 660))
+    assert _states(transitions) == [('firing', 4.9)]
+    assert transitions[0]['timestamp'] == datetime.fromtimestamp(T0 + 1020, tz=timezone.utc)
+
+
+def test_debounce_spans_batches_and_unordered_input():
+    engine = AlertRuleEngine([_low_ph(debounce_seconds=120)])
+
+    assert engine.evaluate('f1', _readings([4.9, 4.9])) == []
+    late = _readings([4.9, 4.9], start=T0 + 120)
+    assert _states(engine.evaluate('f1', late[::-1])) == [('firing', 4.9)]
+
+
+def test_flagged_values_are_ignored():
+    engine = AlertRuleEngine([_low_ph()])
+    readings = _readings([6.0, 3.0, 6.0])
+    readings[1]['quality_flags'] = ['ph']
+
+    assert engine.evaluate('f1', readings) == []
+
+
+def test_rate_of_change_rule():
+    rule = AlertRule('drop', 'rate_of_change', 'moisture', threshold=5.0, clear=1.0, direction='fall')
+    engine = AlertRuleEngine([rule])
+
+    transitions = engine.evaluate('f1', _readings([60.0, 59.0, 52.0, 50.0, 49.5], channel='moisture'))
+
+    assert _states(transitions) == [('firing', 7.0), ('resolved', 0.5)]
+
+
+def test_state_loader_resumes_open_alerts():
+    engine = AlertRuleEngine([_low_ph()], state_loader=lambda field_id: {'ph_low': 'stored-alert'})
+
+    assert engine.is_alert_relevant('f1', {'ph': 6.0}) is False
+    resolved = engine.evaluate('f1', _readings([4.9, 5.5]))
+
+    assert _states(resolved) == [('resolved', 5.5)]
+    assert resolved[0]['alert_id'] == 'stored-alert'
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError):
+        AlertRule('bad', 'threshold', 'ph', threshold=5.0, operator='<', clear=4.0)
+    with pytest.raises(ValueError):
+        AlertRule('bad', 'duration', 'temperature', threshold=38.0)
+    with pytest.raises(ValueError):
+        AlertRule('bad', 'spike', 'ph', threshold=1.0)
+
+
+def test_bundled_rules_load():
+    path = Path(__file__).resolve().parents[2] / 'app' / 'services' / 'alert_rules.json'
+    engine = AlertRuleEngine.from_file(path)
+
+    assert {rule.rule_id for rule in engine.rules} >= {'ph_critical_low', 'temperature_sustained_high'}
@@ -0,0 +1,82 @@
+"""LTTB downsampling"""
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.utils.downsampling import downsample_readings, lttb_indices
+
+
+def _reference_lttb(x, y, n_out):
+    # Steinarsson's reference implementation, with bucket bounds computed in
+    # exact integer arithmetic (float rounding can drop the second-last point)
+    n = len(x)
+
+    def bound(i):
+        return i * (n - 2) // (n_out - 2) + 1
+
+    a = 0
+    selected = [0]
+    for i in range(n_out - 2):
+        avg_start, avg_end = bound(i + 1), min(bound(i + 2), n)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+        best, best_area = -1, -1.0
+        for j in range(bound(i), bound(i + 1)):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def test_matches_reference_implementation():
+    rng = np.random.default_rng(5)
+    for n, n_out in ((1000, 100), (1001, 37), (250, 249), (10, 3)):
+        x = np.cumsum(rng.uniform(1, 5, n))
+        y = np.cumsum(rng.normal(0, 1, n))
+        assert lttb_indices(x, y, n_out).tolist() == _reference_lttb(x.tolist(), y.tolist(), n_out)
+
+
+def test_keeps_endpoints_and_spikes():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[[137, 612]] = [50.0, -40.0]
+
+    keep = lttb_indices(x, y, 20)
+
+    assert keep.size == 20 and keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    assert {137, 612} <= set(keep.tolist())
+
+
+def test_short_series_are_returned_unchanged():
+    x = np.arange(5, dtype=np.float64)
+    assert lttb_indices(x, x, 5).tolist() == [0, 1, 2, 3, 4]
+    assert lttb_indices(x, x, 2).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_downsample_readings_per_channel():
+    base = 1_767_225_600
+    readings = [{'timestamp': datetime.fromtimestamp(base + 60 * i, tz=timezone.utc),
+                 'ph': 6.0 + (i % 10) / 10, 'moisture': None if i % 2 else float(i)}
+                for i in range(200)]
+
+    result = downsample_readings(readings[::-1], ('ph', 'moisture'), 50)
+
+    assert result['count'] == 200 and result['max_points'] == 50
+    ph, moisture = result['channels']['ph'], result['channels']['moisture']
+    assert len(ph['timestamps']) == len(ph['values']) == 50
+    assert ph['timestamps'][0] == base * 1000 and ph['timestamps'][-1] == (base + 60 * 199) * 1000
+    assert ph['timestamps'] == sorted(ph['timestamps'])
+    assert len(moisture['values']) == 50 and all(v % 2 == 0 for v in moisture['values'])
+    assert moisture['timestamps'][-1] == (base + 60 * 198) * 1000
+
+
+def test_downsample_readings_without_limit_keeps_everything():
+    readings = [{'timestamp': datetime.fromtimestamp(i, tz=timezone.utc), 'ph': float(i)} for i in range(10)]
+
+    result = downsample_readings(readings, ('ph',), None)
+
+    assert result['channels']['ph']['values'] == [float(i) for i in range(10)]
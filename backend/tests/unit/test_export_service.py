@@ -0,0 +1,50 @@
+"""Exports stream archived and live readings and validate columns"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import sensor_archive
+from app.services.export_service import ExportError, iter_records, stream_export
+from app.services.reading_store import write_readings
+from app.utils.helpers import normalize_timestamp
+
+BASE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def archive(memory_db, monkeypatch, tmp_path):
+    monkeypatch.setattr(sensor_archive, '_store', sensor_archive.LocalArchiveStore(str(tmp_path)))
+    for field_id in ('f1', 'f2'):
+        readings = []
+        for i in range(90):
+            ts, ms = normalize_timestamp(BASE + timedelta(days=i))
+            readings.append({'field_id': field_id, 'device_id': 'd1', 'timestamp': ts, 'timestamp_ms': ms,
+                             'ph': float(i)})
+        write_readings(field_id, readings)
+    # January and February move to the archive, March stays live
+    sensor_archive.archive_readings(BASE + timedelta(days=59), ['f1', 'f2'])
+
+
+def _days(records):
+    return [int(r['ph']) for r in records]
+
+
+def test_field_export_streams_archive_then_live(archive):
+    records = list(iter_records('sensor_readings', [('field_id', '==', 'f1')],
+                                BASE + timedelta(days=40), BASE + timedelta(days=70), page_size=7))
+    assert _days(records) == list(range(40, 70))
+    assert all(r.get('archived') for r in records[:19]) and not records[19].get('archived')
+
+
+def test_export_without_field_filter_includes_archived_readings(archive):
+    records = list(iter_records('sensor_readings', [('device_id', '==', 'd1')], page_size=11))
+    assert len(records) == 180
+    assert sum(1 for r in records if r.get('archived')) == 2 * 59
+
+
+def test_unknown_columns_are_rejected(archive):
+    with pytest.raises(ExportError, match='allowed: id, field_id'):
+        stream_export('sensor_readings', 'csv', [('field_id', '==', 'f1')], columns=['ph', 'bogus'])
+    csv_bytes = b''.join(stream_export('sensor_readings', 'csv', [('field_id', '==', 'f1')],
+                                       columns=['timestamp', 'ec', 'ph']))
+    assert csv_bytes.splitlines()[0] == b'timestamp,ec,ph'
@@ -0,0 +1,45 @@
+"""Gorilla codec round-trips"""
+import numpy as np
+
+from app.utils.gorilla import decode_floats, decode_timestamps, encode_floats, encode_timestamps
+
+
+def test_timestamps_round_trip_regular_and_large_deltas():
+    base = 1_767_225_600_000
+    timestamps = [base + 60_000 * i for i in range(50)]
+    # Jitter, a gap per delta-of-delta bucket, an hour gap, going backwards and a huge jump
+    timestamps += [timestamps[-1] + d for d in (60_001, 120_000, 120_300, 125_000, 3_725_000, 3_600_000)]
+    timestamps += [timestamps[-1] - 10_000, timestamps[-1] + 2 ** 40, -5]
+
+    data = encode_timestamps(timestamps)
+
+    assert decode_timestamps(data, len(timestamps)) == timestamps
+
+
+def test_regular_timestamps_compress_to_one_bit_per_point():
+    timestamps = [1_767_225_600_000 + 60_000 * i for i in range(1001)]
+    # 64-bit first value, a 4 + 64-bit first delta, then one 0 bit per point
+    assert len(encode_timestamps(timestamps)) == (64 + 68 + 999 + 7) // 8
+
+
+def test_floats_round_trip_bit_exact_with_nan():
+    values = [6.5, 6.5, 6.51, np.nan, 6.49, -0.0, 0.0, 1e300, -1e-300, np.inf, np.nan, np.nan, 42.0]
+
+    decoded = decode_floats(encode_floats(values), len(values))
+
+    np.testing.assert_array_equal(decoded.view(np.uint64), np.asarray(values).view(np.uint64))
+
+
+def test_floats_round_trip_random_walk():
+    rng = np.random.default_rng(7)
+    values = np.round(20 + np.cumsum(rng.normal(0, 0.3, 2000)), 2)
+    values[rng.integers(0, values.size, 50)] = np.nan
+
+    decoded = decode_floats(encode_floats(values), values.size)
+
+    np.testing.assert_array_equal(decoded.view(np.uint64), values.view(np.uint64))
+
+
+def test_empty_streams():
+    assert decode_timestamps(encode_timestamps([]), 0) == []
+    assert decode_floats(encode_floats([]), 0).size == 0
@@ -0,0 +1,59 @@
+"""Hot-window history matches the database path for the same readings"""
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import Config
+from app.services import sensor_data_service
+from app.services.hot_window_store import HotWindowStore
+from app.services.reading_store import write_readings
+from app.utils.helpers import normalize_timestamp
+
+
+def _readings(count: int):
+    now = datetime.now(timezone.utc)
+    readings = []
+    for i in range(count):
+        ts, ms = normalize_timestamp(now - timedelta(minutes=5 * i))
+        reading = {'field_id': 'f1', 'device_id': 'd1', 'timestamp': ts, 'timestamp_ms': ms,
+                   'ph': 6.5, 'nitrogen': 40.0 + i, 'phosphorus': 20.0, 'potassium': 150.0,
+                   'moisture': 55.0, 'temperature': 28.5, 'humidity': 70.0, 'ec': 1.2 + i / 100}
+        if i % 3 == 1:
+            reading['quality_flags'] = ['ph']
+            reading['quality'] = 'suspect'
+        if i % 4 == 2:
+            del reading['moisture']
+        readings.append(reading)
+    return readings
+
+
+def test_hot_window_history_matches_database(memory_db, monkeypatch):
+    memory_db.create_document('fields', {'user_id': 'u1'}, 'f1')
+    readings = _readings(20)
+    ids = write_readings('f1', readings)
+    store = HotWindowStore(capacity=100)
+    store.append('f1', readings, ids)
+    monkeypatch.setattr(sensor_data_service, 'get_hot_window_store', lambda: store)
+
+    monkeypatch.setattr(Config, 'HOT_WINDOW_ENABLED', False)
+    from_db = sensor_data_service.get_sensor_history('f1', 'u1', '1d', 'raw')
+    monkeypatch.setattr(Config, 'HOT_WINDOW_ENABLED', True)
+    from_memory = sensor_data_service.get_sensor_history('f1', 'u1', '1d', 'raw')
+
+    assert len(from_db) == 20
+    assert from_memory == from_db
+    assert from_memory[1]['ph'] == 0.0 and from_memory[2]['moisture'] == 0.0
+    assert from_memory[0]['ec'] == 1.2 and from_memory[0]['id'] == ids[0]
+    assert isinstance(from_memory[0]['timestamp'], str)
+
+
+def test_snapshot_round_trip_keeps_ids_and_ec(tmp_path):
+    readings = _readings(5)
+    store = HotWindowStore(capacity=10)
+    store.append('f1', readings, [f'id{i}' for i in range(5)])
+    path = str(tmp_path / 'hot.npz')
+    store.snapshot(path)
+
+    restored = HotWindowStore(capacity=10)
+    restored.restore(path)
+    start = datetime.now(timezone.utc) - timedelta(days=1)
+    assert restored.readings('f1', start) == store.readings('f1', start)
+    assert restored.latest('f1')['id'] == 'id0'
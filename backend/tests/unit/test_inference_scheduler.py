@@ -0,0 +1,78 @@
+"""InferenceScheduler with several workers draining one queue"""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.ml_models.inference_scheduler import InferenceScheduler
+
+
+def _doubling_model(images: np.ndarray) -> np.ndarray:
+    time.sleep(0.0005)
+    return images * 2
+
+
+def _submit_from_threads(scheduler: InferenceScheduler, threads: int, per_thread: int):
+    errors = []
+
+    def client(offset: int) -> None:
+        for i in range(per_thread):
+            value = offset * per_thread + i
+            try:
+                output = scheduler.predict(np.full((1, 3), value, dtype=np.float32), timeout=10)
+                assert output.shape == (1, 3) and output[0, 0] == 2 * value
+            except Exception as e:  # pylint: disable=broad-except
+                errors.append(e)
+
+    clients = [threading.Thread(target=client, args=(k,)) for k in range(threads)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return errors
+
+
+def test_concurrent_workers_serve_every_request():
+    scheduler = InferenceScheduler(_doubling_model, max_batch_size=4, max_wait_ms=2, workers=4)
+    try:
+        errors = _submit_from_threads(scheduler, threads=16, per_thread=200)
+
+        assert errors == []
+        assert all(thread.is_alive() for thread in scheduler._threads)
+        stats = scheduler.snapshot()
+        assert stats['requests'] == stats['images'] == 16 * 200
+        assert stats['errors'] == 0
+    finally:
+        scheduler.stop(timeout=5)
+
+
+def test_failed_batch_fails_its_requests_only():
+    calls = {'count': 0}
+    lock = threading.Lock()
+
+    def flaky_model(images: np.ndarray) -> np.ndarray:
+        with lock:
+            calls['count'] += 1
+            failing = calls['count'] == 5
+        if failing:
+            raise RuntimeError('invoke failed')
+        return _doubling_model(images)
+
+    scheduler = InferenceScheduler(flaky_model, max_batch_size=4, max_wait_ms=2, workers=4)
+    try:
+        errors = _submit_from_threads(scheduler, threads=8, per_thread=50)
+
+        assert errors and all(isinstance(e, RuntimeError) for e in errors)
+        assert len(errors) <= 4
+        assert all(thread.is_alive() for thread in scheduler._threads)
+        assert scheduler.predict(np.ones((1, 3), dtype=np.float32), timeout=5)[0, 0] == 2
+    finally:
+        scheduler.stop(timeout=5)
+
+
+def test_stopped_scheduler_rejects_requests():
+    scheduler = InferenceScheduler(_doubling_model, workers=2)
+    scheduler.stop()
+    with pytest.raises(RuntimeError):
+        scheduler.submit(np.ones((1, 3), dtype=np.float32))
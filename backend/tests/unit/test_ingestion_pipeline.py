@@ -0,0 +1,45 @@
+"""Tests for the bounded ingestion pipeline"""
+from app.core import ingestion_pipeline
+from app.core.ingestion_pipeline import IngestionPipeline
+
+
+def _paused_pipeline():
+    pipeline = IngestionPipeline(
+        sink=lambda *args: None,
+        maxsize=4,
+        high_watermark=2,
+        low_watermark=0,
+        shed_policy='downsample',
+        max_block_seconds=0,
+    )
+    assert pipeline.submit('f1', 'soil', {'moisture': 10})
+    assert pipeline.submit('f2', 'soil', {'moisture': 20})
+    return pipeline
+
+
+def test_downsample_merge_is_accepted_and_restamped(monkeypatch):
+    pipeline = _paused_pipeline()
+    queued = pipeline._latest_normal['f1']
+    first_received = queued.received_at
+    monkeypatch.setattr(ingestion_pipeline.time, 'time', lambda: first_received + 30)
+
+    assert pipeline.submit('f1', 'soil', {'moisture': 11}) is True
+
+    assert pipeline.paused
+    assert pipeline.depth == 2
+    assert queued.payload == {'moisture': 11}
+    assert queued.stamped_payload()['received_at'] == first_received + 30
+    assert pipeline.stats['downsampled'] == 1
+    assert pipeline.stats['dropped_normal'] == 0
+
+
+def test_hard_limit_sheds_oldest_normal_reading():
+    pipeline = _paused_pipeline()
+    assert pipeline.submit('f3', 'soil', {'moisture': 30})
+    assert pipeline.submit('f4', 'soil', {'moisture': 40})
+
+    assert pipeline.submit('f5', 'soil', {'moisture': 50}) is False
+
+    assert pipeline.depth == 4
+    assert pipeline.stats['dropped_normal'] == 1
+    assert 'f1' not in pipeline._latest_normal
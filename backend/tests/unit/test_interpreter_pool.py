@@ -0,0 +1,61 @@
+"""PooledInterpreter serves channels-first (NCHW) TFLite models from NHWC batches"""
+import numpy as np
+
+from app.ml_models.interpreter_pool import PooledInterpreter
+
+
+class FakeInterpreter:
+    """tf.lite.Interpreter stand-in; the 'model' returns each image's per-channel mean"""
+
+    def __init__(self, shape, dtype=np.float32):
+        self.shape = np.array(shape, dtype=np.int32)
+        self.signature = np.array([-1, *shape[1:]], dtype=np.int32)
+        self.dtype = dtype
+        self.tensor = None
+
+    def allocate_tensors(self):
+        pass
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': self.shape.copy(), 'shape_signature': self.signature.copy(),
+                 'dtype': self.dtype, 'quantization': (0.0, 0)}]
+
+    def get_output_details(self):
+        return [{'index': 1, 'shape': np.array([self.shape[0], 3]), 'dtype': np.float32,
+                 'quantization': (0.0, 0)}]
+
+    def resize_tensor_input(self, index, shape, strict=True):
+        self.shape = np.array(shape, dtype=np.int32)
+
+    def set_tensor(self, index, value):
+        assert tuple(value.shape) == tuple(self.shape)
+        self.tensor = value
+
+    def invoke(self):
+        pass
+
+    def get_tensor(self, index):
+        channels_first = self.shape[1] == 3
+        return self.tensor.mean(axis=(2, 3) if channels_first else (1, 2))
+
+
+def _images(batch_size):
+    images = np.zeros((batch_size, 8, 8, 3), dtype=np.float32)
+    images[..., 1] = 0.5
+    images[..., 2] = 1.0
+    return images
+
+
+def test_channels_first_input_is_reported_and_fed_as_nhwc():
+    member = PooledInterpreter(FakeInterpreter([1, 3, 8, 8]))
+    assert member.channels_first
+    assert list(member.input_details[0]['shape']) == [1, 8, 8, 3]
+    assert member.dynamic_batch
+    np.testing.assert_allclose(member.predict(_images(4)), [[0.0, 0.5, 1.0]] * 4)
+    assert list(member.input_details[0]['shape']) == [4, 8, 8, 3]
+
+
+def test_channels_last_input_is_unchanged():
+    member = PooledInterpreter(FakeInterpreter([1, 8, 8, 3]))
+    assert not member.channels_first
+    np.testing.assert_allclose(member.predict(_images(2)), [[0.0, 0.5, 1.0]] * 2)
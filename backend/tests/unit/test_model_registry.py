@@ -0,0 +1,131 @@
+"""Model registry: hot-swap with pinned requests and shadow evaluation"""
+import numpy as np
+import pytest
+
+from app.ml_models.model_registry import ModelRegistry, manifest_entry, read_manifest, write_manifest
+
+
+class FakeModel:
+    def __init__(self, entry, pool_size):
+        self.model_version = entry.model_version if entry is not None else 'bundled'
+        self.pool_size = pool_size
+        self.in_flight = 0
+        self.retired = False
+        self.warmed = False
+        self.closed = False
+        self.preprocessor = self
+
+    def warmup(self):
+        self.warmed = True
+
+    def close(self):
+        self.closed = True
+
+    def preprocess(self, image_bytes):
+        return np.zeros((1, 2, 2, 3), dtype=np.float32)
+
+    def predict(self, batch):
+        top = 0 if self.model_version.startswith('v1') else 1
+        return np.eye(3, dtype=np.float32)[[top]]
+
+    def get_class_names(self):
+        return ['healthy', 'leaf_curl', 'anthracnose']
+
+
+class Factory:
+    def __init__(self):
+        self.loaded = []
+
+    def __call__(self, entry, pool_size):
+        model = FakeModel(entry, pool_size)
+        self.loaded.append(model)
+        return model
+
+
+def _manifest(path, active, shadow=None, revisions=None):
+    models = {
+        version: {'model': f'{version}/model.tflite', 'info': f'{version}/model_info.json',
+                  **({'revision': revisions[version]} if revisions and version in revisions else {})}
+        for version in ('v1', 'v2')
+    }
+    write_manifest(path, {'active': active, 'shadow': shadow, 'models': models})
+
+
+def test_bundled_model_without_registry_dir():
+    factory = Factory()
+    registry = ModelRegistry(factory)
+
+    assert registry.active.model_version == 'bundled'
+    assert registry.active is registry.active
+    assert len(factory.loaded) == 1 and factory.loaded[0].warmed
+    with pytest.raises(RuntimeError):
+        registry.activate('v2')
+
+
+def test_hot_swap_waits_for_pinned_requests(tmp_path):
+    _manifest(tmp_path, 'v1')
+    factory = Factory()
+    registry = ModelRegistry(factory, str(tmp_path))
+
+    with registry.use() as old:
+        assert old.model_version == 'v1'
+        new = registry.activate('v2')
+        assert new.warmed and registry.active is new
+        assert old.retired and not old.closed
+    assert old.closed and old.in_flight == 0
+    assert registry.activate('v2') is new
+    assert registry.stats['swaps'] == 1
+
+
+def test_reload_follows_manifest_revision(tmp_path):
+    _manifest(tmp_path, 'v1', revisions={'v1': 'aaa'})
+    registry = ModelRegistry(Factory(), str(tmp_path))
+    first = registry.active
+    assert first.model_version == 'v1+aaa'
+
+    registry.reload()
+    assert registry.active is first
+
+    _manifest(tmp_path, 'v1', revisions={'v1': 'bbb'})
+    registry.reload()
+    assert registry.active.model_version == 'v1+bbb'
+    assert first.closed
+
+
+def test_shadow_evaluates_sampled_requests(tmp_path):
+    _manifest(tmp_path, 'v1', shadow={'version': 'v2', 'sample_rate': 1.0})
+    factory = Factory()
+    registry = ModelRegistry(factory, str(tmp_path))
+
+    with registry.use() as model:
+        probabilities = model.predict(None)[0]
+        assert registry.shadow(model, None, b'image', probabilities)
+    shadow = registry._shadow
+    shadow._executor.shutdown(wait=True)
+
+    snapshot = registry.snapshot()['shadow']
+    assert snapshot['version'] == 'v2' and snapshot['evaluated'] == 1
+    assert snapshot['agreement_rate'] == 0.0
+    assert snapshot['disagreements'] == {'healthy -> leaf_curl': 1}
+    assert shadow.candidate.pool_size == 1
+    assert model.in_flight == 0 and shadow.candidate.in_flight == 0
+
+
+def test_shadow_removed_on_reload_retires_candidate(tmp_path):
+    _manifest(tmp_path, 'v1', shadow={'version': 'v2', 'sample_rate': 0.5})
+    registry = ModelRegistry(Factory(), str(tmp_path))
+    assert registry.active.model_version == 'v1'
+    candidate = registry._shadow.candidate
+
+    _manifest(tmp_path, 'v1')
+    registry.reload()
+
+    assert registry._shadow is None
+    assert candidate.closed
+
+
+def test_unknown_version(tmp_path):
+    _manifest(tmp_path, 'v1')
+    with pytest.raises(KeyError):
+        manifest_entry(tmp_path, read_manifest(tmp_path), 'v9')
+    assert read_manifest(tmp_path / 'missing') == {'active': None, 'shadow': None, 'models': {}}
@@ -0,0 +1,107 @@
+"""Content-addressed prediction cache tiers"""
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.ml_models.prediction_cache import PredictionCache
+
+
+def _jpeg(seed, size=(64, 48), quality=90):
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, size[0])[None, :, None] * np.ones((size[1], 1, 3))
+    noise = rng.integers(0, 60, (size[1], size[0], 3))
+    pixels = np.clip(gradient * (0.3 + seed % 5 / 5) + noise, 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def _miss_then_store(cache, version, image, probabilities):
+    lookup = cache.lookup(version, image)
+    assert not lookup.hit
+    cache.store(lookup, probabilities)
+
+
+def test_memory_hit_is_per_model_version():
+    cache = PredictionCache(max_entries=4)
+    image = _jpeg(1)
+    _miss_then_store(cache, 'v1', image, [0.1, 0.9])
+
+    hit = cache.lookup('v1', image)
+    assert hit.hit and hit.tier == 'memory'
+    np.testing.assert_allclose(hit.probabilities, [0.1, 0.9])
+    assert not hit.probabilities.flags.writeable
+    assert not cache.lookup('v2', image).hit
+    assert not cache.lookup('v1', image + b'\0').hit
+
+
+def test_lru_evicts_least_recently_used():
+    cache = PredictionCache(max_entries=2)
+    images = [_jpeg(i) for i in range(3)]
+    _miss_then_store(cache, 'v1', images[0], [1.0])
+    _miss_then_store(cache, 'v1', images[1], [2.0])
+    assert cache.lookup('v1', images[0]).hit
+    _miss_then_store(cache, 'v1', images[2], [3.0])
+
+    assert cache.lookup('v1', images[0]).hit
+    assert not cache.lookup('v1', images[1]).hit
+    assert cache.stats['evictions'] == 1
+
+
+def test_disk_tier_survives_a_new_process(tmp_path):
+    image = _jpeg(2)
+    _miss_then_store(PredictionCache(disk_dir=str(tmp_path)), 'v1', image, [0.25, 0.75])
+
+    restarted = PredictionCache(disk_dir=str(tmp_path))
+    first, second = restarted.lookup('v1', image), restarted.lookup('v1', image)
+
+    assert (first.tier, second.tier) == ('disk', 'memory')
+    np.testing.assert_allclose(first.probabilities, [0.25, 0.75])
+    assert not restarted.lookup('v2', image).hit
+
+
+def test_corrupt_disk_entry_is_a_miss(tmp_path):
+    cache = PredictionCache(disk_dir=str(tmp_path))
+    image = _jpeg(3)
+    _miss_then_store(cache, 'v1', image, [1.0])
+    for path in tmp_path.rglob('*.json'):
+        path.write_text('{not json')
+
+    restarted = PredictionCache(disk_dir=str(tmp_path))
+    assert not restarted.lookup('v1', image).hit
+    assert restarted.stats['disk_errors'] == 1
+
+
+def test_disk_is_pruned_per_version(tmp_path):
+    cache = PredictionCache(disk_dir=str(tmp_path), disk_max_entries=10)
+    for i in range(12):
+        _miss_then_store(cache, 'v1', _jpeg(i), [float(i)])
+
+    assert len(list((tmp_path / 'v1').rglob('*.json'))) <= 10
+
+
+def test_near_duplicate_tier_matches_reencoded_copy():
+    cache = PredictionCache(phash_distance=6)
+    original = _jpeg(4, size=(128, 96))
+    _miss_then_store(cache, 'v1', original, [0.3, 0.7])
+    recompressed = BytesIO()
+    Image.open(BytesIO(original)).resize((96, 72)).save(recompressed, format='JPEG', quality=60)
+
+    hit = cache.lookup('v1', recompressed.getvalue())
+
+    assert hit.tier == 'near_duplicate'
+    assert not cache.lookup('v2', recompressed.getvalue()).hit
+    assert not cache.lookup('v1', b'not an image').hit
+
+
+def test_snapshot_hit_rates():
+    cache = PredictionCache()
+    image = _jpeg(5)
+    _miss_then_store(cache, 'v1', image, [1.0])
+    cache.lookup('v1', image)
+
+    snapshot = cache.snapshot()
+    assert snapshot['lookups'] == 2 and snapshot['entries'] == 1
+    assert snapshot['hit_rate'] == pytest.approx(0.5)
@@ -0,0 +1,75 @@
+"""DDSketch accuracy, merging and serialisation"""
+import numpy as np
+import pytest
+
+from app.services.sensor_rollups import bucket_sketches
+from app.utils.quantile_sketch import DDSketch
+
+QS = (0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0)
+
+
+def _assert_relative_error(sketch, samples, accuracy):
+    ordered = np.sort(samples)
+    for q, estimate in sketch.quantiles(QS).items():
+        expected = ordered[int(q * (ordered.size - 1))]
+        assert abs(estimate - expected) <= accuracy * abs(expected) + 1e-12, q
+
+
+def test_quantiles_within_relative_accuracy():
+    samples = np.random.default_rng(1).lognormal(2.0, 1.0, 5000)
+    sketch = DDSketch(0.01).add(samples)
+
+    assert sketch.count == samples.size
+    _assert_relative_error(sketch, samples, 0.01)
+
+
+def test_merge_keeps_relative_accuracy():
+    rng = np.random.default_rng(2)
+    parts = [rng.normal(25, 4, 3000), rng.normal(-3, 2, 1000), np.zeros(50), rng.uniform(0.5, 90, 2000)]
+    merged = DDSketch(0.02)
+    for part in parts:
+        merged.merge(DDSketch(0.02).add(part))
+
+    samples = np.concatenate(parts)
+    assert merged.count == samples.size
+    _assert_relative_error(merged, samples, 0.02)
+    # Merging equals sketching everything at once
+    assert merged.to_dict() == DDSketch(0.02).add(samples).to_dict()
+
+
+def test_serialisation_round_trip_then_merge():
+    rng = np.random.default_rng(3)
+    first, second = rng.normal(6.5, 0.4, 500), rng.normal(7.5, 0.3, 700)
+    stored = DDSketch(0.01).add(first).to_dict()
+
+    assert all(isinstance(k, str) for k in stored['p'])
+    restored = DDSketch.from_dict(stored, 0.01).merge(DDSketch(0.01).add(second))
+
+    _assert_relative_error(restored, np.concatenate([first, second]), 0.01)
+
+
+def test_nan_ignored_and_empty_sketch():
+    assert DDSketch().add([np.nan, np.nan]).count == 0
+    assert DDSketch().quantile(0.5) is None
+    assert DDSketch().add([np.nan, 4.0]).quantile(0.5) == pytest.approx(4.0, rel=0.01)
+
+
+def test_merge_rejects_different_accuracy():
+    with pytest.raises(ValueError):
+        DDSketch(0.01).merge(DDSketch(0.02))
+
+
+def test_bucket_sketches_match_per_bucket_sketch():
+    rng = np.random.default_rng(4)
+    ts = np.sort(rng.uniform(0, 3 * 86400, 2000))
+    values = rng.normal(20, 8, ts.size)
+    values[::17] = np.nan
+
+    sketches = bucket_sketches(ts, {'temperature': values}, 86400, 0.01)
+
+    assert sorted(sketches) == [0.0, 86400.0, 172800.0]
+    for start, channels in sketches.items():
+        in_bucket = (ts >= start) & (ts < start + 86400)
+        expected = DDSketch(0.01).add(values[in_bucket]).to_dict()
+        actual = DDSketch.from_dict(channels['temperature'], 0.01).to_dict()
+        assert actual == expected
@@ -0,0 +1,109 @@
+"""Retention policies for alerts, notifications and raw readings"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.config import Config
+from app.services import retention
+from app.services.reading_store import query_readings, write_readings
+from app.services.sensor_rollups import get_rollups
+from app.utils.helpers import normalize_timestamp
+
+NOW = datetime(2026, 6, 1, 12, 0, tzinfo=timezone.utc)
+OLD = NOW - timedelta(days=200)
+
+
+def _ids(db, collection):
+    return sorted(d['id'] for d in db.query_collection(collection))
+
+
+@pytest.fixture
+def alerts(memory_db):
+    memory_db.set_documents('alerts', {
+        'resolved_old': {'status': 'resolved', 'resolved_at': OLD},
+        'acked_old': {'status': 'acknowledged', 'acknowledged_at': OLD, 'resolved_at': OLD},
+        'active_acked_old': {'status': 'active', 'acknowledged_at': OLD},
+        'resolved_recent': {'status': 'resolved', 'resolved_at': NOW - timedelta(days=1)},
+        'active_new': {'status': 'active'},
+    })
+    return memory_db
+
+
+def test_alerts_policy_keeps_active_and_recent(alerts):
+    report = retention.compact_collection('alerts', NOW - timedelta(days=90), page_size=2)
+
+    assert _ids(alerts, 'alerts') == ['active_acked_old', 'active_new', 'resolved_recent']
+    assert (report['deleted'], report['kept'], report['complete']) == (2, 1, True)
+
+
+def test_alerts_dry_run_counts_each_document_once(alerts):
+    report = retention.compact_collection('alerts', NOW - timedelta(days=90), dry_run=True)
+
+    assert len(_ids(alerts, 'alerts')) == 5
+    assert (report['deleted'], report['kept']) == (2, 1)
+
+
+def test_limit_leaves_the_rest_for_the_next_run(memory_db):
+    memory_db.set_documents('notifications', {
+        f'n{i}': {'sent_at': OLD + timedelta(minutes=i)} for i in range(5)})
+
+    first = retention.compact_collection('notifications', NOW, limit=3)
+    assert (first['deleted'], first['complete']) == (3, False)
+    second = retention.compact_collection('notifications', NOW, limit=3)
+    assert (second['deleted'], second['complete']) == (2, True)
+    assert _ids(memory_db, 'notifications') == []
+
+
+def _write_days(field_id, start, days, per_day=6):
+    readings = []
+    for i in range(days * per_day):
+        ts, ms = normalize_timestamp(start + timedelta(hours=24 * i / per_day))
+        readings.append({'field_id': field_id, 'timestamp': ts, 'timestamp_ms': ms, 'ph': 6.0 + i % 3})
+    write_readings(field_id, readings)
+    return readings
+
+
+def test_readings_are_rolled_up_then_deleted_in_whole_days(memory_db):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    _write_days('f1', start, 5)
+
+    # Cutoff at noon of day 3 rounds down to midnight: days 1-3 go
+    report = retention.compact_readings(start + timedelta(days=3, hours=12), ['f1'], page_size=4)
+
+    assert report['deleted'] == 18 and report['fields'] == 1
+    assert report['rollup_days'] == 3
+    remaining = query_readings('f1')
+    assert len(remaining) == 12
+    assert min(r['timestamp_ms'] for r in remaining) == normalize_timestamp(start + timedelta(days=3))[1]
+    days = get_rollups('f1', 'day', start, start + timedelta(days=3))
+    assert [d['count'] for d in days] == [6, 6, 6]
+
+
+def test_readings_limit_stops_at_a_day_boundary(memory_db):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    _write_days('f1', start, 4)
+
+    report = retention.compact_readings(start + timedelta(days=4), ['f1'], page_size=100, limit=8)
+
+    assert report['complete'] is False
+    assert report['deleted'] == 12
+    assert len(query_readings('f1')) == 12
+
+
+def test_run_compaction_records_the_run(memory_db, monkeypatch):
+    monkeypatch.setattr(Config, 'RETENTION_READINGS_DAYS', 0)
+    memory_db.set_documents('notifications', {'n1': {'sent_at': OLD}})
+    scheduler = retention.RetentionScheduler(24)
+    assert scheduler.due(NOW)
+
+    reports = retention.run_compaction(now=NOW)
+
+    assert set(reports) == {'alerts', 'notifications'}
+    assert reports['notifications']['deleted'] == 1
+    assert not scheduler.due(NOW + timedelta(hours=23))
+    assert scheduler.due(NOW + timedelta(hours=24))
+
+
+def test_run_compaction_rejects_unknown_policies(memory_db):
+    with pytest.raises(ValueError):
+        retention.run_compaction(policies=['sessions'], now=NOW)
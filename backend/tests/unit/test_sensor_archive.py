@@ -0,0 +1,83 @@
+"""Archive put -> index -> delete, including retried runs"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import sensor_archive
+from app.services.reading_store import query_readings, write_readings
+from app.utils.helpers import normalize_timestamp
+
+BASE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def store(memory_db, monkeypatch, tmp_path):
+    local = sensor_archive.LocalArchiveStore(str(tmp_path))
+    monkeypatch.setattr(sensor_archive, '_store', local)
+    readings = []
+    for i in range(45):
+        ts, ms = normalize_timestamp(BASE + timedelta(days=i))
+        readings.append({'field_id': 'f1', 'device_id': 'd1' if i < 20 else 'd2', 'timestamp': ts,
+                         'timestamp_ms': ms, 'ph': 6.0 + i / 100, 'moisture': None if i % 9 else 30.0,
+                         **({'quality_flags': ['ph']} if i == 3 else {})})
+    write_readings('f1', readings)
+    return local
+
+
+def _live():
+    return query_readings('f1')
+
+
+def test_archive_writes_block_indexes_and_deletes(store):
+    cutoff = BASE + timedelta(days=40)
+
+    assert sensor_archive.archive_readings(cutoff, ['f1']) == {'f1': 40}
+
+    assert len(_live()) == 5
+    index = sensor_archive.db.get_document(sensor_archive.ARCHIVE_INDEX_COLLECTION, 'f1')
+    assert index['months'] == {'2026-01': 31, '2026-02': 9}
+    assert sensor_archive.archived_until('f1') == cutoff
+    archived = sensor_archive.read_archived('f1')
+    assert [r['timestamp'] for r in archived] == [BASE + timedelta(days=i) for i in range(40)]
+    assert archived[3]['quality_flags'] == ['ph'] and archived[3]['quality'] == 'suspect'
+    assert archived[25]['device_id'] == 'd2' and archived[9]['moisture'] == 30.0
+    assert archived[10]['moisture'] is None
+    assert store.get(sensor_archive._block_name('f1', '2026-01')) is not None
+
+
+def test_retry_after_failed_delete_does_not_duplicate(store, monkeypatch):
+    cutoff = BASE + timedelta(days=40)
+    delete = sensor_archive.delete_readings
+
+    def fail_once(field_id, ids):
+        monkeypatch.setattr(sensor_archive, 'delete_readings', delete)
+        raise RuntimeError('deadline exceeded')
+
+    monkeypatch.setattr(sensor_archive, 'delete_readings', fail_once)
+    with pytest.raises(RuntimeError):
+        sensor_archive.archive_readings(cutoff, ['f1'])
+    # January was written and indexed but its documents are still live
+    assert len(_live()) == 45
+
+    sensor_archive.archive_readings(cutoff, ['f1'])
+
+    assert len(_live()) == 5
+    index = sensor_archive.db.get_document(sensor_archive.ARCHIVE_INDEX_COLLECTION, 'f1')
+    assert index['months'] == {'2026-01': 31, '2026-02': 9}
+    assert len(sensor_archive.read_archived('f1')) == 40
+
+
+def test_archive_extends_an_archived_month(store):
+    sensor_archive.archive_readings(BASE + timedelta(days=10), ['f1'])
+    sensor_archive.archive_readings(BASE + timedelta(days=40), ['f1'])
+
+    index = sensor_archive.db.get_document(sensor_archive.ARCHIVE_INDEX_COLLECTION, 'f1')
+    assert index['months'] == {'2026-01': 31, '2026-02': 9}
+    assert len(sensor_archive.read_archived('f1')) == 40
+    assert sensor_archive.read_archived('f1', BASE + timedelta(days=40)) == []
+
+
+def test_dry_run_changes_nothing(store):
+    assert sensor_archive.archive_readings(BASE + timedelta(days=40), ['f1'], dry_run=True) == {'f1': 40}
+    assert len(_live()) == 45
+    assert sensor_archive.archived_until('f1') is None
@@ -0,0 +1,56 @@
+"""Tests for raw-window loading in the sensor query engine"""
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.core.config import Config
+from app.services import sensor_query
+from app.services.reading_store import write_readings
+from app.services.sensor_rollups import reading_columns
+
+START = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def _readings(count):
+    base = START.timestamp()
+    readings = []
+    for i in range(count):
+        ts = base + 60 * i
+        reading = {
+            'field_id': 'f1',
+            'timestamp': datetime.fromtimestamp(ts, tz=timezone.utc),
+            'timestamp_ms': int(ts * 1000),
+            'ph': 6.0 + (i % 7) * 0.1,
+            'moisture': 30.0 + i,
+        }
+        if i % 5 == 0:
+            reading['quality_flags'] = ['moisture']
+        readings.append(reading)
+    return readings
+
+
+def test_raw_window_pages_match_one_shot_conversion(memory_db, monkeypatch):
+    monkeypatch.setattr(Config, 'HOT_WINDOW_ENABLED', False)
+    monkeypatch.setattr(sensor_query, 'RAW_PAGE_SIZE', 4)
+    readings = _readings(23)
+    write_readings('f1', list(reversed(readings)))
+    end = datetime.fromtimestamp(START.timestamp() + 60 * 20, tz=timezone.utc)
+
+    source, ts, columns = sensor_query._raw_window('f1', START, end, ('ph', 'moisture'))
+
+    expected_ts, expected = reading_columns(readings[:20])
+    assert source == 'readings'
+    np.testing.assert_array_equal(ts, expected_ts)
+    assert set(columns) == {'ph', 'moisture'}
+    np.testing.assert_array_equal(columns['ph'], expected['ph'])
+    np.testing.assert_array_equal(columns['moisture'], expected['moisture'])
+    assert np.isnan(columns['moisture'][0])
+
+
+def test_raw_window_empty(memory_db, monkeypatch):
+    monkeypatch.setattr(Config, 'HOT_WINDOW_ENABLED', False)
+
+    source, ts, columns = sensor_query._raw_window('missing', START, datetime.now(timezone.utc), ('ph',))
+
+    assert source == 'readings'
+    assert ts.size == 0 and columns['ph'].size == 0
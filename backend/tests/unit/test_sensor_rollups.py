@@ -0,0 +1,41 @@
+"""Rollup chart series only serve windows they fully cover"""
+from datetime import datetime, timedelta, timezone
+
+from app.services import sensor_data_service
+from app.services.reading_store import write_readings
+from app.services.sensor_rollups import rollup_series, update_rollups
+from app.utils.helpers import normalize_timestamp
+
+NOW = datetime.now(timezone.utc).replace(minute=30, second=0, microsecond=0)
+
+
+def _hourly(hours: int):
+    readings = []
+    for i in range(hours):
+        ts, ms = normalize_timestamp(NOW - timedelta(hours=i))
+        readings.append({'field_id': 'f1', 'timestamp': ts, 'timestamp_ms': ms,
+                         'ph': 6.0 + i / 100, 'temperature': 25.0})
+    return readings
+
+
+def test_partial_rollups_are_not_served(memory_db):
+    update_rollups('f1', _hourly(24))
+    assert rollup_series('f1', 'hour', NOW - timedelta(hours=12))
+    assert rollup_series('f1', 'hour', NOW - timedelta(hours=48)) == []
+
+
+def test_covered_window_returns_every_bucket(memory_db):
+    update_rollups('f1', _hourly(72))
+    points = rollup_series('f1', 'hour', NOW - timedelta(hours=48))
+    assert len(points) == 48
+    assert points[0]['count'] == 1 and points[0]['ph'] == 6.0
+
+
+def test_history_defaults_to_raw_readings(memory_db, monkeypatch):
+    monkeypatch.setattr(sensor_data_service.Config, 'HOT_WINDOW_ENABLED', False)
+    memory_db.create_document('fields', {'user_id': 'u1'}, 'f1')
+    readings = _hourly(72)
+    write_readings('f1', readings)
+    update_rollups('f1', readings)
+    history = sensor_data_service.get_sensor_history('f1', 'u1', '7d')
+    assert history and all('id' in point and 'resolution' not in point for point in history)
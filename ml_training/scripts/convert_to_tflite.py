@@ -8,7 +8,14 @@ import onnx
 import tensorflow as tf
 from onnx_tf.backend import prepare
 import argparse
+import json
 import logging
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -95,6 +102,189 @@ def tensorflow_to_tflite(tf_model_path, tflite_model_path, quantize=True):
     size_mb = os.path.getsize(tflite_model_path) / (1024 * 1024)
     logger.info(f'Model size: {size_mb:.2f} MB')
 
+    check_dynamic_batch(tflite_model_path)
+
+def check_dynamic_batch(tflite_model_path):
+    """Verify the batch axis exported as dynamic by pytorch_to_onnx survived conversion
+
+    The server's inference scheduler batches concurrent requests by resizing
+    the input tensor, which TFLite only allows on axes that are -1 in the
+    shape signature. With a fixed batch of 1 the server falls back to one
+    image per invoke.
+    """
+    interpreter = tf.lite.Interpreter(model_path=tflite_model_path)
+    signature = interpreter.get_input_details()[0]['shape_signature']
+    if int(signature[0]) == -1:
+        logger.info(f'Input shape signature {list(signature)}: dynamic batch axis')
+        return True
+    logger.warning(f'Input shape signature {list(signature)}: batch axis is fixed, '
+                   'the server will not batch requests')
+    return False
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+def list_images(image_dir, max_images=None, seed=42):
+    """Image paths under image_dir (class sub-directories), shuffled with a fixed seed"""
+    paths = sorted(p for p in Path(image_dir).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+    random.Random(seed).shuffle(paths)
+    return paths[:max_images] if max_images else paths
+
+def load_input(image_path, input_shape, normalization='unit'):
+    """
+    One image as a float32 model input of shape (1, ...)
+
+    'unit' keeps [0, 1], which is what the backend feeds (and what makes the
+    uint8 model's input quantization the raw pixels); 'imagenet' matches
+    train_model.get_data_transforms (resize, [0, 1], ImageNet normalisation)
+    for models that expect it. The layout (NCHW / NHWC) follows the input shape.
+    """
+    channels_first = int(input_shape[1]) == 3
+    size = int(input_shape[2]) if channels_first else int(input_shape[1])
+    image = Image.open(image_path).convert('RGB').resize((size, size))
+    array = np.asarray(image, dtype=np.float32) / 255.0
+    if normalization == 'imagenet':
+        array = (array - IMAGENET_MEAN) / IMAGENET_STD
+    if channels_first:
+        array = array.transpose(2, 0, 1)
+    return array[np.newaxis].astype(np.float32)
+
+def representative_dataset(image_dir, input_shape, num_images=200, normalization='unit'):
+    """Calibration generator for full-integer quantization, drawn from the training images"""
+    paths = list_images(image_dir, num_images)
+    if not paths:
+        raise ValueError(f'No calibration images found under {image_dir}')
+    logger.info(f'Calibrating with {len(paths)} images from {image_dir}')
+
+    def generator():
+        for path in paths:
+            yield [load_input(path, input_shape, normalization)]
+    return generator
+
+def saved_model_input_shape(tf_model_path, input_size=224):
+    """Input shape of the SavedModel's serving signature (batch fixed to 1)"""
+    model = tf.saved_model.load(tf_model_path)
+    signature = model.signatures['serving_default']
+    spec = list(signature.structured_input_signature[1].values())[0]
+    shape = [1 if dim is None else int(dim) for dim in spec.shape]
+    # onnx-tf exports the PyTorch NCHW layout; keep spatial dims if unknown
+    return [input_size if dim is None else dim for dim in shape]
+
+def tensorflow_to_tflite_int8(tf_model_path, tflite_model_path, representative_dir,
+                              input_size=224, num_images=200, io_type='uint8',
+                              normalization='unit'):
+    """
+    Full-integer post-training quantization (int8 weights and activations)
+
+    Inputs and outputs are io_type (uint8 or int8), so the server can feed
+    raw pixels and skip float conversion; scale and zero point are stored in
+    the model and read by the backend's TFLiteModelLoader.
+    """
+    input_shape = saved_model_input_shape(tf_model_path, input_size)
+    converter = tf.lite.TFLiteConverter.from_saved_model(tf_model_path)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset(
+        representative_dir, input_shape, num_images, normalization)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8 if io_type == 'uint8' else tf.int8
+    converter.inference_output_type = tf.uint8 if io_type == 'uint8' else tf.int8
+
+    logger.info(f'Converting to full-integer TFLite ({io_type} input/output)...')
+    tflite_model = converter.convert()
+    with open(tflite_model_path, 'wb') as f:
+        f.write(tflite_model)
+
+    import os
+    size_mb = os.path.getsize(tflite_model_path) / (1024 * 1024)
+    logger.info(f'Int8 TFLite model saved to: {tflite_model_path} ({size_mb:.2f} MB)')
+    check_dynamic_batch(tflite_model_path)
+
+def _run_tflite(interpreter, array):
+    input_detail = interpreter.get_input_details()[0]
+    output_detail = interpreter.get_output_details()[0]
+    if input_detail['dtype'] != np.float32:
+        scale, zero_point = input_detail['quantization']
+        info = np.iinfo(input_detail['dtype'])
+        array = np.clip(np.rint(array / scale + zero_point), info.min, info.max)
+    interpreter.set_tensor(input_detail['index'], array.astype(input_detail['dtype']))
+    start = time.perf_counter()
+    interpreter.invoke()
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    output = interpreter.get_tensor(output_detail['index'])
+    if output_detail['dtype'] != np.float32:
+        scale, zero_point = output_detail['quantization']
+        output = (output.astype(np.float32) - zero_point) * scale
+    return output[0], elapsed_ms
+
+def accuracy_parity_report(float_model_path, quant_model_path, image_dir, report_path,
+                           max_images=500, normalization='unit', class_names=None):
+    """
+    Compare the int8 model against the float model on held-out images
+
+    Reports top-1 agreement, accuracy of both models (labels come from the
+    class sub-directory names when they match class_names), the mean
+    absolute probability difference and the median invoke latency of each.
+    """
+    float_interpreter = tf.lite.Interpreter(model_path=float_model_path)
+    quant_interpreter = tf.lite.Interpreter(model_path=quant_model_path)
+    float_interpreter.allocate_tensors()
+    quant_interpreter.allocate_tensors()
+    input_shape = float_interpreter.get_input_details()[0]['shape']
+
+    paths = list_images(image_dir, max_images)
+    agree = labelled = float_correct = quant_correct = 0
+    prob_diffs, float_ms, quant_ms = [], [], []
+    for path in paths:
+        array = load_input(path, input_shape, normalization)
+        float_probs, float_elapsed = _run_tflite(float_interpreter, array)
+        quant_probs, quant_elapsed = _run_tflite(quant_interpreter, array)
+        float_ms.append(float_elapsed)
+        quant_ms.append(quant_elapsed)
+        prob_diffs.append(float(np.abs(float_probs - quant_probs).mean()))
+        agree += int(np.argmax(float_probs) == np.argmax(quant_probs))
+        if class_names and path.parent.name in class_names:
+            label = class_names.index(path.parent.name)
+            labelled += 1
+            float_correct += int(np.argmax(float_probs) == label)
+            quant_correct += int(np.argmax(quant_probs) == label)
+
+    report = {
+        'images': len(paths),
+        'top1_agreement': round(agree / len(paths), 4) if paths else None,
+        'mean_abs_prob_diff': round(float(np.mean(prob_diffs)), 5) if paths else None,
+        'labelled_images': labelled,
+        'float_accuracy': round(float_correct / labelled, 4) if labelled else None,
+        'int8_accuracy': round(quant_correct / labelled, 4) if labelled else None,
+        'float_p50_ms': round(float(np.median(float_ms)), 3) if paths else None,
+        'int8_p50_ms': round(float(np.median(quant_ms)), 3) if paths else None,
+        'float_model_mb': round(Path(float_model_path).stat().st_size / 2**20, 2),
+        'int8_model_mb': round(Path(quant_model_path).stat().st_size / 2**20, 2),
+    }
+    if report['float_p50_ms'] and report['int8_p50_ms']:
+        report['speedup'] = round(report['float_p50_ms'] / report['int8_p50_ms'], 2)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f'Accuracy parity: {report}')
+    logger.info(f'Parity report saved to: {report_path}')
+    return report
+
+def write_model_info(info_path, class_names, input_size, normalization):
+    """
+    model_info.json for the backend: class names, input size and the input
+    normalisation the export was calibrated for (the backend refuses models
+    that do not take its [0, 1] input)
+    """
+    info = {
+        'class_names': list(class_names),
+        'class_indices': {name: i for i, name in enumerate(class_names)},
+        'input_size': [input_size, input_size],
+        'input_normalization': normalization,
+    }
+    with open(info_path, 'w') as f:
+        json.dump(info, f, indent=2)
+    logger.info(f'Model info saved to: {info_path}')
+
 def main():
     parser = argparse.ArgumentParser(description='Convert PyTorch model to TFLite')
     parser.add_argument('--pytorch-model', type=str, required=True,
@@ -107,6 +297,18 @@ def main():
                         help='Input image size')
     parser.add_argument('--quantize', action='store_true',
                         help='Apply quantization for smaller model size')
+    parser.add_argument('--int8', action='store_true',
+                        help='Also export a full-integer (int8) model with a parity report')
+    parser.add_argument('--representative-dir', type=str, default='datasets/processed/train',
+                        help='Training images used to calibrate int8 quantization')
+    parser.add_argument('--num-calibration-images', type=int, default=200)
+    parser.add_argument('--io-type', choices=['uint8', 'int8'], default='uint8',
+                        help='Input/output type of the int8 model')
+    parser.add_argument('--parity-dir', type=str, default='datasets/processed/test',
+                        help='Held-out images for the float vs int8 accuracy report')
+    parser.add_argument('--normalization', choices=['unit', 'imagenet'], default='unit',
+                        help='Input normalisation for calibration and the parity report; the '
+                             'backend feeds [0, 1] (unit), recorded in the model info')
 
     args = parser.parse_args()
 
@@ -117,12 +319,15 @@ def main():
     onnx_path = os.path.join(args.output_dir, f'{args.model_name}.onnx')
     tf_path = os.path.join(args.output_dir, f'{args.model_name}_tf')
     tflite_path = os.path.join(args.output_dir, f'{args.model_name}.tflite')
+    info_path = os.path.join(args.output_dir, f'{args.model_name}_model_info.json')
 
     # Conversion pipeline
     logger.info('Starting conversion pipeline...')
 
     # PyTorch -> ONNX
     pytorch_to_onnx(args.pytorch_model, onnx_path, args.input_size)
+    class_names = torch.load(args.pytorch_model, map_location='cpu')['classes']
+    write_model_info(info_path, class_names, args.input_size, args.normalization)
 
     # ONNX -> TensorFlow
     onnx_to_tensorflow(onnx_path, tf_path)
@@ -130,6 +335,18 @@ def main():
     # TensorFlow -> TFLite
     tensorflow_to_tflite(tf_path, tflite_path, args.quantize)
 
+    # TensorFlow -> full-integer TFLite, checked against an unquantized float model
+    if args.int8:
+        from train_model import DISEASE_CLASSES
+        float_path = os.path.join(args.output_dir, f'{args.model_name}_float32.tflite')
+        int8_path = os.path.join(args.output_dir, f'{args.model_name}_int8.tflite')
+        tensorflow_to_tflite(tf_path, float_path, quantize=False)
+        tensorflow_to_tflite_int8(tf_path, int8_path, args.representative_dir, args.input_size,
+                                  args.num_calibration_images, args.io_type, args.normalization)
+        accuracy_parity_report(float_path, int8_path, args.parity_dir,
+                               os.path.join(args.output_dir, f'{args.model_name}_int8_parity.json'),
+                               normalization=args.normalization, class_names=DISEASE_CLASSES)
+
     logger.info('Conversion completed successfully!')
     logger.info(f'\\nTo use in mobile app, copy {tflite_path} to:')
     logger.info('  mobile_app/assets/ml_models/')